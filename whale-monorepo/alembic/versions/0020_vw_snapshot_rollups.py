@@ -0,0 +1,37 @@
+"""Add market_vw_snapshot_rollups for downsampled VW snapshot history.
+
+prune_vw_snapshots compacts raw snapshots older than a day into 15-minute
+buckets, and 15-minute buckets older than the raw retention into hourly ones,
+each keeping min/max/last divergence and the last YES price. /vw/snapshots
+reads the rollups for long ranges. The primary key leads with market_id, so
+it also serves the per-market range read.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0020"
+down_revision = "0019"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+  op.create_table(
+    "market_vw_snapshot_rollups",
+    sa.Column("market_id", sa.String(length=512), sa.ForeignKey("markets.id", name="fk_vw_rollups_market"), nullable=False),
+    sa.Column("resolution_seconds", sa.Integer(), nullable=False),
+    sa.Column("bucket_at", sa.DateTime(timezone=True), nullable=False),
+    sa.Column("min_divergence", sa.Numeric(10, 8), nullable=True),
+    sa.Column("max_divergence", sa.Numeric(10, 8), nullable=True),
+    sa.Column("last_divergence", sa.Numeric(10, 8), nullable=True),
+    sa.Column("last_yes_market_price", sa.Numeric(10, 8), nullable=True),
+    sa.Column("last_at", sa.DateTime(timezone=True), nullable=False),
+    sa.Column("snapshot_count", sa.Integer(), nullable=False, server_default="0"),
+    sa.PrimaryKeyConstraint("market_id", "resolution_seconds", "bucket_at", name="pk_market_vw_snapshot_rollups"),
+  )
+  op.create_index("ix_market_vw_snapshot_rollups_bucket_at", "market_vw_snapshot_rollups", ["resolution_seconds", "bucket_at"])
+
+
+def downgrade() -> None:
+  op.drop_index("ix_market_vw_snapshot_rollups_bucket_at", table_name="market_vw_snapshot_rollups")
+  op.drop_table("market_vw_snapshot_rollups")
@@ -13,7 +13,8 @@ from shared.db import SessionLocal
 from shared.logging import configure_logging
 from shared.models import TradeRaw, WhaleTradeHistory
 from services.whale_engine.engine import _apply_trade_to_position, recompute_whale_stats
-from shared.db import insert
+from services.whale_engine.wallet_stats import queue_backfilled_wallets
+from shared.db import bulk_upsert
 
 configure_logging("INFO")
 logger = logging.getLogger(__name__)
@@ -31,6 +32,8 @@ async def backfill_trade_history(wallet: str, since_days: int, limit: int, recom
 
   positions: dict[tuple[str, str], tuple[float, float]] = {}
   inserted = 0
+  rows: list[dict] = []
+  wallets: set[str] = set()
 
   async with SessionLocal() as session:
     query = select(TradeRaw).order_by(TradeRaw.timestamp.asc())
@@ -51,42 +54,35 @@ async def backfill_trade_history(wallet: str, since_days: int, limit: int, recom
       positions[key] = (update.new_size, update.new_avg)
 
       pnl = float(update.realized_pnl)
-      trade_usd = float(trade.amount) * float(trade.price)
-      stmt = (
-        insert(WhaleTradeHistory)
-        .values(
-          trade_id=trade.trade_id,
-          wallet_address=wa,
-          market_id=mid,
-          side=str(trade.side),
-          price=float(trade.price),
-          size=float(trade.amount),
-          pnl=pnl,
-          trade_usd=trade_usd,
-          timestamp=trade.timestamp,
-        )
-        .on_conflict_do_update(
-          index_elements=[WhaleTradeHistory.trade_id],
-          set_={
-            "wallet_address": wa,
-            "market_id": mid,
-            "side": str(trade.side),
-            "price": float(trade.price),
-            "size": float(trade.amount),
-            "pnl": pnl,
-            "trade_usd": trade_usd,
-            "timestamp": trade.timestamp,
-          },
-        )
-      )
-      await session.execute(stmt)
+      rows.append({
+        "trade_id": trade.trade_id,
+        "wallet_address": wa,
+        "market_id": mid,
+        "side": str(trade.side),
+        "price": float(trade.price),
+        "size": float(trade.amount),
+        "pnl": pnl,
+        "trade_usd": float(trade.amount) * float(trade.price),
+        "timestamp": trade.timestamp,
+      })
       inserted += 1
+      wallets.add(wa)
+
+    await bulk_upsert(
+      session,
+      WhaleTradeHistory,
+      rows,
+      index_elements=["trade_id"],
+      update_columns=["wallet_address", "market_id", "side", "price", "size", "pnl", "trade_usd", "timestamp"],
+    )
 
     if recompute_stats:
       await recompute_whale_stats(session)
 
     await session.commit()
 
+  if wallets:
+    await queue_backfilled_wallets(wallets)
   return inserted
 
 
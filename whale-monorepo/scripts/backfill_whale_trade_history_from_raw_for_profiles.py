@@ -8,9 +8,10 @@ from sqlalchemy import select
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-from shared.db import SessionLocal, insert
+from shared.db import SessionLocal, bulk_upsert
 from shared.models import TradeRaw, WhaleProfile, WhaleTradeHistory
 from services.whale_engine.engine import _apply_trade_to_position, recompute_whale_stats
+from services.whale_engine.wallet_stats import queue_backfilled_wallets
 
 
 def parse_args() -> argparse.Namespace:
@@ -31,30 +32,14 @@ def _normalize_wallet(value: str) -> str:
 async def _flush_batch(session, batch: list[dict]) -> None:
     if not batch:
         return
-
-    max_params = 32000
-    cols = 9
-    max_rows = max(1, max_params // cols)
-
-    while batch:
-        chunk = batch[:max_rows]
-        del batch[:max_rows]
-
-        stmt = insert(WhaleTradeHistory).values(chunk)
-        stmt = stmt.on_conflict_do_update(
-            index_elements=[WhaleTradeHistory.trade_id],
-            set_={
-                "wallet_address": stmt.excluded.wallet_address,
-                "market_id": stmt.excluded.market_id,
-                "side": stmt.excluded.side,
-                "price": stmt.excluded.price,
-                "size": stmt.excluded.size,
-                "pnl": stmt.excluded.pnl,
-                "trade_usd": stmt.excluded.trade_usd,
-                "timestamp": stmt.excluded.timestamp,
-            },
-        )
-        await session.execute(stmt)
+    await bulk_upsert(
+        session,
+        WhaleTradeHistory,
+        batch,
+        index_elements=["trade_id"],
+        update_columns=["wallet_address", "market_id", "side", "price", "size", "pnl", "trade_usd", "timestamp"],
+    )
+    batch.clear()
 
 
 async def main() -> int:
@@ -75,6 +60,7 @@ async def main() -> int:
         wallets = [str(w) for (w,) in (await session.execute(wq)).all()]
 
         total_trades = 0
+        touched: set[str] = set()
         for i in range(0, len(wallets), wallet_page_size):
             page = wallets[i : i + wallet_page_size]
             tq = select(TradeRaw).where(TradeRaw.wallet.in_(page))
@@ -117,6 +103,7 @@ async def main() -> int:
                         "timestamp": t.timestamp,
                     }
                 )
+                touched.add(wa)
 
                 if len(batch) >= batch_size:
                     await _flush_batch(session, batch)
@@ -135,6 +122,11 @@ async def main() -> int:
             await recompute_whale_stats(session)
             await session.commit()
 
+    # Running engines cache these wallets' history rows; queue them for the
+    # next incremental rescore (which re-reads them from the DB).
+    if touched:
+        await queue_backfilled_wallets(touched)
+
     print(f"✅ Backfilled whale_trade_history from trades_raw for whale_profiles wallets. Processed {total_trades} trades.")
     return 0
 
@@ -1,70 +1,293 @@
 #!/usr/bin/env python
 """
 量价指标历史回测脚本。
-取最近 N 天的高量市场数据，计算 VW divergence 分布和 velocity 阈值。
+取最近 N 天的高量市场数据，计算 VW divergence 分布和 velocity 阈值，
+并对 (divergence_threshold, velocity_5m_threshold) 网格做告警命中率扫描。
 输出建议配置值，用于校准 alert_engine_config.yaml 中的阈值参数。
 
+整个窗口只查三次库（高量市场、按 市场×天×方向 聚合的成交、每日收盘价），
+随后转为列式数组，所有市场的逐日 VW 价格、divergence 与 velocity
+用 numpy 分组运算一次算出；阈值网格按 divergence 阈值分块，交给进程池并行评估。
+
 用法:
   python scripts/backtest_vw.py --days 30 --min-volume 10000
   python scripts/backtest_vw.py --days 7 --min-volume 5000 --top-n 20
+  python scripts/backtest_vw.py --days 30 --top-n 2000 --workers 8 --grid 25
 """
 
 import argparse
 import asyncio
+import os
 import statistics
-from datetime import datetime, timezone
-from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from typing import Optional
 
 from sqlalchemy import text
 
-from services.whale_engine.vw import (
-    _calc_vw_prices,
-    _calc_divergence,
-    _calc_velocity,
-)
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - optional dependency
+    np = None
+
 from shared.config import get_alert_config
 from shared.db import SessionLocal
 
+MINUTES_PER_DAY = 1440
 
-async def get_market_price_at(
-    session, market_id: str, day: datetime.date
-) -> Optional[Decimal]:
-    """
-    获取指定日期该市场的最新 YES 成交价格。
-    先用当日最后一笔 YES 成交价；回退到用 NO 成交价推导。
-    """
+
+async def load_top_markets(session, days: int, min_volume: int, top_n: int) -> list[str]:
+    """窗口内总成交额 ≥ min_volume 的市场，按成交额降序取前 top_n 个。"""
     result = await session.execute(
         text("""
-            SELECT price FROM trades_raw
-            WHERE market_id = :mid AND outcome = 'Yes'
-              AND DATE(timestamp) = :day
-            ORDER BY timestamp DESC LIMIT 1
+            SELECT market_id
+            FROM trades_raw
+            WHERE timestamp > NOW() - (:days * INTERVAL '1 day')
+            GROUP BY market_id
+            HAVING SUM(amount * price) >= :min_vol
+            ORDER BY SUM(amount * price) DESC
+            LIMIT :top_n
         """),
-        {"mid": market_id, "day": day},
+        {"days": int(days), "min_vol": min_volume, "top_n": top_n},
     )
-    row = result.fetchone()
-    if row and row[0] is not None:
-        return row[0]
+    return [row[0] for row in result.fetchall()]
+
 
+async def load_daily_sums(session, market_ids: list[str], days: int) -> list[tuple]:
+    """[(market_id, day, 'yes'|'no', Σ(amount × price), Σ(amount)), ...]，所有市场一次取回。"""
+    result = await session.execute(
+        text("""
+            SELECT market_id, DATE(timestamp) AS day, LOWER(outcome) AS side,
+                   SUM(amount * price) AS turnover,
+                   SUM(amount) AS token_amount
+            FROM trades_raw
+            WHERE market_id = ANY(:mids)
+              AND timestamp > NOW() - (:days * INTERVAL '1 day')
+              AND LOWER(outcome) IN ('yes', 'no')
+            GROUP BY market_id, DATE(timestamp), LOWER(outcome)
+        """),
+        {"mids": market_ids, "days": int(days)},
+    )
+    return result.fetchall()
+
+
+async def load_daily_closes(session, market_ids: list[str], days: int) -> list[tuple]:
+    """
+    [(market_id, day, outcome, price), ...]：每个市场每天 Yes / No 的最后一笔成交价。
+    一条 DISTINCT ON 查询取回所有市场、所有天。
+    """
     result = await session.execute(
         text("""
-            SELECT price FROM trades_raw
-            WHERE market_id = :mid AND outcome = 'No'
-              AND DATE(timestamp) = :day
-            ORDER BY timestamp DESC LIMIT 1
+            SELECT DISTINCT ON (market_id, DATE(timestamp), outcome)
+                   market_id, DATE(timestamp) AS day, outcome, price
+            FROM trades_raw
+            WHERE market_id = ANY(:mids)
+              AND outcome IN ('Yes', 'No')
+              AND timestamp > NOW() - (:days * INTERVAL '1 day')
+            ORDER BY market_id, DATE(timestamp), outcome, timestamp DESC
         """),
-        {"mid": market_id, "day": day},
+        {"mids": market_ids, "days": int(days)},
+    )
+    return result.fetchall()
+
+
+@dataclass
+class DailyFrame:
+    """每行一个 (市场, 天)，按 (market, day) 升序排列的列式数据。"""
+    market: "np.ndarray"        # 市场编号（market_ids 下标）
+    day: "np.ndarray"           # date.toordinal()
+    yes_turnover: "np.ndarray"
+    yes_tokens: "np.ndarray"
+    no_turnover: "np.ndarray"
+    no_tokens: "np.ndarray"
+    close: "np.ndarray"         # 当日 YES 收盘价；当日无 YES 成交时为 1 - NO 收盘价；都没有为 NaN
+
+
+def build_frame(market_ids: list[str], sum_rows: list[tuple], close_rows: list[tuple]) -> DailyFrame:
+    """把查询结果转置为列，并按 (market, day) 分组求和。"""
+    index = {mid: i for i, mid in enumerate(market_ids)}
+    sum_rows = [r for r in sum_rows if r[0] in index and r[3] is not None and r[4] is not None]
+    close_rows = [r for r in close_rows if r[0] in index and r[3] is not None]
+
+    def keys(rows) -> "np.ndarray":
+        market = np.fromiter((index[r[0]] for r in rows), dtype=np.int64, count=len(rows))
+        day = np.fromiter((r[1].toordinal() for r in rows), dtype=np.int64, count=len(rows))
+        return market, day
+
+    s_market, s_day = keys(sum_rows)
+    c_market, c_day = keys(close_rows)
+    all_days = np.concatenate([s_day, c_day])
+    day0 = int(all_days.min()) if len(all_days) else 0
+    span = int(all_days.max()) - day0 + 1 if len(all_days) else 1
+    s_key = s_market * span + (s_day - day0)
+    c_key = c_market * span + (c_day - day0)
+
+    # np.unique 返回有序 key，即 (market, day) 升序
+    groups, inverse = np.unique(s_key, return_inverse=True)
+    n = len(groups)
+    is_yes = np.array([r[2] == "yes" for r in sum_rows], dtype=bool)
+    turnover = np.array([float(r[3]) for r in sum_rows], dtype=np.float64)
+    tokens = np.array([float(r[4]) for r in sum_rows], dtype=np.float64)
+
+    def side_sum(values, mask) -> "np.ndarray":
+        return np.bincount(inverse[mask], weights=values[mask], minlength=n)
+
+    # 每日收盘价落到对应分组；YES 优先，NO 推导兜底
+    close = np.full(n, np.nan)
+    c_yes = np.array([r[2] == "Yes" for r in close_rows], dtype=bool)
+    c_price = np.array([float(r[3]) for r in close_rows], dtype=np.float64)
+    pos = np.searchsorted(groups, c_key)
+    hit = pos < n
+    hit[hit] = groups[pos[hit]] == c_key[hit]
+    no_hit = hit & ~c_yes
+    close[pos[no_hit]] = 1.0 - c_price[no_hit]
+    yes_hit = hit & c_yes
+    close[pos[yes_hit]] = c_price[yes_hit]
+
+    return DailyFrame(
+        market=groups // span,
+        day=groups % span + day0,
+        yes_turnover=side_sum(turnover, is_yes),
+        yes_tokens=side_sum(tokens, is_yes),
+        no_turnover=side_sum(turnover, ~is_yes),
+        no_tokens=side_sum(tokens, ~is_yes),
+        close=close,
     )
-    row = result.fetchone()
-    if row and row[0] is not None:
-        return Decimal("1") - row[0]
 
-    return None
+
+def _safe_div(num: "np.ndarray", den: "np.ndarray", mask: "np.ndarray") -> "np.ndarray":
+    out = np.zeros_like(num, dtype=np.float64)
+    np.divide(num, den, out=out, where=mask)
+    return out
+
+
+@dataclass
+class DailySignals:
+    """至少有两天有效 divergence 的市场的逐日序列（按 (market, day) 升序）。"""
+    market: "np.ndarray"
+    day: "np.ndarray"
+    divergence: "np.ndarray"
+    close: "np.ndarray"
+    velocity: "np.ndarray"      # 相对同市场前一有效日的每分钟变化；每个市场首日为 NaN
+    next_move: "np.ndarray"     # 同市场下一有效日收盘价 - 当日收盘价；末日为 NaN
+
+
+def compute_signals(frame: DailyFrame) -> DailySignals:
+    """
+    所有市场的逐日 VW 价格、divergence 与 velocity，公式同 vw._calc_vw_prices /
+    _calc_divergence / _calc_velocity：
+      VW = Σ(amount × price) / Σ(amount)，缺失方向按 0；
+      divergence = VW_yes / (VW_yes + VW_no) - 当日 YES 收盘价；
+      velocity = Δdivergence / 间隔分钟数。
+    """
+    yes_ok = (frame.yes_tokens > 0) & (frame.yes_turnover > 0)
+    no_ok = (frame.no_tokens > 0) & (frame.no_turnover > 0)
+    yes_vw = _safe_div(frame.yes_turnover, frame.yes_tokens, yes_ok)
+    no_vw = _safe_div(frame.no_turnover, frame.no_tokens, no_ok)
+    total = yes_vw + no_vw
+    valid = (total > 0) & ~np.isnan(frame.close)
+    divergence = _safe_div(yes_vw, total, valid) - np.nan_to_num(frame.close)
+
+    # 只保留有效日数 ≥ 2 的市场（与逐市场实现一致）
+    counts = np.bincount(frame.market[valid], minlength=int(frame.market.max(initial=-1)) + 1)
+    keep = valid & (counts[frame.market] >= 2)
+
+    market = frame.market[keep]
+    day = frame.day[keep]
+    divergence = divergence[keep]
+    close = frame.close[keep]
+
+    same = np.zeros(len(market), dtype=bool)
+    same[1:] = market[1:] == market[:-1]
+    velocity = np.full(len(market), np.nan)
+    gap = (day[1:] - day[:-1]) * MINUTES_PER_DAY
+    velocity[1:][same[1:]] = (divergence[1:] - divergence[:-1])[same[1:]] / gap[same[1:]]
+    next_move = np.full(len(market), np.nan)
+    next_move[:-1][same[1:]] = (close[1:] - close[:-1])[same[1:]]
+
+    return DailySignals(market, day, divergence, close, velocity, next_move)
+
+
+# ---------------------------------------------------------------------------
+# 阈值网格扫描（进程池）
+# ---------------------------------------------------------------------------
+
+_SWEEP: Optional[DailySignals] = None
+
+
+def _init_sweep(signals: DailySignals) -> None:
+    global _SWEEP
+    _SWEEP = signals
+
+
+def evaluate_thresholds(signals: DailySignals, div_threshold: float, vel_thresholds: "np.ndarray") -> list[tuple]:
+    """
+    按实时引擎的规则回放一个 divergence 阈值下的所有 velocity 阈值：
+      方向 = divergence 超过 ±div_threshold 时 bullish / bearish，否则 neutral；
+      告警 = |velocity| ≥ vel_threshold，或方向翻转到非 neutral；
+      命中 = 告警方向非 neutral，且下一有效日收盘价朝该方向移动。
+    返回 [(div_threshold, vel_threshold, alerts, directional_alerts, hits), ...]。
+    """
+    direction = np.where(
+        signals.divergence > div_threshold, 1, np.where(signals.divergence < -div_threshold, -1, 0)
+    )
+    has_prev = ~np.isnan(signals.velocity)
+    prev_direction = np.zeros_like(direction)
+    prev_direction[1:] = direction[:-1]
+    flipped = has_prev & (direction != 0) & (direction != prev_direction)
+    scorable = (direction != 0) & ~np.isnan(signals.next_move)
+    correct = scorable & (np.sign(signals.next_move) == direction)
+    abs_velocity = np.abs(np.nan_to_num(signals.velocity))
+
+    results = []
+    for vel_threshold in vel_thresholds:
+        alert = flipped | (has_prev & (abs_velocity >= vel_threshold))
+        results.append((
+            float(div_threshold),
+            float(vel_threshold),
+            int(alert.sum()),
+            int((alert & scorable).sum()),
+            int((alert & correct).sum()),
+        ))
+    return results
+
+
+def _sweep_chunk(args: tuple) -> list[tuple]:
+    div_thresholds, vel_thresholds = args
+    out = []
+    for div_threshold in div_thresholds:
+        out.extend(evaluate_thresholds(_SWEEP, div_threshold, vel_thresholds))
+    return out
+
+
+def sweep_thresholds(
+    signals: DailySignals,
+    div_thresholds: "np.ndarray",
+    vel_thresholds: "np.ndarray",
+    workers: int = 1,
+) -> list[tuple]:
+    """对整张阈值网格求值；workers > 1 时按 divergence 阈值分块交给进程池。"""
+    if workers <= 1 or len(div_thresholds) <= 1:
+        _init_sweep(signals)
+        return _sweep_chunk((div_thresholds, vel_thresholds))
+    chunks = [(chunk, vel_thresholds) for chunk in np.array_split(div_thresholds, workers) if len(chunk)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep, initargs=(signals,)) as pool:
+        results = []
+        for part in pool.map(_sweep_chunk, chunks):
+            results.extend(part)
+    return results
+
+
+def threshold_grid(values: "np.ndarray", steps: int) -> "np.ndarray":
+    """|values| 的 P50–P99 分位点，去重后作为候选阈值。"""
+    finite = np.abs(values[~np.isnan(values)])
+    if not len(finite):
+        return np.zeros(0)
+    return np.unique(np.quantile(finite, np.linspace(0.5, 0.99, max(1, steps))))
 
 
 def _print_distribution(
-    values: list[Decimal],
+    values: list[float],
     label: str,
     threshold_key: str,
     percentile: float = 0.95,
@@ -91,180 +314,106 @@ def _print_distribution(
     print(f"    建议 {threshold_key}: {p_val:{fmt}}")
 
 
-async def backtest(days: int, min_volume: int, top_n: int = 50) -> None:
-    """Run the backtest: scan markets, compute distributions, print suggestions."""
+def _print_sweep(results: list[tuple], n_days: int, min_alerts: int, top: int = 10) -> None:
+    """按命中率列出告警数 ≥ min_alerts 的最佳阈值组合。"""
+    ranked = [r for r in results if r[3] >= min_alerts]
+    ranked.sort(key=lambda r: (r[4] / r[3], r[3]), reverse=True)
+    print(f"\n  阈值扫描（{len(results)} 组，告警 ≥ {min_alerts} 的前 {min(top, len(ranked))} 组）：")
+    if not ranked:
+        print("    没有满足最少告警数的组合，请降低 --min-alerts 或扩大回测范围。")
+        return
+    print("    divergence   velocity/min   告警/天   命中率")
+    for div_t, vel_t, alerts, directional, hits in ranked[:top]:
+        print(f"    {div_t:10.4f}   {vel_t:12.8f}   {alerts / max(1, n_days):7.2f}   {hits / directional:6.1%}")
+    best = ranked[0]
+    print(f"    建议 divergence_threshold: {best[0]:.6f}")
+    print(f"    建议 velocity_5m_threshold: {best[1]:.8f}")
+
+
+async def backtest(
+    days: int,
+    min_volume: int,
+    top_n: int = 50,
+    workers: int = 1,
+    grid: int = 20,
+    min_alerts: int = 20,
+) -> None:
+    """Run the backtest: load the window once, compute distributions, sweep thresholds."""
     _ = get_alert_config().get("vw_analysis", {})
+    if np is None:
+        print("回测需要 numpy：pip install numpy")
+        return
 
     print("=== 量价指标回测 ===")
     print(f"查询区间:     最近 {days} 天")
     print(f"最低交易量:    ${min_volume:,}")
     print(f"最多市场数:    {top_n}")
+    print(f"扫描进程数:    {workers}")
     print()
 
     async with SessionLocal() as session:
         # 1. 找到高量市场
         print("正在扫描高量市场...")
-        result = await session.execute(
-            text("""
-                SELECT market_id, COUNT(*) AS trade_count,
-                       SUM(amount * price) AS total_vol
-                FROM trades_raw
-                WHERE timestamp > NOW() - INTERVAL :period DAYS
-                GROUP BY market_id
-                HAVING SUM(amount * price) >= :min_vol
-                ORDER BY total_vol DESC
-                LIMIT :top_n
-            """),
-            {"period": days, "min_vol": min_volume, "top_n": top_n},
-        )
-        markets = [(row[0], row[2]) for row in result.fetchall()]
-        print(f"找到 {len(markets)} 个高量市场")
+        market_ids = await load_top_markets(session, days, min_volume, top_n)
+        print(f"找到 {len(market_ids)} 个高量市场")
 
-        if not markets:
+        if not market_ids:
             print("没有找到符合条件的市场，请缩小 --min-volume 或扩大 --days。")
             return
 
-        # 2. 遍历每个市场，计算逐日 divergence
-        all_divergences: list[Decimal] = []
-        all_velocities: list[Decimal] = []
-        markets_processed = 0
-
-        for idx, (market_id, total_vol) in enumerate(markets, 1):
-            if idx % 10 == 0:
-                print(f"  处理进度: {idx}/{len(markets)}")
-
-            # 获取按天、按 outcome 聚合的交易数据
-            trade_result = await session.execute(
-                text("""
-                    SELECT DATE(timestamp) AS day, outcome,
-                           SUM(amount * price) AS turnover,
-                           SUM(amount) AS token_amount
-                    FROM trades_raw
-                    WHERE market_id = :mid
-                      AND timestamp > NOW() - INTERVAL :period DAYS
-                      AND outcome IS NOT NULL
-                    GROUP BY DATE(timestamp), outcome
-                    ORDER BY day
-                """),
-                {"mid": market_id, "period": days},
-            )
-            rows = trade_result.fetchall()
-            if not rows:
-                continue
-
-            # 按天组织数据
-            daily_agg: dict[datetime.date, dict[str, Decimal]] = {}
-            for day, outcome, turnover, token_amount in rows:
-                if turnover is None or token_amount is None or turnover == 0:
-                    continue
-                if day not in daily_agg:
-                    daily_agg[day] = {
-                        "yes_amount": Decimal("0"),
-                        "no_amount": Decimal("0"),
-                    }
-                key = (outcome or "").lower()
-                if key == "yes":
-                    daily_agg[day]["yes_amount"] += Decimal(str(token_amount))
-                    daily_agg[day]["yes_avg_price"] = (
-                        Decimal(str(turnover)) / Decimal(str(token_amount))
-                    )
-                elif key == "no":
-                    daily_agg[day]["no_amount"] += Decimal(str(token_amount))
-                    daily_agg[day]["no_avg_price"] = (
-                        Decimal(str(turnover)) / Decimal(str(token_amount))
-                    )
-
-            if not daily_agg:
-                continue
-
-            # 计算每天 divergence
-            sorted_days = sorted(daily_agg.keys())
-            daily_divs: list[tuple[datetime.date, Decimal]] = []
-
-            for day in sorted_days:
-                agg = daily_agg[day]
-
-                # 构建伪交易行供 _calc_vw_prices 使用
-                pseudo_trades = []
-                if agg.get("yes_amount", 0) > 0 and "yes_avg_price" in agg:
-                    pseudo_trades.append(("Yes", agg["yes_amount"], agg["yes_avg_price"]))
-                if agg.get("no_amount", 0) > 0 and "no_avg_price" in agg:
-                    pseudo_trades.append(("No", agg["no_amount"], agg["no_avg_price"]))
-                if not pseudo_trades:
-                    continue
-
-                vw = _calc_vw_prices(pseudo_trades)
-                if vw is None:
-                    continue
-
-                day_price = await get_market_price_at(session, market_id, day)
-                if day_price is None:
-                    continue
-
-                div = _calc_divergence(
-                    vw.get("yes_vw_price"),
-                    vw.get("no_vw_price"),
-                    day_price,
-                )
-                if div is not None:
-                    daily_divs.append((day, div))
-
-            if len(daily_divs) < 2:
-                continue
-
-            # 收集所有 divergence
-            for _, div in daily_divs:
-                all_divergences.append(div)
-
-            # 计算连续日之间的 velocity（per-minute rate）
-            for i in range(1, len(daily_divs)):
-                prev_day, prev_div = daily_divs[i - 1]
-                curr_day, curr_div = daily_divs[i]
-
-                delta = datetime.combine(
-                    curr_day, datetime.min.time(), tzinfo=timezone.utc
-                ) - datetime.combine(
-                    prev_day, datetime.min.time(), tzinfo=timezone.utc
-                )
-                minutes = int(delta.total_seconds() / 60)
-                if minutes <= 0:
-                    continue
-
-                vel = _calc_velocity(curr_div, prev_div, minutes)
-                if vel is not None:
-                    all_velocities.append(vel)
-
-            markets_processed += 1
-
-        print(f"\n成功处理 {markets_processed} 个市场")
-        print("=" * 40)
-
-        # 3. 输出分布统计和建议值
-        if all_divergences:
-            _print_distribution(
-                all_divergences,
-                "Divergence",
-                "divergence_threshold",
-                percentile=0.95,
-            )
-        else:
-            print("\n没有收集到足够的 divergence 数据。")
-
-        if all_velocities:
-            _print_distribution(
-                all_velocities,
-                "Velocity（per-minute）",
-                "velocity_5m_threshold",
-                percentile=0.99,
-                fmt=".8f",
-            )
-        else:
-            print("\n没有收集到足够的 velocity 数据。")
-
-        print(f"\n=== 回测完成 ===")
-        print(
-            "将以上建议值更新到 alert_engine_config.yaml 的 vw_analysis 节中。"
+        # 2. 整个窗口一次性载入：按 市场×天×方向 的成交汇总 + 每日收盘价
+        print("正在载入逐日成交与收盘价...")
+        sum_rows = await load_daily_sums(session, market_ids, days)
+        close_rows = await load_daily_closes(session, market_ids, days)
+
+    if not sum_rows:
+        print("窗口内没有成交数据。")
+        return
+
+    # 3. 列式计算所有市场的逐日 divergence / velocity
+    signals = compute_signals(build_frame(market_ids, sum_rows, close_rows))
+    markets_processed = len(np.unique(signals.market))
+
+    print(f"\n成功处理 {markets_processed} 个市场")
+    print("=" * 40)
+
+    # 4. 输出分布统计和建议值
+    if len(signals.divergence):
+        _print_distribution(
+            signals.divergence.tolist(),
+            "Divergence",
+            "divergence_threshold",
+            percentile=0.95,
+        )
+    else:
+        print("\n没有收集到足够的 divergence 数据。")
+
+    velocities = signals.velocity[~np.isnan(signals.velocity)]
+    if len(velocities):
+        _print_distribution(
+            velocities.tolist(),
+            "Velocity（per-minute）",
+            "velocity_5m_threshold",
+            percentile=0.99,
+            fmt=".8f",
         )
+    else:
+        print("\n没有收集到足够的 velocity 数据。")
+
+    # 5. 阈值网格扫描
+    if len(velocities):
+        results = sweep_thresholds(
+            signals,
+            threshold_grid(signals.divergence, grid),
+            threshold_grid(signals.velocity, grid),
+            workers=workers,
+        )
+        _print_sweep(results, len(np.unique(signals.day)), min_alerts)
+
+    print(f"\n=== 回测完成 ===")
+    print(
+        "将以上建议值更新到 alert_engine_config.yaml 的 vw_analysis 节中。"
+    )
 
 
 def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
@@ -290,13 +439,31 @@ def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
         default=50,
         help="最多分析的市场数（默认: 50）",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="阈值扫描的进程数（默认: CPU 核数）",
+    )
+    parser.add_argument(
+        "--grid",
+        type=int,
+        default=20,
+        help="每个阈值维度的候选点数（默认: 20）",
+    )
+    parser.add_argument(
+        "--min-alerts",
+        type=int,
+        default=20,
+        help="参与阈值排名的最少告警数（默认: 20）",
+    )
     return parser.parse_args(argv)
 
 
 def main() -> None:
     """Entry point."""
     args = parse_args()
-    asyncio.run(backtest(args.days, args.min_volume, args.top_n))
+    asyncio.run(backtest(args.days, args.min_volume, args.top_n, args.workers, args.grid, args.min_alerts))
 
 
 if __name__ == "__main__":
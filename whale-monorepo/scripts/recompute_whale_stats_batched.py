@@ -12,7 +12,13 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
 from shared.db import SessionLocal, insert
 from shared.models import TradeRaw, WhaleProfile, WhaleScore, WhaleStats, WhaleTradeHistory, Wallet
-from services.whale_engine.engine import _combine_window_metrics, _compute_scores, _WindowMetrics
+from services.whale_engine.engine import (
+    _combine_window_metrics,
+    _compute_scores,
+    _ranked_raw_trades,
+    _sql_context_supported,
+    _WindowMetrics,
+)
 
 
 def parse_args() -> argparse.Namespace:
@@ -46,6 +52,18 @@ def _market_context(raw_trades: list[TradeRaw]) -> tuple[dict[str, float], dict[
     return market_volume, trade_percentiles
 
 
+def _row_context(rows) -> tuple[dict[str, float], dict[str, float]]:
+    """_market_context from (history row, percentile, market_volume) rows."""
+    market_volume: dict[str, float] = {}
+    trade_percentiles: dict[str, float] = {}
+    for t, percentile, volume in rows:
+        if percentile is None:
+            continue
+        trade_percentiles[str(t.trade_id)] = float(percentile)
+        market_volume[str(t.market_id)] = float(volume or 0)
+    return market_volume, trade_percentiles
+
+
 def _window_metrics(
     trades: list[WhaleTradeHistory],
     trade_cap: int,
@@ -154,6 +172,29 @@ async def _fetch_history_rows(session, since: datetime, wallets: list[str]) -> l
     return (await session.execute(q)).scalars().all()
 
 
+async def _fetch_history_with_context(session, since: datetime, wallets: list[str]) -> list:
+    """(history row, percentile, market_volume) rows for a batch; the database
+    ranks trades_raw for only the markets the batch traded in the window."""
+    history_limit = int(os.getenv("WHALE_STATS_HISTORY_CAP", "0"))
+    batch_markets = (
+        select(WhaleTradeHistory.market_id)
+        .where(WhaleTradeHistory.timestamp >= since)
+        .where(WhaleTradeHistory.wallet_address.in_(wallets))
+        .correlate(None)
+    )
+    ranked = _ranked_raw_trades(since, batch_markets)
+    q = (
+        select(WhaleTradeHistory, ranked.c.percentile, ranked.c.market_volume)
+        .outerjoin(ranked, ranked.c.trade_id == WhaleTradeHistory.trade_id)
+        .where(WhaleTradeHistory.timestamp >= since)
+        .where(WhaleTradeHistory.wallet_address.in_(wallets))
+        .order_by(WhaleTradeHistory.wallet_address, WhaleTradeHistory.timestamp.desc())
+    )
+    if history_limit > 0:
+        q = q.limit(history_limit)
+    return (await session.execute(q)).all()
+
+
 async def main() -> int:
     args = parse_args()
     batch_size = max(int(args.batch_size), 1)
@@ -181,19 +222,34 @@ async def main() -> int:
             print("No wallets found in whale_trade_history window.")
             return 0
 
-        raw7 = await _fetch_raw_trades(session, since7)
-        raw30 = await _fetch_raw_trades(session, since30)
-        raw90 = await _fetch_raw_trades(session, since90)
-        mv7, tp7 = _market_context(raw7)
-        mv30, tp30 = _market_context(raw30)
-        mv90, tp90 = _market_context(raw90)
+        # Postgres ranks trades_raw per batch with window functions; without
+        # them every raw row of each window is pulled and ranked here.
+        with_context = _sql_context_supported(session)
+        if not with_context:
+            raw7 = await _fetch_raw_trades(session, since7)
+            raw30 = await _fetch_raw_trades(session, since30)
+            raw90 = await _fetch_raw_trades(session, since90)
+            mv7, tp7 = _market_context(raw7)
+            mv30, tp30 = _market_context(raw30)
+            mv90, tp90 = _market_context(raw90)
 
         total_updated = 0
         for i in range(0, len(wallets), batch_size):
             batch = wallets[i : i + batch_size]
-            h7 = await _fetch_history_rows(session, since7, batch)
-            h30 = await _fetch_history_rows(session, since30, batch)
-            h90 = await _fetch_history_rows(session, since90, batch)
+            if with_context:
+                r7 = await _fetch_history_with_context(session, since7, batch)
+                r30 = await _fetch_history_with_context(session, since30, batch)
+                r90 = await _fetch_history_with_context(session, since90, batch)
+                mv7, tp7 = _row_context(r7)
+                mv30, tp30 = _row_context(r30)
+                mv90, tp90 = _row_context(r90)
+                h7 = [r[0] for r in r7]
+                h30 = [r[0] for r in r30]
+                h90 = [r[0] for r in r90]
+            else:
+                h7 = await _fetch_history_rows(session, since7, batch)
+                h30 = await _fetch_history_rows(session, since30, batch)
+                h90 = await _fetch_history_rows(session, since90, batch)
 
             w7_map: dict[str, list[WhaleTradeHistory]] = defaultdict(list)
             w30_map: dict[str, list[WhaleTradeHistory]] = defaultdict(list)
@@ -11,13 +11,14 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from shared.db import SessionLocal
 from shared.models import WhaleTradeHistory
 from services.whale_engine.engine import _apply_trade_to_position, recompute_whale_stats
+from services.whale_engine.wallet_stats import queue_backfilled_wallets
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Recompute pnl for existing whale_trade_history rows.")
     parser.add_argument("--wallet", default="", help="wallet address to recompute (optional)")
     parser.add_argument("--since-days", type=int, default=0, help="only include trades within N days")
-    parser.add_argument("--no-recompute", action="store_true", help="skip recompute_whale_stats")
+    parser.add_argument("--no-recompute", action="store_true", help="skip recompute_whale_stats; changed wallets are still queued for the incremental rescore")
     return parser.parse_args()
 
 
@@ -35,6 +36,7 @@ async def main() -> int:
 
     positions: dict[tuple[str, str], tuple[float, float]] = {}
     updated = 0
+    changed_wallets: set[str] = set()
 
     async with SessionLocal() as session:
         query = select(WhaleTradeHistory).order_by(
@@ -66,13 +68,19 @@ async def main() -> int:
             if float(row.pnl or 0) != pnl:
                 row.pnl = pnl
                 updated += 1
+                changed_wallets.add(row.wallet_address)
 
         if not args.no_recompute:
             await recompute_whale_stats(session)
 
         await session.commit()
 
-    print(f"✅ Recomputed whale_trade_history pnl. Updated {updated} rows.")
+    # Running engines cache these wallets' history rows; queue them for the
+    # next incremental rescore (which re-reads them from the DB).
+    if changed_wallets:
+        await queue_backfilled_wallets(changed_wallets)
+
+    print(f"✅ Recomputed whale_trade_history pnl. Updated {updated} rows in {len(changed_wallets)} wallets.")
     return 0
 
 
@@ -4,7 +4,6 @@ import logging
 import os
 from datetime import datetime, timedelta, timezone
 
-import httpx
 from fastapi import Depends, FastAPI, Header, HTTPException, Query
 from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert
@@ -26,6 +25,7 @@ app = FastAPI(title="alert-engine")
 
 from shared.auth import require_admin as _require_admin
 from shared.error_handlers import register_exception_handlers
+from shared.http_clients import http_client
 register_exception_handlers(app)
 
 
@@ -82,46 +82,76 @@ async def debug_outcome(
   proxy = settings.https_proxy or None
   result: dict = {"token_id": tid, "proxy_set": bool(proxy), "steps": []}
   condition_id: str | None = None
-  async with httpx.AsyncClient(proxy=proxy) as client:
-    for name, url, params in [
-      ("gamma_tokens", "https://gamma-api.polymarket.com/tokens", {"tokenId": tid}),
-      ("gamma_markets_by_clob", "https://gamma-api.polymarket.com/markets", {"clobTokenIds": tid}),
-    ]:
-      step: dict = {"name": name}
-      try:
-        resp = await client.get(url, params=params, timeout=10)
-        step["status"] = resp.status_code
-        if resp.status_code == 200:
+  client = http_client("https://gamma-api.polymarket.com")
+  for name, url, params in [
+    ("gamma_tokens", "https://gamma-api.polymarket.com/tokens", {"tokenId": tid}),
+    ("gamma_markets_by_clob", "https://gamma-api.polymarket.com/markets", {"clobTokenIds": tid}),
+  ]:
+    step: dict = {"name": name}
+    try:
+      resp = await client.get(url, params=params, timeout=10)
+      step["status"] = resp.status_code
+      if resp.status_code == 200:
+        data = resp.json()
+        first = data[0] if isinstance(data, list) and data else data
+        if isinstance(first, dict):
+          step["keys"] = sorted(list(first.keys()))[:40]
+          market = first.get("market") if name == "gamma_tokens" else first
+          if isinstance(market, dict):
+            for k in ["clobTokenIds", "outcomes", "outcomeNames", "outcomeTokens", "tokens"]:
+              if k in market:
+                v = market.get(k)
+                if isinstance(v, list):
+                  step[f"{k}_len"] = len(v)
+                elif isinstance(v, str):
+                  step[f"{k}_preview"] = v[:200]
+        step["preview"] = resp.text[:200]
+      else:
+        step["preview"] = resp.text[:200]
+    except Exception as e:
+      step["error"] = repr(e)
+    result["steps"].append(step)
+
+  client = http_client("https://clob.polymarket.com")
+  for name, url, params in [
+    ("clob_ok", "https://clob.polymarket.com/ok", None),
+    ("clob_book_token_id", "https://clob.polymarket.com/book", {"token_id": tid}),
+    ("clob_book_tokenID", "https://clob.polymarket.com/book", {"tokenID": tid}),
+    ("clob_orderbook_token_id", "https://clob.polymarket.com/orderbook", {"token_id": tid}),
+    ("clob_price", "https://clob.polymarket.com/price", {"token_id": tid, "side": "buy"}),
+  ]:
+    step: dict = {"name": name}
+    try:
+      resp = await client.get(url, params=params, timeout=10)
+      step["status"] = resp.status_code
+      step["preview"] = resp.text[:200]
+      if resp.status_code == 200:
+        try:
           data = resp.json()
-          first = data[0] if isinstance(data, list) and data else data
-          if isinstance(first, dict):
-            step["keys"] = sorted(list(first.keys()))[:40]
-            market = first.get("market") if name == "gamma_tokens" else first
-            if isinstance(market, dict):
-              for k in ["clobTokenIds", "outcomes", "outcomeNames", "outcomeTokens", "tokens"]:
-                if k in market:
-                  v = market.get(k)
-                  if isinstance(v, list):
-                    step[f"{k}_len"] = len(v)
-                  elif isinstance(v, str):
-                    step[f"{k}_preview"] = v[:200]
-          step["preview"] = resp.text[:200]
-        else:
-          step["preview"] = resp.text[:200]
-      except Exception as e:
-        step["error"] = repr(e)
-      result["steps"].append(step)
-
-    for name, url, params in [
-      ("clob_ok", "https://clob.polymarket.com/ok", None),
-      ("clob_book_token_id", "https://clob.polymarket.com/book", {"token_id": tid}),
-      ("clob_book_tokenID", "https://clob.polymarket.com/book", {"tokenID": tid}),
-      ("clob_orderbook_token_id", "https://clob.polymarket.com/orderbook", {"token_id": tid}),
-      ("clob_price", "https://clob.polymarket.com/price", {"token_id": tid, "side": "buy"}),
+          if isinstance(data, dict):
+            step["keys"] = sorted(list(data.keys()))[:40]
+            if "market" in data:
+              step["market"] = data.get("market")
+              if name == "clob_book_token_id" and isinstance(data.get("market"), str):
+                condition_id = data.get("market")
+            if "condition_id" in data:
+              step["condition_id"] = data.get("condition_id")
+            if "asset_id" in data:
+              step["asset_id"] = data.get("asset_id")
+        except Exception:
+          pass
+    except Exception as e:
+      step["error"] = repr(e)
+    result["steps"].append(step)
+
+  if condition_id:
+    for name, url in [
+      ("clob_market_markets", f"https://clob.polymarket.com/markets/{condition_id}"),
+      ("clob_market_market", f"https://clob.polymarket.com/market/{condition_id}"),
     ]:
       step: dict = {"name": name}
       try:
-        resp = await client.get(url, params=params, timeout=10)
+        resp = await client.get(url, timeout=10)
         step["status"] = resp.status_code
         step["preview"] = resp.text[:200]
         if resp.status_code == 200:
@@ -129,46 +159,17 @@ async def debug_outcome(
             data = resp.json()
             if isinstance(data, dict):
               step["keys"] = sorted(list(data.keys()))[:40]
-              if "market" in data:
-                step["market"] = data.get("market")
-                if name == "clob_book_token_id" and isinstance(data.get("market"), str):
-                  condition_id = data.get("market")
-              if "condition_id" in data:
-                step["condition_id"] = data.get("condition_id")
-              if "asset_id" in data:
-                step["asset_id"] = data.get("asset_id")
+              tokens = data.get("tokens")
+              if isinstance(tokens, list) and tokens:
+                first = tokens[0] if isinstance(tokens[0], dict) else None
+                if isinstance(first, dict):
+                  step["token_keys"] = sorted(list(first.keys()))[:40]
+                  step["tokens_len"] = len(tokens)
           except Exception:
             pass
       except Exception as e:
         step["error"] = repr(e)
       result["steps"].append(step)
-
-    if condition_id:
-      for name, url in [
-        ("clob_market_markets", f"https://clob.polymarket.com/markets/{condition_id}"),
-        ("clob_market_market", f"https://clob.polymarket.com/market/{condition_id}"),
-      ]:
-        step: dict = {"name": name}
-        try:
-          resp = await client.get(url, timeout=10)
-          step["status"] = resp.status_code
-          step["preview"] = resp.text[:200]
-          if resp.status_code == 200:
-            try:
-              data = resp.json()
-              if isinstance(data, dict):
-                step["keys"] = sorted(list(data.keys()))[:40]
-                tokens = data.get("tokens")
-                if isinstance(tokens, list) and tokens:
-                  first = tokens[0] if isinstance(tokens[0], dict) else None
-                  if isinstance(first, dict):
-                    step["token_keys"] = sorted(list(first.keys()))[:40]
-                    step["tokens_len"] = len(tokens)
-            except Exception:
-              pass
-        except Exception as e:
-          step["error"] = repr(e)
-        result["steps"].append(step)
   return result
 
 @app.get("/admin/diag/outcome")
@@ -353,17 +354,17 @@ async def force_alert(
       f"Whale Score:\n{whale_score}\n\n"
       f"Alert ID:\n{alert_id}"
     )
-    async with httpx.AsyncClient() as client:
-      resp = await client.post(
-        url,
-        json={
-          "chat_id": settings.telegram_alert_chat_id,
-          "text": text,
-          "parse_mode": "HTML",
-          "disable_web_page_preview": True,
-        },
-        timeout=10,
-      )
+    client = http_client(url)
+    resp = await client.post(
+      url,
+      json={
+        "chat_id": settings.telegram_alert_chat_id,
+        "text": text,
+        "parse_mode": "HTML",
+        "disable_web_page_preview": True,
+      },
+      timeout=10,
+    )
     if 200 <= resp.status_code < 300:
       direct = {"ok": True}
     else:
@@ -3,7 +3,6 @@ import json
 from datetime import datetime, timedelta, timezone
 
 from redis.asyncio import Redis
-import httpx
 from sqlalchemy import select, update
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -15,7 +14,8 @@ from services.alert_engine.rules import should_alert
 from services.alert_engine.wallet_names import resolve_wallet_name
 from services.trade_ingest.markets import resolve_market_title
 from services.trade_ingest.markets import resolve_market_status
-from shared.config import settings, get_alert_config, parse_duration
+from shared.config import settings, current_config
+from shared.http_clients import http_client
 from shared.models import Alert, Market, TradeRaw, WhaleTrade, WhaleTradeHistory
 
 
@@ -31,8 +31,8 @@ async def _send_landing_alert(payload: dict) -> None:
   if settings.landing_alerts_ingest_token:
     headers["x-alert-token"] = settings.landing_alerts_ingest_token
   try:
-    async with httpx.AsyncClient() as client:
-      resp = await client.post(url, json=payload, headers=headers, timeout=10)
+    client = http_client(url)
+    resp = await client.post(url, json=payload, headers=headers, timeout=10)
     if resp.status_code < 200 or resp.status_code >= 300:
       logger.warning("landing_alert_failed status=%s body=%s", resp.status_code, resp.text[:200])
   except Exception as e:
@@ -77,44 +77,43 @@ async def _resolve_outcome_from_token(redis: Redis, token_id: str) -> str | None
   cached = await redis.get(cache_key)
   if cached:
     return None if cached == "__none__" else cached
-  proxy = settings.https_proxy or None
   outcome: str | None = None
   try:
-    async with httpx.AsyncClient(proxy=proxy) as client:
-      resp = await client.get("https://clob.polymarket.com/book", params={"token_id": tid}, timeout=10)
-      if resp.status_code == 200:
-        book = resp.json()
-        condition_id = None
-        if isinstance(book, dict):
-          condition_id = book.get("market") or book.get("condition_id")
-        if condition_id:
-          for url in (
-            f"https://clob.polymarket.com/markets/{condition_id}",
-            f"https://clob.polymarket.com/market/{condition_id}",
-          ):
-            try:
-              market_resp = await client.get(url, timeout=10)
-            except Exception:
+    client = http_client("https://clob.polymarket.com")
+    resp = await client.get("https://clob.polymarket.com/book", params={"token_id": tid}, timeout=10)
+    if resp.status_code == 200:
+      book = resp.json()
+      condition_id = None
+      if isinstance(book, dict):
+        condition_id = book.get("market") or book.get("condition_id")
+      if condition_id:
+        for url in (
+          f"https://clob.polymarket.com/markets/{condition_id}",
+          f"https://clob.polymarket.com/market/{condition_id}",
+        ):
+          try:
+            market_resp = await client.get(url, timeout=10)
+          except Exception:
+            continue
+          if market_resp.status_code != 200:
+            continue
+          market = market_resp.json()
+          if not isinstance(market, dict):
+            continue
+          tokens = market.get("tokens")
+          if not isinstance(tokens, list):
+            continue
+          tid_lower = tid.lower()
+          for t in tokens:
+            if not isinstance(t, dict):
               continue
-            if market_resp.status_code != 200:
-              continue
-            market = market_resp.json()
-            if not isinstance(market, dict):
-              continue
-            tokens = market.get("tokens")
-            if not isinstance(tokens, list):
-              continue
-            tid_lower = tid.lower()
-            for t in tokens:
-              if not isinstance(t, dict):
-                continue
-              token_value = str(t.get("token_id") or t.get("asset_id") or "").strip().lower()
-              if token_value == tid_lower:
-                outcome = _extract_outcome_value(t.get("outcome"))
-                if outcome:
-                  break
-            if outcome:
-              break
+            token_value = str(t.get("token_id") or t.get("asset_id") or "").strip().lower()
+            if token_value == tid_lower:
+              outcome = _extract_outcome_value(t.get("outcome"))
+              if outcome:
+                break
+          if outcome:
+            break
   except Exception:
     outcome = None
   if outcome is not None and str(outcome).strip():
@@ -125,11 +124,10 @@ async def _resolve_outcome_from_token(redis: Redis, token_id: str) -> str | None
 
 
 async def _can_alert_event(session: AsyncSession, redis: Redis, market_id: str, wallet: str, now: datetime, usd: float) -> bool:
-  config = get_alert_config()
-  cooldown = config.get("cooldown_settings", {})
-  same_wallet_seconds = parse_duration(cooldown.get("same_wallet_same_market"), settings.alert_cooldown_seconds)
-  different_wallet_seconds = parse_duration(cooldown.get("same_market_different_wallet"), 0)
-  increased_position_seconds = parse_duration(cooldown.get("increased_position"), same_wallet_seconds)
+  cfg = current_config()
+  same_wallet_seconds = cfg.cooldown_same_wallet_seconds
+  different_wallet_seconds = cfg.cooldown_different_wallet_seconds
+  increased_position_seconds = cfg.cooldown_increased_position_seconds
 
   key_wallet = f"cooldown:{wallet}:{market_id}"
   cached = await redis.get(key_wallet)
@@ -230,13 +228,10 @@ async def process_whale_trade_event(session: AsyncSession, redis: Redis, event:
   usd = float(event.get("trade_usd") or 0)
 
   logger.info(f"DEBUG: process_whale_trade_event score={score}, usd={usd}")
-  config = get_alert_config()
-  thresholds = config.get("alert_thresholds", {})
-  confidence = thresholds.get("confidence_scores", {})
-  usd_thresholds = thresholds.get("usd_thresholds", {})
-  min_score = int(confidence.get("medium_confidence", settings.alert_min_score))
-  min_usd = float(usd_thresholds.get("medium", settings.alert_min_trade_usd))
-  always_score = int(confidence.get("high_confidence", settings.alert_always_score))
+  cfg = current_config()
+  min_score = cfg.alert_min_score
+  min_usd = cfg.alert_min_trade_usd
+  always_score = cfg.alert_always_score
   d = should_alert(
     whale_score=score,
     trade_usd=usd,
@@ -396,11 +391,10 @@ async def process_whale_trade_event(session: AsyncSession, redis: Redis, event:
     await pipe.execute()
 
   if created:
-    config = get_alert_config()
-    cooldown = config.get("cooldown_settings", {})
-    same_wallet_seconds = parse_duration(cooldown.get("same_wallet_same_market"), settings.alert_cooldown_seconds)
-    different_wallet_seconds = parse_duration(cooldown.get("same_market_different_wallet"), 0)
-    increased_position_seconds = parse_duration(cooldown.get("increased_position"), same_wallet_seconds)
+    cfg = current_config()
+    same_wallet_seconds = cfg.cooldown_same_wallet_seconds
+    different_wallet_seconds = cfg.cooldown_different_wallet_seconds
+    increased_position_seconds = cfg.cooldown_increased_position_seconds
     wallet_ttl = max(int(same_wallet_seconds), int(increased_position_seconds))
     await redis.set(
       f"cooldown:{wallet}:{raw_token_id}",
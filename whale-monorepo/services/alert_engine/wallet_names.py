@@ -5,7 +5,7 @@ import httpx
 from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from shared.config import settings
+from shared.http_clients import http_client
 from shared.models import WalletName
 
 
@@ -91,10 +91,8 @@ async def resolve_wallet_name(session: AsyncSession, wallet_address: str) -> str
       else:
         raise
 
-  proxies = settings.https_proxy or None
-  async with httpx.AsyncClient(proxies=proxies) as client:
-    pm = await _fetch_polymarket_username(client, addr)
-    ens = await _fetch_ens_name(client, addr)
+  pm = await _fetch_polymarket_username(http_client("https://gamma-api.polymarket.com"), addr)
+  ens = await _fetch_ens_name(http_client("https://api.ensideas.com"), addr)
 
   if has_table:
     if not row:
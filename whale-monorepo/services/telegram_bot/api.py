@@ -7,7 +7,6 @@ from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from uuid import uuid4
 
-import httpx
 from fastapi import FastAPI, Header, HTTPException, Query
 from redis.asyncio import Redis
 from sqlalchemy import func, or_, select, text
@@ -31,7 +30,7 @@ from services.telegram_bot.recipients import (
   dedupe_triples,
   group_recipients_by_telegram,
 )
-from shared.config import settings, get_alert_config, parse_duration
+from shared.config import settings, current_config
 from shared.db import SessionLocal
 from shared.logging import configure_logging
 from shared.models import (
@@ -65,44 +64,43 @@ async def _resolve_outcome_from_token(redis: Redis, token_id: str) -> str | None
   cached = await redis.get(cache_key)
   if cached:
     return None if cached == "__none__" else cached
-  proxy = settings.https_proxy or None
   outcome: str | None = None
   try:
-    async with httpx.AsyncClient(proxy=proxy) as client:
-      resp = await client.get("https://clob.polymarket.com/book", params={"token_id": tid}, timeout=10)
-      if resp.status_code == 200:
-        book = resp.json()
-        condition_id = None
-        if isinstance(book, dict):
-          condition_id = book.get("market") or book.get("condition_id")
-        if condition_id:
-          for url in (
-            f"https://clob.polymarket.com/markets/{condition_id}",
-            f"https://clob.polymarket.com/market/{condition_id}",
-          ):
-            try:
-              market_resp = await client.get(url, timeout=10)
-            except Exception:
-              continue
-            if market_resp.status_code != 200:
-              continue
-            market = market_resp.json()
-            if not isinstance(market, dict):
-              continue
-            tokens = market.get("tokens")
-            if not isinstance(tokens, list):
+    client = http_client("https://clob.polymarket.com")
+    resp = await client.get("https://clob.polymarket.com/book", params={"token_id": tid}, timeout=10)
+    if resp.status_code == 200:
+      book = resp.json()
+      condition_id = None
+      if isinstance(book, dict):
+        condition_id = book.get("market") or book.get("condition_id")
+      if condition_id:
+        for url in (
+          f"https://clob.polymarket.com/markets/{condition_id}",
+          f"https://clob.polymarket.com/market/{condition_id}",
+        ):
+          try:
+            market_resp = await client.get(url, timeout=10)
+          except Exception:
+            continue
+          if market_resp.status_code != 200:
+            continue
+          market = market_resp.json()
+          if not isinstance(market, dict):
+            continue
+          tokens = market.get("tokens")
+          if not isinstance(tokens, list):
+            continue
+          tid_lower = tid.lower()
+          for t in tokens:
+            if not isinstance(t, dict):
               continue
-            tid_lower = tid.lower()
-            for t in tokens:
-              if not isinstance(t, dict):
-                continue
-              token_value = str(t.get("token_id") or t.get("asset_id") or t.get("tokenId") or t.get("id") or "").strip().lower()
-              if token_value == tid_lower:
-                outcome = str(t.get("outcome") or "").strip() or None
-                if outcome:
-                  break
-            if outcome:
-              break
+            token_value = str(t.get("token_id") or t.get("asset_id") or t.get("tokenId") or t.get("id") or "").strip().lower()
+            if token_value == tid_lower:
+              outcome = str(t.get("outcome") or "").strip() or None
+              if outcome:
+                break
+          if outcome:
+            break
   except Exception:
     outcome = None
   if outcome is not None and str(outcome).strip():
@@ -303,13 +301,13 @@ async def _send_via_bot(token: str, chat_id: str, text: str):
     "parse_mode": "HTML",
     "disable_web_page_preview": True,
   }
-  async with httpx.AsyncClient() as client:
-    try:
-      resp = await client.post(url, json=payload, timeout=10)
-      resp.raise_for_status()
-    except Exception:
-      # Never log the token (or a usable prefix of it) — bot tokens are credentials.
-      logger.exception("send_via_bot_failed chat_id=%s", chat_id)
+  client = http_client(url)
+  try:
+    resp = await client.post(url, json=payload, timeout=10)
+    resp.raise_for_status()
+  except Exception:
+    # Never log the token (or a usable prefix of it) — bot tokens are credentials.
+    logger.exception("send_via_bot_failed chat_id=%s", chat_id)
 
 
 async def _log_subscriber_stats_forever(stop: asyncio.Event) -> None:
@@ -383,22 +381,7 @@ async def consume_alerts_forever(stop: asyncio.Event, redis: Redis, application)
 
     triples: list[tuple[str, str, str]] = []
     lookup_db_ok = False
-    config = get_alert_config()
-    plan_cfg = config.get("user_plans", {})
-
-    def _plan_limits(name: str, default_delay_minutes: int, default_max_alerts, default_min_score: int):
-      data = plan_cfg.get(name, {})
-      delay_seconds = parse_duration(data.get("alerts_delay"), default_delay_minutes * 60)
-      delay_minutes = int(delay_seconds / 60)
-      max_alerts = data.get("max_alerts_per_day", default_max_alerts)
-      min_score = data.get("min_whale_score", default_min_score)
-      return {"max_alerts_per_day": max_alerts, "alert_delay_minutes": delay_minutes, "min_whale_score": int(min_score)}
-
-    PLAN_LIMITS_MAP = {
-      "FREE": _plan_limits("free", 10, 3, 0),
-      "PRO": _plan_limits("pro", 0, "unlimited", 70),
-      "ELITE": _plan_limits("elite", 0, "unlimited", 80),
-    }
+    PLAN_LIMITS_MAP = current_config().plan_limits
     try:
       async with SessionLocal() as session:
         has_users = await _has_users_table(session)
@@ -695,7 +678,7 @@ async def consume_alerts_forever(stop: asyncio.Event, redis: Redis, application)
       # top and incremented after delivery; two concurrent requests could both
       # pass the read check, deliver two alerts, and then the late increment
       # would roll back — the alert was sent but not counted.
-      if not await try_increment_daily_alert_count(redis, tid, limits["max_alerts_per_day"]):
+      if not await try_increment_daily_alert_count(redis, tid, limits.max_alerts_per_day):
         return
 
       # Admin is exempt from rate limits
@@ -706,7 +689,7 @@ async def consume_alerts_forever(stop: asyncio.Event, redis: Redis, application)
           await redis.decr(f"alert_limit:{tid}:{today}")
           return
       # Plan-based score filter: Pro ≥70, Elite ≥80 (see alert_engine_config.yaml)
-      min_score = limits.get("min_whale_score", 0)
+      min_score = limits.min_whale_score
       if score_value < min_score:
         today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
         await redis.decr(f"alert_limit:{tid}:{today}")
@@ -783,7 +766,7 @@ async def consume_alerts_forever(stop: asyncio.Event, redis: Redis, application)
         if rowcount != 1:
           return
 
-        delay_seconds = limits["alert_delay_minutes"] * 60
+        delay_seconds = limits.alert_delay_minutes * 60
         if plan_name == "ELITE" and signal_level == "low" and not elite_same_focus:
           delay_seconds = max(delay_seconds, 60)
 
@@ -944,6 +927,7 @@ async def lifespan(_: FastAPI):
 app = FastAPI(title="telegram-bot", lifespan=lifespan)
 
 from shared.error_handlers import register_exception_handlers
+from shared.http_clients import http_client
 register_exception_handlers(app)
 
 
@@ -990,8 +974,8 @@ async def test_alert(
     "parse_mode": "HTML",
     "disable_web_page_preview": True,
   }
-  async with httpx.AsyncClient() as client:
-    resp = await client.post(url, json=payload, timeout=10)
+  client = http_client(url)
+  resp = await client.post(url, json=payload, timeout=10)
   if resp.status_code < 200 or resp.status_code >= 300:
     return {"ok": False, "status": resp.status_code, "body": resp.text[:200]}
   return {"ok": True}
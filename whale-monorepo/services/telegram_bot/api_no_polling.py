@@ -5,7 +5,6 @@ import logging
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 
-import httpx
 from fastapi import FastAPI, Header, HTTPException, Query
 from redis.asyncio import Redis
 from sqlalchemy import func, or_, select, text
@@ -24,7 +23,7 @@ from services.telegram_bot.elite_filters import elite_delivery_allowed
 from services.telegram_bot.templates import format_alert, format_digest_lines
 from services.telegram_bot.rate_limit import allow_send, check_daily_alert_limit, try_increment_daily_alert_count
 from services.telegram_bot.recipients import AlertRecipient, dedupe_recipients, group_recipients_by_telegram
-from shared.config import settings, get_alert_config, parse_duration
+from shared.config import settings, current_config
 from shared.db import SessionLocal
 from shared.logging import configure_logging
 from shared.models import (
@@ -182,22 +181,7 @@ async def consume_alerts_forever(stop: asyncio.Event, redis: Redis, application)
     grouped_recipients: list[tuple[str, str, list[AlertRecipient]]] = []
     lookup_db_ok = False
 
-    config = get_alert_config()
-    plan_cfg = config.get("user_plans", {})
-
-    def _plan_limits(name: str, default_delay_minutes: int, default_max_alerts, default_min_score: int):
-      data = plan_cfg.get(name, {})
-      delay_seconds = parse_duration(data.get("alerts_delay"), default_delay_minutes * 60)
-      delay_minutes = int(delay_seconds / 60)
-      max_alerts = data.get("max_alerts_per_day", default_max_alerts)
-      min_score = data.get("min_whale_score", default_min_score)
-      return {"max_alerts_per_day": max_alerts, "alert_delay_minutes": delay_minutes, "min_whale_score": int(min_score)}
-
-    PLAN_LIMITS_MAP = {
-      "FREE": _plan_limits("free", 10, 3, 0),
-      "PRO": _plan_limits("pro", 0, "unlimited", 70),
-      "ELITE": _plan_limits("elite", 0, "unlimited", 80),
-    }
+    PLAN_LIMITS_MAP = current_config().plan_limits
 
     async def _send_with_rules(
       tid: str,
@@ -216,7 +200,7 @@ async def consume_alerts_forever(stop: asyncio.Event, redis: Redis, application)
       wallet_value = str(p_json.get("wallet_address") or "").lower()
 
       # 1. Check Daily Limit
-      if not await check_daily_alert_limit(redis, tid, limits["max_alerts_per_day"]):
+      if not await check_daily_alert_limit(redis, tid, limits.max_alerts_per_day):
         logger.warning("daily_limit_reached telegram_id=%s plan=%s", tid, plan_name)
         return False
 
@@ -226,7 +210,7 @@ async def consume_alerts_forever(stop: asyncio.Event, redis: Redis, application)
         return False
 
       # Plan-based score filter: Pro ≥70, Elite ≥80 (see alert_engine_config.yaml)
-      min_score = limits.get("min_whale_score", 0)
+      min_score = limits.min_whale_score
       if score_value < min_score:
         return False
 
@@ -257,7 +241,7 @@ async def consume_alerts_forever(stop: asyncio.Event, redis: Redis, application)
             parse_mode="HTML",
             disable_web_page_preview=True,
           )
-          await try_increment_daily_alert_count(redis, tid, limits["max_alerts_per_day"])
+          await try_increment_daily_alert_count(redis, tid, limits.max_alerts_per_day)
           await record_after_digest_flush(redis, tid, matched_group, cd.flushed_raws or [])
         except Exception:
           logger.exception(
@@ -282,7 +266,7 @@ async def consume_alerts_forever(stop: asyncio.Event, redis: Redis, application)
         elite_same_focus = last_focus == f"{wallet_value}|{market_id}"
 
       # 3. Handle Delay for FREE users
-      delay_min = limits["alert_delay_minutes"]
+      delay_min = limits.alert_delay_minutes
       delay_seconds = delay_min * 60
       if plan_name == "ELITE" and signal_level == "low" and not elite_same_focus:
         delay_seconds = max(delay_seconds, 60)
@@ -297,7 +281,7 @@ async def consume_alerts_forever(stop: asyncio.Event, redis: Redis, application)
               parse_mode="HTML",
               disable_web_page_preview=True,
             )
-            await try_increment_daily_alert_count(redis, tid, limits["max_alerts_per_day"])
+            await try_increment_daily_alert_count(redis, tid, limits.max_alerts_per_day)
             await record_push_for_group(redis, tid, matched_group, compute_effective_score(p_json))
             if plan_name == "ELITE" and market_id and wallet_value:
               await redis.set(elite_priority_key, f"{wallet_value}|{market_id}", ex=12 * 3600)
@@ -566,6 +550,7 @@ async def lifespan(_: FastAPI):
 app = FastAPI(title="telegram-bot", lifespan=lifespan)
 
 from shared.error_handlers import register_exception_handlers
+from shared.http_clients import http_client
 register_exception_handlers(app)
 
 
@@ -589,8 +574,8 @@ async def test_alert(
     "parse_mode": "HTML",
     "disable_web_page_preview": True,
   }
-  async with httpx.AsyncClient() as client:
-    resp = await client.post(url, json=payload, timeout=10)
+  client = http_client(url)
+  resp = await client.post(url, json=payload, timeout=10)
   if resp.status_code < 200 or resp.status_code >= 300:
     return {"ok": False, "status": resp.status_code, "body": resp.text[:200]}
   return {"ok": True}
@@ -16,13 +16,13 @@ import asyncio
 import logging
 from datetime import datetime, time, timedelta, timezone
 
-import httpx
 from sqlalchemy import func, select
 from telegram import Bot
 from telegram.error import TelegramError
 
 from shared.config import settings
 from shared.db import SessionLocal
+from shared.http_clients import http_client
 from shared.models import Subscription
 from services.telegram_bot.recipients import get_active_subscribers
 
@@ -196,14 +196,14 @@ async def run_backtest_report(stop: asyncio.Event, bot: Bot) -> None:
             end_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
             start_date = (datetime.now(timezone.utc) - timedelta(days=7)).strftime("%Y-%m-%d")
 
-            async with httpx.AsyncClient(timeout=API_TIMEOUT) as client:
-                resp = await client.get(
-                    f"{_landing_base_url()}/api/backtest",
-                    params={"start": start_date, "end": end_date},
-                    timeout=API_TIMEOUT,
-                )
-                resp.raise_for_status()
-                data = resp.json()
+            client = http_client(_landing_base_url())
+            resp = await client.get(
+                f"{_landing_base_url()}/api/backtest",
+                params={"start": start_date, "end": end_date},
+                timeout=API_TIMEOUT,
+            )
+            resp.raise_for_status()
+            data = resp.json()
 
             report = data.get("report") if isinstance(data, dict) else None
             message = _format_report(report or {}, start_date, end_date)
@@ -8,6 +8,7 @@ from telegram.ext import ContextTypes
 
 from shared.config import settings
 from shared.db import SessionLocal
+from shared.http_clients import http_client
 from shared.models import ActivationCode, Subscription, TgUser
 
 
@@ -216,13 +217,14 @@ async def analyze(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
   await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
 
   try:
-    async with httpx.AsyncClient(timeout=15.0) as client:
-      resp = await client.post(
-        f"{_landing_base_url()}/api/analyze",
-        json={"query": query, "userId": telegram_id},
-      )
-      resp.raise_for_status()
-      data = resp.json()
+    client = http_client(_landing_base_url())
+    resp = await client.post(
+      f"{_landing_base_url()}/api/analyze",
+      json={"query": query, "userId": telegram_id},
+      timeout=15.0,
+    )
+    resp.raise_for_status()
+    data = resp.json()
   except httpx.HTTPStatusError as e:
     try:
       body = e.response.json()
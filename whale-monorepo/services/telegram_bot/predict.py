@@ -23,6 +23,7 @@ from telegram.ext import ContextTypes
 
 from shared.config import settings
 from shared.db import SessionLocal
+from shared.http_clients import http_client
 from shared.models import Subscription
 
 logger = logging.getLogger(__name__)
@@ -261,10 +262,10 @@ async def predict_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         secret = getattr(settings, "internal_gateway_secret", None) or os.environ.get("INTERNAL_GATEWAY_SECRET", "")
         if secret:
             headers["x-internal-secret"] = secret
-        async with httpx.AsyncClient(timeout=API_TIMEOUT) as client:
-            resp = await client.get(url, headers=headers if headers else None)
-            resp.raise_for_status()
-            data: dict[str, Any] = resp.json()
+        client = http_client(url)
+        resp = await client.get(url, headers=headers if headers else None, timeout=API_TIMEOUT)
+        resp.raise_for_status()
+        data: dict[str, Any] = resp.json()
     except httpx.HTTPStatusError as e:
         try:
             body = e.response.json()
@@ -17,6 +17,7 @@ from telegram import Bot
 from telegram.error import TelegramError
 
 from shared.config import settings
+from shared.http_clients import http_client
 from services.telegram_bot.recipients import get_active_subscribers
 
 logger = logging.getLogger(__name__)
@@ -135,39 +136,39 @@ async def run_prediction_digest(stop: asyncio.Event, bot: Bot) -> None:
                 continue
 
             # Discover: fetch predictions for configured markets
-            async with httpx.AsyncClient(timeout=API_TIMEOUT) as client:
-                # First, try to get active market list from the API
-                # If _DIGEST_MARKETS is empty, we just send a generic message
-                if not _DIGEST_MARKETS:
-                    # Query the history endpoint for recent markets
-                    try:
-                        resp = await client.get(
-                            f"{_landing_base_url()}/api/history/summary",
-                            timeout=API_TIMEOUT,
-                        )
-                        if resp.status_code == 200:
-                            summary = resp.json()
-                            # Extract unique market slugs from recent activity
-                            recent_markets: list[str] = []
-                            tiers = summary.get("byScoreTier", []) if isinstance(summary, dict) else []
-                            for tier in tiers:
-                                items = tier.get("items", []) if isinstance(tier, dict) else []
-                                for item in items[:5]:
-                                    slug = item.get("marketSlug") if isinstance(item, dict) else None
-                                    if slug and slug not in recent_markets:
-                                        recent_markets.append(slug)
-                            _DIGEST_MARKETS[:] = recent_markets[:5]
-                    except Exception:
-                        logger.debug("digest_discovery_failed", exc_info=True)
-
-                markets = _DIGEST_MARKETS if _DIGEST_MARKETS else []
-
-                if markets:
-                    tasks = [_fetch_prediction(client, slug) for slug in markets]
-                    results = await asyncio.gather(*tasks)
-                    valid = [r for r in results if r is not None]
-                else:
-                    valid = []
+            client = http_client(_landing_base_url())
+            # First, try to get active market list from the API
+            # If _DIGEST_MARKETS is empty, we just send a generic message
+            if not _DIGEST_MARKETS:
+                # Query the history endpoint for recent markets
+                try:
+                    resp = await client.get(
+                        f"{_landing_base_url()}/api/history/summary",
+                        timeout=API_TIMEOUT,
+                    )
+                    if resp.status_code == 200:
+                        summary = resp.json()
+                        # Extract unique market slugs from recent activity
+                        recent_markets: list[str] = []
+                        tiers = summary.get("byScoreTier", []) if isinstance(summary, dict) else []
+                        for tier in tiers:
+                            items = tier.get("items", []) if isinstance(tier, dict) else []
+                            for item in items[:5]:
+                                slug = item.get("marketSlug") if isinstance(item, dict) else None
+                                if slug and slug not in recent_markets:
+                                    recent_markets.append(slug)
+                        _DIGEST_MARKETS[:] = recent_markets[:5]
+                except Exception:
+                    logger.debug("digest_discovery_failed", exc_info=True)
+
+            markets = _DIGEST_MARKETS if _DIGEST_MARKETS else []
+
+            if markets:
+                tasks = [_fetch_prediction(client, slug) for slug in markets]
+                results = await asyncio.gather(*tasks)
+                valid = [r for r in results if r is not None]
+            else:
+                valid = []
 
             message = _format_digest(valid)
 
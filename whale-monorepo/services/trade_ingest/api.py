@@ -131,10 +131,11 @@ async def ingest_trade(payload: TradeIn, x_admin_token: str | None = Header(None
 # ---------------------------------------------------------------------------
 
 from shared.db import SessionLocal
+from shared.http_clients import http_sync_client
+from shared.latest_prices import latest_prices
 from sqlalchemy import text
 import concurrent.futures
 import re as _re
-import httpx
 
 # ---------------------------------------------------------------------------
 # Gamma API helpers — settlement prices & ROI for resolved Polymarket markets
@@ -143,13 +144,6 @@ import httpx
 GAMMA_API = "https://gamma-api.polymarket.com/markets"
 MAX_GAMMA_LOOKUPS = 520
 
-# Shared httpx client (sync, thread-safe) — respects HTTPS_PROXY env var
-_gamma_http = httpx.Client(
-    headers={"Accept": "application/json"},
-    timeout=httpx.Timeout(10.0),
-    follow_redirects=True,
-)
-
 
 def _gamma_fetch(param: str, value: str) -> tuple[dict | None, str | None]:
     """Fetch one Gamma market. Returns (data, error_message)."""
@@ -157,7 +151,13 @@ def _gamma_fetch(param: str, value: str) -> tuple[dict | None, str | None]:
     if not value:
         return None, "empty value"
     try:
-        resp = _gamma_http.get(f"{GAMMA_API}", params={param: value, "limit": "1"})
+        resp = http_sync_client(GAMMA_API).get(
+            GAMMA_API,
+            params={param: value, "limit": "1"},
+            headers={"Accept": "application/json"},
+            timeout=10.0,
+            follow_redirects=True,
+        )
         resp.raise_for_status()
         data = resp.json()
         if isinstance(data, list) and len(data) > 0:
@@ -352,11 +352,26 @@ def _roi_from_gamma(side: str | None, outcome_token: str | None, entry_price: fl
     if idx >= len(prices):
         return None, None
 
-    S = prices[idx]
+    return _roi_at_price(side, entry_price, prices[idx])
+
+
+def _roi_at_price(side: str | None, entry_price: float | None, S: float | None) -> tuple[float | None, float | None]:
+    """
+    ROI of a trade marked at price S.
+    BUY:  (S − entry) / entry
+    SELL: (entry − S) / (1 − entry)
+    Returns (roi_pct, end_price).
+    """
+    if entry_price is None or not (0 < entry_price < 1):
+        return None, None
+    side = (side or "").strip().upper()
+    if side not in ("BUY", "SELL"):
+        return None, None
     if S is None or abs(S) >= float('inf'):
         return None, None
 
-    end_price = float(S)
+    S = float(S)
+    end_price = S
 
     if side == "BUY":
         roi = (S - entry_price) / entry_price
@@ -775,9 +790,12 @@ async def history_signals(limit: int = Query(500, ge=1, le=1000)):
         rows = result.all()
 
     # ── Collect unique Gamma lookup keys ──
+    # Rows already priced by whale_trade_history never read Gamma (Step 1).
     token_ids: list[str] = []
     condition_ids: list[str] = []
     for r in rows:
+        if r.hist_pnl is not None and abs(r.hist_pnl) >= 0.01 and r.hist_trade_usd and float(r.hist_trade_usd) > 0:
+            continue
         raw_tid = (r.raw_token_id or "").strip()
         cid = (r.condition_id or "").strip()
         if raw_tid:
@@ -795,6 +813,7 @@ async def history_signals(limit: int = Query(500, ge=1, le=1000)):
         pass  # Gamma unavailable → ROI from hist_pnl only
 
     # ── Build signal list ──
+    prices = latest_prices()
     signals = []
     for r in rows:
         price = r.price
@@ -852,6 +871,12 @@ async def history_signals(limit: int = Query(500, ge=1, le=1000)):
                         if end_price is None:
                             end_price = mtm_end
 
+        # ---- Step 2b: mark to the last traded price when Gamma has nothing ----
+        if roi_pct is None and end_price is None and prices is not None and raw_token_id:
+            last = prices.price(raw_token_id, r.outcome)
+            if last is not None:
+                roi_pct, end_price = _roi_at_price(r.side, price, float(last))
+
         # ---- Step 3: Compute PnL from ROI if no hist_pnl ----
         if computed_pnl is None and roi_pct is not None and size_usd is not None and size_usd > 0:
             computed_pnl = size_usd * roi_pct
@@ -12,6 +12,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 logger = logging.getLogger("trade_ingest.markets")
 
 from shared.config import settings
+from shared.http_clients import http_client
 from shared.models import Market, TokenCondition
 
 
@@ -69,89 +70,88 @@ async def resolve_token_id(session: AsyncSession, token_id: str, title_hint: str
         await _save_token_condition(session, token_id, f"cond_{token_id}", f"market_{token_id}", title_hint)
         return title_hint
 
-    proxy = settings.https_proxy or None
-    async with httpx.AsyncClient(proxy=proxy) as client:
-        # 2. Try Tokens API (Layer 3 -> Layer 1)
-        try:
-            url = "https://gamma-api.polymarket.com/tokens"
-            resp = await client.get(url, params={"tokenId": token_id}, timeout=10)
-            if resp.status_code == 200:
-                data = resp.json()
-                token_data = data[0] if isinstance(data, list) and data else data
-                if isinstance(token_data, dict):
-                    market_data = token_data.get("market")
-                    if isinstance(market_data, dict):
-                        question = market_data.get("question")
-                        cid = market_data.get("conditionId") or token_data.get("conditionId")
-                        mid = market_data.get("id")
-                        if question and mid:
-                            await _save_token_condition(session, token_id, cid or "unknown", str(mid), question)
-                            return question
-        except Exception as e:
-            logger.warning("Tokens API error for %s: %s", token_id, e)
+    client = http_client("https://gamma-api.polymarket.com")
+    # 2. Try Tokens API (Layer 3 -> Layer 1)
+    try:
+        url = "https://gamma-api.polymarket.com/tokens"
+        resp = await client.get(url, params={"tokenId": token_id}, timeout=10)
+        if resp.status_code == 200:
+            data = resp.json()
+            token_data = data[0] if isinstance(data, list) and data else data
+            if isinstance(token_data, dict):
+                market_data = token_data.get("market")
+                if isinstance(market_data, dict):
+                    question = market_data.get("question")
+                    cid = market_data.get("conditionId") or token_data.get("conditionId")
+                    mid = market_data.get("id")
+                    if question and mid:
+                        await _save_token_condition(session, token_id, cid or "unknown", str(mid), question)
+                        return question
+    except Exception as e:
+        logger.warning("Tokens API error for %s: %s", token_id, e)
 
-        # 3. Try Markets API with clobTokenIds (Layer 3 -> Layer 1)
-        try:
-            url = "https://gamma-api.polymarket.com/markets"
-            resp = await client.get(url, params={"clobTokenIds": token_id}, timeout=10)
-            if resp.status_code == 200:
-                data = resp.json()
-                if isinstance(data, list) and data:
-                    # STRICT CHECK: Verify that the returned market actually contains this token_id
-                    for market_data in data:
-                        market_tokens = market_data.get("clobTokenIds")
-                        # clobTokenIds is usually a JSON string like '["id1", "id2"]'
-                        if market_tokens:
-                            if isinstance(market_tokens, str):
-                                try:
-                                    market_tokens = json.loads(market_tokens)
-                                except Exception:
-                                    logger.debug("clobTokenIds json.loads failed for market")
-                                    pass
+    # 3. Try Markets API with clobTokenIds (Layer 3 -> Layer 1)
+    try:
+        url = "https://gamma-api.polymarket.com/markets"
+        resp = await client.get(url, params={"clobTokenIds": token_id}, timeout=10)
+        if resp.status_code == 200:
+            data = resp.json()
+            if isinstance(data, list) and data:
+                # STRICT CHECK: Verify that the returned market actually contains this token_id
+                for market_data in data:
+                    market_tokens = market_data.get("clobTokenIds")
+                    # clobTokenIds is usually a JSON string like '["id1", "id2"]'
+                    if market_tokens:
+                        if isinstance(market_tokens, str):
+                            try:
+                                market_tokens = json.loads(market_tokens)
+                            except Exception:
+                                logger.debug("clobTokenIds json.loads failed for market")
+                                pass
                             
-                            if isinstance(market_tokens, list) and token_id in [str(t).lower() for t in market_tokens]:
-                                question = market_data.get("question")
-                                cid = market_data.get("conditionId")
-                                mid = market_data.get("id")
-                                if question and mid:
-                                    await _save_token_condition(session, token_id, cid or "unknown", str(mid), question)
-                                    return question
-        except Exception as e:
-            logger.warning("Markets API (clobTokenIds) error for %s: %s", token_id, e)
-
-        # 4. Try Markets API with conditionIds (Layer 2 -> Layer 1)
-        try:
-            url = "https://gamma-api.polymarket.com/markets"
-            resp = await client.get(url, params={"conditionIds": token_id}, timeout=10)
-            if resp.status_code == 200:
-                data = resp.json()
-                if isinstance(data, list) and data:
-                    for market_data in data:
-                        cid = market_data.get("conditionId")
-                        if cid and cid.lower() == token_id:
+                        if isinstance(market_tokens, list) and token_id in [str(t).lower() for t in market_tokens]:
                             question = market_data.get("question")
-                            logger.info("Resolved via Markets API (conditionIds): %s", question)
+                            cid = market_data.get("conditionId")
                             mid = market_data.get("id")
                             if question and mid:
-                                await _save_token_condition(session, token_id, cid, str(mid), question)
+                                await _save_token_condition(session, token_id, cid or "unknown", str(mid), question)
                                 return question
-        except Exception as e:
-            logger.warning("Markets API (conditionIds) error for %s: %s", token_id, e)
+    except Exception as e:
+        logger.warning("Markets API (clobTokenIds) error for %s: %s", token_id, e)
 
-        # 5. Try Markets API by slug/id (Layer 1 -> Layer 1)
-        try:
-            resp = await client.get(f"https://gamma-api.polymarket.com/markets/{token_id}", timeout=10)
-            if resp.status_code == 200:
-                market_data = resp.json()
-                if isinstance(market_data, dict):
-                    question = market_data.get("question")
+    # 4. Try Markets API with conditionIds (Layer 2 -> Layer 1)
+    try:
+        url = "https://gamma-api.polymarket.com/markets"
+        resp = await client.get(url, params={"conditionIds": token_id}, timeout=10)
+        if resp.status_code == 200:
+            data = resp.json()
+            if isinstance(data, list) and data:
+                for market_data in data:
                     cid = market_data.get("conditionId")
-                    mid = market_data.get("id")
-                    if question and mid:
-                        await _save_token_condition(session, token_id, cid or "unknown", str(mid), question)
-                        return question
-        except Exception:
-            pass
+                    if cid and cid.lower() == token_id:
+                        question = market_data.get("question")
+                        logger.info("Resolved via Markets API (conditionIds): %s", question)
+                        mid = market_data.get("id")
+                        if question and mid:
+                            await _save_token_condition(session, token_id, cid, str(mid), question)
+                            return question
+    except Exception as e:
+        logger.warning("Markets API (conditionIds) error for %s: %s", token_id, e)
+
+    # 5. Try Markets API by slug/id (Layer 1 -> Layer 1)
+    try:
+        resp = await client.get(f"https://gamma-api.polymarket.com/markets/{token_id}", timeout=10)
+        if resp.status_code == 200:
+            market_data = resp.json()
+            if isinstance(market_data, dict):
+                question = market_data.get("question")
+                cid = market_data.get("conditionId")
+                mid = market_data.get("id")
+                if question and mid:
+                    await _save_token_condition(session, token_id, cid or "unknown", str(mid), question)
+                    return question
+    except Exception:
+        pass
 
     # Final Fallback
     question = f"Market ({token_id[:8]}...)"
@@ -334,9 +334,8 @@ async def resolve_market_status(session: AsyncSession, target_id: str) -> str |
   if not raw_target:
     return None
   url = settings.polymarket_markets_url or "https://gamma-api.polymarket.com/markets"
-  proxies = settings.https_proxy or None
-  async with httpx.AsyncClient(proxies=proxies) as client:
-    records = await _fetch_market_by_id(client, url, raw_target)
+  client = http_client(url)
+  records = await _fetch_market_by_id(client, url, raw_target)
   if not records:
     return None
   for r in records:
@@ -364,30 +363,29 @@ async def ingest_markets(session: AsyncSession) -> int:
   max_markets = int(os.getenv("MARKET_INGEST_MAX", "1000"))
   sep = "&" if "?" in url else "?"
 
-  proxies = settings.https_proxy or None
-  async with httpx.AsyncClient(proxies=proxies) as client:
-    while offset < max_markets:
-      resp = await client.get(f"{url}{sep}limit={batch_size}&offset={offset}&active=true", timeout=30)
-      if resp.status_code != 200:
-        break
-      records = _extract_market_records(resp.json())
-      if not records:
-        break
-
-      for r in records:
-        if not isinstance(r, dict):
-          continue
-        title = str(r.get("title") or "")
-        if not title:
-          continue
-        status = str(r.get("status") or "active")
-        ids = r.get("ids") or set()
-        if not isinstance(ids, set) or not ids:
-          continue
-        await _upsert_market(session, str(title), status, ids)
-        total_upserts += len(ids)
-
-      offset += batch_size
+  client = http_client(url)
+  while offset < max_markets:
+    resp = await client.get(f"{url}{sep}limit={batch_size}&offset={offset}&active=true", timeout=30)
+    if resp.status_code != 200:
+      break
+    records = _extract_market_records(resp.json())
+    if not records:
+      break
+
+    for r in records:
+      if not isinstance(r, dict):
+        continue
+      title = str(r.get("title") or "")
+      if not title:
+        continue
+      status = str(r.get("status") or "active")
+      ids = r.get("ids") or set()
+      if not isinstance(ids, set) or not ids:
+        continue
+      await _upsert_market(session, str(title), status, ids)
+      total_upserts += len(ids)
+
+    offset += batch_size
   return total_upserts
 
 
@@ -430,47 +428,46 @@ async def _resolve_by_condition(session: AsyncSession, target_id: str) -> str |
     max_scan = 200  # 4 pages (was 1000 — reduced for PF-H5)
     sep = "&" if "?" in url else "?"
 
-    proxies = settings.https_proxy or None
-    async with httpx.AsyncClient(proxies=proxies) as client:
-        direct = await _fetch_market_by_id(client, url, target_id)
-        if direct:
-            for r in direct:
-                if not isinstance(r, dict):
-                    continue
-                title = str(r.get("title") or "")
-                if not title:
-                    continue
-                status = str(r.get("status") or "active")
-                ids = r.get("ids") or set()
-                if not isinstance(ids, set):
-                    continue
+    client = http_client(url)
+    direct = await _fetch_market_by_id(client, url, target_id)
+    if direct:
+        for r in direct:
+            if not isinstance(r, dict):
+                continue
+            title = str(r.get("title") or "")
+            if not title:
+                continue
+            status = str(r.get("status") or "active")
+            ids = r.get("ids") or set()
+            if not isinstance(ids, set):
+                continue
                 
-                if target not in ids:
-                    continue
-
+            if target not in ids:
+                continue
+
+            await _upsert_market(session, str(title), status, ids)
+            return str(title)
+
+    offset = 0
+    while offset < max_scan:
+        resp = await client.get(f"{url}{sep}limit={batch_size}&offset={offset}&active=true", timeout=30)
+        if resp.status_code != 200:
+            break
+        records = _extract_market_records(resp.json())
+        if not records:
+            break
+        for r in records:
+            if not isinstance(r, dict):
+                continue
+            title = str(r.get("title") or "")
+            if not title:
+                continue
+            status = str(r.get("status") or "active")
+            ids = r.get("ids") or set()
+            if not isinstance(ids, set):
+                continue
+            if target in ids:
                 await _upsert_market(session, str(title), status, ids)
                 return str(title)
-
-        offset = 0
-        while offset < max_scan:
-            resp = await client.get(f"{url}{sep}limit={batch_size}&offset={offset}&active=true", timeout=30)
-            if resp.status_code != 200:
-                break
-            records = _extract_market_records(resp.json())
-            if not records:
-                break
-            for r in records:
-                if not isinstance(r, dict):
-                    continue
-                title = str(r.get("title") or "")
-                if not title:
-                    continue
-                status = str(r.get("status") or "active")
-                ids = r.get("ids") or set()
-                if not isinstance(ids, set):
-                    continue
-                if target in ids:
-                    await _upsert_market(session, str(title), status, ids)
-                    return str(title)
-            offset += batch_size
+        offset += batch_size
     return None
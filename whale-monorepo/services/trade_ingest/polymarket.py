@@ -1,19 +1,40 @@
 import asyncio
 import json
 import logging
+import os
+import time
 from datetime import datetime, timezone
 from typing import Any
 
 import httpx
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 from shared.config import settings
-from shared.db import insert
+from shared.db import bulk_upsert, insert
+from shared.http_clients import http_client
 from shared.models import Market, TradeRaw, WhaleProfile, WhaleStats
 
 
 logger = logging.getLogger("trade_ingest.polymarket")
 
+# Trade polling pages backwards (newest first) from offset 0 until it reaches
+# the watermark, so bursts larger than one page are not dropped.
+TRADE_INGEST_PAGE_LIMIT = int(os.getenv("TRADE_INGEST_PAGE_LIMIT", "500"))
+TRADE_INGEST_MAX_PAGES = int(os.getenv("TRADE_INGEST_MAX_PAGES", "20"))
+# Adaptive poll interval bounds; the upper bound is the old fixed cadence.
+TRADE_INGEST_MIN_SECONDS = float(os.getenv("TRADE_INGEST_MIN_SECONDS", "5"))
+TRADE_INGEST_SECONDS = float(os.getenv("TRADE_INGEST_SECONDS", "30"))
+# Consecutive page-capped polls after which an unreachable gap is accepted.
+TRADE_INGEST_GAP_ACCEPT_POLLS = int(os.getenv("TRADE_INGEST_GAP_ACCEPT_POLLS", "3"))
+TRADE_WATERMARK_KEY = "trade_ingest:watermark"
+
+SCAN_REACHED = "reached"
+SCAN_FAILED = "failed"
+SCAN_CAPPED = "capped"
+_STAGED_KEY = "trade_watermark_staged"
+
 
 def normalize_key(value: str) -> str:
   v = value.strip()
@@ -168,27 +189,34 @@ def parse_trade(t: dict[str, Any]) -> dict[str, Any] | None:
   }
 
 
-async def fetch_trades(client: httpx.AsyncClient) -> list[dict[str, Any]]:
+async def fetch_trades(client: httpx.AsyncClient, *, offset: int = 0, limit: int | None = None) -> list[dict[str, Any]] | None:
+  """One page of recent trades, newest first, or None when the page could not
+  be fetched (so callers can tell a failure from the end of the feed).
+
+  limit/offset are only sent to the primary URL; the fallback is tried for
+  the first page only. A page past the end of the feed comes back empty
+  without retries."""
   primary_url = settings.polymarket_trades_url
   fallback_url = settings.polymarket_trades_url_fallback
   urls = [u for u in [primary_url, fallback_url] if u]
   if not urls:
     logger.warning("polymarket_trades_url_missing")
-    return []
+    return None
 
   now_ms = int(datetime.now().timestamp() * 1000)
+  page_params = {"limit": limit, "offset": offset} if limit else None
 
-  async def _fetch_one(url: str) -> list[dict[str, Any]]:
+  async def _fetch_one(url: str, params: dict[str, int] | None) -> list[dict[str, Any]] | None:
     sep = "&" if "?" in url else "?"
     fetch_url = f"{url}{sep}_t={now_ms}"
 
     last_error = "unknown_error"
     for attempt in range(1, 4):
       try:
-        resp = await client.get(fetch_url, timeout=30)
+        resp = await client.get(fetch_url, params=params, timeout=30)
         if resp.status_code in (401, 403):
           logger.warning(f"polymarket_fetch_auth_error url={url} status={resp.status_code}")
-          return []
+          return None
 
         if resp.status_code != 200:
           last_error = f"status={resp.status_code} body={resp.text[:200]}"
@@ -204,8 +232,8 @@ async def fetch_trades(client: httpx.AsyncClient) -> list[dict[str, Any]]:
             elif isinstance(data, dict):
               trades = data.get("trades") or data.get("data") or []
 
-            if isinstance(trades, list) and trades:
-              logger.info(f"polymarket_trades_fetched url={url} count={len(trades)}")
+            if isinstance(trades, list) and (trades or offset):
+              logger.info(f"polymarket_trades_fetched url={url} offset={offset} count={len(trades)}")
               return [t for t in trades if isinstance(t, dict)]
             last_error = "empty_or_unexpected_payload"
       except Exception as e:
@@ -213,48 +241,224 @@ async def fetch_trades(client: httpx.AsyncClient) -> list[dict[str, Any]]:
         last_error = f"request_failed error={msg}"
         if "No address associated with hostname" in msg:
           logger.warning(f"polymarket_fetch_dns_error url={url} {last_error}")
-          return []
+          return None
 
       logger.warning(f"polymarket_fetch_retry url={url} attempt={attempt} {last_error}")
       if attempt < 3:
         await asyncio.sleep(1 * attempt)
 
-    return []
+    return None
 
-  primary = await _fetch_one(primary_url) if primary_url else []
-  if primary:
+  primary = await _fetch_one(primary_url, page_params) if primary_url else None
+  if primary is not None:
     return primary
-  if fallback_url:
-    return await _fetch_one(fallback_url)
-  return []
+  if fallback_url and offset == 0:
+    return await _fetch_one(fallback_url, None)
+  return None
+
+
+class TradeWatermark:
+  """Newest trade timestamp ingested, plus the trade ids seen at exactly that
+  timestamp (the feed reports whole seconds, so ties are common)."""
+
+  def __init__(self, ts: datetime | None = None, ids=()) -> None:
+    self.ts = ts
+    self.ids = set(ids)
+
+  def covers(self, ts: datetime, trade_id: str) -> bool:
+    if self.ts is None:
+      return False
+    return ts < self.ts or (ts == self.ts and trade_id in self.ids)
+
+  def advanced(self, rows: list[dict[str, Any]]) -> "TradeWatermark":
+    ts, ids = self.ts, set(self.ids)
+    for r in rows:
+      if ts is None or r["timestamp"] > ts:
+        ts, ids = r["timestamp"], {r["trade_id"]}
+      elif r["timestamp"] == ts:
+        ids.add(r["trade_id"])
+    return TradeWatermark(ts, ids)
+
+  def dumps(self) -> str:
+    return json.dumps({"ts": self.ts.isoformat() if self.ts else None, "ids": sorted(self.ids)})
+
+  @classmethod
+  def loads(cls, raw: str | bytes) -> "TradeWatermark":
+    data = json.loads(raw)
+    ts = datetime.fromisoformat(data["ts"]) if data.get("ts") else None
+    return cls(ts, data.get("ids") or ())
+
+
+class TradePollPacer:
+  """Poll interval from the observed trade rate: aim to pick up about half a
+  page per poll, poll at the floor while polls need more than one page, and
+  back off to the ceiling when the feed is quiet."""
+
+  def __init__(self, min_seconds: float, max_seconds: float, page_limit: int, alpha: float = 0.3) -> None:
+    self.min_seconds = min_seconds
+    self.max_seconds = max(min_seconds, max_seconds)
+    self.page_limit = page_limit
+    self.alpha = alpha
+    self.rate: float | None = None
+    self.saturated = False
+    self._last: float | None = None
+
+  def observe(self, new_trades: int, saturated: bool, now: float | None = None) -> None:
+    now = time.monotonic() if now is None else now
+    if self._last is not None:
+      sample = new_trades / max(now - self._last, 1e-3)
+      self.rate = sample if self.rate is None else self.alpha * sample + (1 - self.alpha) * self.rate
+    self._last = now
+    self.saturated = saturated
+
+  def interval(self) -> float:
+    if self.saturated:
+      return self.min_seconds
+    if not self.rate:
+      return self.max_seconds
+    return min(self.max_seconds, max(self.min_seconds, 0.5 * self.page_limit / self.rate))
+
+
+_WATERMARK: TradeWatermark | None = None
+_capped_polls = 0
+_PACER = TradePollPacer(TRADE_INGEST_MIN_SECONDS, TRADE_INGEST_SECONDS, TRADE_INGEST_PAGE_LIMIT)
+
+
+def next_trade_poll_interval() -> float:
+  """Seconds until the next trade poll, from the rate seen so far."""
+  return _PACER.interval()
+
+
+async def load_trade_watermark(session: AsyncSession, redis=None) -> TradeWatermark:
+  """The newest of the in-process, Redis and trades_raw watermarks.
+
+  trades_raw is only read on a cold process with nothing in Redis (the
+  unified service's in-memory Redis does not survive a restart)."""
+  global _WATERMARK
+  wm = _WATERMARK
+  if redis is not None:
+    try:
+      raw = await redis.get(TRADE_WATERMARK_KEY)
+      stored = TradeWatermark.loads(raw) if raw else None
+    except Exception:
+      logger.warning("trade_watermark_read_failed", exc_info=True)
+      stored = None
+    if stored is not None and stored.ts is not None and (wm is None or wm.ts is None or stored.ts > wm.ts):
+      wm = stored
+  if wm is None:
+    rows = (
+      await session.execute(
+        text("SELECT trade_id, timestamp FROM trades_raw WHERE timestamp = (SELECT MAX(timestamp) FROM trades_raw)")
+      )
+    ).fetchall()
+    wm = TradeWatermark(rows[0][1], (str(r[0]) for r in rows)) if rows else TradeWatermark()
+    logger.info("trade_watermark_hydrated ts=%s", wm.ts)
+  _WATERMARK = wm
+  return wm
+
+
+async def save_trade_watermark(redis) -> None:
+  """Persist the committed watermark so restarts resume where polling stopped."""
+  if _WATERMARK is None or _WATERMARK.ts is None:
+    return
+  try:
+    await redis.set(TRADE_WATERMARK_KEY, _WATERMARK.dumps())
+  except Exception:
+    logger.warning("trade_watermark_save_failed", exc_info=True)
 
 
-async def ingest_trades(session: AsyncSession) -> list[str]:
-  proxies = settings.https_proxy or None
-  async with httpx.AsyncClient(proxy=proxies) as client:
-    raw_trades = await fetch_trades(client)
+@event.listens_for(Session, "after_commit")
+def _advance_staged(session: Session) -> None:
+  global _WATERMARK
+  staged = session.info.pop(_STAGED_KEY, None)
+  if staged is not None and (_WATERMARK is None or _WATERMARK.ts is None or staged.ts >= _WATERMARK.ts):
+    _WATERMARK = staged
 
-  if not raw_trades:
-    return []
 
-  seen = set()
-  rows: list[dict[str, Any]] = []
-  for t in raw_trades:
-    if not isinstance(t, dict):
-      continue
-    parsed = parse_trade(t)
-    if not parsed:
-      continue
-    tid = parsed["trade_id"]
-    if tid in seen:
-      continue
-    seen.add(tid)
-    rows.append(parsed)
-
-  logger.info(f"polymarket_trades_parsed total_fetched={len(raw_trades)} unique_parsed={len(rows)}")
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_staged(session: Session, previous_transaction) -> None:
+  session.info.pop(_STAGED_KEY, None)
+
+
+async def fetch_new_trades(client: httpx.AsyncClient, watermark: TradeWatermark) -> tuple[list[dict[str, Any]], bool, str]:
+  """(parsed trades newer than the watermark, more than one page needed,
+  scan outcome: SCAN_REACHED, SCAN_FAILED or SCAN_CAPPED).
 
+  Pages backwards until a page reaches the watermark, runs short, or
+  TRADE_INGEST_MAX_PAGES is hit. A page that fails to fetch ends the scan
+  unreached, as does the page cap; the caller then keeps the old watermark so
+  the next poll pages back over the gap. New trades printing mid-scan shift
+  later pages, which only repeats rows (deduped here) and never skips them.
+  With no watermark yet (empty trades_raw) only the first page is read."""
+  limit = max(1, TRADE_INGEST_PAGE_LIMIT)
+  max_pages = max(1, TRADE_INGEST_MAX_PAGES) if watermark.ts is not None else 1
+  seen: set[str] = set()
+  rows: list[dict[str, Any]] = []
+  fetched = 0
+  reached = watermark.ts is None
+  failed = False
+  pages = 0
+  for pages in range(1, max_pages + 1):
+    page = await fetch_trades(client, offset=(pages - 1) * limit, limit=limit)
+    if page is None:
+      failed = True
+      reached = False
+      logger.warning("polymarket_trades_page_failed page=%s watermark=%s", pages, watermark.ts)
+      break
+    fetched += len(page)
+    parsed_any = False
+    for t in page:
+      parsed = parse_trade(t)
+      if not parsed:
+        continue
+      parsed_any = True
+      tid = parsed["trade_id"]
+      if watermark.covers(parsed["timestamp"], tid):
+        reached = True
+        continue
+      if tid in seen:
+        continue
+      seen.add(tid)
+      rows.append(parsed)
+    if reached or len(page) < limit or not parsed_any:
+      reached = True
+      break
+  if not reached and not failed:
+    logger.warning("polymarket_trades_watermark_gap pages=%s watermark=%s", pages, watermark.ts)
+  logger.info(f"polymarket_trades_parsed total_fetched={fetched} pages={pages} new={len(rows)}")
+  outcome = SCAN_REACHED if reached else SCAN_FAILED if failed else SCAN_CAPPED
+  return rows, pages > 1, outcome
+
+
+async def ingest_trades(session: AsyncSession, redis=None) -> list[str]:
+  """Insert trades newer than the watermark; returns the inserted trade ids.
+
+  The advanced watermark is staged on the session and only takes effect when
+  the caller commits; callers with Redis then call save_trade_watermark. It
+  only advances when the scan reached the old watermark."""
+  watermark = await load_trade_watermark(session, redis)
+
+  client = http_client(settings.polymarket_trades_url)
+  global _capped_polls
+  rows, saturated, outcome = await fetch_new_trades(client, watermark)
+
+  _PACER.observe(len(rows), saturated or outcome != SCAN_REACHED)
+  _capped_polls = _capped_polls + 1 if outcome == SCAN_CAPPED else 0
   if not rows:
     return []
+  if outcome == SCAN_REACHED:
+    session.info[_STAGED_KEY] = watermark.advanced(rows)
+  elif outcome == SCAN_CAPPED and _capped_polls >= TRADE_INGEST_GAP_ACCEPT_POLLS:
+    # The backlog is deeper than TRADE_INGEST_MAX_PAGES can reach and only
+    # grows; holding the watermark would page to the cap on every poll forever.
+    logger.error("trade_watermark_gap_accepted ts=%s polls=%s", watermark.ts, _capped_polls)
+    _capped_polls = 0
+    session.info[_STAGED_KEY] = watermark.advanced(rows)
+  else:
+    # Trades between the watermark and the oldest row fetched are still
+    # missing: keep the watermark so the next poll pages back over them
+    # (rows re-fetched then are dropped by ON CONFLICT).
+    logger.warning("trade_watermark_held ts=%s outcome=%s new=%s", watermark.ts, outcome, len(rows))
 
   # Batch upsert markets in a single INSERT instead of N individual queries (PF-M1).
   market_rows: dict[str, str] = {}
@@ -263,21 +467,11 @@ async def ingest_trades(session: AsyncSession) -> list[str]:
     if title and r["market_id"] not in market_rows:
       market_rows[r["market_id"]] = title
   if market_rows:
-    # Use pg_insert directly for proper ON CONFLICT DO UPDATE with bulk values.
-    from sqlalchemy.dialects.postgresql import insert as pg_insert
-    market_stmt = pg_insert(Market).values(
-      [{"id": mid, "title": t} for mid, t in market_rows.items()]
-    )
-    market_stmt = market_stmt.on_conflict_do_nothing(index_elements=[Market.id])
-    await session.execute(market_stmt)
-
-  stmt = (
-    insert(TradeRaw)
-    .values(rows)
-    .on_conflict_do_nothing(index_elements=[TradeRaw.trade_id])
-    .returning(TradeRaw.trade_id)
-  )
-  inserted = (await session.execute(stmt)).scalars().all()
+    await bulk_upsert(session, Market, [{"id": mid, "title": t} for mid, t in market_rows.items()], index_elements=["id"])
+
+  # A paged poll can return thousands of rows; bulk_upsert keeps them under the
+  # bind-parameter limit (or COPYs them).
+  inserted = await bulk_upsert(session, TradeRaw, rows, index_elements=["trade_id"], returning="trade_id")
   return [str(tid) for tid in inserted]
 
 
@@ -358,9 +552,8 @@ async def ingest_smart_money_leaderboard(session: AsyncSession, *, category: str
   """
   Fetch and upsert smart money (top traders) into WhaleProfile + WhaleStats.
   """
-  proxies = settings.https_proxy or None
-  async with httpx.AsyncClient(proxy=proxies) as client:
-    rows = await fetch_leaderboard(client, category=category, time_period=time_period, order_by=order_by, limit=limit)
+  client = http_client("https://data-api.polymarket.com")
+  rows = await fetch_leaderboard(client, category=category, time_period=time_period, order_by=order_by, limit=limit)
 
   parsed = [_parse_leaderboard_row(r) for r in rows if isinstance(r, dict)]
   parsed = [p for p in parsed if p]
@@ -4,7 +4,7 @@ from decimal import Decimal
 from typing import Any
 import uuid
 
-from sqlalchemy import select, delete
+from sqlalchemy import delete, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 
@@ -159,14 +159,15 @@ async def rebuild_smart_collections(session: AsyncSession) -> int:
             .where(SmartCollectionWhale.snapshot_date == snapshot)
         )
 
-        for w in wallets:
-            session.add(
-                SmartCollectionWhale(
-                    id=uuid.uuid4().hex,
-                    smart_collection_id=col.id,
-                    wallet=w,
-                    snapshot_date=snapshot,
-                )
+        # One executemany instead of a unit-of-work object per wallet: the
+        # flush bookkeeping was the CPU cost of this job on the event loop.
+        if wallets:
+            await session.execute(
+                insert(SmartCollectionWhale),
+                [
+                    {"id": uuid.uuid4().hex, "smart_collection_id": col.id, "wallet": w, "snapshot_date": snapshot}
+                    for w in wallets
+                ],
             )
         total_rows += len(wallets)
 
@@ -17,11 +17,13 @@ from sqlalchemy import select, desc, text, or_, func
 from sqlalchemy.dialects.postgresql import insert
 
 from services.trade_ingest.markets import ingest_markets
-from services.trade_ingest.polymarket import ingest_trades
-from shared.async_utils import BATCH_RPUSH_SCRIPT as _BATCH_RPUSH, get_or_create_event_loop, run_async
+from services.trade_ingest.polymarket import ingest_trades, save_trade_watermark
+from shared.async_utils import BATCH_RPUSH_SCRIPT as _BATCH_RPUSH, get_or_create_event_loop, mark_vw_dirty, run_async
 from shared.config import settings
 from shared.db import SessionLocal
+from shared.http_clients import http_client
 from shared.logging import configure_logging
+from shared.recent_trades import push_trades
 from shared.models import Alert, Market, TradeRaw, WalletName, WhaleProfile, WhaleStats, WhaleTrade
 from services.trade_ingest.smart_collections import rebuild_smart_collections
 from services.trade_ingest.polymarket import ingest_smart_money_leaderboard
@@ -97,11 +99,7 @@ def _is_health_trade(trade, title) -> bool:
   return False
 
 
-async def _cache_trade(redis: Redis, payload: dict) -> None:
-  wallet = str(payload.get("wallet") or "").lower()
-  market_id = str(payload.get("market_id") or "")
-  if not wallet or not market_id:
-    return
+def _cache_entry(payload: dict) -> tuple:
   ts = payload.get("timestamp")
   if isinstance(ts, datetime):
     ts_value = ts
@@ -109,23 +107,23 @@ async def _cache_trade(redis: Redis, payload: dict) -> None:
     ts_value = _parse_ts(str(ts))
   if not ts_value:
     ts_value = datetime.now(timezone.utc)
-  body = {
-    "timestamp": ts_value.isoformat(),
-    "side": payload.get("side"),
-    "amount": float(payload.get("amount") or 0),
-    "price": float(payload.get("price") or 0),
-  }
-  key = f"recent_trades:{wallet}:{market_id}"
+  return (
+    str(payload.get("wallet") or "").lower(),
+    str(payload.get("market_id") or ""),
+    ts_value,
+    payload.get("side"),
+    payload.get("amount"),
+    payload.get("price"),
+  )
+
+
+async def _cache_trades(redis: Redis, payloads: list[dict]) -> None:
+  # Packed records, one pipeline for the whole batch: RPUSH per key plus a
+  # single LTRIM + EXPIRE per key (PF-M6).
   try:
-    # Batch RPUSH + LTRIM + EXPIRE into a single pipeline to save
-    # two network round-trips per cache write (PF-M6).
-    async with redis.pipeline(transaction=True) as pipe:
-      pipe.rpush(key, json.dumps(body))
-      pipe.ltrim(key, -settings.recent_trades_cache_max, -1)
-      pipe.expire(key, settings.recent_trades_cache_seconds)
-      await pipe.execute()
+    await push_trades(redis, (_cache_entry(p) for p in payloads))
   except Exception:
-    logger.debug("cache_trade_failed trade_id=%s", payload.get("trade_id"), exc_info=True)
+    logger.debug("cache_trades_failed count=%s", len(payloads), exc_info=True)
 
 
 async def _fetch_health(client: httpx.AsyncClient, base_url: str) -> tuple[int | None, str]:
@@ -524,9 +522,8 @@ async def run_daily_spotlight() -> dict:
   else:
     lines += ["", "🎯 The Sniper: No qualifying sniper trades found."]
 
-  proxies = settings.https_proxy or None
-  async with httpx.AsyncClient(proxies=proxies) as client:
-    await _send_alert_telegram(client, "\n".join(lines))
+  client = http_client("https://api.telegram.org")
+  await _send_alert_telegram(client, "\n".join(lines))
 
   blog_post = _build_blog_post(now_local, now_utc, big_spender, contrarian, sniper)
   async with SessionLocal() as session:
@@ -544,7 +541,6 @@ async def run_daily_spotlight() -> dict:
 
 
 async def run_full_health_check() -> dict:
-  proxies = settings.https_proxy or None
   health_urls = {
     "trade_ingest": settings.health_trade_ingest_api_url,
     "whale_engine": settings.health_whale_engine_api_url,
@@ -555,38 +551,37 @@ async def run_full_health_check() -> dict:
   started_at = datetime.now(timezone.utc)
   results: dict[str, str] = {}
 
-  async with httpx.AsyncClient(proxies=proxies) as client:
-    for name, base_url in health_urls.items():
-      if not base_url:
-        continue
-      code, err = await _fetch_health(client, base_url)
-      if code is None:
-        results[name] = f"error:{err}"
-      else:
-        results[name] = str(code)
-
-    # Read-only pipeline freshness — no synthetic trades are injected (CR-H1).
-    results.update(await _pipeline_freshness())
-
-    ok = (
-      all(results.get(k) == "200" for k in health_urls if health_urls[k])
-      and results.get("db") == "ok"
-    )
-    status = "OK" if ok else "FAIL"
-    lines = [
-      f"全链路检查结果: {status}",
-      f"时间(UTC): {started_at.isoformat()}",
-      f"DB: {results.get('db')}",
-      f"最近原始交易距今: {results.get('raw_trade_age')}",
-      f"最近 WhaleTrade 距今: {results.get('whale_trade_age')}",
-      f"最近 Alert 距今: {results.get('alert_age')}",
-      f"24h WhaleTrades: {results.get('whale_trades_24h')}",
-      f"24h Alerts: {results.get('alerts_24h')}",
-    ]
-    for name, base_url in health_urls.items():
-      if base_url:
-        lines.append(f"{name} /health: {results.get(name)}")
-    await _send_telegram(client, "\n".join(lines))
+  for name, base_url in health_urls.items():
+    if not base_url:
+      continue
+    code, err = await _fetch_health(http_client(base_url), base_url)
+    if code is None:
+      results[name] = f"error:{err}"
+    else:
+      results[name] = str(code)
+
+  # Read-only pipeline freshness — no synthetic trades are injected (CR-H1).
+  results.update(await _pipeline_freshness())
+
+  ok = (
+    all(results.get(k) == "200" for k in health_urls if health_urls[k])
+    and results.get("db") == "ok"
+  )
+  status = "OK" if ok else "FAIL"
+  lines = [
+    f"全链路检查结果: {status}",
+    f"时间(UTC): {started_at.isoformat()}",
+    f"DB: {results.get('db')}",
+    f"最近原始交易距今: {results.get('raw_trade_age')}",
+    f"最近 WhaleTrade 距今: {results.get('whale_trade_age')}",
+    f"最近 Alert 距今: {results.get('alert_age')}",
+    f"24h WhaleTrades: {results.get('whale_trades_24h')}",
+    f"24h Alerts: {results.get('alerts_24h')}",
+  ]
+  for name, base_url in health_urls.items():
+    if base_url:
+      lines.append(f"{name} /health: {results.get(name)}")
+  await _send_telegram(http_client("https://api.telegram.org"), "\n".join(lines))
 
   return {"status": status, "results": results}
 
@@ -608,8 +603,9 @@ def ingest_trades_task() -> int:
     redis = Redis.from_url(settings.redis_url, decode_responses=True)
     try:
       async with SessionLocal() as session:
-        trade_ids = await ingest_trades(session)
+        trade_ids = await ingest_trades(session, redis)
         await session.commit()
+        await save_trade_watermark(redis)
 
         if trade_ids:
           rows = (
@@ -617,9 +613,9 @@ def ingest_trades_task() -> int:
               select(TradeRaw).where(TradeRaw.trade_id.in_(list(trade_ids)))
             )
           ).scalars().all()
-          for r in rows:
-            await _cache_trade(
-              redis,
+          await _cache_trades(
+            redis,
+            [
               {
                 "trade_id": r.trade_id,
                 "market_id": r.market_id,
@@ -629,8 +625,14 @@ def ingest_trades_task() -> int:
                 "amount": float(r.amount),
                 "price": float(r.price),
                 "timestamp": r.timestamp,
-              },
-            )
+              }
+              for r in rows
+            ],
+          )
+          try:
+            await mark_vw_dirty(redis, {r.market_id for r in rows})
+          except Exception:
+            logger.exception("mark_vw_dirty_failed")
 
       if trade_ids:
         # Batch RPUSH in chunks of 50 to avoid Redis protocol limits (CR-I4).
@@ -755,9 +757,11 @@ async def _consume_incoming_trades_once() -> int:
     if inserted:
       await redis.rpush(settings.trade_created_queue, *[json.dumps({"trade_id": tid}) for tid in inserted])
       inserted_set = set(str(t) for t in inserted)
-      for p in payloads:
-        if p["trade_id"] in inserted_set:
-          await _cache_trade(redis, p)
+      await _cache_trades(redis, [p for p in payloads if p["trade_id"] in inserted_set])
+      try:
+        await mark_vw_dirty(redis, {p["market_id"] for p in payloads if p["trade_id"] in inserted_set})
+      except Exception:
+        logger.exception("mark_vw_dirty_failed")
 
     # Delete the processing list — items have been successfully committed.
     # If we crash before this line, items remain in :processing and will be
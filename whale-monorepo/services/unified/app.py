@@ -96,6 +96,26 @@ async def lifespan(app: FastAPI):
             await asyncio.gather(*worker_tasks, return_exceptions=True)
             logger.info("workers_cancelled count=%d", len(worker_tasks))
 
+        # Write back positions the consumers left in the write-behind book.
+        try:
+            from services.whale_engine.positions import flush_position_book
+            n = await flush_position_book()
+            logger.info("position_book_flushed count=%d", n)
+        except Exception:
+            logger.exception("position_book_shutdown_flush_failed")
+        try:
+            from services.whale_engine.wallet_seen import flush_wallet_seen
+            n = await flush_wallet_seen()
+            logger.info("wallet_seen_flushed count=%d", n)
+        except Exception:
+            logger.exception("wallet_seen_shutdown_flush_failed")
+
+        try:
+            from services.unified.executor import shutdown_compute_pool
+            shutdown_compute_pool()
+        except Exception:
+            logger.exception("compute_pool_shutdown_failed")
+
         # Cancel pending Telegram delayed sends
         for t in list(_pending_sends):
             t.cancel()
@@ -103,6 +123,14 @@ async def lifespan(app: FastAPI):
             await asyncio.gather(*_pending_sends, return_exceptions=True)
             logger.info("pending_sends_cancelled count=%d", len(_pending_sends))
 
+        # Close pooled outbound HTTP clients after the last sender is gone
+        try:
+            from shared.http_clients import close_http_clients
+            n = await close_http_clients()
+            logger.info("http_clients_closed count=%d", n)
+        except Exception:
+            logger.exception("http_clients_shutdown_failed")
+
         # Close InMemoryRedis (no-op but for API compatibility)
         await memory_redis.aclose()
 
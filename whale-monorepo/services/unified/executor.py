@@ -0,0 +1,114 @@
+"""
+Process pool for the CPU-bound halves of the periodic recompute jobs.
+
+The unified app runs every worker and every API router on one event loop, so
+the pure-Python stretches of recompute_whale_stats (window metrics, scoring)
+stall requests while they run. The job keeps its queries and writes on the
+loop and hands the compute step to run_compute, which runs it in a
+ProcessPoolExecutor. Arguments and results are pickled across the boundary,
+so callers pass plain tuples, not ORM rows, and the function must be
+importable at module level.
+
+COMPUTE_POOL_WORKERS sets the pool size; 0 runs every job inline on the loop.
+Each job is bounded by COMPUTE_TIMEOUT_<JOB>_SECONDS (falling back to
+COMPUTE_TIMEOUT_SECONDS). A running job cannot be cancelled, so on a timeout
+or a crashed worker the pool is torn down and the next job starts a new one.
+Each worker reports its PID through a queue when it starts, so teardown can
+terminate the workers without reaching into the executor's internals.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger("unified.executor")
+
+COMPUTE_POOL_WORKERS = int(os.getenv("COMPUTE_POOL_WORKERS", "1"))
+COMPUTE_TIMEOUT_SECONDS = float(os.getenv("COMPUTE_TIMEOUT_SECONDS", "600"))
+
+_pool: ProcessPoolExecutor | None = None
+_pool_pids: dict[ProcessPoolExecutor, object] = {}  # pool → SimpleQueue of worker PIDs
+
+
+def _job_timeout(job: str) -> float | None:
+    timeout = float(os.getenv(f"COMPUTE_TIMEOUT_{job.upper()}_SECONDS", str(COMPUTE_TIMEOUT_SECONDS)))
+    return timeout if timeout > 0 else None
+
+
+def _report_pid(pids) -> None:
+    """Pool initializer: runs once in each new worker process."""
+    pids.put(os.getpid())
+
+
+def _worker_pids(pool: ProcessPoolExecutor) -> list[int]:
+    """PIDs the pool's workers reported (forgets the pool)."""
+    pids = _pool_pids.pop(pool, None)
+    found: list[int] = []
+    while pids is not None and not pids.empty():
+        found.append(pids.get())
+    return found
+
+
+def compute_pool() -> ProcessPoolExecutor | None:
+    """The shared pool, started on first use; None when pooling is off."""
+    global _pool
+    if COMPUTE_POOL_WORKERS <= 0:
+        return None
+    if _pool is None:
+        # spawn, not fork: this process runs threads (DB drivers, executors)
+        # and forking a threaded process can deadlock the child.
+        ctx = multiprocessing.get_context("spawn")
+        pids = ctx.SimpleQueue()
+        _pool = ProcessPoolExecutor(
+            max_workers=COMPUTE_POOL_WORKERS,
+            mp_context=ctx,
+            initializer=_report_pid,
+            initargs=(pids,),
+        )
+        _pool_pids[_pool] = pids
+        logger.info("compute_pool_started workers=%d", COMPUTE_POOL_WORKERS)
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    if _pool is pool:
+        _pool = None
+    for pid in _worker_pids(pool):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_compute(job: str, fn, *args):
+    """fn(*args) in the compute pool (inline when pooling is off)."""
+    pool = compute_pool()
+    if pool is None:
+        return fn(*args)
+    timeout = _job_timeout(job)
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(pool, fn, *args), timeout)
+    except asyncio.TimeoutError:
+        logger.error("compute_job_timeout job=%s timeout=%ss", job, timeout)
+        _discard_pool(pool)
+        raise
+    except BrokenProcessPool:
+        logger.error("compute_pool_broken job=%s", job)
+        _discard_pool(pool)
+        raise
+
+
+def shutdown_compute_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        _pool_pids.pop(pool, None)
+        pool.shutdown(wait=False, cancel_futures=True)
+        logger.info("compute_pool_shutdown")
@@ -5,7 +5,8 @@ In-memory drop-in replacement for redis.asyncio.Redis.
 
 Supports the exact subset of Redis commands used by SightWhale services:
 - Lists: rpush, blpop, lpop, llen, lrange, ltrim, lmove, delete
-- KV: get, set (ex, nx), delete, expire, ping, incr, decr
+- KV: get, mget, set (ex, nx), delete, expire, ping, incr, decr
+- Sets: sadd, srem, smembers, scard, spop
 - Lua eval: BATCH_RPUSH, _BATCH_LMOVE
 - Pipeline (transaction)
 
@@ -37,8 +38,11 @@ class _Pipeline:
             await self.execute()
 
     async def execute(self):
+        # Drain the queue like redis-py does, so the implicit execute in
+        # __aexit__ does not replay commands already run explicitly.
+        commands, self._commands = self._commands, []
         results = []
-        for cmd, args, kwargs in self._commands:
+        for cmd, args, kwargs in commands:
             method = getattr(self._store, cmd, None)
             if method:
                 try:
@@ -62,6 +66,14 @@ class _Pipeline:
         self._commands.append(("expire", (key, seconds), {}))
         return "QUEUED"
 
+    def lrange(self, key: str, start: int, end: int) -> "str":
+        self._commands.append(("lrange", (key, start, end), {}))
+        return "QUEUED"
+
+    def set(self, key: str, value: str, ex: int | None = None, nx: bool = False) -> "str":
+        self._commands.append(("set", (key, value), {"ex": ex, "nx": nx}))
+        return "QUEUED"
+
 
 class InMemoryRedis:
     """Drop-in async replacement for redis.asyncio.Redis.
@@ -249,6 +261,14 @@ class InMemoryRedis:
             return None
         return value
 
+    async def mget(self, keys, *args: str) -> list[str | None]:
+        """Match redis-py: accepts a list of keys or keys as varargs."""
+        if isinstance(keys, (list, tuple)):
+            key_list = list(keys) + list(args)
+        else:
+            key_list = [keys, *args]
+        return [await self.get(k) for k in key_list]
+
     async def set(
         self,
         key: str,
@@ -380,6 +400,18 @@ class InMemoryRedis:
     async def scard(self, key: str) -> int:
         return len(self._sets.get(key, set()))
 
+    async def spop(self, key: str, count: int | None = None):
+        s = self._sets.get(key)
+        if not s:
+            return [] if count is not None else None
+        if count is None:
+            value = s.pop()
+        else:
+            value = [s.pop() for _ in range(min(count, len(s)))]
+        if not s:
+            self._sets.pop(key, None)
+        return value
+
     # ── Utility ─────────────────────────────────────────────
 
     def __repr__(self) -> str:
@@ -29,6 +29,7 @@ from sqlalchemy import select, text
 from shared.config import settings
 from shared.db import SessionLocal
 from shared.models import Alert, TradeRaw, WhaleTrade
+from services.unified.worker_loop import trade_created_message
 
 logger = logging.getLogger("unified.reconcile")
 
@@ -52,17 +53,18 @@ async def reconcile_pipeline_on_startup(redis) -> dict[str, int]:
             text(f"SET LOCAL statement_timeout = {RECONCILE_STATEMENT_TIMEOUT_MS}")
         )
         # Stage 1: raw trades that never produced a whale_trade.
-        raw_ids = (
+        raw_rows = (
             await session.execute(
-                select(TradeRaw.trade_id)
+                select(TradeRaw.trade_id, TradeRaw.wallet)
                 .where(TradeRaw.timestamp >= since)
                 .where(~TradeRaw.trade_id.in_(select(WhaleTrade.trade_id)))
                 .order_by(TradeRaw.timestamp)
                 .limit(max_items)
             )
-        ).scalars().all()
-        for i in range(0, len(raw_ids), 50):
-            chunk = [json.dumps({"trade_id": tid}) for tid in raw_ids[i : i + 50]]
+        ).all()
+        raw_ids = [tid for tid, _ in raw_rows]
+        for i in range(0, len(raw_rows), 50):
+            chunk = [trade_created_message(tid, wallet) for tid, wallet in raw_rows[i : i + 50]]
             await redis.rpush(settings.trade_created_queue, *chunk)
         summary["reconciled_raw_trades"] = len(raw_ids)
 
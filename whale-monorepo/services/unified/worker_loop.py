@@ -5,7 +5,7 @@ Each loop corresponds to one Celery Beat schedule in the old architecture.
 All loops run as background asyncio tasks in the same event loop.
 Communication is via the shared InMemoryRedis instance.
 
-The business logic functions (ingest_markets, process_trade_id, etc.) are
+The business logic functions (ingest_markets, process_trade_batch, etc.) are
 imported and called directly — they remain unchanged.
 """
 
@@ -14,14 +14,15 @@ import json
 import logging
 import os
 import time
+import zlib
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 
-import httpx
-
 from shared.config import get_alert_config, settings
 from shared.db import SessionLocal
+from shared.http_clients import http_client
 from shared.logging import configure_logging
+from shared.recent_trades import push_trades
 
 logger = logging.getLogger("unified.worker_loop")
 
@@ -36,6 +37,8 @@ _INITIAL_DELAY_HEALTH_CHECK = 300           # let all services stabilize before
 
 _worker_heartbeats: dict[str, float] = {}
 _worker_has_error: dict[str, bool] = {}
+# Queue depth / lag per consumer (whale_consume or whale_consume:p{i}).
+_worker_queue_stats: dict[str, dict[str, float]] = {}
 
 
 def _beat(name: str) -> None:
@@ -60,10 +63,16 @@ def get_worker_status() -> dict:
         status[name] = {
             "last_beat_sec": round(now - ts, 1),
             "has_error": _worker_has_error.get(name, False),
+            **_worker_queue_stats.get(name, {}),
         }
     return status
 
 
+def trade_created_message(trade_id: str, wallet: str | None = None) -> str:
+    """trade_created payload; wallet routes it to its partition, enqueued_at feeds lag."""
+    return json.dumps({"trade_id": trade_id, "wallet": wallet, "enqueued_at": time.time()})
+
+
 # ═══════════════════════════════════════════════════════════════
 # Trade Ingest Workers
 # ═══════════════════════════════════════════════════════════════
@@ -97,8 +106,12 @@ async def ingest_markets_loop() -> None:
 
 
 async def ingest_trades_loop() -> None:
-    """Periodically ingest trades from Polymarket (replaces Celery beat)."""
-    from services.trade_ingest.polymarket import ingest_trades
+    """Poll Polymarket trades (replaces Celery beat).
+
+    Each poll pages back to the watermark; the sleep between polls adapts to
+    the observed trade rate within [TRADE_INGEST_MIN_SECONDS, TRADE_INGEST_SECONDS].
+    """
+    from services.trade_ingest.polymarket import ingest_trades, next_trade_poll_interval, save_trade_watermark
     from shared.models import TradeRaw
     from sqlalchemy import select
 
@@ -110,9 +123,11 @@ async def ingest_trades_loop() -> None:
     while True:
         try:
             async with SessionLocal() as session:
-                trade_ids = await ingest_trades(session)
+                trade_ids = await ingest_trades(session, redis)
                 await session.commit()
+                await save_trade_watermark(redis)
 
+                wallets: dict[str, str] = {}
                 if trade_ids:
                     # Cache recent trades
                     rows = (
@@ -120,11 +135,12 @@ async def ingest_trades_loop() -> None:
                             select(TradeRaw).where(TradeRaw.trade_id.in_(list(trade_ids)))
                         )
                     ).scalars().all()
-                    for r in rows:
-                        await _cache_trade(redis, r)
+                    await _cache_trades(redis, rows)
+                    await _index_inserted_trades(redis, ((r.market_id, r.outcome, r.amount, r.price, r.timestamp) for r in rows))
+                    wallets = {str(r.trade_id): r.wallet for r in rows}
 
             if trade_ids:
-                messages = [json.dumps({"trade_id": tid}) for tid in trade_ids]
+                messages = [trade_created_message(tid, wallets.get(str(tid))) for tid in trade_ids]
                 for i in range(0, len(messages), 50):
                     chunk = messages[i : i + 50]
                     await redis.rpush(settings.trade_created_queue, *chunk)
@@ -135,34 +151,71 @@ async def ingest_trades_loop() -> None:
         except Exception as e:
             logger.exception("ingest_trades_failed")
             _err("ingest_trades")
-        await asyncio.sleep(interval)
+            await asyncio.sleep(interval)
+            continue
+        await asyncio.sleep(next_trade_poll_interval())
 
 
-async def _cache_trade(redis, trade_row) -> None:
-    """Cache a trade row for the /analyze page."""
-    wallet = str(getattr(trade_row, "wallet", "") or "").lower()
-    market_id = str(getattr(trade_row, "market_id", "") or "")
-    if not wallet or not market_id:
-        return
-    ts = getattr(trade_row, "timestamp", None) or datetime.now(timezone.utc)
-    body = {
-        "timestamp": ts.isoformat() if hasattr(ts, "isoformat") else str(ts),
-        "side": getattr(trade_row, "side", None),
-        "amount": float(getattr(trade_row, "amount", 0) or 0),
-        "price": float(getattr(trade_row, "price", 0) or 0),
-    }
-    key = f"recent_trades:{wallet}:{market_id}"
+async def _cache_trades(redis, trade_rows) -> None:
+    """Cache trade rows in the packed recent-trades lists (one pipeline)."""
     try:
-        await redis.rpush(key, json.dumps(body))
-        await redis.ltrim(key, -settings.recent_trades_cache_max, -1)
-        await redis.expire(key, settings.recent_trades_cache_seconds)
+        await push_trades(
+            redis,
+            (
+                (
+                    str(getattr(r, "wallet", "") or "").lower(),
+                    str(getattr(r, "market_id", "") or ""),
+                    getattr(r, "timestamp", None) or datetime.now(timezone.utc),
+                    getattr(r, "side", None),
+                    getattr(r, "amount", 0),
+                    getattr(r, "price", 0),
+                )
+                for r in trade_rows
+            ),
+        )
     except Exception:
-        logger.debug("cache_trade_failed trade_id=%s", getattr(trade_row, "trade_id", "?"), exc_info=True)
+        logger.debug("cache_trades_failed count=%s", len(trade_rows), exc_info=True)
+
+
+async def _index_inserted_trades(redis, trades) -> None:
+    """Feed newly inserted trades (market_id, outcome, amount, price, timestamp)
+    to the VW accumulators and the latest-price index, and mark their markets
+    for the debounced VW recompute."""
+    from shared.async_utils import mark_vw_dirty
+    from services.whale_engine.vw_book import vw_book
+    from shared.latest_prices import latest_prices_index
+
+    trades = list(trades)
+    book = vw_book()
+    prices = latest_prices_index()
+    try:
+        if book is not None:
+            book.record_many(trades)
+        if prices is not None:
+            prices.record_many((t[0], t[1], t[3], t[4]) for t in trades)
+        await mark_vw_dirty(redis, {t[0] for t in trades})
+    except Exception:
+        logger.debug("index_inserted_trades_failed count=%s", len(trades), exc_info=True)
+
+
+async def hydrate_latest_prices() -> None:
+    """Load the latest-price index once at startup, retrying until it succeeds."""
+    from shared.latest_prices import latest_prices_index
+
+    index = latest_prices_index()
+    while index is not None and not index.ready:
+        try:
+            async with SessionLocal() as session:
+                n = await index.load(session)
+            logger.info("latest_prices_loaded markets=%s", n)
+        except Exception:
+            logger.exception("latest_prices_load_failed")
+            await asyncio.sleep(30)
 
 
 async def consume_incoming_trades_loop() -> None:
     """Consume trades from the incoming queue and publish to trade_created."""
-    from sqlalchemy.dialects.postgresql import insert
+    from shared.db import bulk_upsert
     from shared.models import Market, TradeRaw
 
     batch_seconds = float(os.getenv("TRADE_INGEST_BATCH_SECONDS", "3"))
@@ -267,42 +320,38 @@ async def consume_incoming_trades_loop() -> None:
                 continue
 
             async with SessionLocal() as session:
-                for mid, title in market_titles.items():
-                    await session.execute(
-                        insert(Market)
-                        .values(id=mid, title=title)
-                        .on_conflict_do_nothing(index_elements=[Market.id])
-                    )
-
-                stmt = (
-                    insert(TradeRaw)
-                    .values(payloads)
-                    .on_conflict_do_nothing(index_elements=[TradeRaw.trade_id])
-                    .returning(TradeRaw.trade_id)
+                await bulk_upsert(
+                    session,
+                    Market,
+                    [{"id": mid, "title": title} for mid, title in market_titles.items()],
+                    index_elements=["id"],
                 )
-                inserted = (await session.execute(stmt)).scalars().all()
+                inserted = await bulk_upsert(session, TradeRaw, payloads, index_elements=["trade_id"], returning="trade_id")
                 await session.commit()
 
             if inserted:
+                wallets = {p["trade_id"]: p["wallet"] for p in payloads}
                 await redis.rpush(
                     settings.trade_created_queue,
-                    *[json.dumps({"trade_id": tid}) for tid in inserted],
+                    *[trade_created_message(tid, wallets.get(str(tid))) for tid in inserted],
                 )
                 inserted_set = set(str(t) for t in inserted)
-                for p in payloads:
-                    if p["trade_id"] in inserted_set:
-                        cache_key = f"recent_trades:{p['wallet']}:{p['market_id']}"
-                        await redis.rpush(
-                            cache_key,
-                            json.dumps({
-                                "timestamp": p["timestamp"].isoformat(),
-                                "side": p["side"],
-                                "amount": p["amount"],
-                                "price": p["price"],
-                            }),
-                        )
-                        await redis.ltrim(cache_key, -settings.recent_trades_cache_max, -1)
-                        await redis.expire(cache_key, settings.recent_trades_cache_seconds)
+                await push_trades(
+                    redis,
+                    (
+                        (p["wallet"], p["market_id"], p["timestamp"], p["side"], p["amount"], p["price"])
+                        for p in payloads
+                        if p["trade_id"] in inserted_set
+                    ),
+                )
+                await _index_inserted_trades(
+                    redis,
+                    (
+                        (p["market_id"], p["outcome"], p["amount"], p["price"], p["timestamp"])
+                        for p in payloads
+                        if p["trade_id"] in inserted_set
+                    ),
+                )
 
             logger.info(
                 "consume_incoming_trades_done received=%s inserted=%s parse_failures=%s",
@@ -408,8 +457,8 @@ async def _send_health_telegram(trade_id: str, started_at: datetime, status: str
     text = "\n".join(lines)
     url = f"https://api.telegram.org/bot{token}/sendMessage"
     try:
-        async with httpx.AsyncClient() as client:
-            await client.post(url, json={"chat_id": chat_id, "text": text, "disable_web_page_preview": True}, timeout=10)
+        client = http_client(url)
+        await client.post(url, json={"chat_id": chat_id, "text": text, "disable_web_page_preview": True}, timeout=10)
     except Exception:
         # Deliberately NOT logging the URL — it contains the Telegram bot token
         logger.exception("health_telegram_failed chat_id=%s", chat_id[-4:] if len(chat_id) > 4 else "???")
@@ -475,49 +524,173 @@ async def generate_daily_article_loop() -> None:
 # ═══════════════════════════════════════════════════════════════
 
 
-async def whale_consume_trade_created_loop() -> None:
-    """Consume trade_created queue and identify whale trades."""
-    from services.whale_engine.engine import process_trade_id
+def _wallet_partition(wallet: str, partitions: int) -> int:
+    """Stable partition for a wallet (crc32, not the per-process salted hash())."""
+    return zlib.crc32(wallet.lower().encode("utf-8")) % partitions
+
+
+def _partition_queue(index: int) -> str:
+    return f"{settings.trade_created_queue}:p{index}"
+
+
+async def _route_trade_created(redis, raws: list[str], partitions: int) -> int:
+    """Route trade_created payloads to their wallet partitions, keeping order.
+
+    Messages without a wallet (older producers) are resolved with a single
+    TradeRaw lookup; unknown trades, and every trade when the lookup fails,
+    are spread by trade_id. If a partition push fails, the messages not yet
+    pushed go back to the head of trade_created in arrival order and the
+    error is raised, so nothing popped by the dispatcher is dropped.
+    """
+    from sqlalchemy import select
+    from shared.models import TradeRaw
 
+    now = time.time()
+    messages: list[dict] = []
+    for payload in raws:
+        try:
+            msg = json.loads(payload)
+        except Exception:
+            logger.exception("whale_dispatch_bad_payload payload=%s", payload[:200])
+            continue
+        if msg.get("trade_id"):
+            msg["trade_id"] = str(msg["trade_id"])
+            messages.append(msg)
+
+    missing = [m["trade_id"] for m in messages if not m.get("wallet")]
+    if missing:
+        found: dict = {}
+        try:
+            async with SessionLocal() as session:
+                found = dict(
+                    (await session.execute(
+                        select(TradeRaw.trade_id, TradeRaw.wallet).where(TradeRaw.trade_id.in_(missing))
+                    )).all()
+                )
+        except Exception:
+            logger.warning("whale_dispatch_wallet_lookup_failed trades=%d", len(missing), exc_info=True)
+        for m in messages:
+            if not m.get("wallet"):
+                m["wallet"] = found.get(m["trade_id"])
+
+    routed: dict[int, list[tuple[int, str]]] = {}
+    for position, m in enumerate(messages):
+        m.setdefault("enqueued_at", now)
+        key = m.get("wallet") or m["trade_id"]
+        routed.setdefault(_wallet_partition(str(key), partitions), []).append((position, json.dumps(m)))
+    pending = list(routed)
+    try:
+        while pending:
+            index = pending[0]
+            await redis.rpush(_partition_queue(index), *(item for _, item in routed[index]))
+            pending.pop(0)
+    except Exception:
+        unpushed = sorted(entry for index in pending for entry in routed[index])
+        # One LPUSH per item, newest first: the head ends up in arrival order
+        # (multi-value LPUSH order differs between Redis and InMemoryRedis).
+        for _, item in reversed(unpushed):
+            await redis.lpush(settings.trade_created_queue, item)
+        logger.warning("whale_dispatch_requeued count=%d", len(unpushed))
+        raise
+    return len(messages)
+
+
+async def whale_partition_dispatch_loop(partitions: int) -> None:
+    """Split trade_created into per-wallet partitions (crc32(wallet) % N).
+
+    One dispatcher preserves arrival order within each wallet; each partition
+    then has its own consumer and DB session, so position updates for a
+    wallet stay sequential while different wallets run in parallel.
+    """
+    batch_size = int(os.getenv("TRADE_CONSUME_BATCH", "50"))
+    logger.info("whale_dispatch_loop_started partitions=%s", partitions)
+
+    redis = await _get_inmem_redis()
+
+    while True:
+        try:
+            item = await redis.blpop(settings.trade_created_queue, timeout=1)
+            if not item:
+                _beat("whale_dispatch")
+                continue
+            _, raw = item
+            raws = [raw]
+            for _ in range(batch_size * partitions - 1):
+                nxt = await redis.lpop(settings.trade_created_queue)
+                if not nxt:
+                    break
+                raws.append(nxt)
+            await _route_trade_created(redis, raws, partitions)
+            _beat("whale_dispatch")
+        except Exception:
+            logger.exception("whale_dispatch_failed")
+            _err("whale_dispatch")
+            await asyncio.sleep(1)
+
+
+async def whale_consume_trade_created_loop(queue: str | None = None, name: str = "whale_consume") -> None:
+    """Consume trade_created (or one of its partitions) and identify whale trades."""
+    from services.whale_engine.engine import process_trade_batch, process_trade_id
+
+    queue = queue or settings.trade_created_queue
     poll_interval = float(os.getenv("WHALE_CONSUME_SECONDS", "1"))
     batch_size = int(os.getenv("TRADE_CONSUME_BATCH", "50"))
-    logger.info("whale_consume_loop_started poll_s=%s batch=%s", poll_interval, batch_size)
+    logger.info("whale_consume_loop_started name=%s poll_s=%s batch=%s", name, poll_interval, batch_size)
 
     redis = await _get_inmem_redis()
 
     while True:
         try:
             # BLPOP with 1s timeout
-            item = await redis.blpop(settings.trade_created_queue, timeout=1)
+            item = await redis.blpop(queue, timeout=1)
             if not item:
-                _beat("whale_consume")  # idle heartbeat
+                _worker_queue_stats[name] = {"depth": 0, "lag_sec": 0.0}
+                _beat(name)  # idle heartbeat
                 continue
 
             _, raw = item
             raws = [raw]
             # Drain remaining
             for _ in range(batch_size - 1):
-                nxt = await redis.lpop(settings.trade_created_queue)
+                nxt = await redis.lpop(queue)
                 if not nxt:
                     break
                 raws.append(nxt)
 
-            created_count = 0
+            trade_ids: list[str] = []
+            oldest: float | None = None
+            for payload in raws:
+                try:
+                    msg = json.loads(payload)
+                    trade_id = str(msg.get("trade_id") or "")
+                    enqueued_at = msg.get("enqueued_at")
+                except Exception:
+                    logger.exception("whale_consume_failed_single payload=%s", payload[:200])
+                    continue
+                if trade_id:
+                    trade_ids.append(trade_id)
+                if enqueued_at is not None:
+                    oldest = float(enqueued_at) if oldest is None else min(oldest, float(enqueued_at))
+
             events: list[dict] = []
             async with SessionLocal() as session:
-                for payload in raws:
-                    try:
-                        msg = json.loads(payload)
-                        trade_id = str(msg.get("trade_id") or "")
-                        if not trade_id:
-                            continue
-                        created, event = await process_trade_id(session, redis, trade_id)
-                        if created and event is not None:
-                            created_count += 1
-                            events.append(event)
-                    except Exception:
-                        logger.exception("whale_consume_failed_single payload=%s", payload[:200])
+                try:
+                    events = await process_trade_batch(session, redis, trade_ids)
+                except Exception:
+                    # One bad trade must not stall the whole batch: roll back
+                    # and fall back to the per-trade path, which isolates it.
+                    logger.exception("whale_consume_batch_failed size=%s — falling back to per-trade", len(trade_ids))
+                    await session.rollback()
+                    events = []
+                    for trade_id in trade_ids:
+                        try:
+                            created, event = await process_trade_id(session, redis, trade_id)
+                            if created and event is not None:
+                                events.append(event)
+                        except Exception:
+                            logger.exception("whale_consume_failed_single trade_id=%s", trade_id)
                 await session.commit()
+            created_count = len(events)
 
             if events:
                 for i in range(0, len(events), 50):
@@ -525,46 +698,171 @@ async def whale_consume_trade_created_loop() -> None:
                     chunk_raw = [json.dumps(e) for e in chunk]
                     await redis.rpush(settings.whale_trade_created_queue, *chunk_raw)
 
+            _worker_queue_stats[name] = {
+                "depth": await redis.llen(queue),
+                "lag_sec": round(time.time() - oldest, 1) if oldest is not None else 0.0,
+            }
             if raws:
-                logger.info("whale_consume_done received=%s created=%s", len(raws), created_count)
-            _beat("whale_consume")
+                logger.info("whale_consume_done name=%s received=%s created=%s", name, len(raws), created_count)
+            _beat(name)
         except Exception as e:
-            logger.exception("whale_consume_failed")
-            _err("whale_consume")
+            logger.exception("whale_consume_failed name=%s", name)
+            _err(name)
             await asyncio.sleep(1)
 
 
+async def flush_position_book_loop() -> None:
+    """Write dirty whale positions from the in-process book back to the DB."""
+    from services.whale_engine.positions import POSITION_BOOK_ENABLED, POSITION_BOOK_FLUSH_SECONDS, flush_position_book
+
+    if not POSITION_BOOK_ENABLED:
+        return
+    logger.info("flush_position_book_loop_started interval=%ss", POSITION_BOOK_FLUSH_SECONDS)
+
+    while True:
+        await asyncio.sleep(POSITION_BOOK_FLUSH_SECONDS)
+        try:
+            n = await flush_position_book()
+            if n > 0:
+                logger.debug("flush_position_book_done count=%s", n)
+            _beat("position_book_flush")
+        except Exception:
+            logger.exception("flush_position_book_failed")
+            _err("position_book_flush")
+
+
+async def flush_wallet_seen_loop() -> None:
+    """Write buffered wallet first/last-seen timestamps back to the DB."""
+    from services.whale_engine.wallet_seen import WALLET_SEEN_FLUSH_SECONDS, flush_wallet_seen
+
+    logger.info("flush_wallet_seen_loop_started interval=%ss", WALLET_SEEN_FLUSH_SECONDS)
+
+    while True:
+        await asyncio.sleep(WALLET_SEEN_FLUSH_SECONDS)
+        try:
+            n = await flush_wallet_seen()
+            if n > 0:
+                logger.debug("flush_wallet_seen_done count=%s", n)
+            _beat("wallet_seen_flush")
+        except Exception:
+            logger.exception("flush_wallet_seen_failed")
+            _err("wallet_seen_flush")
+
+
 async def recompute_whale_stats_loop() -> None:
-    """Periodically recompute whale stats."""
-    from services.whale_engine.engine import recompute_whale_stats
+    """Periodically recompute whale stats.
+
+    Every WHALE_STATS_INCREMENTAL_SECONDS only wallets with new history (or
+    rows leaving a window) are rescored. Backfill scripts cannot reach this
+    process's InMemoryRedis dirty set, so wallets they rewrite are picked up
+    by the full sweep (or a restart); the full sweep runs every
+    WHALE_RECOMPUTE_SECONDS (hourly by default, every 300s when
+    WHALE_STATS_INCREMENTAL_SECONDS=0 disables the incremental runs).
+    """
+    from services.unified.executor import run_compute
+    from services.whale_engine.engine import recompute_whale_stats, recompute_whale_stats_incremental
+    from services.whale_engine.score_table import publish_whale_scores
 
-    interval = float(os.getenv("WHALE_RECOMPUTE_SECONDS", "300"))
-    logger.info("recompute_whale_stats_loop_started interval=%ss", interval)
+    incremental = float(os.getenv("WHALE_STATS_INCREMENTAL_SECONDS", "15"))
+    interval = float(os.getenv("WHALE_RECOMPUTE_SECONDS", "300" if incremental <= 0 else "3600"))
+    logger.info("recompute_whale_stats_loop_started interval=%ss incremental=%ss", interval, incremental)
+
+    redis = await _get_inmem_redis()
+    next_full = 0.0
 
     while True:
+        full = incremental <= 0 or time.monotonic() >= next_full
+        if full:
+            next_full = time.monotonic() + interval
         try:
             async with SessionLocal() as session:
-                n = await recompute_whale_stats(session)
+                if full:
+                    n = await recompute_whale_stats(session, offload=run_compute)
+                else:
+                    n = await recompute_whale_stats_incremental(session, redis=redis)
                 await session.commit()
             if n > 0:
-                logger.info("recompute_whale_stats_done count=%s", n)
+                logger.info("recompute_whale_stats_done count=%s full=%s", n, full)
+                await publish_whale_scores(redis)
         except Exception:
-            logger.exception("recompute_whale_stats_failed")
-        await asyncio.sleep(interval)
+            logger.exception("recompute_whale_stats_failed full=%s", full)
+        await asyncio.sleep(interval if incremental <= 0 else incremental)
+
+
+async def whale_score_sync_loop() -> None:
+    """Reload the in-process score table when another process publishes a
+    newer version. Single-process (InMemoryRedis) mode has nothing to sync."""
+    from services.whale_engine.score_table import WHALE_SCORE_CHANNEL, WHALE_SCORE_TABLE_ENABLED, whale_score_table
+
+    redis = await _get_inmem_redis()
+    if not WHALE_SCORE_TABLE_ENABLED or not hasattr(redis, "pubsub"):
+        return
+    logger.info("whale_score_sync_loop_started channel=%s", WHALE_SCORE_CHANNEL)
+
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(WHALE_SCORE_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    version = int(message.get("data"))
+                except (TypeError, ValueError):
+                    continue
+                if whale_score_table().note_version(version):
+                    logger.info("whale_score_table_stale version=%s", version)
+                _beat("whale_score_sync")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("whale_score_sync_failed")
+            _err("whale_score_sync")
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
 
 
 async def compute_vw_metrics_loop() -> None:
-    """Periodically compute volume-weighted metrics."""
+    """Periodically compute volume-weighted metrics for every active market.
+
+    This full sweep is the safety net; markets with new trades are picked up
+    within VW_DEBOUNCE_SECONDS by compute_dirty_vw_metrics_loop. The VW
+    accumulators are rebuilt from trades_raw on the first pass and every
+    VW_BOOK_REBUILD_SECONDS, and the ingest loops keep them current in
+    between. The snapshot rings are seeded once and then kept by
+    compute_vw_metrics.
+    """
     from services.whale_engine.vw import compute_vw_metrics
+    from services.whale_engine.vw_book import VW_BOOK_REBUILD_SECONDS, vw_book, vw_snapshot_rings
 
+    book = vw_book()
+    rings = vw_snapshot_rings()
     interval = float(os.getenv("VW_COMPUTE_SECONDS", "3600"))
-    logger.info("compute_vw_metrics_loop_started interval=%ss", interval)
+    logger.info("compute_vw_metrics_loop_started interval=%ss book=%s", interval, book is not None)
 
     redis = await _get_inmem_redis()
 
     while True:
         try:
             config = get_alert_config().get("vw_analysis", {})
+            if book is not None and (not book.ready or time.time() - book.loaded_at >= VW_BOOK_REBUILD_SECONDS):
+                try:
+                    async with SessionLocal() as session:
+                        markets = await book.load(session, int(config.get("computation_window_days", 7)))
+                    logger.info("vw_book_loaded markets=%s", markets)
+                except Exception:
+                    logger.exception("vw_book_load_failed")
+            if rings is not None and not rings.ready:
+                try:
+                    async with SessionLocal() as session:
+                        markets = await rings.load(session)
+                    logger.info("vw_snapshot_rings_loaded markets=%s", markets)
+                except Exception:
+                    logger.exception("vw_snapshot_rings_load_failed")
             async with SessionLocal() as session:
                 n = await compute_vw_metrics(session, redis, config)
                 await session.commit()
@@ -575,11 +873,36 @@ async def compute_vw_metrics_loop() -> None:
         await asyncio.sleep(interval)
 
 
+async def compute_dirty_vw_metrics_loop() -> None:
+    """Recompute VW metrics for markets the ingest loops marked dirty, each
+    at most once per VW_DEBOUNCE_SECONDS."""
+    from services.whale_engine.vw import VW_DEBOUNCE_SECONDS, compute_dirty_vw_metrics
+
+    interval = float(os.getenv("VW_DIRTY_TICK_SECONDS", "5"))
+    logger.info("compute_dirty_vw_metrics_loop_started interval=%ss debounce=%ss", interval, VW_DEBOUNCE_SECONDS)
+
+    redis = await _get_inmem_redis()
+
+    while True:
+        try:
+            config = get_alert_config().get("vw_analysis", {})
+            async with SessionLocal() as session:
+                n = await compute_dirty_vw_metrics(session, redis, config)
+                await session.commit()
+            if n > 0:
+                logger.debug("compute_dirty_vw_metrics_done count=%s", n)
+            _beat("vw_dirty")
+        except Exception:
+            logger.exception("compute_dirty_vw_metrics_failed")
+            _err("vw_dirty")
+        await asyncio.sleep(interval)
+
+
 async def prune_vw_snapshots_loop() -> None:
     """Periodically prune old VW snapshots."""
     from services.whale_engine.vw import prune_vw_snapshots
 
-    interval = float(os.getenv("VW_PRUNE_SECONDS", "86400"))
+    interval = float(os.getenv("VW_PRUNE_SECONDS", "3600"))
     logger.info("prune_vw_snapshots_loop_started interval=%ss", interval)
 
     while True:
@@ -792,6 +1115,7 @@ async def start_all_workers(application=None, stop: asyncio.Event | None = None)
 
     # Trade Ingest
     tasks.append(asyncio.create_task(ingest_markets_loop(), name="ingest_markets"))
+    tasks.append(asyncio.create_task(hydrate_latest_prices(), name="latest_prices_load"))
     tasks.append(asyncio.create_task(ingest_trades_loop(), name="ingest_trades"))
     tasks.append(asyncio.create_task(consume_incoming_trades_loop(), name="consume_incoming"))
     tasks.append(asyncio.create_task(rebuild_smart_collections_loop(), name="rebuild_smart"))
@@ -801,9 +1125,22 @@ async def start_all_workers(application=None, stop: asyncio.Event | None = None)
     tasks.append(asyncio.create_task(generate_daily_article_loop(), name="daily_article"))
 
     # Whale Engine
-    tasks.append(asyncio.create_task(whale_consume_trade_created_loop(), name="whale_consume"))
+    # WHALE_CONSUME_PARTITIONS > 1 runs one consumer (and DB session) per
+    # wallet partition; keep N within the DB pool budget (CR-DB1).
+    partitions = max(1, int(os.getenv("WHALE_CONSUME_PARTITIONS", "1")))
+    if partitions == 1:
+        tasks.append(asyncio.create_task(whale_consume_trade_created_loop(), name="whale_consume"))
+    else:
+        tasks.append(asyncio.create_task(whale_partition_dispatch_loop(partitions), name="whale_dispatch"))
+        for i in range(partitions):
+            name = f"whale_consume:p{i}"
+            tasks.append(asyncio.create_task(whale_consume_trade_created_loop(_partition_queue(i), name), name=name))
+    tasks.append(asyncio.create_task(flush_position_book_loop(), name="position_book_flush"))
+    tasks.append(asyncio.create_task(flush_wallet_seen_loop(), name="wallet_seen_flush"))
     tasks.append(asyncio.create_task(recompute_whale_stats_loop(), name="whale_stats"))
+    tasks.append(asyncio.create_task(whale_score_sync_loop(), name="whale_score_sync"))
     tasks.append(asyncio.create_task(compute_vw_metrics_loop(), name="vw_metrics"))
+    tasks.append(asyncio.create_task(compute_dirty_vw_metrics_loop(), name="vw_dirty"))
     tasks.append(asyncio.create_task(prune_vw_snapshots_loop(), name="vw_prune"))
     tasks.append(asyncio.create_task(prune_trades_raw_loop(), name="trades_raw_prune"))
 
@@ -594,20 +594,72 @@ async def vw_snapshots(
     hours: int = 24,
     session: AsyncSession = Depends(get_session),
 ):
-    """Fetch snapshot data for a single market's divergence chart."""
+    """Fetch snapshot data for a single market's divergence chart.
+
+    Up to 24h returns raw snapshots. Longer ranges are served in 15m buckets
+    (up to 7 days) or 1h buckets, merged from raw snapshots and the rollups
+    that prune_vw_snapshots compacts them into.
+    """
+    if hours <= 24:
+        rows = (
+            await session.execute(
+                text("""
+                    SELECT
+                        snapshot_at,
+                        vw_divergence::float,
+                        yes_market_price::float
+                    FROM market_vw_snapshots
+                    WHERE market_id = :mid
+                      AND snapshot_at > NOW() - INTERVAL '1 hour' * :hours
+                    ORDER BY snapshot_at ASC
+                """),
+                {"mid": marketId, "hours": hours},
+            )
+        ).fetchall()
+
+        data = [
+            {
+                "snapshotAt": row[0].isoformat() if row[0] else None,
+                "vwDivergence": row[1],
+                "yesMarketPrice": row[2],
+            }
+            for row in rows
+        ]
+        return {"data": data, "resolution": 0}
+
+    resolution = 900 if hours <= 168 else 3600
     rows = (
         await session.execute(
             text("""
+                WITH points AS (
+                    SELECT snapshot_at AS bucket_at,
+                           vw_divergence AS min_divergence,
+                           vw_divergence AS max_divergence,
+                           vw_divergence AS last_divergence,
+                           yes_market_price AS last_yes_market_price,
+                           snapshot_at AS last_at
+                    FROM market_vw_snapshots
+                    WHERE market_id = :mid
+                      AND snapshot_at > NOW() - INTERVAL '1 hour' * :hours
+                    UNION ALL
+                    SELECT bucket_at, min_divergence, max_divergence,
+                           last_divergence, last_yes_market_price, last_at
+                    FROM market_vw_snapshot_rollups
+                    WHERE market_id = :mid
+                      AND resolution_seconds <= :res
+                      AND bucket_at > NOW() - INTERVAL '1 hour' * :hours
+                )
                 SELECT
-                    snapshot_at,
-                    vw_divergence::float,
-                    yes_market_price::float
-                FROM market_vw_snapshots
-                WHERE market_id = :mid
-                  AND snapshot_at > NOW() - INTERVAL '1 hour' * :hours
-                ORDER BY snapshot_at ASC
+                    to_timestamp(FLOOR(EXTRACT(EPOCH FROM bucket_at) / :width) * :width) AS bucket,
+                    (ARRAY_AGG(last_divergence ORDER BY last_at DESC))[1]::float,
+                    (ARRAY_AGG(last_yes_market_price ORDER BY last_at DESC))[1]::float,
+                    MIN(min_divergence)::float,
+                    MAX(max_divergence)::float
+                FROM points
+                GROUP BY bucket
+                ORDER BY bucket ASC
             """),
-            {"mid": marketId, "hours": hours},
+            {"mid": marketId, "hours": hours, "res": resolution, "width": float(resolution)},
         )
     ).fetchall()
 
@@ -616,10 +668,12 @@ async def vw_snapshots(
             "snapshotAt": row[0].isoformat() if row[0] else None,
             "vwDivergence": row[1],
             "yesMarketPrice": row[2],
+            "minDivergence": row[3],
+            "maxDivergence": row[4],
         }
         for row in rows
     ]
-    return {"data": data}
+    return {"data": data, "resolution": resolution}
 
 
 @app.get("/vw/cross")
@@ -0,0 +1,224 @@
+"""Incremental per-(wallet, market) behavior windows for the whale consumer.
+
+detect_behavior() rebuilds the micro/macro windows from the whole recent-trade
+list on every call, so a wallet spraying hundreds of fills into one market
+costs O(n²) over the macro window. RollingWindowState keeps both windows as
+timestamp-ordered deques with running buy/sell USD and volume totals: each
+append and each expiry step is amortized O(1), and the spike/build/exit checks
+read the totals directly.
+
+A state is only complete while this process sees every trade for its key —
+true for the single unified consumer (and per wallet partition once the
+stream is partitioned). Set ROLLING_WINDOW_STATE_ENABLED=0 when several
+consumers share one unpartitioned queue.
+"""
+import os
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from shared.recent_trades import SIDE_BUY, SIDE_NAMES, SIDE_SELL, RecentTrades, side_code
+
+
+ROLLING_WINDOW_STATE_ENABLED = os.getenv("ROLLING_WINDOW_STATE_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+ROLLING_WINDOW_MAX_KEYS = int(os.getenv("ROLLING_WINDOW_MAX_KEYS", "50000"))
+
+# Entry layout: (epoch_ts, trade_id | None, raw_side, side_code, amount, price, usd)
+_TS, _TID, _SIDE, _CODE, _AMOUNT, _PRICE, _USD = range(7)
+_BUY = SIDE_BUY
+_SELL = SIDE_SELL
+
+
+def _epoch(ts: datetime | float) -> float:
+  if isinstance(ts, datetime):
+    if ts.tzinfo is None:
+      ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+  return float(ts)
+
+
+def _insert_ordered(dq: deque, entry: tuple) -> None:
+  # Trades arrive almost in timestamp order; fall back to a short scan from
+  # the right for the occasional late fill.
+  if not dq or dq[-1][_TS] <= entry[_TS]:
+    dq.append(entry)
+    return
+  i = len(dq)
+  while i > 0 and dq[i - 1][_TS] > entry[_TS]:
+    i -= 1
+  dq.insert(i, entry)
+
+
+class RollingWindowState:
+  """Micro/macro trade windows for one (wallet, market_id) with running totals."""
+
+  __slots__ = (
+    "micro_seconds", "macro_seconds", "spike_threshold",
+    "micro", "macro", "large", "trade_ids", "seeded_through",
+    "buy_count", "buy_usd", "buy_vol", "sell_usd", "sell_vol",
+  )
+
+  def __init__(self, micro_seconds: float, macro_seconds: float, spike_threshold: float) -> None:
+    self.micro_seconds = float(micro_seconds)
+    self.macro_seconds = float(macro_seconds)
+    self.spike_threshold = float(spike_threshold)
+    self.micro: deque = deque()
+    self.macro: deque = deque()
+    self.large: deque = deque()  # micro entries with usd >= spike_threshold
+    self.trade_ids: set[str] = set()
+    self.seeded_through = float("-inf")
+    self._reset_totals()
+
+  def _reset_totals(self) -> None:
+    self.buy_count = 0
+    self.buy_usd = 0.0
+    self.buy_vol = 0.0
+    self.sell_usd = 0.0
+    self.sell_vol = 0.0
+
+  def __len__(self) -> int:
+    return len(self.macro)
+
+  def _add(self, entry: tuple) -> None:
+    _insert_ordered(self.macro, entry)
+    _insert_ordered(self.micro, entry)
+    if entry[_USD] >= self.spike_threshold:
+      _insert_ordered(self.large, entry)
+    if entry[_TID] is not None:
+      self.trade_ids.add(entry[_TID])
+    code = entry[_CODE]
+    if code == _BUY:
+      self.buy_count += 1
+      self.buy_usd += entry[_USD]
+      self.buy_vol += entry[_AMOUNT]
+    elif code == _SELL:
+      self.sell_usd += entry[_USD]
+      self.sell_vol += entry[_AMOUNT]
+
+  def seed(self, trades, through: datetime | float) -> None:
+    """Load history strictly older than ``through`` (the first trade this
+    process will append). Later appends older than ``through`` are assumed
+    to be part of the seed and skipped.
+
+    ``trades`` is either cached RecentTrades columns or TradeRaw rows."""
+    cutoff = _epoch(through)
+    if isinstance(trades, RecentTrades):
+      for ts, code, amt, px in zip(trades.timestamps, trades.sides, trades.amounts, trades.prices):
+        if ts < cutoff:
+          self._add((ts, None, SIDE_NAMES[code], code, amt, px, amt * px))
+    else:
+      for t in trades:
+        ts = _epoch(t.timestamp)
+        if ts < cutoff:
+          self._add(self._entry(ts, getattr(t, "trade_id", None), t.side, t.amount, t.price))
+    self.seeded_through = cutoff
+
+  @staticmethod
+  def _entry(ts: float, trade_id, side, amount, price) -> tuple:
+    amt = float(amount or 0)
+    px = float(price or 0)
+    return (ts, str(trade_id) if trade_id else None, side, side_code(side), amt, px, amt * px)
+
+  def append(self, timestamp: datetime | float, side: str | None, amount, price, trade_id: str | None = None) -> bool:
+    """Add one processed trade. Idempotent per trade_id (batch fallbacks
+    replay trades after a rollback). Returns False when skipped."""
+    ts = _epoch(timestamp)
+    if ts < self.seeded_through:
+      return False
+    if trade_id is not None and str(trade_id) in self.trade_ids:
+      return False
+    self._add(self._entry(ts, trade_id, side, amount, price))
+    return True
+
+  def set_spike_threshold(self, threshold: float) -> None:
+    threshold = float(threshold)
+    if threshold != self.spike_threshold:
+      self.spike_threshold = threshold
+      self.large = deque(e for e in self.micro if e[_USD] >= threshold)
+
+  def expire(self, now: datetime | float) -> None:
+    now_ts = _epoch(now)
+    micro_cutoff = now_ts - self.micro_seconds
+    macro_cutoff = now_ts - self.macro_seconds
+    while self.micro and self.micro[0][_TS] < micro_cutoff:
+      self.micro.popleft()
+    while self.large and self.large[0][_TS] < micro_cutoff:
+      self.large.popleft()
+    while self.macro and self.macro[0][_TS] < macro_cutoff:
+      entry = self.macro.popleft()
+      if entry[_TID] is not None:
+        self.trade_ids.discard(entry[_TID])
+      code = entry[_CODE]
+      if code == _BUY:
+        self.buy_count -= 1
+        self.buy_usd -= entry[_USD]
+        self.buy_vol -= entry[_AMOUNT]
+      elif code == _SELL:
+        self.sell_usd -= entry[_USD]
+        self.sell_vol -= entry[_AMOUNT]
+    if not self.macro:
+      # Running sums drift under subtraction; an empty window is exact zero.
+      self._reset_totals()
+
+  def detect(self, now: datetime | float, build_threshold: float, exit_threshold: float) -> tuple[str | None, int, float, float, str | None]:
+    """Same contract as engine.detect_behavior, answered from the totals."""
+    self.expire(now)
+    if self.large:
+      e = self.large[0]
+      return ("spike", 80, e[_AMOUNT], e[_PRICE], str(e[_SIDE]))
+
+    if self.buy_count >= 3 and self.buy_usd >= float(build_threshold):
+      avg_price = (self.buy_usd / self.buy_vol) if self.buy_vol > 0 else 0.0
+      return ("build", 75, self.buy_vol, avg_price, "buy")
+
+    if self.buy_vol > 0 and self.sell_vol >= 0.5 * self.buy_vol and self.sell_usd >= float(exit_threshold):
+      avg_price = (self.sell_usd / self.sell_vol) if self.sell_vol > 0 else 0.0
+      return ("exit", 85, self.sell_vol, avg_price, "sell")
+
+    return (None, 0, 0.0, 0.0, None)
+
+
+class RollingWindowRegistry:
+  """LRU map of (wallet, market_id) → RollingWindowState.
+
+  Cleared whenever the configured window lengths change, since states built
+  under the old lengths may already have evicted trades the new ones need.
+  """
+
+  def __init__(self, max_keys: int = ROLLING_WINDOW_MAX_KEYS) -> None:
+    self.max_keys = max(1, int(max_keys))
+    self._states: OrderedDict[tuple[str, str], RollingWindowState] = OrderedDict()
+    self._windows: tuple[float, float] | None = None
+
+  def configure(self, micro_seconds: float, macro_seconds: float) -> None:
+    windows = (float(micro_seconds), float(macro_seconds))
+    if windows != self._windows:
+      self._states.clear()
+      self._windows = windows
+
+  def get(self, wallet: str, market_id: str) -> RollingWindowState | None:
+    key = (wallet, market_id)
+    state = self._states.get(key)
+    if state is not None:
+      self._states.move_to_end(key)
+    return state
+
+  def create(self, wallet: str, market_id: str, spike_threshold: float) -> RollingWindowState:
+    micro_seconds, macro_seconds = self._windows or (20 * 60, 6 * 60 * 60)
+    state = RollingWindowState(micro_seconds, macro_seconds, spike_threshold)
+    self._states[(wallet, market_id)] = state
+    while len(self._states) > self.max_keys:
+      self._states.popitem(last=False)
+    return state
+
+  def clear(self) -> None:
+    self._states.clear()
+
+  def __len__(self) -> int:
+    return len(self._states)
+
+
+_REGISTRY = RollingWindowRegistry()
+
+
+def window_states() -> RollingWindowRegistry:
+  return _REGISTRY
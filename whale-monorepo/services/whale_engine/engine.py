@@ -1,18 +1,26 @@
 import hashlib
-import json
 import logging
 import math
 import os
+from collections import namedtuple
 from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
+from functools import lru_cache
 
 from redis.asyncio import Redis
-from sqlalchemy import select, text, inspect
+from sqlalchemy import case, func, inspect, literal, select, text, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from shared.db import insert
-from shared.config import settings, get_alert_config, parse_duration
+from shared.db import bulk_upsert, insert
+from shared.config import CompiledAlertConfig, current_config, settings
 from shared.models import TradeRaw, Wallet, WhaleScore, WhaleTrade, WhaleProfile, WhalePosition, WhaleTradeHistory, WhaleStats
+from shared.recent_trades import SIDE_BUY, SIDE_NAMES, SIDE_SELL, RecentTrades, decode_trades, load_trades, recent_trades_key, side_code
+from services.whale_engine.behavior import ROLLING_WINDOW_STATE_ENABLED, RollingWindowRegistry, RollingWindowState, window_states
+from services.whale_engine.positions import position_book
+from services.whale_engine.score_table import score_version, stage_whale_scores, whale_score_table
+from services.whale_engine.stats_columnar import columnar_enabled, multi_window_metrics
+from services.whale_engine.wallet_seen import wallet_seen_buffer
+from services.whale_engine.wallet_stats import HistoryEntry, WindowAccumulator, drain_dirty_wallets, publish_dirty_wallets, stage_history, stage_rescored, wallet_stats_book
 
 
 logger = logging.getLogger("whale_engine.engine")
@@ -101,50 +109,6 @@ class _PositionUpdate:
   action_type: str
 
 
-@dataclass(frozen=True)
-class _CachedTrade:
-  side: str
-  amount: float
-  price: float
-  timestamp: datetime
-
-
-async def _load_recent_trades(redis: Redis, wallet: str, market_id: str) -> list[_CachedTrade] | None:
-  key = f"recent_trades:{wallet}:{market_id}"
-  exists = await redis.exists(key)
-  if not exists:
-    return None
-  raws = await redis.lrange(key, 0, -1)
-  if not raws:
-    return None
-  trades: list[_CachedTrade] = []
-  for raw in raws:
-    try:
-      data = json.loads(raw)
-    except Exception:
-      logger.debug("_load_recent_trades json parse failed")
-      continue
-    ts_raw = data.get("timestamp")
-    try:
-      ts = datetime.fromisoformat(ts_raw)
-    except Exception:
-      logger.debug("_load_recent_trades timestamp parse failed raw=%s", ts_raw)
-      continue
-    if ts.tzinfo is None:
-      ts = ts.replace(tzinfo=timezone.utc)
-    trades.append(
-      _CachedTrade(
-        side=str(data.get("side") or ""),
-        amount=float(data.get("amount") or 0),
-        price=float(data.get("price") or 0),
-        timestamp=ts,
-      )
-    )
-  if not trades:
-    return None
-  return trades
-
-
 def _apply_trade_to_position(prev_size: float, prev_avg: float, side: str, amount: float, price: float) -> _PositionUpdate:
   s = (side or "").lower()
   amt = float(amount or 0.0)
@@ -209,168 +173,282 @@ def _apply_trade_to_position(prev_size: float, prev_avg: float, side: str, amoun
   return _PositionUpdate(new_size=float(new_size), new_avg=float(new_avg), realized_pnl=float(realized), action_type=action_type)
 
 
+def _to_aware(dt: datetime) -> datetime:
+  if dt.tzinfo is None:
+    return dt.replace(tzinfo=timezone.utc)
+  return dt
+
+
 def _usd(t: TradeRaw) -> float:
   return float(t.amount) * float(t.price)
 
 
-def detect_behavior(micro_trades: list[TradeRaw], macro_trades: list[TradeRaw], now: datetime) -> tuple[str | None, int, float, float, str | None]:
-  def _to_aware(dt: datetime) -> datetime:
-    if dt.tzinfo is None:
-      return dt.replace(tzinfo=timezone.utc)
-    return dt
-
-  config = get_alert_config()
-  alert_thresholds = config.get("alert_thresholds", {})
-  behavior_config = config.get("behavior_detection", {})
-  spike_build_exit = alert_thresholds.get("spike_build_exit_thresholds", {})
-
-  now_aware = _to_aware(now)
-  micro_seconds = parse_duration(alert_thresholds.get("micro_window"), 20 * 60)
-  macro_seconds = parse_duration(alert_thresholds.get("macro_window"), 6 * 60 * 60)
-  micro_window = [t for t in micro_trades if (now_aware - _to_aware(t.timestamp)).total_seconds() <= micro_seconds]
-  macro_window = [t for t in macro_trades if (now_aware - _to_aware(t.timestamp)).total_seconds() <= macro_seconds]
-  buys_macro = [t for t in macro_window if (t.side or "").lower() == "buy"]
-  sells_macro = [t for t in macro_window if (t.side or "").lower() == "sell"]
-
-  spike_threshold = behavior_config.get("spike_threshold")
-  if spike_threshold is None:
-    spike_threshold = spike_build_exit.get("whale_entry") or settings.whale_single_trade_usd_threshold
-  build_threshold = behavior_config.get("build_threshold")
-  if build_threshold is None:
-    build_threshold = spike_build_exit.get("whale_build") or settings.whale_build_usd_threshold
-  exit_threshold = behavior_config.get("exit_threshold")
-  if exit_threshold is None:
-    exit_threshold = spike_build_exit.get("whale_exit") or settings.whale_exit_usd_threshold
-
-  single_large = next((t for t in micro_window if _usd(t) >= float(spike_threshold)), None)
-  if single_large:
-    return ("spike", 80, float(single_large.amount), float(single_large.price), str(single_large.side))
-
-  buy_val = sum(_usd(t) for t in buys_macro)
-  sell_val = sum(_usd(t) for t in sells_macro)
-  if len(buys_macro) >= 3 and buy_val >= float(build_threshold):
-    total_amount = sum(float(t.amount) for t in buys_macro)
-    avg_price = (buy_val / total_amount) if total_amount > 0 else 0.0
-    return ("build", 75, total_amount, avg_price, "buy")
-
-  buy_vol = sum(float(t.amount) for t in buys_macro)
-  sell_vol = sum(float(t.amount) for t in sells_macro)
-  if buy_vol > 0 and sell_vol >= 0.5 * buy_vol and sell_val >= float(exit_threshold):
-    total_amount = sum(float(t.amount) for t in sells_macro)
-    avg_price = (sell_val / total_amount) if total_amount > 0 else 0.0
-    return ("exit", 85, total_amount, avg_price, "sell")
+def _window_seconds(cfg: CompiledAlertConfig) -> tuple[float, float]:
+  return cfg.micro_window_seconds, cfg.macro_window_seconds
+
+
+def _behavior_thresholds(cfg: CompiledAlertConfig) -> tuple[float, float, float]:
+  """Return (spike, build, exit) USD thresholds for behavior detection."""
+  return cfg.spike_threshold, cfg.build_threshold, cfg.exit_threshold
+
+
+def _trade_columns(trades) -> tuple:
+  """(epoch_ts, side_code, amount, price) columns for cached RecentTrades or TradeRaw rows."""
+  if isinstance(trades, RecentTrades):
+    return trades.timestamps, trades.sides, trades.amounts, trades.prices
+  return (
+    [_to_aware(t.timestamp).timestamp() for t in trades],
+    [side_code(t.side) for t in trades],
+    [float(t.amount) for t in trades],
+    [float(t.price) for t in trades],
+  )
+
+
+def detect_behavior(micro_trades, macro_trades, now: datetime) -> tuple[str | None, int, float, float, str | None]:
+  """List-based detector over RecentTrades columns or TradeRaw rows; the
+  consumers use RollingWindowState instead when ROLLING_WINDOW_STATE_ENABLED
+  is on."""
+  cfg = current_config()
+
+  now_ts = _to_aware(now).timestamp()
+  micro_seconds, macro_seconds = _window_seconds(cfg)
+  spike_threshold, build_threshold, exit_threshold = _behavior_thresholds(cfg)
+
+  for ts, side, amount, price in zip(*_trade_columns(micro_trades)):
+    if now_ts - ts <= micro_seconds and amount * price >= spike_threshold:
+      return ("spike", 80, amount, price, SIDE_NAMES[side])
+
+  buy_count = 0
+  buy_val = sell_val = buy_vol = sell_vol = 0.0
+  for ts, side, amount, price in zip(*_trade_columns(macro_trades)):
+    if now_ts - ts > macro_seconds:
+      continue
+    if side == SIDE_BUY:
+      buy_count += 1
+      buy_val += amount * price
+      buy_vol += amount
+    elif side == SIDE_SELL:
+      sell_val += amount * price
+      sell_vol += amount
+
+  if buy_count >= 3 and buy_val >= build_threshold:
+    avg_price = (buy_val / buy_vol) if buy_vol > 0 else 0.0
+    return ("build", 75, buy_vol, avg_price, "buy")
+
+  if buy_vol > 0 and sell_vol >= 0.5 * buy_vol and sell_val >= exit_threshold:
+    avg_price = (sell_val / sell_vol) if sell_vol > 0 else 0.0
+    return ("exit", 85, sell_vol, avg_price, "sell")
 
   return (None, 0, 0.0, 0.0, None)
 
 
+def _window_bounds(cfg: CompiledAlertConfig, now: datetime) -> tuple[datetime, datetime]:
+  micro_seconds, macro_seconds = _window_seconds(cfg)
+  return now - timedelta(seconds=micro_seconds), now - timedelta(seconds=macro_seconds)
+
+
+def _rolling_registry(cfg: CompiledAlertConfig) -> RollingWindowRegistry | None:
+  if not ROLLING_WINDOW_STATE_ENABLED:
+    return None
+  registry = window_states()
+  registry.configure(*_window_seconds(cfg))
+  return registry
+
+
+def _seed_window_state(registry: RollingWindowRegistry, trade: TradeRaw, recent: list, thresholds: tuple[float, float, float]) -> RollingWindowState:
+  # Seed with history strictly older than the first trade this process
+  # appends; the trade itself (and anything later) arrives via append().
+  state = registry.create(trade.wallet, trade.market_id, thresholds[0])
+  state.seed(recent, trade.timestamp)
+  return state
+
+
+def _rolling_behavior(state: RollingWindowState, trade: TradeRaw, now: datetime, thresholds: tuple[float, float, float]) -> tuple[str | None, int, float, float, str | None]:
+  spike_threshold, build_threshold, exit_threshold = thresholds
+  state.set_spike_threshold(spike_threshold)
+  state.append(trade.timestamp, trade.side, trade.amount, trade.price, trade.trade_id)
+  return state.detect(now, build_threshold, exit_threshold)
+
+
+@dataclass(frozen=True)
+class _TradeDecision:
+  score: int
+  behavior: str | None
+  qualifies: bool
+  signal_level: str
+  event_side: str
+  event_amount: float
+  event_price: float
+  event_trade_usd: float
+
+
+def _decide_trade(trade: TradeRaw, score: int, detected: tuple[str | None, int, float, float, str | None], cfg: CompiledAlertConfig) -> _TradeDecision:
+  """Apply the confidence/USD gates to one trade and its detected behavior.
+
+  Pure function shared by process_trade_id and process_trade_batch so both
+  paths qualify trades and shape events identically.
+  """
+  trade_usd = _usd(trade)
+  behavior, score_hint, agg_amount, agg_price, behavior_side = detected
+  if score_hint:
+    score = max(score, score_hint)
+
+  high_signal = (score >= cfg.high_confidence and trade_usd >= cfg.high_usd) or bool(score_hint)
+  low_signal = (not high_signal) and (score >= cfg.low_confidence and trade_usd >= cfg.low_usd)
+
+  event_side = behavior_side or str(trade.side)
+  event_amount = agg_amount if score_hint else float(trade.amount)
+  event_price = agg_price if score_hint else float(trade.price)
+  return _TradeDecision(
+    score=score,
+    behavior=behavior,
+    qualifies=high_signal or low_signal,
+    signal_level="high" if high_signal else "low",
+    event_side=event_side,
+    event_amount=event_amount,
+    event_price=event_price,
+    event_trade_usd=float(event_amount) * float(event_price),
+  )
+
+
+def _build_event(trade: TradeRaw, decision: _TradeDecision, action_type: str, now: datetime) -> dict:
+  return {
+    "whale_trade_id": _id(trade.trade_id),
+    "trade_id": trade.trade_id,
+    "market_id": trade.market_id,
+    "wallet_address": trade.wallet,
+    "whale_score": decision.score,
+    "action_type": action_type,
+    "behavior": decision.behavior,
+    "outcome": trade.outcome,
+    "side": decision.event_side,
+    "amount": decision.event_amount,
+    "price": decision.event_price,
+    "trade_usd": decision.event_trade_usd,
+    "signal_level": decision.signal_level,
+    "created_at": now.isoformat(),
+  }
+
+
 async def process_trade_id(session: AsyncSession, redis: Redis, trade_id: str) -> tuple[bool, dict | None]:
   trade = (await session.execute(select(TradeRaw).where(TradeRaw.trade_id == trade_id))).scalars().first()
   if not trade:
     logger.warning(f"trade_not_found trade_id={trade_id}")
     return (False, None)
 
-  has_positions, has_action_type_col, has_profiles, has_trade_history, _ = await _ensure_schema_flags(session)
+  has_positions, has_action_type_col, has_profiles, has_trade_history, has_stats = await _ensure_schema_flags(session)
 
   wallet = trade.wallet
   now = datetime.now(timezone.utc)
 
-  await session.execute(
-    insert(Wallet)
-    .values(address=wallet, first_seen_at=now, last_seen_at=now)
-    .on_conflict_do_update(index_elements=[Wallet.address], set_={"last_seen_at": now})
-  )
+  # Pre-qualification: nothing below writes until the trade is known to
+  # qualify. last_seen_at goes through the write-behind buffer instead.
+  wallet_seen_buffer().touch(wallet, now)
 
   trade_usd = _usd(trade)
   score_key = f"trade_score:{trade_id}"
-  cached_trade_score = await redis.get(score_key)
+  table = whale_score_table()
+  cached_trade_score = None
   cache_wallet_score = False
-  if cached_trade_score is not None:
-    try:
-      score = int(float(cached_trade_score))
-    except Exception:
-      logger.debug("trade_score parse failed wallet=%s cached=%s", wallet, cached_trade_score)
-      score = await _get_whale_score(session, wallet)
-      cache_wallet_score = True
+  if table is not None:
+    # In-process score table: no Redis round trips, no per-wallet query.
+    await table.ensure_loaded(session, has_stats)
+    score, cache_wallet_score = table.lookup(wallet)
   else:
-    cached_wallet_score = await redis.get(f"whale_score:{wallet}")
-    if cached_wallet_score is not None:
+    cached_trade_score = await redis.get(score_key)
+    if cached_trade_score is not None:
       try:
-        score = int(float(cached_wallet_score))
+        score = int(float(cached_trade_score))
       except Exception:
-        logger.debug("wallet_score parse failed wallet=%s cached=%s", wallet, cached_wallet_score)
+        logger.debug("trade_score parse failed wallet=%s cached=%s", wallet, cached_trade_score)
         score = await _get_whale_score(session, wallet)
         cache_wallet_score = True
     else:
-      score = await _get_whale_score(session, wallet)
-      cache_wallet_score = True
+      cached_wallet_score = await redis.get(f"whale_score:{wallet}")
+      if cached_wallet_score is not None:
+        try:
+          score = int(float(cached_wallet_score))
+        except Exception:
+          logger.debug("wallet_score parse failed wallet=%s cached=%s", wallet, cached_wallet_score)
+          score = await _get_whale_score(session, wallet)
+          cache_wallet_score = True
+      else:
+        score = await _get_whale_score(session, wallet)
+        cache_wallet_score = True
   if "SniperWhale009" in wallet:
       logger.debug("Wallet %s score=%s trade_usd=%s", wallet, score, trade_usd)
+  base_score = score
+
+  cfg = current_config()
+  thresholds = _behavior_thresholds(cfg)
+  registry = _rolling_registry(cfg)
+  state = registry.get(wallet, trade.market_id) if registry is not None else None
+  if state is None:
+    micro_since, macro_since = _window_bounds(cfg, now)
+    cached_recent = await load_trades(redis, wallet, trade.market_id)
+    if cached_recent is not None:
+      # detect_behavior and the rolling state apply the window bounds themselves.
+      micro_recent = macro_recent = cached_recent
+    else:
+      micro_recent = (
+        await session.execute(
+          select(TradeRaw)
+          .where(TradeRaw.wallet == wallet)
+          .where(TradeRaw.market_id == trade.market_id)
+          .where(TradeRaw.timestamp >= micro_since)
+          .order_by(TradeRaw.timestamp.asc())
+        )
+      ).scalars().all()
+      macro_recent = (
+        await session.execute(
+          select(TradeRaw)
+          .where(TradeRaw.wallet == wallet)
+          .where(TradeRaw.market_id == trade.market_id)
+          .where(TradeRaw.timestamp >= macro_since)
+          .order_by(TradeRaw.timestamp.asc())
+        )
+      ).scalars().all()
+    if registry is not None:
+      state = _seed_window_state(registry, trade, macro_recent if macro_since <= micro_since else micro_recent, thresholds)
 
-  await session.execute(
-    insert(WhaleScore)
-    .values(wallet_address=wallet, final_score=score, updated_at=now)
-    .on_conflict_do_update(index_elements=[WhaleScore.wallet_address], set_={"final_score": score, "updated_at": now})
-  )
-
-  config = get_alert_config()
-  alert_thresholds = config.get("alert_thresholds", {})
-  micro_seconds = parse_duration(alert_thresholds.get("micro_window"), 20 * 60)
-  macro_seconds = parse_duration(alert_thresholds.get("macro_window"), 6 * 60 * 60)
-  micro_since = now - timedelta(seconds=micro_seconds)
-  macro_since = now - timedelta(seconds=macro_seconds)
-  cached_recent = await _load_recent_trades(redis, wallet, trade.market_id)
-  if cached_recent is not None:
-    micro_recent = [t for t in cached_recent if t.timestamp >= micro_since]
-    macro_recent = [t for t in cached_recent if t.timestamp >= macro_since]
+  if state is not None:
+    detected = _rolling_behavior(state, trade, now, thresholds)
   else:
-    micro_recent = (
-      await session.execute(
-        select(TradeRaw)
-        .where(TradeRaw.wallet == wallet)
-        .where(TradeRaw.market_id == trade.market_id)
-        .where(TradeRaw.timestamp >= micro_since)
-        .order_by(TradeRaw.timestamp.asc())
-      )
-    ).scalars().all()
-    macro_recent = (
-      await session.execute(
-        select(TradeRaw)
-        .where(TradeRaw.wallet == wallet)
-        .where(TradeRaw.market_id == trade.market_id)
-        .where(TradeRaw.timestamp >= macro_since)
-        .order_by(TradeRaw.timestamp.asc())
-      )
-    ).scalars().all()
-
-  behavior, score_hint, agg_amount, agg_price, behavior_side = detect_behavior(micro_recent, macro_recent, now)
-  if score_hint:
-    score = max(score, score_hint)
-
-  confidence_scores = alert_thresholds.get("confidence_scores", {})
-  usd_thresholds = alert_thresholds.get("usd_thresholds", {})
-  high_score = float(confidence_scores.get("high_confidence", 85))
-  low_score = float(confidence_scores.get("low_confidence", 70))
-  high_usd = float(usd_thresholds.get("high", 400))
-  low_usd = float(usd_thresholds.get("low", 2500))
-  high_signal = (score >= high_score and trade_usd >= high_usd) or bool(score_hint)
-  low_signal = (not high_signal) and (score >= low_score and trade_usd >= low_usd)
-  qualifies = high_signal or low_signal
+    detected = detect_behavior(micro_recent, macro_recent, now)
+  decision = _decide_trade(trade, score, detected, cfg)
+  score = decision.score
   if "SniperWhale009" in wallet:
-      logger.debug("Wallet %s qualifies=%s (score=%s, trade_usd=%s)", wallet, qualifies, score, trade_usd)
+      logger.debug("Wallet %s qualifies=%s (score=%s, trade_usd=%s)", wallet, decision.qualifies, score, trade_usd)
       logger.debug("has_trade_history=%s", has_trade_history)
 
-  if not qualifies:
+  if not decision.qualifies:
     return (False, None)
 
-  event_side = behavior_side or str(trade.side)
-  event_amount = agg_amount if score_hint else float(trade.amount)
-  event_price = agg_price if score_hint else float(trade.price)
-  event_trade_usd = float(event_amount) * float(event_price)
-  signal_level = "high" if high_signal else "low"
+  await session.execute(
+    insert(WhaleScore)
+    .values(wallet_address=wallet, final_score=base_score, updated_at=now)
+    .on_conflict_do_update(index_elements=[WhaleScore.wallet_address], set_={"final_score": base_score, "updated_at": now})
+  )
+
+  event_side = decision.event_side
+  event_amount = decision.event_amount
+  event_price = decision.event_price
+  event_trade_usd = decision.event_trade_usd
 
   action_type = "entry" if (event_side or "").lower() != "sell" else "exit"
   realized_pnl = 0.0
-  if has_positions:
+  book = position_book() if has_positions else None
+  if book is not None:
+    # Write-behind book: no row lock, at most one hydrating SELECT; the
+    # update is staged on the session and promoted on commit.
+    pair = (wallet, trade.market_id)
+    await book.hydrate(session, [pair])
+    prev_size, prev_avg = book.position(session, pair)
+    update = _apply_trade_to_position(prev_size, prev_avg, event_side, event_amount, event_price)
+    action_type = update.action_type
+    realized_pnl = update.realized_pnl
+    book.stage(session, pair, update.new_size, update.new_avg, now)
+  elif has_positions:
     # Use SELECT ... FOR UPDATE to prevent concurrent position updates (race condition #12)
     pos = (
       await session.execute(
@@ -419,6 +497,9 @@ async def process_trade_id(session: AsyncSession, redis: Redis, trade_id: str) -
         )
         .on_conflict_do_nothing(index_elements=[WhaleTradeHistory.trade_id])
       )
+      stage_history(session, wallet, HistoryEntry(
+        str(trade_id), str(trade.market_id), str(event_side or trade.side), float(realized_pnl), float(event_trade_usd), _to_aware(trade.timestamp)
+      ))
     except Exception as e:
       logger.exception("insert_whale_trade_history_failed")
       pass
@@ -474,10 +555,14 @@ async def process_trade_id(session: AsyncSession, redis: Redis, trade_id: str) -
   # Writing before commit risks stale cache entries if the transaction
   # is rolled back — subsequent lookups would trust a score for a trade
   # that was never persisted.
-  if cache_wallet_score:
-      await redis.set(f"whale_score:{wallet}", str(score), ex=settings.whale_score_cache_seconds)
-  if cached_trade_score is None:
-      await redis.set(score_key, str(score), ex=settings.trade_score_cache_seconds)
+  if table is not None:
+      if cache_wallet_score:
+          table.remember(wallet, score)
+  else:
+      if cache_wallet_score:
+          await redis.set(f"whale_score:{wallet}", str(score), ex=settings.whale_score_cache_seconds)
+      if cached_trade_score is None:
+          await redis.set(score_key, str(score), ex=settings.trade_score_cache_seconds)
 
   # Build event payload but do NOT push to Redis here (CR-C3).
   # The caller must commit the DB transaction first, then push.
@@ -485,23 +570,339 @@ async def process_trade_id(session: AsyncSession, redis: Redis, trade_id: str) -
   # transaction rolls back.
   event = None
   if created:
-    event = {
-      "whale_trade_id": wt_id,
-      "trade_id": trade_id,
+    event = _build_event(trade, decision, action_type, now)
+  return created, event
+
+
+def _parse_cached_score(raw: object) -> int | None:
+  if raw is None:
+    return None
+  try:
+    return int(float(raw))  # type: ignore[arg-type]
+  except Exception:
+    logger.debug("cached score parse failed cached=%s", raw)
+    return None
+
+
+async def process_trade_batch(session: AsyncSession, redis: Redis, trade_ids: list[str]) -> list[dict]:
+  """Set-based variant of process_trade_id for a drained queue batch.
+
+  Loads all trades in one query, prefetches scores, recent-trade windows and
+  positions in bulk, then issues one multi-row statement per table. Trades are
+  still evaluated sequentially in input order against the in-memory state
+  (score cache overlay, running positions), so the returned events match what
+  calling process_trade_id once per id would have produced, in the same
+  order. Duplicate ids within a batch are processed once.
+
+  Events are returned but NOT pushed — the caller commits first (CR-C3).
+  """
+  ordered_ids = list(dict.fromkeys(str(t) for t in trade_ids if t))
+  if not ordered_ids:
+    return []
+
+  rows = (await session.execute(select(TradeRaw).where(TradeRaw.trade_id.in_(ordered_ids)))).scalars().all()
+  by_id = {str(r.trade_id): r for r in rows}
+  trades: list[TradeRaw] = []
+  for tid in ordered_ids:
+    trade = by_id.get(tid)
+    if trade is None:
+      logger.warning(f"trade_not_found trade_id={tid}")
+      continue
+    trades.append(trade)
+  if not trades:
+    return []
+
+  has_positions, has_action_type_col, has_profiles, has_trade_history, has_stats = await _ensure_schema_flags(session)
+  now = datetime.now(timezone.utc)
+  wallets = list(dict.fromkeys(t.wallet for t in trades))
+
+  seen = wallet_seen_buffer()
+  for w in wallets:
+    seen.touch(w, now)
+
+  # ── Scores: the in-process table, or one MGET for every cache key plus
+  # one query for the misses ──
+  table = whale_score_table()
+  cached_trade_scores: dict[str, object] = {}
+  cached_wallet_scores: dict[str, object] = {}
+  db_scores: dict[str, int] = {}
+  if table is not None:
+    await table.ensure_loaded(session, has_stats)
+  else:
+    trade_keys = [f"trade_score:{t.trade_id}" for t in trades]
+    wallet_keys = [f"whale_score:{w}" for w in wallets]
+    cached_values = await redis.mget(trade_keys + wallet_keys)
+    cached_trade_scores = dict(zip((t.trade_id for t in trades), cached_values[: len(trades)]))
+    cached_wallet_scores = dict(zip(wallets, cached_values[len(trades):]))
+
+    db_wallets = set(w for w in wallets if _parse_cached_score(cached_wallet_scores.get(w)) is None)
+    for t in trades:
+      raw = cached_trade_scores.get(t.trade_id)
+      if raw is not None and _parse_cached_score(raw) is None:
+        db_wallets.add(t.wallet)
+    if db_wallets:
+      try:
+        db_scores = {
+          str(w): int(s)
+          for w, s in (
+            await session.execute(
+              select(WhaleStats.wallet_address, WhaleStats.whale_score).where(WhaleStats.wallet_address.in_(list(db_wallets)))
+            )
+          ).all()
+          if s is not None
+        }
+      except Exception:
+        logger.warning("whale_score_batch_lookup_failed wallets=%d", len(db_wallets), exc_info=True)
+
+  # ── Recent-trade windows: one pipelined LRANGE per (wallet, market) ──
+  # Pairs that already have a rolling window state need no history at all.
+  cfg = current_config()
+  thresholds = _behavior_thresholds(cfg)
+  registry = _rolling_registry(cfg)
+  micro_since, macro_since = _window_bounds(cfg, now)
+  states: dict[tuple[str, str], RollingWindowState] = {}
+  pairs: list[tuple[str, str]] = []
+  for pair in dict.fromkeys((t.wallet, t.market_id) for t in trades):
+    state = registry.get(*pair) if registry is not None else None
+    if state is not None:
+      states[pair] = state
+    else:
+      pairs.append(pair)
+  cached_lists: list = []
+  if pairs:
+    async with redis.pipeline(transaction=False) as pipe:
+      for wallet, market_id in pairs:
+        pipe.lrange(recent_trades_key(wallet, market_id), 0, -1)
+      cached_lists = await pipe.execute()
+  recent_by_pair: dict[tuple[str, str], RecentTrades | list] = {}
+  missing_pairs: list[tuple[str, str]] = []
+  for pair, raws in zip(pairs, cached_lists):
+    parsed = decode_trades(raws)
+    if parsed is None:
+      missing_pairs.append(pair)
+    else:
+      recent_by_pair[pair] = parsed
+  if missing_pairs:
+    db_since = min(micro_since, macro_since)
+    db_rows = (
+      await session.execute(
+        select(TradeRaw)
+        .where(tuple_(TradeRaw.wallet, TradeRaw.market_id).in_(missing_pairs))
+        .where(TradeRaw.timestamp >= db_since)
+        .order_by(TradeRaw.timestamp.asc())
+      )
+    ).scalars().all()
+    for pair in missing_pairs:
+      recent_by_pair[pair] = []
+    for r in db_rows:
+      recent_by_pair.setdefault((r.wallet, r.market_id), []).append(r)
+
+  # ── Sequential decisions against the in-memory score overlay ──
+  score_rows: dict[str, int] = {}
+  wallet_cache_writes: dict[str, int] = {}
+  trade_cache_writes: dict[str, int] = {}
+  qualified: list[tuple[TradeRaw, _TradeDecision]] = []
+  for trade in trades:
+    wallet = trade.wallet
+    cache_wallet_score = False
+    cached_trade_score = cached_trade_scores.get(trade.trade_id)
+    score = _parse_cached_score(cached_trade_score)
+    if table is not None:
+      if wallet in wallet_cache_writes:
+        score = wallet_cache_writes[wallet]
+      else:
+        score, cache_wallet_score = table.lookup(wallet)
+    elif score is None:
+      cached_wallet_score = wallet_cache_writes.get(wallet, cached_wallet_scores.get(wallet))
+      score = _parse_cached_score(cached_wallet_score) if cached_trade_score is None else None
+      if score is None:
+        score = db_scores.get(wallet, 0)
+        cache_wallet_score = True
+    base_score = score
+
+    pair = (wallet, trade.market_id)
+    recent = recent_by_pair.get(pair, [])
+    if registry is not None:
+      state = states.get(pair)
+      if state is None:
+        state = states[pair] = _seed_window_state(registry, trade, recent, thresholds)
+      detected = _rolling_behavior(state, trade, now, thresholds)
+    else:
+      detected = detect_behavior(recent, recent, now)
+    decision = _decide_trade(trade, score, detected, cfg)
+    if not decision.qualifies:
+      continue
+    score_rows[wallet] = base_score
+    if cache_wallet_score:
+      wallet_cache_writes[wallet] = decision.score
+    if cached_trade_score is None and table is None:
+      trade_cache_writes[trade.trade_id] = decision.score
+    qualified.append((trade, decision))
+
+  # Pre-qualified: batches with no qualifying trade write nothing at all.
+  if not qualified:
+    return []
+  score_stmt = insert(WhaleScore).values(
+    [{"wallet_address": w, "final_score": s, "updated_at": now} for w, s in score_rows.items()]
+  )
+  await session.execute(
+    score_stmt.on_conflict_do_update(
+      index_elements=[WhaleScore.wallet_address],
+      set_={"final_score": score_stmt.excluded.final_score, "updated_at": now},
+    )
+  )
+
+  # ── Positions: one locking read, replay in order, one upsert ──
+  action_types: dict[str, str] = {}
+  realized: dict[str, float] = {}
+  for trade, decision in qualified:
+    action_types[trade.trade_id] = "entry" if (decision.event_side or "").lower() != "sell" else "exit"
+    realized[trade.trade_id] = 0.0
+  if has_positions:
+    position_pairs = list(dict.fromkeys((t.wallet, t.market_id) for t, _ in qualified))
+    positions: dict[tuple[str, str], tuple[float, float]] = {}
+    book = position_book()
+    if book is not None:
+      await book.hydrate(session, position_pairs)
+      positions = {pair: book.position(session, pair) for pair in position_pairs}
+    else:
+      for pos in (
+        await session.execute(
+          select(WhalePosition)
+          .where(tuple_(WhalePosition.wallet_address, WhalePosition.market_id).in_(position_pairs))
+          .with_for_update()
+        )
+      ).scalars().all():
+        positions[(pos.wallet_address, pos.market_id)] = (
+          float(pos.net_size) if pos.net_size is not None else 0.0,
+          float(pos.avg_price) if pos.avg_price is not None else 0.0,
+        )
+    for trade, decision in qualified:
+      key = (trade.wallet, trade.market_id)
+      prev_size, prev_avg = positions.get(key, (0.0, 0.0))
+      update = _apply_trade_to_position(prev_size, prev_avg, decision.event_side, decision.event_amount, decision.event_price)
+      positions[key] = (update.new_size, update.new_avg)
+      action_types[trade.trade_id] = update.action_type
+      realized[trade.trade_id] = update.realized_pnl
+  if has_positions and book is not None:
+    for pair, (size, avg) in positions.items():
+      book.stage(session, pair, size, avg, now)
+  elif has_positions:
+    pos_stmt = insert(WhalePosition).values(
+      [
+        {"wallet_address": w, "market_id": m, "net_size": size, "avg_price": avg, "updated_at": now}
+        for (w, m), (size, avg) in positions.items()
+      ]
+    )
+    await session.execute(
+      pos_stmt.on_conflict_do_update(
+        index_elements=[WhalePosition.wallet_address, WhalePosition.market_id],
+        set_={"net_size": pos_stmt.excluded.net_size, "avg_price": pos_stmt.excluded.avg_price, "updated_at": now},
+      )
+    )
+
+  if has_trade_history:
+    try:
+      await session.execute(
+        insert(WhaleTradeHistory)
+        .values([
+          {
+            "trade_id": trade.trade_id,
+            "wallet_address": trade.wallet,
+            "market_id": trade.market_id,
+            "side": str(decision.event_side or trade.side),
+            "price": decision.event_price,
+            "size": decision.event_amount,
+            "pnl": realized[trade.trade_id],
+            "trade_usd": decision.event_trade_usd,
+            "timestamp": trade.timestamp,
+          }
+          for trade, decision in qualified
+        ])
+        .on_conflict_do_nothing(index_elements=[WhaleTradeHistory.trade_id])
+      )
+      for trade, decision in qualified:
+        stage_history(session, trade.wallet, HistoryEntry(
+          str(trade.trade_id), str(trade.market_id), str(decision.event_side or trade.side),
+          float(realized[trade.trade_id]), float(decision.event_trade_usd), _to_aware(trade.timestamp),
+        ))
+    except Exception:
+      logger.exception("insert_whale_trade_history_failed batch=%d", len(qualified))
+
+  whale_trade_rows: list[dict[str, object]] = []
+  for trade, decision in qualified:
+    row: dict[str, object] = {
+      "id": _id(trade.trade_id),
+      "trade_id": trade.trade_id,
+      "wallet_address": trade.wallet,
+      "whale_score": decision.score,
       "market_id": trade.market_id,
-      "wallet_address": wallet,
-      "whale_score": score,
-      "action_type": action_type,
-      "behavior": behavior,
-      "outcome": trade.outcome,
-      "side": event_side,
-      "amount": event_amount,
-      "price": event_price,
-      "trade_usd": event_trade_usd,
-      "signal_level": signal_level,
-      "created_at": now.isoformat(),
+      "created_at": now,
     }
-  return created, event
+    if has_action_type_col:
+      row["action_type"] = action_types[trade.trade_id]
+    whale_trade_rows.append(row)
+  created_ids = set(
+    str(tid)
+    for tid in (
+      await session.execute(
+        insert(WhaleTrade)
+        .values(whale_trade_rows)
+        .on_conflict_do_nothing(index_elements=[WhaleTrade.trade_id])
+        .returning(WhaleTrade.trade_id)
+      )
+    ).scalars().all()
+  )
+
+  if has_profiles and created_ids:
+    profile_deltas: dict[str, dict[str, float]] = {}
+    for trade, decision in qualified:
+      if trade.trade_id not in created_ids:
+        continue
+      pnl = realized[trade.trade_id]
+      d = profile_deltas.setdefault(trade.wallet, {"total_volume": 0.0, "total_trades": 0, "realized_pnl": 0.0, "wins": 0, "losses": 0})
+      d["total_volume"] += decision.event_trade_usd
+      d["total_trades"] += 1
+      d["realized_pnl"] += pnl
+      d["wins"] += 1 if pnl > 0 else 0
+      d["losses"] += 1 if pnl < 0 else 0
+    try:
+      profile_stmt = insert(WhaleProfile).values(
+        [{"wallet_address": w, **d, "updated_at": now} for w, d in profile_deltas.items()]
+      )
+      await session.execute(
+        profile_stmt.on_conflict_do_update(
+          index_elements=[WhaleProfile.wallet_address],
+          set_={
+            "total_volume": WhaleProfile.total_volume + profile_stmt.excluded.total_volume,
+            "total_trades": WhaleProfile.total_trades + profile_stmt.excluded.total_trades,
+            "realized_pnl": WhaleProfile.realized_pnl + profile_stmt.excluded.realized_pnl,
+            "wins": WhaleProfile.wins + profile_stmt.excluded.wins,
+            "losses": WhaleProfile.losses + profile_stmt.excluded.losses,
+            "updated_at": now,
+          },
+        )
+      )
+    except Exception:
+      logger.exception("whale_profile_batch_upsert_failed wallets=%d", len(profile_deltas))
+
+  # Score caches are written after the DB statements, same as process_trade_id.
+  if table is not None:
+    for wallet, score in wallet_cache_writes.items():
+      table.remember(wallet, score)
+  elif wallet_cache_writes or trade_cache_writes:
+    async with redis.pipeline(transaction=False) as pipe:
+      for wallet, score in wallet_cache_writes.items():
+        pipe.set(f"whale_score:{wallet}", str(score), ex=settings.whale_score_cache_seconds)
+      for tid, score in trade_cache_writes.items():
+        pipe.set(f"trade_score:{tid}", str(score), ex=settings.trade_score_cache_seconds)
+      await pipe.execute()
+
+  return [
+    _build_event(trade, decision, action_types[trade.trade_id], now)
+    for trade, decision in qualified
+    if trade.trade_id in created_ids
+  ]
 
 
 @dataclass(frozen=True)
@@ -711,21 +1112,12 @@ def _combine_window_metrics(m7: _WindowMetrics | None, m30: _WindowMetrics | Non
   )
 
 
-async def _fetch_window_metrics(session: AsyncSession, *, since: datetime, trade_cap: int) -> dict[str, _WindowMetrics]:
-  raw_limit = int(os.getenv("WHALE_STATS_RAW_TRADE_CAP", "100000"))
-  tr_query = (
-    select(TradeRaw.trade_id, TradeRaw.market_id, TradeRaw.price, TradeRaw.amount, TradeRaw.timestamp)
-    .where(TradeRaw.timestamp >= since)
-  )
-  if raw_limit > 0:
-    tr_query = tr_query.order_by(TradeRaw.timestamp.desc()).limit(raw_limit)
-  tr_result = await session.execute(tr_query)
-  raw_trades = tr_result.all()
-  
-  # Compute Market Volume and Price Percentiles
+def _market_context(raw_trades) -> tuple[dict[str, float], dict[str, float]]:
+  """Per-market USD volume and each trade's price percentile within its
+  market, from (trade_id, market_id, price, amount) rows."""
   market_volume: dict[str, float] = {}
   market_prices: dict[str, list[tuple[float, str]]] = {} # market_id -> list of (price, trade_id)
-  
+
   for r in raw_trades:
     mid = str(r.market_id)
     vol = float(r.price) * float(r.amount)
@@ -733,7 +1125,7 @@ async def _fetch_window_metrics(session: AsyncSession, *, since: datetime, trade
     if mid not in market_prices:
       market_prices[mid] = []
     market_prices[mid].append((float(r.price), str(r.trade_id)))
-    
+
   trade_percentiles: dict[str, float] = {}
   for mid, items in market_prices.items():
     items.sort(key=lambda x: x[0])
@@ -744,151 +1136,397 @@ async def _fetch_window_metrics(session: AsyncSession, *, since: datetime, trade
       else:
         p = 0.5
       trade_percentiles[tid] = p
+  return market_volume, trade_percentiles
 
-  history_limit = int(os.getenv("WHALE_STATS_HISTORY_CAP", "100000"))
-  wth_query = (
-    select(WhaleTradeHistory)
-    .where(WhaleTradeHistory.timestamp >= since)
+
+def _wallet_window_metrics(trades, trade_percentiles: dict[str, float], market_volume: dict[str, float]) -> _WindowMetrics | None:
+  """Metrics for one wallet's window rows (any order; WhaleTradeHistory or
+  HistoryEntry), folded oldest-first through a WindowAccumulator."""
+  if not trades:
+    return None
+  acc = WindowAccumulator()
+  for t in sorted(trades, key=lambda t: t.timestamp):
+    acc.add(
+      float(t.pnl),
+      float(t.trade_usd),
+      str(t.side),
+      str(t.market_id),
+      trade_percentiles.get(t.trade_id),
+      market_volume.get(t.market_id, 0.0),
+    )
+
+  n_trades = acc.n
+  total_vol = acc.volume
+  n_closed = acc.wins + acc.losses
+  avg_win = acc.win_sum / acc.wins if acc.wins else 0.0
+  avg_loss = acc.loss_sum / acc.losses if acc.losses else 0.0
+  top_cnt = max(acc.market_counts.values()) if acc.market_counts else 0
+  return _WindowMetrics(
+    trades=n_trades,
+    # Win rate is based on closed trades (wins + losses)
+    win_rate=acc.wins / n_closed if n_closed > 0 else 0.0,
+    roi=acc.pnl_sum / total_vol if total_vol > 0 else 0.0,
+    total_pnl=acc.pnl_sum,
+    total_volume=total_vol,
+    avg_trade_size=total_vol / n_trades,
+    max_drawdown=acc.max_drawdown,
+    stddev_pnl=math.sqrt(acc.variance),
+    avg_entry_percentile=acc.entry_sum / acc.entry_n if acc.entry_n else 0.5,
+    avg_exit_percentile=acc.exit_sum / acc.exit_n if acc.exit_n else 0.5,
+    risk_reward_ratio=avg_win / avg_loss if avg_loss > 0 else 0.0,
+    market_liquidity_ratio=acc.liquidity_sum / acc.liquidity_n if acc.liquidity_n else 0.0,
+    top_market_fraction=top_cnt / n_trades,
+    pnl_abs_ratio=abs(acc.pnl_sum) / total_vol if total_vol > 0 else 0.0,
+  )
+
+
+_HISTORY_COLUMNS = (
+  WhaleTradeHistory.wallet_address,
+  WhaleTradeHistory.trade_id,
+  WhaleTradeHistory.market_id,
+  WhaleTradeHistory.side,
+  WhaleTradeHistory.pnl,
+  WhaleTradeHistory.trade_usd,
+  WhaleTradeHistory.timestamp,
+)
+
+WHALE_STATS_SQL_CONTEXT_ENABLED = os.getenv("WHALE_STATS_SQL_CONTEXT_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _sql_context_supported(session: AsyncSession) -> bool:
+  """Whether the database can rank trades_raw itself (window functions:
+  Postgres, SQLite >= 3.25). Otherwise the raw rows are ranked in Python."""
+  if not WHALE_STATS_SQL_CONTEXT_ENABLED:
+    return False
+  bind = getattr(session, "bind", None)
+  name = getattr(getattr(bind, "dialect", None), "name", None)
+  if name == "postgresql":
+    return True
+  if name == "sqlite":
+    import sqlite3
+    return sqlite3.sqlite_version_info >= (3, 25, 0)
+  return False
+
+
+def _ranked_raw_trades(since: datetime, markets=None):
+  """trades_raw rows of one window with their price percentile inside their
+  market and the market's USD volume, computed by the database.
+
+  Same definition as _market_context (a lone trade in a market sits at 0.5),
+  except that equal prices share a percentile instead of being ordered by
+  fetch order. markets (ids or a subquery) narrows the scan to whole
+  partitions, so it does not change the values.
+  """
+  by_market = {"partition_by": TradeRaw.market_id}
+  q = (
+    select(
+      TradeRaw.trade_id,
+      TradeRaw.market_id,
+      case(
+        (func.count().over(**by_market) > 1, func.percent_rank().over(order_by=TradeRaw.price, **by_market)),
+        else_=literal(0.5),
+      ).label("percentile"),
+      func.sum(TradeRaw.price * TradeRaw.amount).over(**by_market).label("market_volume"),
+    )
+    .where(TradeRaw.timestamp >= since)
+  )
+  if markets is not None:
+    q = q.where(TradeRaw.market_id.in_(markets))
+  return q.subquery()
+
+
+def _history_context_query(sinces: list[datetime], history_limit: int):
+  """History rows of the widest window, each followed by its (percentile,
+  market_volume) in every window; NULLs when the trade is outside it."""
+  ranked = [_ranked_raw_trades(since) for since in sinces]
+  q = select(*_HISTORY_COLUMNS, *[c for r in ranked for c in (r.c.percentile, r.c.market_volume)])
+  q = q.select_from(WhaleTradeHistory)
+  for r in ranked:
+    q = q.outerjoin(r, r.c.trade_id == WhaleTradeHistory.trade_id)
+  q = (
+    q.where(WhaleTradeHistory.timestamp >= min(sinces))
     .order_by(WhaleTradeHistory.wallet_address, WhaleTradeHistory.timestamp.desc())
   )
   if history_limit > 0:
-    wth_query = wth_query.limit(history_limit)
-  wth_result = await session.execute(wth_query)
-  history_rows = wth_result.scalars().all()
-  
-  wallet_trades: dict[str, list[WhaleTradeHistory]] = {}
+    q = q.limit(history_limit)
+  return q
+
+
+def _row_contexts(rows, n_windows: int, offset: int = 7) -> list[tuple[dict[str, float], dict[str, float]]]:
+  """(market_volume, trade_percentiles) per window from rows carrying a
+  (percentile, market_volume) pair per window from column offset on."""
+  contexts = []
+  for i in range(n_windows):
+    market_volume: dict[str, float] = {}
+    trade_percentiles: dict[str, float] = {}
+    for r in rows:
+      p = r[offset + 2 * i]
+      if p is not None:
+        trade_percentiles[r.trade_id] = float(p)
+        market_volume[r.market_id] = float(r[offset + 2 * i + 1] or 0)
+    contexts.append((market_volume, trade_percentiles))
+  return contexts
+
+
+async def _fetch_trade_contexts(session: AsyncSession, sinces: list[datetime], markets: list[str], trade_ids: list[str]) -> list[tuple[dict[str, float], dict[str, float]]]:
+  """(market_volume, trade_percentiles) per window for trade_ids only,
+  ranked by the database over the given markets."""
+  ranked = [_ranked_raw_trades(since, markets) for since in sinces]
+  q = select(TradeRaw.trade_id, TradeRaw.market_id, *[c for r in ranked for c in (r.c.percentile, r.c.market_volume)])
+  q = q.select_from(TradeRaw)
+  for r in ranked:
+    q = q.outerjoin(r, r.c.trade_id == TradeRaw.trade_id)
+  rows = (await session.execute(q.where(TradeRaw.trade_id.in_(trade_ids)))).all()
+  return _row_contexts(rows, len(sinces), offset=2)
+
+
+def _window_metrics_from_rows(history_rows, sinces: list[datetime], trade_cap: int, raw_rows=None) -> list[dict[str, _WindowMetrics]]:
+  """Window metrics for each since from history rows covering the widest
+  one (ordered by wallet, newest first). The market context comes from
+  raw_rows when given, else from the rows' own context columns (see
+  _history_context_query).
+
+  Uses the NumPy columnar backend when available; the scalar fold below is
+  the fallback and the reference it is tested against.
+  """
+  if columnar_enabled():
+    return [
+      {wallet: _WindowMetrics(*values) for wallet, values in zip(wallets, zip(*columns))}
+      for wallets, columns in multi_window_metrics(history_rows, sinces, trade_cap, raw_rows)
+    ]
+
+  if raw_rows is None:
+    contexts = _row_contexts(history_rows, len(sinces))
+  else:
+    raw_by_window: list[list] = [[] for _ in sinces]
+    for r in raw_rows:
+      ts = _to_aware(r.timestamp)
+      for i, since in enumerate(sinces):
+        if ts >= since:
+          raw_by_window[i].append(r)
+    contexts = [_market_context(rows) for rows in raw_by_window]
+
+  wallet_trades: dict[str, list] = {}
   for wth in history_rows:
     wa = str(wth.wallet_address)
     if wa not in wallet_trades:
       wallet_trades[wa] = []
     wallet_trades[wa].append(wth)
-      
-  out: dict[str, _WindowMetrics] = {}
+
+  out: list[dict[str, _WindowMetrics]] = [{} for _ in sinces]
   for wallet, trades in wallet_trades.items():
-    trades = trades[:trade_cap]
-    if not trades:
-      continue
-      
-    n_trades = len(trades)
-    total_pnl = sum(float(t.pnl) for t in trades)
-    total_vol = sum(float(t.trade_usd) for t in trades)
-    avg_trade_size = total_vol / n_trades if n_trades > 0 else 0.0
-    
-    pnls = [float(t.pnl) for t in trades]
-    mean_pnl = total_pnl / n_trades if n_trades > 0 else 0.0
-    
-    if n_trades > 0:
-      variance = sum((p - mean_pnl) ** 2 for p in pnls) / n_trades
-      stddev_pnl = math.sqrt(variance)
+    # Rows are newest first: each window's rows are a prefix of the list.
+    stamps = [_to_aware(t.timestamp) for t in trades]
+    for i, since in enumerate(sinces):
+      end = 0
+      while end < len(trades) and stamps[end] >= since:
+        end += 1
+      volume, percentiles = contexts[i]
+      metrics = _wallet_window_metrics(trades[:min(end, trade_cap)], percentiles, volume)
+      if metrics is not None:
+        out[i][wallet] = metrics
+  return out
+
+
+_RawRow = namedtuple("_RawRow", "trade_id market_id price amount timestamp")
+
+
+@lru_cache(maxsize=None)
+def _history_row_type(width: int):
+  names = [c.key for c in _HISTORY_COLUMNS]
+  return namedtuple("_HistoryRow", names + [f"context_{i}" for i in range(width - len(names))])
+
+
+def _window_metrics_job(history_rows: list[tuple], sinces: list[datetime], trade_cap: int, raw_rows: list[tuple] | None) -> list[dict[str, _WindowMetrics]]:
+  """_window_metrics_from_rows over plain tuples, for a compute process.
+  The columnar backend reads rows positionally; the scalar fold needs the
+  column names back."""
+  if history_rows and not columnar_enabled():
+    row_type = _history_row_type(len(history_rows[0]))
+    history_rows = [row_type._make(r) for r in history_rows]
+    if raw_rows is not None:
+      raw_rows = [_RawRow._make(r) for r in raw_rows]
+  return _window_metrics_from_rows(history_rows, sinces, trade_cap, raw_rows)
+
+
+async def _window_metrics(history_rows, sinces: list[datetime], trade_cap: int, raw_rows, offload) -> list[dict[str, _WindowMetrics]]:
+  """_window_metrics_from_rows, through offload(job, fn, *args) when given
+  (the unified app's compute pool); rows are sent as tuples."""
+  if offload is None:
+    return _window_metrics_from_rows(history_rows, sinces, trade_cap, raw_rows)
+  return await offload(
+    "whale_stats",
+    _window_metrics_job,
+    [tuple(r) for r in history_rows],
+    sinces,
+    trade_cap,
+    None if raw_rows is None else [tuple(r) for r in raw_rows],
+  )
+
+
+async def _fetch_raw_trades(session: AsyncSession, since: datetime) -> list:
+  raw_limit = int(os.getenv("WHALE_STATS_RAW_TRADE_CAP", "100000"))
+  tr_query = (
+    select(TradeRaw.trade_id, TradeRaw.market_id, TradeRaw.price, TradeRaw.amount, TradeRaw.timestamp)
+    .where(TradeRaw.timestamp >= since)
+  )
+  if raw_limit > 0:
+    # The newest raw_limit rows of a wide window, filtered to a narrower
+    # window, are exactly that window's newest raw_limit rows.
+    tr_query = tr_query.order_by(TradeRaw.timestamp.desc()).limit(raw_limit)
+  return (await session.execute(tr_query)).all()
+
+
+async def _fetch_history_rows(session: AsyncSession, sinces: list[datetime], history_limit: int, with_context: bool) -> list:
+  if with_context:
+    return (await session.execute(_history_context_query(sinces, history_limit))).all()
+  wth_query = (
+    select(*_HISTORY_COLUMNS)
+    .where(WhaleTradeHistory.timestamp >= min(sinces))
+    .order_by(WhaleTradeHistory.wallet_address, WhaleTradeHistory.timestamp.desc())
+  )
+  if history_limit > 0:
+    wth_query = wth_query.limit(history_limit)
+  return (await session.execute(wth_query)).all()
+
+
+async def _fetch_window_metrics(session: AsyncSession, *, since: datetime, trade_cap: int, offload=None) -> dict[str, _WindowMetrics]:
+  history_limit = int(os.getenv("WHALE_STATS_HISTORY_CAP", "100000"))
+  if _sql_context_supported(session):
+    history_rows = await _fetch_history_rows(session, [since], history_limit, True)
+    return (await _window_metrics(history_rows, [since], trade_cap, None, offload))[0]
+  raw_rows = await _fetch_raw_trades(session, since)
+  history_rows = await _fetch_history_rows(session, [since], history_limit, False)
+  return (await _window_metrics(history_rows, [since], trade_cap, raw_rows, offload))[0]
+
+
+async def _fetch_multi_window_metrics(session: AsyncSession, *, sinces: list[datetime], trade_cap: int, offload=None) -> list[dict[str, _WindowMetrics]]:
+  """_fetch_window_metrics for several windows from one scan of the widest.
+
+  On Postgres (and SQLite >= 3.25) the database ranks trades_raw per window
+  with window functions and only history rows come back, each carrying its
+  percentile and market volume for every window; no raw-trade cap applies.
+  Elsewhere the raw rows of the widest window are read once (newest
+  WHALE_STATS_RAW_TRADE_CAP) and ranked in Python.
+
+  The history rows of every narrower window are a timestamp-filtered subset
+  of the widest window's rows, so each row is routed to every window it
+  falls in. Output is identical to one _fetch_window_metrics call per
+  window; if the history cap truncates the wide scan the narrower windows
+  are re-read on their own, since the cap would cut them at a different
+  wallet.
+  """
+  if not sinces:
+    return []
+  widest = min(sinces)
+  history_limit = int(os.getenv("WHALE_STATS_HISTORY_CAP", "100000"))
+  with_context = _sql_context_supported(session)
+  raw_rows = None if with_context else await _fetch_raw_trades(session, widest)
+  history_rows = await _fetch_history_rows(session, sinces, history_limit, with_context)
+  truncated = history_limit > 0 and len(history_rows) >= history_limit
+  if not truncated:
+    return await _window_metrics(history_rows, sinces, trade_cap, raw_rows, offload)
+
+  logger.info("whale_stats_history_truncated rows=%d — narrower windows re-read", len(history_rows))
+  wide = (await _window_metrics(history_rows, sinces, trade_cap, raw_rows, offload))[sinces.index(widest)]
+  out: list[dict[str, _WindowMetrics]] = []
+  for since in sinces:
+    if since == widest:
+      out.append(wide)
     else:
-      stddev_pnl = 0.0
-      
-    wins = [p for p in pnls if p > 0]
-    losses = [p for p in pnls if p < 0]
-    
-    # Calculate win rate based on closed trades (wins + losses)
-    n_closed = len(wins) + len(losses)
-    win_rate = len(wins) / n_closed if n_closed > 0 else 0.0
-    
-    avg_win = sum(wins) / len(wins) if wins else 0.0
-    avg_loss = sum(abs(l) for l in losses) / len(losses) if losses else 0.0
-    
-    roi = total_pnl / total_vol if total_vol > 0 else 0.0
-    risk_reward = avg_win / avg_loss if avg_loss > 0 else 0.0
-    
-    # Max Drawdown
-    trades_asc = sorted(trades, key=lambda t: t.timestamp)
-    current_cum = 0.0
-    peak = -float('inf') 
-    max_dd = 0.0
-    
-    # Initialize peak with first cum if needed, but logic:
-    # running_max starts at -inf, updates as we go.
-    # Actually if first cum is -100, peak becomes -100.
-    
-    for t in trades_asc:
-      current_cum += float(t.pnl)
-      if current_cum > peak:
-        peak = current_cum
-      dd = peak - current_cum
-      if dd > max_dd:
-        max_dd = dd
-        
-    entry_prs = []
-    exit_prs = []
-    liquidity_ratios = []
-    market_counts: dict[str, int] = {}
-    
-    for t in trades:
-      pr = trade_percentiles.get(t.trade_id)
-      if pr is None:
-        continue  # skip trades with missing market price data
-      side = str(t.side).lower()
-      if side == 'buy':
-        entry_prs.append(pr)
-      elif side == 'sell':
-        exit_prs.append(pr)
-        
-      m_vol = market_volume.get(t.market_id, 0.0)
-      liq_ratio = float(t.trade_usd) / m_vol if m_vol > 0 else 0.0
-      liquidity_ratios.append(liq_ratio)
-      
-      mid = str(t.market_id)
-      market_counts[mid] = market_counts.get(mid, 0) + 1
-      
-    avg_entry = sum(entry_prs) / len(entry_prs) if entry_prs else 0.5
-    avg_exit = sum(exit_prs) / len(exit_prs) if exit_prs else 0.5
-    m_liq_ratio = sum(liquidity_ratios) / len(liquidity_ratios) if liquidity_ratios else 0.0
-    
-    top_cnt = max(market_counts.values()) if market_counts else 0
-    top_frac = top_cnt / n_trades if n_trades > 0 else 0.0
-    
-    pnl_abs_ratio = abs(total_pnl) / total_vol if total_vol > 0 else 0.0
-    
-    out[wallet] = _WindowMetrics(
-      trades=n_trades,
-      win_rate=win_rate,
-      roi=roi,
-      total_pnl=total_pnl,
-      total_volume=total_vol,
-      avg_trade_size=avg_trade_size,
-      max_drawdown=max_dd,
-      stddev_pnl=stddev_pnl,
-      avg_entry_percentile=avg_entry,
-      avg_exit_percentile=avg_exit,
-      risk_reward_ratio=risk_reward,
-      market_liquidity_ratio=m_liq_ratio,
-      top_market_fraction=top_frac,
-      pnl_abs_ratio=pnl_abs_ratio,
-    )
+      out.append(await _fetch_window_metrics(session, since=since, trade_cap=trade_cap, offload=offload))
   return out
 
 
-async def recompute_whale_stats(session: AsyncSession, *, trade_cap: int = 30) -> int:
+WHALE_STATS_STREAM_ENABLED = os.getenv("WHALE_STATS_STREAM_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+WHALE_STATS_STREAM_CHUNK_WALLETS = int(os.getenv("WHALE_STATS_STREAM_CHUNK_WALLETS", "2000"))
+WHALE_STATS_STREAM_YIELD_PER = int(os.getenv("WHALE_STATS_STREAM_YIELD_PER", "5000"))
+
+
+async def _stream_window_metrics(session: AsyncSession, *, sinces: list[datetime], trade_cap: int, chunk_wallets: int = 0, offload=None):
+  """Yield _fetch_multi_window_metrics results for consecutive chunks of
+  wallets, streaming whale_trade_history through a server-side cursor.
+
+  Rows arrive in wallet order with their market context (see
+  _history_context_query), so a wallet is complete once the next one
+  starts. Only a wallet's trade_cap newest rows can reach any window, so
+  the rest are dropped as they stream by: memory is one chunk of
+  chunk_wallets wallets, whatever the table size, and there is no
+  history cap to cut wallets off. Needs the database-side context.
+  """
+  chunk_wallets = max(1, chunk_wallets or WHALE_STATS_STREAM_CHUNK_WALLETS)
+  query = _history_context_query(sinces, 0).execution_options(yield_per=max(1, WHALE_STATS_STREAM_YIELD_PER))
+  result = await session.stream(query)
+  chunk: list = []
+  n_wallets = 0
+  wallet = None
+  kept = 0
+  async for partition in result.partitions():
+    for r in partition:
+      if r[0] != wallet:
+        if n_wallets >= chunk_wallets:
+          yield await _window_metrics(chunk, sinces, trade_cap, None, offload)
+          chunk, n_wallets = [], 0
+        wallet, kept = r[0], 0
+        n_wallets += 1
+      if kept < trade_cap:
+        chunk.append(r)
+        kept += 1
+  if chunk:
+    yield await _window_metrics(chunk, sinces, trade_cap, None, offload)
+
+
+def _stats_window_days() -> tuple[int, int, int]:
+  return (
+    max(1, int(os.getenv("WHALE_STATS_DAYS_7", "7"))),
+    max(1, int(os.getenv("WHALE_STATS_DAYS_30", "30"))),
+    max(1, int(os.getenv("WHALE_STATS_DAYS_90", "90"))),
+  )
+
+
+async def recompute_whale_stats(session: AsyncSession, *, trade_cap: int = 30, offload=None) -> int:
   """Recompute whale stats for all wallets with recent trading activity.
 
-  Memory safety (CR-I8): set WHALE_STATS_MAX_WALLETS to cap the number of
-  wallets processed per run.  Also tune WHALE_STATS_RAW_TRADE_CAP and
-  WHALE_STATS_HISTORY_CAP to bound the raw trade data loaded into memory.
+  Where the database ranks trades itself, history is streamed and scored
+  in chunks of WHALE_STATS_STREAM_CHUNK_WALLETS wallets (upserted as each
+  chunk finishes), so no row cap applies. Otherwise, or with
+  WHALE_STATS_STREAM_ENABLED=0, the whole input is loaded. Memory safety
+  (CR-I8) for that path: set WHALE_STATS_MAX_WALLETS to cap the number of
+  wallets processed per run (it needs every wallet's metrics to rank them,
+  so it also turns streaming off), and tune WHALE_STATS_HISTORY_CAP (and,
+  on databases without window functions, WHALE_STATS_RAW_TRADE_CAP) to
+  bound the trade data loaded into memory.
+
+  offload(job, fn, *args), when given, runs the window metrics and scoring
+  off the event loop (services.unified.executor.run_compute); queries and
+  upserts stay here.
+
+  Each full pass also refreshes the in-process WalletStatsBook, so rows it
+  cached for the incremental runs are re-read from whale_trade_history.
   """
   now = datetime.now(timezone.utc)
   _, _, _, has_trade_history, has_stats = await _ensure_schema_flags(session)
   if not has_trade_history or not has_stats:
     return 0
+  wallet_stats_book().refresh()
 
   trade_cap = int(os.getenv("WHALE_STATS_TRADE_CAP", str(trade_cap)))
   max_wallets = int(os.getenv("WHALE_STATS_MAX_WALLETS", "0"))  # 0 = unlimited
-  days7 = max(1, int(os.getenv("WHALE_STATS_DAYS_7", "7")))
-  days30 = max(1, int(os.getenv("WHALE_STATS_DAYS_30", "30")))
-  days90 = max(1, int(os.getenv("WHALE_STATS_DAYS_90", "90")))
+  days7, days30, days90 = _stats_window_days()
 
   since7 = now - timedelta(days=days7)
   since30 = now - timedelta(days=days30)
   since90 = now - timedelta(days=days90)
 
-  m7 = await _fetch_window_metrics(session, since=since7, trade_cap=trade_cap)
-  m30 = await _fetch_window_metrics(session, since=since30, trade_cap=trade_cap)
-  m90 = await _fetch_window_metrics(session, since=since90, trade_cap=trade_cap)
+  if WHALE_STATS_STREAM_ENABLED and max_wallets <= 0 and _sql_context_supported(session):
+    n = 0
+    async for m7, m30, m90 in _stream_window_metrics(session, sinces=[since7, since30, since90], trade_cap=trade_cap, offload=offload):
+      wallets = set(m7) | set(m30) | set(m90)
+      if wallets:
+        n += await _score_wallets(session, now, wallets, m7, m30, m90, offload=offload)
+    return n
+
+  m7, m30, m90 = await _fetch_multi_window_metrics(session, sinces=[since7, since30, since90], trade_cap=trade_cap, offload=offload)
 
   wallets = set(m7.keys()) | set(m30.keys()) | set(m90.keys())
   if not wallets:
@@ -905,13 +1543,19 @@ async def recompute_whale_stats(session: AsyncSession, *, trade_cap: int = 30) -
     ))[:max_wallets])
     logger.info("recompute_whale_stats wallets_capped=%d/%d", len(wallets), len(total_set))
 
-  age_rows = (
-    await session.execute(
-      select(Wallet.address, Wallet.first_seen_at).where(Wallet.address.in_(list(wallets)))
-    )
-  ).all()
-  first_seen_map: dict[str, datetime | None] = {str(a): fs for a, fs in age_rows}
+  return await _score_wallets(session, now, wallets, m7, m30, m90, offload=offload)
 
+
+def _score_values(
+  now: datetime,
+  wallets,
+  m7: dict[str, _WindowMetrics],
+  m30: dict[str, _WindowMetrics],
+  m90: dict[str, _WindowMetrics],
+  first_seen_map: dict[str, datetime | None],
+) -> tuple[list[dict[str, object]], list[dict[str, object]]]:
+  """WhaleStats and WhaleProfile upsert values for wallets (pure; may run
+  in a compute process)."""
   def wallet_age_days(addr: str) -> float:
     fs = first_seen_map.get(addr)
     if not fs:
@@ -994,58 +1638,164 @@ async def recompute_whale_stats(session: AsyncSession, *, trade_cap: int = 30) -
         "losses": losses,
         "updated_at": now,
     })
+  return values, profile_values
+
+
+async def _score_wallets(
+  session: AsyncSession,
+  now: datetime,
+  wallets: set[str],
+  m7: dict[str, _WindowMetrics],
+  m30: dict[str, _WindowMetrics],
+  m90: dict[str, _WindowMetrics],
+  offload=None,
+) -> int:
+  """Score wallets from their window metrics and upsert WhaleStats,
+  WhaleScore and WhaleProfile. The caller commits."""
+  age_rows = (
+    await session.execute(
+      select(Wallet.address, Wallet.first_seen_at).where(Wallet.address.in_(list(wallets)))
+    )
+  ).all()
+  first_seen_map: dict[str, datetime | None] = {str(a): fs for a, fs in age_rows}
 
+  if offload is None:
+    values, profile_values = _score_values(now, wallets, m7, m30, m90, first_seen_map)
+  else:
+    values, profile_values = await offload(
+      "whale_stats",
+      _score_values,
+      now,
+      list(wallets),
+      {w: m7[w] for w in wallets if w in m7},
+      {w: m30[w] for w in wallets if w in m30},
+      {w: m90[w] for w in wallets if w in m90},
+      first_seen_map,
+    )
   if not values:
     return 0
 
-  stmt = insert(WhaleStats).values(values)
-  update_cols = {
-    "whale_score": stmt.excluded.whale_score,
-    "performance_score": stmt.excluded.performance_score,
-    "consistency_score": stmt.excluded.consistency_score,
-    "timing_score": stmt.excluded.timing_score,
-    "risk_score": stmt.excluded.risk_score,
-    "impact_score": stmt.excluded.impact_score,
-    "win_rate": stmt.excluded.win_rate,
-    "roi": stmt.excluded.roi,
-    "total_pnl": stmt.excluded.total_pnl,
-    "avg_trade_size": stmt.excluded.avg_trade_size,
-    "max_drawdown": stmt.excluded.max_drawdown,
-    "stddev_pnl": stmt.excluded.stddev_pnl,
-    "avg_entry_percentile": stmt.excluded.avg_entry_percentile,
-    "avg_exit_percentile": stmt.excluded.avg_exit_percentile,
-    "risk_reward_ratio": stmt.excluded.risk_reward_ratio,
-    "market_liquidity_ratio": stmt.excluded.market_liquidity_ratio,
-    "updated_at": now,
-  }
-  await session.execute(
-    stmt.on_conflict_do_update(index_elements=[WhaleStats.wallet_address], set_=update_cols)
+  # COPY + INSERT ... SELECT on Postgres for large runs; rows carry updated_at=now.
+  await bulk_upsert(
+    session,
+    WhaleStats,
+    values,
+    index_elements=["wallet_address"],
+    update_columns=[c for c in values[0] if c != "wallet_address"],
   )
 
   score_values = [{"wallet_address": v["wallet_address"], "final_score": v["whale_score"], "updated_at": now} for v in values]
-  score_stmt = insert(WhaleScore).values(score_values)
-  await session.execute(
-    score_stmt.on_conflict_do_update(
-      index_elements=[WhaleScore.wallet_address],
-      set_={"final_score": score_stmt.excluded.final_score, "updated_at": now},
-    )
-  )
+  await bulk_upsert(session, WhaleScore, score_values, index_elements=["wallet_address"], update_columns=["final_score", "updated_at"])
+  # Swapped into the in-process score table when the caller commits.
+  stage_whale_scores(session, {str(v["wallet_address"]): int(v["whale_score"]) for v in values}, score_version(now))
 
   if profile_values:
-    profile_stmt = insert(WhaleProfile).values(profile_values)
-    profile_update_cols = {
-        "total_volume": profile_stmt.excluded.total_volume,
-        "total_trades": profile_stmt.excluded.total_trades,
-        "realized_pnl": profile_stmt.excluded.realized_pnl,
-        "wins": profile_stmt.excluded.wins,
-        "losses": profile_stmt.excluded.losses,
-        "updated_at": now,
-    }
-    await session.execute(
-        profile_stmt.on_conflict_do_update(
-            index_elements=[WhaleProfile.wallet_address],
-            set_=profile_update_cols
-        )
+    await bulk_upsert(
+      session,
+      WhaleProfile,
+      profile_values,
+      index_elements=["wallet_address"],
+      update_columns=["total_volume", "total_trades", "realized_pnl", "wins", "losses", "updated_at"],
     )
 
   return len(values)
+
+
+async def recompute_whale_stats_incremental(session: AsyncSession, *, trade_cap: int = 30, redis=None) -> int:
+  """Rescore only wallets whose whale_trade_history changed since the last
+  run, or whose rows crossed a 7/30/90-day boundary, from the in-process
+  WalletStatsBook. Market volume and price percentiles are rebuilt for the
+  markets those wallets traded only (by the database where it can).
+
+  With redis, wallets recorded here are published to the shared dirty set
+  and the set is drained, so history written by other processes (PnL
+  backfills, other worker replicas) is rescored too. recompute_whale_stats stays the
+  slow periodic full pass for market-context drift on wallets that did not
+  trade.
+  """
+  now = datetime.now(timezone.utc)
+  _, _, _, has_trade_history, has_stats = await _ensure_schema_flags(session)
+  if not has_trade_history or not has_stats:
+    return 0
+
+  trade_cap = int(os.getenv("WHALE_STATS_TRADE_CAP", str(trade_cap)))
+  days = _stats_window_days()
+  sinces = [now - timedelta(days=d) for d in days]
+  since_min = min(sinces)
+  book = wallet_stats_book()
+  book.configure(trade_cap)
+  shared: set[str] = set()
+  if redis is not None:
+    await publish_dirty_wallets(redis)
+    shared = await drain_dirty_wallets(redis)
+  dirty = book.take_dirty(now, shared)
+  if not dirty:
+    return 0
+  try:
+    missing = [w for w in dirty if not book.has(w)]
+    if missing:
+      loaded: dict[str, list[HistoryEntry]] = {w: [] for w in missing}
+      for r in (
+        await session.execute(
+          select(
+            WhaleTradeHistory.wallet_address,
+            WhaleTradeHistory.trade_id,
+            WhaleTradeHistory.market_id,
+            WhaleTradeHistory.side,
+            WhaleTradeHistory.pnl,
+            WhaleTradeHistory.trade_usd,
+            WhaleTradeHistory.timestamp,
+          )
+          .where(WhaleTradeHistory.wallet_address.in_(missing))
+          .where(WhaleTradeHistory.timestamp >= since_min)
+        )
+      ).all():
+        loaded[str(r.wallet_address)].append(
+          HistoryEntry(str(r.trade_id), str(r.market_id), str(r.side), float(r.pnl or 0), float(r.trade_usd or 0), _to_aware(r.timestamp))
+        )
+      for w, entries in loaded.items():
+        book.load(w, entries)
+
+    rows = {w: [e for e in book.rows(w) if e.timestamp >= since_min] for w in dirty}
+    markets = {e.market_id for entries in rows.values() for e in entries}
+    raw: list = []
+    contexts = None
+    if markets and _sql_context_supported(session):
+      trade_ids = [e.trade_id for entries in rows.values() for e in entries]
+      contexts = await _fetch_trade_contexts(session, sinces, list(markets), trade_ids)
+    elif markets:
+      raw_limit = int(os.getenv("WHALE_STATS_RAW_TRADE_CAP", "100000"))
+      tr_query = (
+        select(TradeRaw.trade_id, TradeRaw.market_id, TradeRaw.price, TradeRaw.amount, TradeRaw.timestamp)
+        .where(TradeRaw.market_id.in_(list(markets)))
+        .where(TradeRaw.timestamp >= since_min)
+        .order_by(TradeRaw.timestamp.desc())
+      )
+      if raw_limit > 0:
+        tr_query = tr_query.limit(raw_limit)
+      raw = (await session.execute(tr_query)).all()
+
+    windows: list[dict[str, _WindowMetrics]] = []
+    for i, since in enumerate(sinces):
+      if contexts is not None:
+        market_volume, trade_percentiles = contexts[i]
+      else:
+        market_volume, trade_percentiles = _market_context([r for r in raw if _to_aware(r.timestamp) >= since])
+      metrics: dict[str, _WindowMetrics] = {}
+      for w, entries in rows.items():
+        m = _wallet_window_metrics([e for e in entries if e.timestamp >= since], trade_percentiles, market_volume)
+        if m is not None:
+          metrics[w] = m
+      windows.append(metrics)
+    m7, m30, m90 = windows
+
+    wallets = set(m7) | set(m30) | set(m90)
+    n = await _score_wallets(session, now, wallets, m7, m30, m90) if wallets else 0
+  except Exception:
+    book.mark_dirty(dirty)
+    raise
+  stage_rescored(session, dirty)
+  window_seconds = tuple(d * 86400.0 for d in days)
+  for w in dirty:
+    book.schedule_expiry(w, now, window_seconds)
+  return n
@@ -0,0 +1,179 @@
+"""Write-behind position book for whale_positions.
+
+process_trade_id used to lock, read and rewrite one whale_positions row per
+qualifying trade (SELECT … FOR UPDATE), which serializes consumers on hot
+wallets. The book keeps (net_size, avg_price) per (wallet, market_id) in
+process, hydrated lazily with a plain SELECT, and is authoritative while this
+process owns the wallet (the single unified consumer, or its wallet
+partition). Dirty rows are written back in one multi-row upsert by
+flush_position_book() on a short interval and at shutdown.
+
+Updates are staged on the session (session.info) and promoted into the book
+only when that session commits, so a rolled-back batch never leaks positions
+into the book. Set POSITION_BOOK_ENABLED=0 to go back to locking reads when
+several processes update the same wallets.
+"""
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import event, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from shared.db import SessionLocal, insert
+from shared.models import WhalePosition
+
+
+logger = logging.getLogger("whale_engine.positions")
+
+POSITION_BOOK_ENABLED = os.getenv("POSITION_BOOK_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+POSITION_BOOK_FLUSH_SECONDS = float(os.getenv("POSITION_BOOK_FLUSH_SECONDS", "2"))
+POSITION_BOOK_MAX_KEYS = int(os.getenv("POSITION_BOOK_MAX_KEYS", "200000"))
+
+_STAGED_KEY = "whale_position_book_staged"
+_FLUSHED_KEY = "whale_position_book_flushed"
+
+Pair = tuple[str, str]
+
+
+class PositionBook:
+  """(wallet, market_id) → [net_size, avg_price, updated_at] with a dirty set."""
+
+  def __init__(self, max_keys: int = POSITION_BOOK_MAX_KEYS) -> None:
+    self.max_keys = max(1, int(max_keys))
+    self._entries: OrderedDict[Pair, list] = OrderedDict()
+    self._dirty: set[Pair] = set()
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  @property
+  def dirty_count(self) -> int:
+    return len(self._dirty)
+
+  async def hydrate(self, session: AsyncSession, pairs: list[Pair]) -> None:
+    """Load committed rows for pairs the book has not seen yet (one SELECT)."""
+    staged = session.info.get(_STAGED_KEY, {})
+    missing = [p for p in dict.fromkeys(pairs) if p not in self._entries and p not in staged]
+    if not missing:
+      return
+    loaded: dict[Pair, list] = {p: [0.0, 0.0, None] for p in missing}
+    for pos in (
+      await session.execute(
+        select(WhalePosition).where(tuple_(WhalePosition.wallet_address, WhalePosition.market_id).in_(missing))
+      )
+    ).scalars().all():
+      loaded[(pos.wallet_address, pos.market_id)] = [
+        float(pos.net_size) if pos.net_size is not None else 0.0,
+        float(pos.avg_price) if pos.avg_price is not None else 0.0,
+        pos.updated_at,
+      ]
+    for pair, entry in loaded.items():
+      # A concurrent commit may have promoted the pair meanwhile; keep it.
+      self._entries.setdefault(pair, entry)
+    self._evict()
+
+  def position(self, session: AsyncSession, pair: Pair) -> tuple[float, float]:
+    """Current (net_size, avg_price), including updates staged on session."""
+    staged = session.info.get(_STAGED_KEY)
+    if staged and pair in staged:
+      size, avg, _ = staged[pair]
+      return size, avg
+    entry = self._entries.get(pair)
+    if entry is None:
+      return 0.0, 0.0
+    self._entries.move_to_end(pair)
+    return entry[0], entry[1]
+
+  def stage(self, session: AsyncSession, pair: Pair, net_size: float, avg_price: float, now: datetime) -> None:
+    session.info.setdefault(_STAGED_KEY, {})[pair] = (float(net_size), float(avg_price), now)
+
+  def _promote(self, staged: dict[Pair, tuple[float, float, datetime]]) -> None:
+    for pair, (size, avg, now) in staged.items():
+      self._entries[pair] = [size, avg, now]
+      self._entries.move_to_end(pair)
+      self._dirty.add(pair)
+    self._evict()
+
+  def _evict(self) -> None:
+    # Only clean entries may be dropped; dirty ones wait for the next flush.
+    if len(self._entries) <= self.max_keys:
+      return
+    for pair in list(self._entries):
+      if len(self._entries) <= self.max_keys:
+        break
+      if pair not in self._dirty:
+        del self._entries[pair]
+
+  async def flush(self, session: AsyncSession) -> int:
+    """Upsert every dirty row in one statement. The caller commits; on
+    failure the rows are marked dirty again."""
+    if not self._dirty:
+      return 0
+    batch, self._dirty = self._dirty, set()
+    rows = []
+    for pair in batch:
+      entry = self._entries.get(pair)
+      if entry is None:
+        continue
+      rows.append({
+        "wallet_address": pair[0],
+        "market_id": pair[1],
+        "net_size": entry[0],
+        "avg_price": entry[1],
+        "updated_at": entry[2],
+      })
+    if not rows:
+      return 0
+    try:
+      stmt = insert(WhalePosition).values(rows)
+      await session.execute(
+        stmt.on_conflict_do_update(
+          index_elements=[WhalePosition.wallet_address, WhalePosition.market_id],
+          set_={"net_size": stmt.excluded.net_size, "avg_price": stmt.excluded.avg_price, "updated_at": stmt.excluded.updated_at},
+        )
+      )
+    except Exception:
+      self._dirty |= batch
+      raise
+    session.info.setdefault(_FLUSHED_KEY, set()).update(batch)
+    return len(rows)
+
+  def clear(self) -> None:
+    self._entries.clear()
+    self._dirty.clear()
+
+
+_BOOK = PositionBook()
+
+
+def position_book() -> PositionBook | None:
+  return _BOOK if POSITION_BOOK_ENABLED else None
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_staged(session: Session) -> None:
+  staged = session.info.pop(_STAGED_KEY, None)
+  if staged:
+    _BOOK._promote(staged)
+  session.info.pop(_FLUSHED_KEY, None)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_staged(session: Session, previous_transaction) -> None:
+  session.info.pop(_STAGED_KEY, None)
+  flushed = session.info.pop(_FLUSHED_KEY, None)
+  if flushed:
+    _BOOK._dirty |= flushed
+
+
+async def flush_position_book() -> int:
+  """Write all dirty positions back to whale_positions in one transaction."""
+  if not POSITION_BOOK_ENABLED or not _BOOK.dirty_count:
+    return 0
+  async with SessionLocal() as session:
+    n = await _BOOK.flush(session)
+    await session.commit()
+  return n
@@ -0,0 +1,192 @@
+"""Process-local whale score table for the whale consumer.
+
+Every trade used to resolve its wallet score through trade_score:{id}, then
+whale_score:{wallet} in Redis, then a per-wallet WhaleStats query. Scores only
+change when recompute_whale_stats runs, so the consumer keeps the whole
+wallet → whale_score mapping in memory instead, loaded once with one SELECT.
+
+recompute_whale_stats stages its new scores on the session; when that session
+commits they are merged into the table (wallets the run did not cover keep
+their score) and swapped in with a single assignment under a new version
+stamp (epoch ms of the run). publish_whale_scores() then SETs the version and
+PUBLISHes it on WHALE_SCORE_CHANNEL so other processes reload from the DB:
+the unified app listens on the channel, Celery workers compare the key once
+per drained batch.
+
+Boosted decision scores that used to be cached in whale_score:{wallet} live in
+a small overlay with the same TTL, dropped whenever a new version lands. The
+overlay is only shared within this process, which holds while each wallet has
+one consumer (the unified consumer or its wallet partition). Set
+WHALE_SCORE_TABLE_ENABLED=0 to go back to the Redis score caches.
+
+A failed load is not retried for WHALE_SCORE_TABLE_RETRY_SECONDS, so a
+database outage costs one SELECT per cooldown rather than one per trade;
+lookups meanwhile answer from whatever the table last held.
+"""
+import logging
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from shared.config import settings
+from shared.models import WhaleStats
+
+
+logger = logging.getLogger("whale_engine.score_table")
+
+WHALE_SCORE_TABLE_ENABLED = os.getenv("WHALE_SCORE_TABLE_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+WHALE_SCORE_TABLE_RETRY_SECONDS = float(os.getenv("WHALE_SCORE_TABLE_RETRY_SECONDS", "30"))
+WHALE_SCORE_VERSION_KEY = "whale_scores:version"
+WHALE_SCORE_CHANNEL = "whale_scores:updates"
+
+_STAGED_KEY = "whale_score_table_staged"
+
+
+def score_version(now: datetime) -> int:
+  return int(now.timestamp() * 1000)
+
+
+class WhaleScoreTable:
+  """wallet → whale_score with a version stamp and a TTL'd decision overlay."""
+
+  def __init__(self, overlay_seconds: float | None = None, retry_seconds: float = WHALE_SCORE_TABLE_RETRY_SECONDS) -> None:
+    self.overlay_seconds = float(settings.whale_score_cache_seconds if overlay_seconds is None else overlay_seconds)
+    self.retry_seconds = float(retry_seconds)
+    self.version = 0
+    self.loaded = False
+    self._scores: dict[str, int] = {}
+    self._overlay: dict[str, tuple[int, float]] = {}
+    self._failed_at: float | None = None
+
+  def __len__(self) -> int:
+    return len(self._scores)
+
+  async def ensure_loaded(self, session: AsyncSession, has_stats: bool = True) -> None:
+    """Load every WhaleStats score once (and again after a newer version was
+    announced). Without the whale_stats table every wallet scores 0. After a
+    failed load, calls within retry_seconds return without querying."""
+    if self.loaded:
+      return
+    if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_seconds:
+      return
+    scores: dict[str, int] = {}
+    if has_stats:
+      try:
+        scores = {
+          str(w): int(s)
+          for w, s in (await session.execute(select(WhaleStats.wallet_address, WhaleStats.whale_score))).all()
+          if s is not None
+        }
+      except Exception:
+        self._failed_at = time.monotonic()
+        logger.warning("whale_score_table_load_failed retry_in=%ss", self.retry_seconds, exc_info=True)
+        return
+    self._failed_at = None
+    self._replace(scores, self.version)
+    logger.info("whale_score_table_loaded wallets=%d version=%s", len(scores), self.version)
+
+  def lookup(self, wallet: str) -> tuple[int, bool]:
+    """Return (score, from_table). from_table is False for overlay hits, the
+    same distinction the Redis path made between a whale_score:{wallet} hit
+    and a DB fallback."""
+    hit = self._overlay.get(wallet)
+    if hit is not None:
+      if hit[1] > time.monotonic():
+        return hit[0], False
+      del self._overlay[wallet]
+    return self._scores.get(wallet, 0), True
+
+  def remember(self, wallet: str, score: int) -> None:
+    self._overlay[wallet] = (int(score), time.monotonic() + self.overlay_seconds)
+
+  def _replace(self, scores: dict[str, int], version: int) -> None:
+    # One assignment per attribute: readers never see a half-applied run.
+    self._scores = scores
+    self._overlay = {}
+    self.version = max(self.version, int(version))
+    self.loaded = True
+
+  def apply(self, updates: dict[str, int], version: int) -> None:
+    """Merge a recompute run. recompute only covers recently active wallets;
+    everyone else keeps their previous score."""
+    if int(version) <= self.version and self.loaded:
+      return
+    if not self.loaded:
+      # Nothing to merge into yet; the first lookup loads the full table.
+      self.version = max(self.version, int(version))
+      return
+    merged = dict(self._scores)
+    merged.update(updates)
+    self._replace(merged, version)
+
+  def note_version(self, version: int) -> bool:
+    """A newer version was published elsewhere: reload on next use."""
+    if int(version) <= self.version:
+      return False
+    self.version = int(version)
+    self.loaded = False
+    return True
+
+  def clear(self) -> None:
+    self.version = 0
+    self.loaded = False
+    self._scores = {}
+    self._overlay = {}
+    self._failed_at = None
+
+
+_TABLE = WhaleScoreTable()
+
+
+def whale_score_table() -> WhaleScoreTable | None:
+  return _TABLE if WHALE_SCORE_TABLE_ENABLED else None
+
+
+def stage_whale_scores(session: AsyncSession, scores: dict[str, int], version: int) -> None:
+  """Stage scores for the session's commit. A run that upserts in chunks
+  stages once per chunk; the chunks merge."""
+  staged = session.info.get(_STAGED_KEY)
+  if staged is None:
+    session.info[_STAGED_KEY] = (dict(scores), int(version))
+  else:
+    staged[0].update(scores)
+    session.info[_STAGED_KEY] = (staged[0], max(staged[1], int(version)))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_staged(session: Session) -> None:
+  staged = session.info.pop(_STAGED_KEY, None)
+  if staged is not None:
+    _TABLE.apply(*staged)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_staged(session: Session, previous_transaction) -> None:
+  session.info.pop(_STAGED_KEY, None)
+
+
+async def publish_whale_scores(redis) -> int:
+  """Announce the current version to other processes; returns it (0 = none)."""
+  version = _TABLE.version
+  if not WHALE_SCORE_TABLE_ENABLED or not version:
+    return 0
+  await redis.set(WHALE_SCORE_VERSION_KEY, str(version))
+  if hasattr(redis, "publish"):
+    await redis.publish(WHALE_SCORE_CHANNEL, str(version))
+  return version
+
+
+async def refresh_whale_scores(redis) -> bool:
+  """Poll the published version (one GET); True when a reload is due."""
+  if not WHALE_SCORE_TABLE_ENABLED:
+    return False
+  raw = await redis.get(WHALE_SCORE_VERSION_KEY)
+  try:
+    version = int(raw) if raw is not None else 0
+  except (TypeError, ValueError):
+    return False
+  return _TABLE.note_version(version)
@@ -0,0 +1,235 @@
+"""Columnar (NumPy) backend for the whale-stats window metrics.
+
+_wallet_window_metrics folds each wallet's rows through a WindowAccumulator
+one Python call at a time, and _market_context sorts per-market tuple lists
+for every window. Here the rows are transposed into arrays once, then for
+each window:
+
+  - market volume is one bincount, price percentiles one lexsort by
+    (market, price) with a rank-within-market subtraction;
+  - wallets are grouped with a stable argsort and each wallet's window rows
+    are laid out oldest-first in a (wallets x trade_cap) matrix padded with
+    zeros, so sums come from row-wise cumsum, drawdown from
+    np.maximum.accumulate over the cumulative PnL, and the Welford variance
+    from trade_cap vectorised column steps;
+  - the ratios are computed per column, not per wallet.
+
+Every float is accumulated in the same order as WindowAccumulator, so the
+results match the scalar path exactly. numpy is optional: without it (or with
+WHALE_STATS_NUMPY_ENABLED=0) the engine keeps the scalar path.
+"""
+import os
+from datetime import datetime, timezone
+
+try:
+  import numpy as np
+except Exception:  # pragma: no cover - optional dependency
+  np = None
+
+
+WHALE_STATS_NUMPY_ENABLED = os.getenv("WHALE_STATS_NUMPY_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def columnar_enabled() -> bool:
+  return np is not None and WHALE_STATS_NUMPY_ENABLED
+
+
+def _epoch(ts: datetime) -> float:
+  if ts.tzinfo is None:
+    ts = ts.replace(tzinfo=timezone.utc)
+  return ts.timestamp()
+
+
+def _columns(rows, width: int) -> list[tuple]:
+  """Transpose result rows (tuples in select order) into column tuples."""
+  cols = list(zip(*rows))
+  return cols if cols else [()] * width
+
+
+def _codes(values, index: dict[str, int]) -> "np.ndarray":
+  """Factorise string keys in first-seen order (shared index across calls)."""
+  return np.array([index.setdefault(v, len(index)) for v in values], dtype=np.int64)
+
+
+def _stamps(values) -> "np.ndarray":
+  utc = timezone.utc
+  return np.array([(ts if ts.tzinfo is not None else ts.replace(tzinfo=utc)).timestamp() for ts in values], dtype=np.float64)
+
+
+def _market_context(codes, prices, volumes, n_markets: int):
+  """Per-market volume and per-row price percentile (row order kept).
+
+  lexsort is stable, so equal prices keep their row order exactly as the
+  scalar list.sort does."""
+  market_volume = np.bincount(codes, weights=volumes, minlength=n_markets)
+  counts = np.bincount(codes, minlength=n_markets)
+  order = np.lexsort((prices, codes))
+  starts = np.cumsum(counts) - counts
+  sorted_codes = codes[order]
+  rank = np.arange(len(order)) - starts[sorted_codes]
+  size = counts[sorted_codes]
+  pct_sorted = np.full(len(order), 0.5)
+  many = size > 1
+  pct_sorted[many] = rank[many] / (size[many] - 1)
+  percentiles = np.empty(len(order))
+  percentiles[order] = pct_sorted
+  return market_volume, percentiles
+
+
+def _group_starts(groups) -> tuple:
+  """(start offsets, sizes) of the runs of equal values in groups."""
+  starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+  return starts, np.diff(np.r_[starts, len(groups)])
+
+
+def multi_window_metrics(history_rows, sinces: list[datetime], trade_cap: int, raw_rows=None) -> list[tuple[list[str], list[list]]]:
+  """Window metrics for each since as (wallets, columns).
+
+  history_rows: (wallet_address, trade_id, market_id, side, pnl, trade_usd,
+  timestamp) tuples ordered by wallet, newest first. With raw_rows
+  ((trade_id, market_id, price, amount, timestamp) tuples covering the
+  widest window) the market context is computed here; without, each history
+  row carries a (percentile, market_volume) pair per since, NULL when its
+  trade is not in that window. columns holds one list per
+  engine._WindowMetrics field, in field order, aligned with wallets.
+  """
+  h_cols = _columns(history_rows, 7 + 2 * len(sinces))
+  h_addr, h_tid, h_mid, h_sides, h_pnls, h_usds, h_ts = h_cols[:7]
+  r_tid, r_mid, r_price, r_amount, r_ts = _columns(raw_rows or (), 5)
+  n_raw = len(r_tid)
+
+  market_index: dict[str, int] = {}
+  r_market = _codes(r_mid, market_index)
+  h_market = _codes(h_mid, market_index)
+  wallet_index: dict[str, int] = {}
+  h_wallet = _codes(h_addr, wallet_index)
+  wallets = list(wallet_index)
+  raw_pos = {t: i for i, t in enumerate(r_tid)}
+  # -1 (no raw row) reads the trailing NaN slot of the percentile array.
+  h_raw = np.array([raw_pos.get(t, -1) for t in h_tid], dtype=np.int64)
+  side_codes = {s: {"buy": 1, "sell": 2}.get(str(s).lower(), 0) for s in set(h_sides)}
+  h_side = np.array([side_codes[s] for s in h_sides], dtype=np.int8)
+
+  r_prices = np.array(r_price, dtype=np.float64)
+  r_volumes = r_prices * np.array(r_amount, dtype=np.float64)
+  r_stamps = _stamps(r_ts)
+  h_pnl = np.array(h_pnls, dtype=np.float64)
+  h_usd = np.array(h_usds, dtype=np.float64)
+  h_stamps = _stamps(h_ts)
+  # Group by wallet; stable, so each group stays newest first.
+  by_wallet = np.argsort(h_wallet, kind="stable")
+
+  out: list[tuple[list[str], list[list]]] = []
+  for since in sinces:
+    cutoff = _epoch(since)
+    if raw_rows is None:
+      i = 7 + 2 * len(out)
+      h_pct = np.array(h_cols[i], dtype=np.float64)  # NULL -> NaN
+      h_volume = np.array(h_cols[i + 1], dtype=np.float64)
+    else:
+      in_raw = r_stamps >= cutoff
+      window_volume, window_pct = _market_context(r_market[in_raw], r_prices[in_raw], r_volumes[in_raw], len(market_index))
+      percentile = np.full(n_raw + 1, np.nan)
+      percentile[np.flatnonzero(in_raw)] = window_pct
+      h_pct = percentile[h_raw]
+      h_volume = window_volume[h_market]
+
+    rows = by_wallet[h_stamps[by_wallet] >= cutoff]
+    if len(rows) == 0 or trade_cap <= 0:
+      out.append(([], [[] for _ in range(14)]))
+      continue
+    starts, sizes = _group_starts(h_wallet[rows])
+    rank = np.arange(len(rows)) - np.repeat(starts, sizes)
+    rows = rows[rank < trade_cap]
+    # Oldest first within each wallet; stable, so equal timestamps keep the
+    # newest-first order, like sorted() over the scalar list.
+    rows = rows[np.lexsort((h_stamps[rows], h_wallet[rows]))]
+    out.append(_window_columns(
+      rows, wallets, h_wallet, h_market[rows], h_side[rows], h_pnl[rows], h_usd[rows],
+      h_pct[rows], h_volume[rows],
+    ))
+  return out
+
+
+def _ratio(num, den, default: float) -> "np.ndarray":
+  out = np.full(len(num), default, dtype=np.float64)
+  np.divide(num, den, out=out, where=den > 0)
+  return out
+
+
+def _window_columns(rows, wallets, h_wallet, market, side, pnl, usd, pct, market_volume) -> tuple[list[str], list[list]]:
+  """pct and market_volume are per row; pct is NaN without market data."""
+  starts, counts = _group_starts(h_wallet[rows])
+  n_wallets = len(starts)
+  g = np.repeat(np.arange(n_wallets), counts)
+  col = np.arange(len(rows)) - np.repeat(starts, counts)
+  shape = (n_wallets, int(counts.max()))
+  last = (np.arange(n_wallets), counts - 1)
+
+  def row_sums(values):
+    # cumsum adds left to right, the order WindowAccumulator uses.
+    m = np.zeros(shape)
+    m[g, col] = values
+    return np.cumsum(m, axis=1)
+
+  cum = row_sums(pnl)
+  pnl_sum = cum[last]
+  # Padding repeats the last cumulative value, so it never adds drawdown.
+  max_drawdown = np.maximum((np.maximum.accumulate(cum, axis=1) - cum).max(axis=1), 0.0)
+  volume = row_sums(usd)[last]
+  won, lost = pnl > 0, pnl < 0
+  wins = np.bincount(g[won], minlength=n_wallets)
+  losses = np.bincount(g[lost], minlength=n_wallets)
+  win_sum = row_sums(np.where(won, pnl, 0.0))[last]
+  loss_sum = row_sums(np.where(lost, -pnl, 0.0))[last]
+
+  # Welford, one column (= one trade per wallet) at a time.
+  pnl_m = np.zeros(shape)
+  pnl_m[g, col] = pnl
+  mean = np.zeros(n_wallets)
+  m2 = np.zeros(n_wallets)
+  for j in range(shape[1]):
+    live = j < counts
+    x = pnl_m[:, j]
+    delta = x - mean
+    new_mean = mean + delta / (j + 1)
+    m2 = np.where(live, m2 + delta * (x - new_mean), m2)
+    mean = np.where(live, new_mean, mean)
+
+  known = ~np.isnan(pct)
+  entry = known & (side == 1)
+  exit_ = known & (side == 2)
+  entry_sum = row_sums(np.where(entry, pct, 0.0))[last]
+  exit_sum = row_sums(np.where(exit_, pct, 0.0))[last]
+  entry_n = np.bincount(g[entry], minlength=n_wallets)
+  exit_n = np.bincount(g[exit_], minlength=n_wallets)
+  liquidity = _ratio(usd, market_volume, 0.0)
+  liquidity_sum = row_sums(np.where(known, liquidity, 0.0))[last]
+  liquidity_n = np.bincount(g[known], minlength=n_wallets)
+
+  top = np.zeros(n_wallets, dtype=np.int64)
+  if known.any():
+    n_markets = int(market.max()) + 1
+    pairs, pair_counts = np.unique(g[known] * n_markets + market[known], return_counts=True)
+    np.maximum.at(top, pairs // n_markets, pair_counts)
+
+  avg_win = _ratio(win_sum, wins, 0.0)
+  avg_loss = _ratio(loss_sum, losses, 0.0)
+  columns = [
+    counts,
+    # Win rate is based on closed trades (wins + losses)
+    _ratio(wins, wins + losses, 0.0),
+    _ratio(pnl_sum, volume, 0.0),
+    pnl_sum,
+    volume,
+    volume / counts,
+    max_drawdown,
+    np.sqrt(m2 / counts),
+    _ratio(entry_sum, entry_n, 0.5),
+    _ratio(exit_sum, exit_n, 0.5),
+    _ratio(avg_win, avg_loss, 0.0),
+    _ratio(liquidity_sum, liquidity_n, 0.0),
+    top / counts,
+    _ratio(np.abs(pnl_sum), volume, 0.0),
+  ]
+  return [wallets[w] for w in h_wallet[rows[starts]].tolist()], [c.tolist() for c in columns]
@@ -2,18 +2,29 @@
 
 import json
 import logging
+import os
+import time
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from typing import Optional
 
-from sqlalchemy import text
+from sqlalchemy import insert, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
 
+from services.whale_engine.vw_book import VW_BASELINE_SLACK_SECONDS, vw_book, vw_snapshot_rings
+from shared.async_utils import VW_DIRTY_KEY
+from shared.db import bulk_upsert
+from shared.latest_prices import latest_prices
 from shared.models.models import MarketVwMetrics, MarketVwSnapshot
 
 logger = logging.getLogger(__name__)
 
+# 事件驱动重算：成交写入方用 shared.async_utils.mark_vw_dirty 把市场加入共享 dirty 集合，
+# VW worker 周期性取出，同一市场在 VW_DEBOUNCE_SECONDS 内最多重算一次；整点全量扫描保留作兜底
+VW_DIRTY_DRAIN_BATCH = int(os.getenv("VW_DIRTY_DRAIN_BATCH", "1000"))
+VW_DEBOUNCE_SECONDS = float(os.getenv("VW_DEBOUNCE_SECONDS", "60"))
+
 
 def _normalize_outcome(outcome: Optional[str]) -> Optional[str]:
     """Normalize Polymarket outcome names to 'yes' or 'no'.
@@ -42,22 +53,29 @@ def _calc_vw_prices(trades: list[tuple]) -> Optional[dict]:
     VW 公式: Σ(amount × price) / Σ(amount)
       分子 = USD 成交额，分母 = token 数量（用作权重）
     """
+    return _calc_vw_from_sums([(outcome, amount * price, amount) for outcome, amount, price in trades])
+
+
+def _calc_vw_from_sums(groups: list[tuple]) -> Optional[dict]:
+    """
+    同 _calc_vw_prices，输入为按 outcome 预聚合的
+    [(outcome, Σ(amount × price), Σ(amount)), ...]（见 _fetch_vw_sums）。
+    """
     yes_token_sum = Decimal("0")   # Σ(amount) — token count
     no_token_sum = Decimal("0")
     yes_turnover = Decimal("0")    # Σ(amount × price) — USD value
     no_turnover = Decimal("0")
 
-    for outcome, amount, price in trades:
+    for outcome, turnover, tokens in groups:
         direction = _normalize_outcome(outcome)
         if direction is None:
             continue
-        usd = amount * price
         if direction == "yes":
-            yes_turnover += usd
-            yes_token_sum += amount
+            yes_turnover += turnover
+            yes_token_sum += tokens
         elif direction == "no":
-            no_turnover += usd
-            no_token_sum += amount
+            no_turnover += turnover
+            no_token_sum += tokens
 
     if yes_token_sum == 0 and no_token_sum == 0:
         return None
@@ -150,7 +168,14 @@ async def _get_market_price(session: AsyncSession, market_id: str) -> Optional[D
     获取市场最新 YES 价格（快照）。
     支持多种 outcome 命名：Yes/Up → yes 方向，No/Down → no 方向。
     若只有 no 方向成交，用 yes = 1 - no 推导。
+    最新成交价索引（shared.latest_prices）已加载时直接读内存。
     """
+    index = latest_prices()
+    if index is not None:
+        cached = index.yes_price(market_id)
+        if cached is not None:
+            return cached
+
     result = await session.execute(
         text("""
             SELECT price FROM trades_raw
@@ -179,20 +204,115 @@ async def _get_market_price(session: AsyncSession, market_id: str) -> Optional[D
     return None
 
 
-async def _get_previous_snapshot(
-    session: AsyncSession, market_id: str, minutes_ago: int
-) -> Optional[Decimal]:
-    """获取 N 分钟前的 divergence 快照值"""
+async def _fetch_vw_sums(session: AsyncSession, market_ids: list[str], window_days: int) -> dict[str, list[tuple]]:
+    """所有市场窗口内按 outcome 聚合的 (outcome, Σ(amount × price), Σ(amount))，一条 GROUP BY 查询"""
     result = await session.execute(
         text("""
-            SELECT vw_divergence FROM market_vw_snapshots
-            WHERE market_id = :mid AND snapshot_at <= :cutoff
-            ORDER BY snapshot_at DESC LIMIT 1
+            SELECT market_id, outcome, SUM(amount * price), SUM(amount)
+            FROM trades_raw
+            WHERE market_id = ANY(:mids)
+              AND timestamp > NOW() - (:days * INTERVAL '1 day')
+            GROUP BY market_id, outcome
         """),
-        {"mid": market_id, "cutoff": datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)},
+        {"mids": market_ids, "days": int(window_days)},
     )
-    row = result.fetchone()
-    return row[0] if row else None
+    sums: dict[str, list[tuple]] = {}
+    for market_id, outcome, turnover, tokens in result.fetchall():
+        sums.setdefault(market_id, []).append((outcome, turnover, tokens))
+    return sums
+
+
+async def _open_markets(session: AsyncSession, volumes: dict[str, Decimal]) -> dict[str, Decimal]:
+    """过滤掉已关闭或不在 markets 表中的市场（累加器路径的活跃市场筛选）"""
+    if not volumes:
+        return {}
+    result = await session.execute(
+        text("""
+            SELECT id FROM markets
+            WHERE id = ANY(:mids) AND (status IS NULL OR status != 'closed')
+        """),
+        {"mids": list(volumes)},
+    )
+    return {row[0]: volumes[row[0]] for row in result.fetchall()}
+
+
+async def _fetch_market_prices(session: AsyncSession, market_ids: list[str]) -> dict[str, Decimal]:
+    """批量版 _get_market_price：每个市场最新 YES 价格（无 YES 成交时用 1 - NO）。
+    先查最新成交价索引，未命中的市场每个两次按索引取最新一笔，一次往返。"""
+    prices: dict[str, Decimal] = {}
+    index = latest_prices()
+    if index is not None:
+        for market_id in market_ids:
+            cached = index.yes_price(market_id)
+            if cached is not None:
+                prices[market_id] = cached
+        market_ids = [mid for mid in market_ids if mid not in prices]
+        if not market_ids:
+            return prices
+    result = await session.execute(
+        text("""
+            SELECT m.mid,
+                   (SELECT price FROM trades_raw
+                     WHERE market_id = m.mid AND outcome IN ('Yes', 'Up', 'yes', 'YES')
+                     ORDER BY timestamp DESC LIMIT 1),
+                   (SELECT price FROM trades_raw
+                     WHERE market_id = m.mid AND outcome IN ('No', 'Down', 'no', 'NO')
+                     ORDER BY timestamp DESC LIMIT 1)
+            FROM unnest(CAST(:mids AS text[])) AS m(mid)
+        """),
+        {"mids": market_ids},
+    )
+    for market_id, yes_price, no_price in result.fetchall():
+        if yes_price is not None:
+            prices[market_id] = yes_price
+        elif no_price is not None:
+            prices[market_id] = Decimal("1") - no_price
+    return prices
+
+
+async def _fetch_snapshot_history(
+    session: AsyncSession, market_ids: list[str], now: datetime
+) -> dict[str, tuple]:
+    """每个市场 5m/15m/1h 前最近一次快照的 divergence 与近 24h 快照数，一条聚合查询。
+    返回 {market_id: (past_5m, past_15m, past_1h, count_24h)}
+
+    扫描只覆盖近 24h；基准快照不得早于 1h 前再往前 VW_BASELINE_SLACK_SECONDS（默认 5 分钟），
+    更早的快照不能当作 N 分钟前的基准，返回 None（与快照环形缓冲一致）。"""
+    c60 = now - timedelta(minutes=60)
+    result = await session.execute(
+        text("""
+            SELECT market_id,
+                   (ARRAY_AGG(vw_divergence ORDER BY snapshot_at DESC)
+                      FILTER (WHERE snapshot_at <= :c5 AND snapshot_at >= :floor))[1],
+                   (ARRAY_AGG(vw_divergence ORDER BY snapshot_at DESC)
+                      FILTER (WHERE snapshot_at <= :c15 AND snapshot_at >= :floor))[1],
+                   (ARRAY_AGG(vw_divergence ORDER BY snapshot_at DESC)
+                      FILTER (WHERE snapshot_at <= :c60 AND snapshot_at >= :floor))[1],
+                   COUNT(*)
+            FROM market_vw_snapshots
+            WHERE market_id = ANY(:mids)
+              AND snapshot_at >= :since24
+            GROUP BY market_id
+        """),
+        {
+            "mids": market_ids,
+            "c5": now - timedelta(minutes=5),
+            "c15": now - timedelta(minutes=15),
+            "c60": c60,
+            "floor": c60 - timedelta(seconds=VW_BASELINE_SLACK_SECONDS),
+            "since24": now - timedelta(hours=24),
+        },
+    )
+    return {row[0]: tuple(row[1:]) for row in result.fetchall()}
+
+
+async def _fetch_signal_directions(session: AsyncSession, market_ids: list[str]) -> dict[str, Optional[str]]:
+    """写入前的上一次信号方向（用于检测方向翻转）"""
+    result = await session.execute(
+        text("SELECT market_id, signal_direction FROM market_vw_metrics WHERE market_id = ANY(:mids)"),
+        {"mids": market_ids},
+    )
+    return {row[0]: row[1] for row in result.fetchall()}
 
 
 async def _get_last_alert_time(redis: Redis, market_id: str) -> Optional[float]:
@@ -208,10 +328,63 @@ async def _set_last_alert_time(redis: Redis, market_id: str):
     await redis.set(key, str(datetime.now(timezone.utc).timestamp()))
 
 
-async def compute_vw_metrics(session: AsyncSession, redis: Redis, config: dict) -> int:
+async def drain_vw_dirty(redis: Redis) -> set[str]:
+    """取出共享 dirty 集合（SPOP 原子，并发 SADD 留给下一次）"""
+    drained: set[str] = set()
+    batch = max(1, VW_DIRTY_DRAIN_BATCH)
+    while True:
+        popped = await redis.spop(VW_DIRTY_KEY, batch) or []
+        drained.update(popped)
+        if len(popped) < batch:
+            return drained
+
+
+class VwDebouncer:
+    """待重算市场；每个市场在 interval 秒内最多被取出一次，未到期的继续等待"""
+
+    def __init__(self, interval: float = VW_DEBOUNCE_SECONDS):
+        self.interval = interval
+        self._pending: set[str] = set()
+        self._last: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, market_ids) -> None:
+        self._pending.update(market_ids)
+
+    def take_due(self, now: float) -> list[str]:
+        self._last = {m: t for m, t in self._last.items() if now - t < self.interval}
+        due = [m for m in self._pending if m not in self._last]
+        self._pending.difference_update(due)
+        for m in due:
+            self._last[m] = now
+        return due
+
+
+_DEBOUNCER = VwDebouncer()
+
+
+async def compute_dirty_vw_metrics(session: AsyncSession, redis: Redis, config: dict) -> int:
+    """重算到期的 dirty 市场，返回成功计算的市场数"""
+    _DEBOUNCER.add(await drain_vw_dirty(redis))
+    due = _DEBOUNCER.take_due(time.time())
+    if not due:
+        return 0
+    return await compute_vw_metrics(session, redis, config, market_ids=due)
+
+
+async def compute_vw_metrics(
+    session: AsyncSession, redis: Redis, config: dict, market_ids: Optional[list[str]] = None
+) -> int:
     """
     主计算函数：对活跃市场计算 VW 指标并写入 DB，突变时推送 Redis。
-    返回成功计算的市场数。
+    返回成功计算的市场数。market_ids 非空时只考虑这些市场（事件驱动重算）。
+
+    所有活跃市场一起处理：VW 求和、市场价格、历史快照和上一次信号方向各一条
+    查询，指标与快照各一次批量写入，每轮往返次数不随市场数增长。
+    VW 累加器（vw_book）已加载时，活跃市场与 VW 求和直接读内存，不再扫描 trades_raw；
+    快照环形缓冲已加载时，velocity 基准与预热计数同样从内存二分查找。
     """
     window_days = config.get("computation_window_days", 7)
     min_24h_vol = Decimal(str(config.get("min_24h_volume_usd", 10000)))
@@ -222,55 +395,76 @@ async def compute_vw_metrics(session: AsyncSession, redis: Redis, config: dict)
     cooldown_minutes = config.get("alert_cooldown_minutes", 30)
     uai_extreme = Decimal(str(config.get("uai_extreme_price_threshold", 0.02)))
 
+    now = datetime.now(timezone.utc)
+    # 已加载的累加器（仅 unified 进程）覆盖本窗口时，活跃市场与 VW 求和都从内存读取
+    book = vw_book()
+    if book is None or not book.ready or book.window_days < int(window_days):
+        book = None
+
     # 1. 找到最近 10 分钟内有交易且 24h 量达标的活跃市场
-    # 用 CTE 先算 24h vol，避免 WHERE 10min 过滤吃掉 SUM 24h 的数据
-    result = await session.execute(
-        text("""
-            WITH vol_24h AS (
-                SELECT market_id, SUM(amount * price) AS vol
-                FROM trades_raw
-                WHERE timestamp > NOW() - INTERVAL '24 hours'
-                GROUP BY market_id
-            )
-            SELECT DISTINCT t.market_id, COALESCE(v.vol, 0) AS vol_24h
-            FROM trades_raw t
-            JOIN markets m ON t.market_id = m.id
-            LEFT JOIN vol_24h v ON t.market_id = v.market_id
-            WHERE t.timestamp > NOW() - INTERVAL '10 minutes'
-              AND (m.status IS NULL OR m.status != 'closed')
-              AND COALESCE(v.vol, 0) >= :min_vol
-        """),
-        {"min_vol": min_24h_vol},
-    )
-    # Build dict: market_id → vol_24h
-    active_markets = {row[0]: row[1] for row in result.fetchall()}
+    if book is not None:
+        book.expire(now)
+        candidates = book.active_markets(now, min_24h_vol)
+        if market_ids is not None:
+            candidates = {mid: candidates[mid] for mid in market_ids if mid in candidates}
+        active_markets = await _open_markets(session, candidates)
+    else:
+        # 用 CTE 先算 24h vol，避免 WHERE 10min 过滤吃掉 SUM 24h 的数据
+        result = await session.execute(
+            text("""
+                WITH vol_24h AS (
+                    SELECT market_id, SUM(amount * price) AS vol
+                    FROM trades_raw
+                    WHERE timestamp > NOW() - INTERVAL '24 hours'
+                      AND (CAST(:mids AS text[]) IS NULL OR market_id = ANY(:mids))
+                    GROUP BY market_id
+                )
+                SELECT DISTINCT t.market_id, COALESCE(v.vol, 0) AS vol_24h
+                FROM trades_raw t
+                JOIN markets m ON t.market_id = m.id
+                LEFT JOIN vol_24h v ON t.market_id = v.market_id
+                WHERE t.timestamp > NOW() - INTERVAL '10 minutes'
+                  AND (CAST(:mids AS text[]) IS NULL OR t.market_id = ANY(:mids))
+                  AND (m.status IS NULL OR m.status != 'closed')
+                  AND COALESCE(v.vol, 0) >= :min_vol
+            """),
+            {"min_vol": min_24h_vol, "mids": market_ids},
+        )
+        # Build dict: market_id → vol_24h
+        active_markets = {row[0]: row[1] for row in result.fetchall()}
 
     if not active_markets:
         return 0
 
-    computed_count = 0
-    now = datetime.now(timezone.utc)
+    market_ids = list(active_markets)
+
+    # 2a. 批量读取：VW 求和、市场价格、历史快照、上一次信号方向
+    # 方向必须在 upsert 之前读，否则读到的是本轮刚写入的方向
+    if book is not None:
+        vw_sums = {mid: book.sums(mid, now, window_days) for mid in market_ids}
+    else:
+        vw_sums = await _fetch_vw_sums(session, market_ids, window_days)
+    market_prices = await _fetch_market_prices(session, market_ids)
+    rings = vw_snapshot_rings()
+    if rings is not None and rings.ready:
+        history = {mid: rings.history(mid, now) for mid in market_ids}
+    else:
+        rings = None
+        history = await _fetch_snapshot_history(session, market_ids, now)
+    prev_directions = await _fetch_signal_directions(session, market_ids)
+
+    metrics_rows: list[dict] = []
+    snapshot_rows: list[dict] = []
+    pending_alerts: list[tuple] = []
 
     for market_id, vol_24h in active_markets.items():
         try:
-            # 使用参数化查询避免 SQL 注入：:days * INTERVAL '1 day' 支持绑定参数
-            trade_result = await session.execute(
-                text("""
-                    SELECT outcome, amount, price
-                    FROM trades_raw
-                    WHERE market_id = :mid
-                      AND timestamp > NOW() - (:days * INTERVAL '1 day')
-                """),
-                {"mid": market_id, "days": int(window_days)},
-            )
-            trades = [(row[0], row[1], row[2]) for row in trade_result.fetchall()]
-
-            vw_data = _calc_vw_prices(trades)
+            vw_data = _calc_vw_from_sums(vw_sums.get(market_id, []))
             if vw_data is None:
                 continue
 
-            # 2b. 获取市场价格
-            yes_market_price = await _get_market_price(session, market_id)
+            # 2b. 市场价格
+            yes_market_price = market_prices.get(market_id)
             if yes_market_price is None:
                 continue
 
@@ -290,21 +484,9 @@ async def compute_vw_metrics(session: AsyncSession, redis: Redis, config: dict)
                 uai_extreme,
             )
 
-            # Velocity（查询历史快照）
-            past_5m = await _get_previous_snapshot(session, market_id, 5)
-            past_15m = await _get_previous_snapshot(session, market_id, 15)
-            past_1h = await _get_previous_snapshot(session, market_id, 60)
-
-            # 统计近24h快照数量判断是否预热完毕
-            snapshot_count = await session.execute(
-                text("""
-                    SELECT COUNT(*) FROM market_vw_snapshots
-                    WHERE market_id = :mid
-                      AND snapshot_at >= NOW() - INTERVAL '24 hours'
-                """),
-                {"mid": market_id},
-            )
-            warmup_done = snapshot_count.scalar() >= warmup_snapshots
+            # Velocity（历史快照）；近24h快照数量判断是否预热完毕
+            past_5m, past_15m, past_1h, snapshot_count = history.get(market_id, (None, None, None, 0))
+            warmup_done = (snapshot_count or 0) >= warmup_snapshots
 
             velocity_5m = _calc_velocity(divergence, past_5m, 5) if warmup_done else None
             velocity_15m = _calc_velocity(divergence, past_15m, 15) if warmup_done else None
@@ -325,151 +507,200 @@ async def compute_vw_metrics(session: AsyncSession, redis: Redis, config: dict)
             vol_24h_dec = Decimal(str(vol_24h))
             status = "active" if vol_24h_dec >= min_24h_vol else "dormant"
 
-            # 2e. UPSERT market_vw_metrics
-            await session.execute(
-                text("""
-                    INSERT INTO market_vw_metrics (
-                        market_id, total_volume_usd, yes_volume_usd, no_volume_usd,
-                        yes_vw_price, no_vw_price,
-                        yes_market_price, no_market_price,
-                        vw_divergence, uai,
-                        vw_velocity_5m, vw_velocity_15m, vw_velocity_1h,
-                        signal_direction, signal_strength, status, computed_at
-                    ) VALUES (
-                        :mid, :tv, :yv, :nv,
-                        :yvp, :nvp,
-                        :ymp, :nmp,
-                        :div, :uai,
-                        :v5, :v15, :v1h,
-                        :sd, :ss, :st, :now
-                    )
-                    ON CONFLICT (market_id) DO UPDATE SET
-                        total_volume_usd = EXCLUDED.total_volume_usd,
-                        yes_volume_usd = EXCLUDED.yes_volume_usd,
-                        no_volume_usd = EXCLUDED.no_volume_usd,
-                        yes_vw_price = EXCLUDED.yes_vw_price,
-                        no_vw_price = EXCLUDED.no_vw_price,
-                        yes_market_price = EXCLUDED.yes_market_price,
-                        no_market_price = EXCLUDED.no_market_price,
-                        vw_divergence = EXCLUDED.vw_divergence,
-                        uai = EXCLUDED.uai,
-                        vw_velocity_5m = EXCLUDED.vw_velocity_5m,
-                        vw_velocity_15m = EXCLUDED.vw_velocity_15m,
-                        vw_velocity_1h = EXCLUDED.vw_velocity_1h,
-                        signal_direction = EXCLUDED.signal_direction,
-                        signal_strength = EXCLUDED.signal_strength,
-                        status = EXCLUDED.status,
-                        computed_at = EXCLUDED.computed_at
-                """),
-                {
-                    "mid": market_id,
-                    "tv": total_vol,
-                    "yv": vw_data["yes_volume_usd"],
-                    "nv": vw_data["no_volume_usd"],
-                    "yvp": vw_data["yes_vw_price"],
-                    "nvp": vw_data["no_vw_price"],
-                    "ymp": yes_market_price,
-                    "nmp": Decimal("1") - yes_market_price,
-                    "div": divergence,
-                    "uai": uai,
-                    "v5": velocity_5m,
-                    "v15": velocity_15m,
-                    "v1h": velocity_1h,
-                    "sd": signal_direction,
-                    "ss": signal_strength,
-                    "st": status,
-                    "now": now,
-                },
-            )
-
-            # 2f. INSERT snapshot
-            await session.execute(
-                text("""
-                    INSERT INTO market_vw_snapshots (
-                        market_id, vw_divergence, uai,
-                        yes_vw_price, no_vw_price,
-                        yes_market_price,
-                        total_volume_usd, snapshot_at
-                    ) VALUES (
-                        :mid, :div, :uai,
-                        :yvp, :nvp,
-                        :ymp,
-                        :tv, :now
-                    )
-                """),
-                {
-                    "mid": market_id,
-                    "div": divergence,
-                    "uai": uai,
-                    "yvp": vw_data["yes_vw_price"],
-                    "nvp": vw_data["no_vw_price"],
-                    "ymp": yes_market_price,
-                    "tv": total_vol,
-                    "now": now,
-                },
-            )
-
-            # 查询上一次信号方向（用于检测方向翻转）
-            prev_dir_result = await session.execute(
-                text("SELECT signal_direction FROM market_vw_metrics WHERE market_id = :mid"),
-                {"mid": market_id},
-            )
-            prev_dir_row = prev_dir_result.fetchone()
-            prev_direction = prev_dir_row[0] if prev_dir_row else None
+            metrics_rows.append({
+                "market_id": market_id,
+                "total_volume_usd": total_vol,
+                "yes_volume_usd": vw_data["yes_volume_usd"],
+                "no_volume_usd": vw_data["no_volume_usd"],
+                "yes_vw_price": vw_data["yes_vw_price"],
+                "no_vw_price": vw_data["no_vw_price"],
+                "yes_market_price": yes_market_price,
+                "no_market_price": Decimal("1") - yes_market_price,
+                "vw_divergence": divergence,
+                "uai": uai,
+                "vw_velocity_5m": velocity_5m,
+                "vw_velocity_15m": velocity_15m,
+                "vw_velocity_1h": velocity_1h,
+                "signal_direction": signal_direction,
+                "signal_strength": signal_strength,
+                "status": status,
+                "computed_at": now,
+            })
+            snapshot_rows.append({
+                "market_id": market_id,
+                "vw_divergence": divergence,
+                "uai": uai,
+                "yes_vw_price": vw_data["yes_vw_price"],
+                "no_vw_price": vw_data["no_vw_price"],
+                "yes_market_price": yes_market_price,
+                "total_volume_usd": total_vol,
+                "snapshot_at": now,
+            })
+
+            # 方向翻转检测
+            prev_direction = prev_directions.get(market_id)
             direction_changed = (
                 prev_direction is not None
                 and prev_direction != signal_direction
                 and signal_direction != "neutral"
             )
-
-            # 2g. 推送检查
-            should_push = False
             if (is_mutation or direction_changed) and status == "active":
-                last_alert = await _get_last_alert_time(redis, market_id)
-                if last_alert is None or (datetime.now(timezone.utc).timestamp() - last_alert) > cooldown_minutes * 60:
-                    should_push = True
-
-            if should_push:
-                payload = json.dumps({
-                    "market_id": market_id,
-                    "divergence": float(divergence),
-                    "velocity_5m": float(velocity_5m) if velocity_5m else None,
-                    "uai": float(uai) if uai else None,
-                    "signal_direction": signal_direction,
-                    "signal_strength": signal_strength,
-                    "is_mutation": is_mutation,
-                    "is_direction_change": direction_changed and not is_mutation,
-                })
-                await redis.rpush("vw_alert_queue", payload)
-                await _set_last_alert_time(redis, market_id)
-                logger.info(f"vw_mutation_pushed market={market_id} divergence={divergence}")
-
-            computed_count += 1
+                pending_alerts.append((
+                    market_id, divergence, velocity_5m, uai,
+                    signal_direction, signal_strength, is_mutation, direction_changed,
+                ))
 
         except Exception:
             logger.exception(f"vw_compute_failed market={market_id}")
             continue
 
-    return computed_count
+    if not metrics_rows:
+        return 0
+
+    # 2e. 批量 UPSERT market_vw_metrics + INSERT snapshots
+    await bulk_upsert(
+        session,
+        MarketVwMetrics,
+        metrics_rows,
+        index_elements=["market_id"],
+        update_columns=[c for c in metrics_rows[0] if c != "market_id"],
+    )
+    await session.execute(insert(MarketVwSnapshot), snapshot_rows)
+    if rings is not None:
+        rings.stage(session, snapshot_rows)
+
+    # 2f. 推送检查
+    for (
+        market_id, divergence, velocity_5m, uai,
+        signal_direction, signal_strength, is_mutation, direction_changed,
+    ) in pending_alerts:
+        try:
+            last_alert = await _get_last_alert_time(redis, market_id)
+            if last_alert is not None and (datetime.now(timezone.utc).timestamp() - last_alert) <= cooldown_minutes * 60:
+                continue
+            payload = json.dumps({
+                "market_id": market_id,
+                "divergence": float(divergence),
+                "velocity_5m": float(velocity_5m) if velocity_5m else None,
+                "uai": float(uai) if uai else None,
+                "signal_direction": signal_direction,
+                "signal_strength": signal_strength,
+                "is_mutation": is_mutation,
+                "is_direction_change": direction_changed and not is_mutation,
+            })
+            await redis.rpush("vw_alert_queue", payload)
+            await _set_last_alert_time(redis, market_id)
+            logger.info(f"vw_mutation_pushed market={market_id} divergence={divergence}")
+        except Exception:
+            logger.exception(f"vw_alert_push_failed market={market_id}")
+
+    return len(metrics_rows)
+
+
+# 快照降采样分辨率（秒）
+ROLLUP_15M = 900
+ROLLUP_1H = 3600
+
+# :res 写入 integer 列，:width 参与 EPOCH（double precision）运算；
+# 同一参数不能两处复用，否则 asyncpg 推断出冲突类型（AmbiguousParameterError）。
+
+# 合并到已存在的桶：min/max 取极值，last 取 last_at 较新的一侧，计数相加
+_ROLLUP_MERGE = """
+    ON CONFLICT (market_id, resolution_seconds, bucket_at) DO UPDATE SET
+        min_divergence = LEAST(r.min_divergence, EXCLUDED.min_divergence),
+        max_divergence = GREATEST(r.max_divergence, EXCLUDED.max_divergence),
+        last_divergence = CASE WHEN EXCLUDED.last_at >= r.last_at
+                               THEN EXCLUDED.last_divergence ELSE r.last_divergence END,
+        last_yes_market_price = CASE WHEN EXCLUDED.last_at >= r.last_at
+                                     THEN EXCLUDED.last_yes_market_price ELSE r.last_yes_market_price END,
+        last_at = GREATEST(r.last_at, EXCLUDED.last_at),
+        snapshot_count = r.snapshot_count + EXCLUDED.snapshot_count
+"""
+
+
+def _floor_to(ts: datetime, seconds: int) -> datetime:
+    return datetime.fromtimestamp(int(ts.timestamp()) // seconds * seconds, tz=timezone.utc)
 
 
 async def prune_vw_snapshots(session: AsyncSession, config: dict) -> int:
-    """清理过期快照，执行三级降采样"""
-    retention_days = config.get("snapshot_retention_days", 7)
-    # TODO: implement hourly/daily aggregation in future enhancement
-    deleted = 0
+    """
+    快照降采样与分级保留，返回被压缩或删除的行数：
+      1. 超过 rollup_raw_after_hours（默认 24h）的原始快照 → 15 分钟桶；
+      2. 超过 snapshot_retention_days（默认 7 天）的 15 分钟桶 → 1 小时桶；
+      3. 超过 hourly_retention_days（默认 30 天）的 1 小时桶删除。
+    每个桶保存 min/max/last divergence 与最后一次 YES 价格。
+    原始快照保留 24h，velocity 与预热计数不受影响。
+    """
+    raw_hours = int(config.get("rollup_raw_after_hours", 24))
+    retention_days = int(config.get("snapshot_retention_days", 7))
+    hourly_days = int(config.get("hourly_retention_days", 30))
+    now = datetime.now(timezone.utc)
+    compacted = 0
 
-    # 使用参数化查询删除超过保留期的原始快照
+    # 1. 原始快照 → 15m（DELETE ... RETURNING 与 INSERT 在同一语句内，原子）
     result = await session.execute(
         text("""
-            DELETE FROM market_vw_snapshots
-            WHERE snapshot_at < NOW() - (:days * INTERVAL '1 day')
-        """),
-        {"days": int(retention_days)},
+            WITH moved AS (
+                DELETE FROM market_vw_snapshots
+                WHERE snapshot_at < :cutoff
+                RETURNING market_id, snapshot_at, vw_divergence, yes_market_price
+            )
+            INSERT INTO market_vw_snapshot_rollups AS r (
+                market_id, resolution_seconds, bucket_at,
+                min_divergence, max_divergence, last_divergence,
+                last_yes_market_price, last_at, snapshot_count
+            )
+            SELECT market_id, CAST(:res AS integer),
+                   to_timestamp(FLOOR(EXTRACT(EPOCH FROM snapshot_at) / :width) * :width) AS bucket_at,
+                   MIN(vw_divergence), MAX(vw_divergence),
+                   (ARRAY_AGG(vw_divergence ORDER BY snapshot_at DESC))[1],
+                   (ARRAY_AGG(yes_market_price ORDER BY snapshot_at DESC))[1],
+                   MAX(snapshot_at), COUNT(*)
+            FROM moved
+            GROUP BY market_id, bucket_at
+        """ + _ROLLUP_MERGE),
+        {"cutoff": _floor_to(now - timedelta(hours=raw_hours), ROLLUP_15M), "res": ROLLUP_15M, "width": float(ROLLUP_15M)},
     )
-    deleted += result.rowcount
+    compacted += result.rowcount
 
-    # 注意：小时/天级聚合可以后续版本实现
-    # 第一版先清理原始数据，聚合逻辑作为增强
+    # 2. 15m → 1h
+    result = await session.execute(
+        text("""
+            WITH moved AS (
+                DELETE FROM market_vw_snapshot_rollups
+                WHERE resolution_seconds = :src AND bucket_at < :cutoff
+                RETURNING market_id, bucket_at, min_divergence, max_divergence,
+                          last_divergence, last_yes_market_price, last_at, snapshot_count
+            )
+            INSERT INTO market_vw_snapshot_rollups AS r (
+                market_id, resolution_seconds, bucket_at,
+                min_divergence, max_divergence, last_divergence,
+                last_yes_market_price, last_at, snapshot_count
+            )
+            SELECT market_id, CAST(:res AS integer),
+                   to_timestamp(FLOOR(EXTRACT(EPOCH FROM bucket_at) / :width) * :width) AS hour_at,
+                   MIN(min_divergence), MAX(max_divergence),
+                   (ARRAY_AGG(last_divergence ORDER BY last_at DESC))[1],
+                   (ARRAY_AGG(last_yes_market_price ORDER BY last_at DESC))[1],
+                   MAX(last_at), SUM(snapshot_count)
+            FROM moved
+            GROUP BY market_id, hour_at
+        """ + _ROLLUP_MERGE),
+        {
+            "cutoff": _floor_to(now - timedelta(days=retention_days), ROLLUP_1H),
+            "src": ROLLUP_15M, "res": ROLLUP_1H, "width": float(ROLLUP_1H),
+        },
+    )
+    compacted += result.rowcount
+
+    # 3. 过期小时桶
+    result = await session.execute(
+        text("""
+            DELETE FROM market_vw_snapshot_rollups
+            WHERE resolution_seconds = :res AND bucket_at < NOW() - (:days * INTERVAL '1 day')
+        """),
+        {"res": ROLLUP_1H, "days": hourly_days},
+    )
+    compacted += result.rowcount
 
-    return deleted
+    return compacted
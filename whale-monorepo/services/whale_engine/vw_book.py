@@ -0,0 +1,336 @@
+"""Streaming per-market accumulators for the VW job.
+
+compute_vw_metrics used to re-aggregate computation_window_days of trades_raw
+for every active market on every run, plus a 24h scan to find the active
+markets. VwBook keeps, per market and per outcome, time buckets of notional
+Σ(amount × price) and token volume Σ(amount), fed by the unified ingest loops
+as they insert trades and rebuilt from trades_raw at startup. expire() drops
+buckets that left the window, so a run sums a few hundred buckets instead of
+rescanning the table, and can afford to run every minute.
+
+Windows are bucket-aligned: the oldest bucket is counted whole, so a window may
+reach up to VW_BOOK_BUCKET_SECONDS further back than the SQL path. Only the
+unified process feeds the book; anywhere else (the Celery workers) it is never
+loaded and compute_vw_metrics falls back to SQL. Trades recorded while load()
+runs are replayed once it finishes, so a trade committed just before the load
+query may be counted twice; the periodic rebuild (VW_BOOK_REBUILD_SECONDS)
+bounds that drift.
+
+VwSnapshotRings is the snapshot side: a fixed-size ring of (snapshot_at,
+vw_divergence) per market, seeded from market_vw_snapshots when the VW worker
+starts and appended as compute_vw_metrics inserts snapshots (staged on the
+session, applied on commit). The 5m/15m/1h velocity baselines and the 24h
+warm-up count are binary searches over the ring instead of a snapshot query.
+VW_SNAPSHOT_RING_SIZE must cover the 1h lookback at the recompute rate; past
+that the ring still remembers the last snapshot it evicted. A baseline older
+than 1h + VW_BASELINE_SLACK_SECONDS is not used (None), as in the SQL path.
+"""
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+
+logger = logging.getLogger("whale_engine.vw_book")
+
+VW_BOOK_ENABLED = os.getenv("VW_BOOK_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+VW_BOOK_BUCKET_SECONDS = int(os.getenv("VW_BOOK_BUCKET_SECONDS", "3600"))
+VW_BOOK_REBUILD_SECONDS = float(os.getenv("VW_BOOK_REBUILD_SECONDS", "86400"))
+VW_SNAPSHOT_RING_ENABLED = os.getenv("VW_SNAPSHOT_RING_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+VW_SNAPSHOT_RING_SIZE = int(os.getenv("VW_SNAPSHOT_RING_SIZE", "512"))
+VW_BASELINE_SLACK_SECONDS = float(os.getenv("VW_BASELINE_SLACK_SECONDS", "300"))
+
+_STAGED_KEY = "vw_snapshot_ring_staged"
+
+
+def _epoch(ts: datetime) -> float:
+  if ts.tzinfo is None:
+    ts = ts.replace(tzinfo=timezone.utc)
+  return ts.timestamp()
+
+
+class VwBook:
+  """market_id → {bucket → {outcome → [Σ(amount × price), Σ(amount)]}},
+  plus the time of each market's latest trade."""
+
+  def __init__(self, bucket_seconds: int = VW_BOOK_BUCKET_SECONDS) -> None:
+    self.bucket_seconds = max(1, int(bucket_seconds))
+    self.window_days = 0
+    self.ready = False
+    self.loaded_at = 0.0
+    self._buckets: dict[str, dict[int, dict[str | None, list[Decimal]]]] = {}
+    self._last_trade: dict[str, float] = {}
+    self._pending: list[tuple] | None = None
+
+  def __len__(self) -> int:
+    return len(self._buckets)
+
+  def _bucket(self, epoch: float) -> int:
+    return int(epoch // self.bucket_seconds)
+
+  def _add(self, market_id: str, outcome, turnover: Decimal, tokens: Decimal, bucket: int, last_epoch: float) -> None:
+    sums = self._buckets.setdefault(market_id, {}).setdefault(bucket, {}).get(outcome)
+    if sums is None:
+      self._buckets[market_id][bucket][outcome] = [turnover, tokens]
+    else:
+      sums[0] += turnover
+      sums[1] += tokens
+    if last_epoch > self._last_trade.get(market_id, 0.0):
+      self._last_trade[market_id] = last_epoch
+
+  def record(self, market_id: str, outcome, amount, price, ts: datetime) -> None:
+    """Add one inserted trade; a no-op until the book has been loaded."""
+    if self._pending is not None:
+      self._pending.append((market_id, outcome, amount, price, ts))
+      return
+    if not self.ready or not market_id:
+      return
+    amount = Decimal(str(amount or 0))
+    price = Decimal(str(price or 0))
+    epoch = _epoch(ts)
+    if epoch < time.time() - self.window_days * 86400:
+      return
+    self._add(market_id, outcome, amount * price, amount, self._bucket(epoch), epoch)
+
+  def record_many(self, trades) -> None:
+    """trades: iterable of (market_id, outcome, amount, price, timestamp)."""
+    for market_id, outcome, amount, price, ts in trades:
+      self.record(market_id, outcome, amount, price, ts)
+
+  async def load(self, session: AsyncSession, window_days: int) -> int:
+    """Rebuild every market's buckets from trades_raw; returns the market count."""
+    self._pending = []
+    try:
+      result = await session.execute(
+        text("""
+          SELECT market_id, outcome,
+                 FLOOR(EXTRACT(EPOCH FROM timestamp) / :bucket) AS bucket,
+                 SUM(amount * price), SUM(amount), MAX(timestamp)
+          FROM trades_raw
+          WHERE timestamp > NOW() - (:days * INTERVAL '1 day')
+          GROUP BY market_id, outcome, bucket
+        """),
+        {"bucket": self.bucket_seconds, "days": int(window_days)},
+      )
+      rows = result.fetchall()
+    except Exception:
+      self._pending = None
+      raise
+    self._buckets.clear()
+    self._last_trade.clear()
+    for market_id, outcome, bucket, turnover, tokens, last_ts in rows:
+      self._add(market_id, outcome, turnover or Decimal("0"), tokens or Decimal("0"), int(bucket), _epoch(last_ts))
+    pending, self._pending = self._pending, None
+    self.window_days = int(window_days)
+    self.ready = True
+    self.loaded_at = time.time()
+    self.record_many(pending)
+    return len(self._buckets)
+
+  def expire(self, now: datetime) -> int:
+    """Drop buckets that left the window; returns the number dropped."""
+    cutoff = self._bucket(_epoch(now) - self.window_days * 86400)
+    dropped = 0
+    for market_id in list(self._buckets):
+      buckets = self._buckets[market_id]
+      for bucket in [b for b in buckets if b < cutoff]:
+        del buckets[bucket]
+        dropped += 1
+      if not buckets:
+        del self._buckets[market_id]
+        self._last_trade.pop(market_id, None)
+    return dropped
+
+  def sums(self, market_id: str, now: datetime, window_days: int) -> list[tuple]:
+    """[(outcome, Σ(amount × price), Σ(amount)), ...] over the window, in the
+    shape _calc_vw_from_sums takes."""
+    cutoff = self._bucket(_epoch(now) - window_days * 86400)
+    totals: dict[str | None, list[Decimal]] = {}
+    for bucket, outcomes in self._buckets.get(market_id, {}).items():
+      if bucket < cutoff:
+        continue
+      for outcome, (turnover, tokens) in outcomes.items():
+        acc = totals.get(outcome)
+        if acc is None:
+          totals[outcome] = [turnover, tokens]
+        else:
+          acc[0] += turnover
+          acc[1] += tokens
+    return [(outcome, turnover, tokens) for outcome, (turnover, tokens) in totals.items()]
+
+  def active_markets(self, now: datetime, min_volume: Decimal, recent_seconds: int = 600) -> dict[str, Decimal]:
+    """market_id → 24h notional, for markets traded in the last recent_seconds
+    whose 24h notional reaches min_volume."""
+    now_epoch = _epoch(now)
+    day_cutoff = self._bucket(now_epoch - 86400)
+    active: dict[str, Decimal] = {}
+    for market_id, last in self._last_trade.items():
+      if last <= now_epoch - recent_seconds:
+        continue
+      vol = Decimal("0")
+      for bucket, outcomes in self._buckets.get(market_id, {}).items():
+        if bucket >= day_cutoff:
+          for turnover, _ in outcomes.values():
+            vol += turnover
+      if vol >= min_volume:
+        active[market_id] = vol
+    return active
+
+  def clear(self) -> None:
+    self._buckets.clear()
+    self._last_trade.clear()
+    self._pending = None
+    self.ready = False
+    self.window_days = 0
+
+
+class SnapshotRing:
+  """One market's last `capacity` snapshots as (epoch, divergence), oldest
+  first, plus the newest one evicted."""
+
+  __slots__ = ("_ts", "_div", "_head", "_size", "_evicted")
+
+  def __init__(self, capacity: int) -> None:
+    self._ts = [0.0] * capacity
+    self._div: list = [None] * capacity
+    self._head = 0
+    self._size = 0
+    self._evicted: tuple[float, Decimal | None] | None = None
+
+  def __len__(self) -> int:
+    return self._size
+
+  def _at(self, k: int) -> int:
+    return (self._head + k) % len(self._ts)
+
+  def append(self, epoch: float, divergence) -> None:
+    """Snapshots arrive in time order; an older one than the newest is dropped."""
+    if self._size and epoch < self._ts[self._at(self._size - 1)]:
+      return
+    cap = len(self._ts)
+    if self._size < cap:
+      i = self._at(self._size)
+      self._size += 1
+    else:
+      i = self._head
+      self._evicted = (self._ts[i], self._div[i])
+      self._head = (self._head + 1) % cap
+    self._ts[i] = epoch
+    self._div[i] = divergence
+
+  def _bisect(self, epoch: float, right: bool) -> int:
+    """Entries with ts <= epoch (right) or ts < epoch (left)."""
+    lo, hi = 0, self._size
+    while lo < hi:
+      mid = (lo + hi) // 2
+      ts = self._ts[self._at(mid)]
+      if ts < epoch or (right and ts == epoch):
+        lo = mid + 1
+      else:
+        hi = mid
+    return lo
+
+  def latest_at_or_before(self, epoch: float, floor: float = float("-inf")):
+    k = self._bisect(epoch, right=True)
+    if k:
+      i = self._at(k - 1)
+      return self._div[i] if self._ts[i] >= floor else None
+    if self._evicted is not None and floor <= self._evicted[0] <= epoch:
+      return self._evicted[1]
+    return None
+
+  def count_since(self, epoch: float) -> int:
+    return self._size - self._bisect(epoch, right=False)
+
+
+class VwSnapshotRings:
+  """market_id → SnapshotRing."""
+
+  def __init__(self, capacity: int = VW_SNAPSHOT_RING_SIZE) -> None:
+    self.capacity = max(1, int(capacity))
+    self.ready = False
+    self._rings: dict[str, SnapshotRing] = {}
+
+  def __len__(self) -> int:
+    return len(self._rings)
+
+  def append(self, market_id: str, at: datetime, divergence) -> None:
+    ring = self._rings.get(market_id)
+    if ring is None:
+      ring = self._rings[market_id] = SnapshotRing(self.capacity)
+    ring.append(_epoch(at), divergence)
+
+  async def load(self, session: AsyncSession) -> int:
+    """Seed each market's ring with its newest capacity + 1 snapshots (the
+    extra one becomes the evicted baseline); returns the market count."""
+    result = await session.execute(
+      text("""
+        SELECT market_id, snapshot_at, vw_divergence FROM (
+          SELECT market_id, snapshot_at, vw_divergence,
+                 ROW_NUMBER() OVER (PARTITION BY market_id ORDER BY snapshot_at DESC) AS rn
+          FROM market_vw_snapshots
+        ) s
+        WHERE rn <= :n
+        ORDER BY market_id, snapshot_at
+      """),
+      {"n": self.capacity + 1},
+    )
+    self._rings.clear()
+    for market_id, at, divergence in result.fetchall():
+      self.append(market_id, at, divergence)
+    self.ready = True
+    return len(self._rings)
+
+  def history(self, market_id: str, now: datetime) -> tuple:
+    """(past_5m, past_15m, past_1h, count_24h), as _fetch_snapshot_history."""
+    ring = self._rings.get(market_id)
+    if ring is None:
+      return (None, None, None, 0)
+    now_epoch = _epoch(now)
+    floor = now_epoch - 3600 - VW_BASELINE_SLACK_SECONDS
+    return (
+      ring.latest_at_or_before(now_epoch - 300, floor),
+      ring.latest_at_or_before(now_epoch - 900, floor),
+      ring.latest_at_or_before(now_epoch - 3600, floor),
+      ring.count_since(now_epoch - 86400),
+    )
+
+  def stage(self, session, rows: list[dict]) -> None:
+    """Append snapshot rows once the session that inserts them commits."""
+    session.info.setdefault(_STAGED_KEY, []).extend(
+      (row["market_id"], row["snapshot_at"], row["vw_divergence"]) for row in rows
+    )
+
+  def clear(self) -> None:
+    self._rings.clear()
+    self.ready = False
+
+
+_BOOK = VwBook()
+_RINGS = VwSnapshotRings()
+
+
+def vw_book() -> VwBook | None:
+  return _BOOK if VW_BOOK_ENABLED else None
+
+
+def vw_snapshot_rings() -> VwSnapshotRings | None:
+  return _RINGS if VW_SNAPSHOT_RING_ENABLED else None
+
+
+@event.listens_for(Session, "after_commit")
+def _append_staged(session: Session) -> None:
+  staged = session.info.pop(_STAGED_KEY, None)
+  if staged and _RINGS.ready:
+    for market_id, at, divergence in staged:
+      _RINGS.append(market_id, at, divergence)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_staged(session: Session, previous_transaction) -> None:
+  session.info.pop(_STAGED_KEY, None)
@@ -0,0 +1,86 @@
+"""Write-behind buffer for wallets.first_seen_at / last_seen_at.
+
+Every consumed trade used to upsert its wallet row before we knew whether the
+trade qualified, so the vast majority of WAL on whale_consume was no-op
+last_seen_at bumps. touch() records the sighting in memory; flush_wallet_seen()
+writes all buffered wallets in one multi-row upsert every
+WALLET_SEEN_FLUSH_SECONDS and at shutdown. last_seen_at is best-effort
+bookkeeping, so sightings are kept even if the consuming batch rolls back.
+"""
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.db import SessionLocal, insert
+from shared.models import Wallet
+
+
+logger = logging.getLogger("whale_engine.wallet_seen")
+
+WALLET_SEEN_FLUSH_SECONDS = float(os.getenv("WALLET_SEEN_FLUSH_SECONDS", "5"))
+
+
+class WalletSeenBuffer:
+  """address → [first_seen_at, last_seen_at] since the last flush."""
+
+  def __init__(self) -> None:
+    self._seen: dict[str, list[datetime]] = {}
+
+  def __len__(self) -> int:
+    return len(self._seen)
+
+  def touch(self, wallet: str, now: datetime) -> None:
+    entry = self._seen.get(wallet)
+    if entry is None:
+      self._seen[wallet] = [now, now]
+    elif now > entry[1]:
+      entry[1] = now
+    elif now < entry[0]:
+      entry[0] = now
+
+  def take(self) -> dict[str, list[datetime]]:
+    batch, self._seen = self._seen, {}
+    return batch
+
+  def merge(self, batch: dict[str, list[datetime]]) -> None:
+    """Put back a batch whose write failed, keeping the widest range."""
+    for wallet, (first, last) in batch.items():
+      self.touch(wallet, first)
+      self.touch(wallet, last)
+
+  @staticmethod
+  async def write(session: AsyncSession, batch: dict[str, list[datetime]]) -> int:
+    if not batch:
+      return 0
+    stmt = insert(Wallet).values(
+      [{"address": w, "first_seen_at": first, "last_seen_at": last} for w, (first, last) in batch.items()]
+    )
+    await session.execute(
+      stmt.on_conflict_do_update(index_elements=[Wallet.address], set_={"last_seen_at": stmt.excluded.last_seen_at})
+    )
+    return len(batch)
+
+
+_BUFFER = WalletSeenBuffer()
+
+
+def wallet_seen_buffer() -> WalletSeenBuffer:
+  return _BUFFER
+
+
+async def flush_wallet_seen() -> int:
+  """Write all buffered wallet sightings in one transaction; a failed write
+  is merged back for the next attempt."""
+  batch = _BUFFER.take()
+  if not batch:
+    return 0
+  try:
+    async with SessionLocal() as session:
+      n = await _BUFFER.write(session, batch)
+      await session.commit()
+  except Exception:
+    _BUFFER.merge(batch)
+    raise
+  return n
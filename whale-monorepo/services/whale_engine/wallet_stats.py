@@ -0,0 +1,325 @@
+"""Streaming per-wallet accumulators for incremental whale stats.
+
+recompute_whale_stats rescans the 7/30/90-day windows of trades_raw and
+whale_trade_history for every active wallet on each run. Only wallets whose
+inputs changed need rescoring, and their inputs are small: each window's
+metrics use a wallet's trade_cap most recent history rows inside the window,
+which is always a suffix of its trade_cap most recent rows overall. So the
+book keeps one bounded, time-ordered list per wallet for all three windows.
+
+WindowAccumulator folds those rows in one pass: counts, PnL and volume sums,
+Welford mean/variance, wins/losses, running peak/drawdown and per-market
+counts. History rows inserted by the consumer are staged on the session and
+recorded when it commits; a recorded wallet is dirty until the next
+incremental run. Rows also age out of the 7/30/90-day windows with no new
+trade, so each rescored wallet is filed in an hourly expiry bucket at its
+next window boundary and comes back dirty when that bucket is due.
+
+Hydrated rows are only kept until the next full recompute_whale_stats pass,
+which drops them (refresh) so the book cannot drift from whale_trade_history
+for long: any write it missed is re-read when the wallet is next dirty.
+
+The consumer records into the same book as the incremental run (one process
+in unified mode; one solo-pool Celery worker otherwise). Writers in other
+processes (PnL backfill scripts, a second worker replica) reach the
+recompute through a shared Redis set: publish_dirty_wallets pushes the
+wallets this process recorded, mark_wallets_dirty adds arbitrary ones, and
+drain_dirty_wallets pops them for the incremental run. A wallet dirtied
+elsewhere has rows this book never saw, so take_dirty drops it and the run
+re-hydrates it from the DB.
+
+In unified mode (REDIS_URL empty) the shared set is the engine's private
+InMemoryRedis, which a backfill script cannot reach: queue_backfilled_wallets
+says so, and the engine only sees the new rows on its next full sweep or
+restart.
+"""
+import logging
+import math
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+WHALE_STATS_BOOK_MAX_WALLETS = int(os.getenv("WHALE_STATS_BOOK_MAX_WALLETS", "200000"))
+WHALE_STATS_EXPIRY_BUCKET_SECONDS = int(os.getenv("WHALE_STATS_EXPIRY_BUCKET_SECONDS", "3600"))
+WHALE_STATS_DIRTY_KEY = os.getenv("WHALE_STATS_DIRTY_KEY", "whale_stats:dirty")
+WHALE_STATS_DIRTY_DRAIN_BATCH = int(os.getenv("WHALE_STATS_DIRTY_DRAIN_BATCH", "5000"))
+
+logger = logging.getLogger("whale_engine.wallet_stats")
+
+_STAGED_KEY = "whale_stats_book_staged"
+_RESCORED_KEY = "whale_stats_book_rescored"
+
+
+class HistoryEntry(NamedTuple):
+  """The whale_trade_history columns the window metrics read."""
+  trade_id: str
+  market_id: str
+  side: str
+  pnl: float
+  trade_usd: float
+  timestamp: datetime
+
+
+def _epoch(ts: datetime) -> float:
+  if ts.tzinfo is None:
+    ts = ts.replace(tzinfo=timezone.utc)
+  return ts.timestamp()
+
+
+class WindowAccumulator:
+  """One pass over a wallet's window rows, oldest first."""
+
+  __slots__ = (
+    "n", "mean", "m2", "pnl_sum", "volume", "wins", "win_sum", "losses", "loss_sum",
+    "cum", "peak", "max_drawdown", "entry_sum", "entry_n", "exit_sum", "exit_n",
+    "liquidity_sum", "liquidity_n", "market_counts",
+  )
+
+  def __init__(self) -> None:
+    self.n = 0
+    self.mean = 0.0
+    self.m2 = 0.0
+    self.pnl_sum = 0.0
+    self.volume = 0.0
+    self.wins = 0
+    self.win_sum = 0.0
+    self.losses = 0
+    self.loss_sum = 0.0
+    self.cum = 0.0
+    self.peak = -math.inf
+    self.max_drawdown = 0.0
+    self.entry_sum = 0.0
+    self.entry_n = 0
+    self.exit_sum = 0.0
+    self.exit_n = 0
+    self.liquidity_sum = 0.0
+    self.liquidity_n = 0
+    self.market_counts: dict[str, int] = {}
+
+  def add(self, pnl: float, trade_usd: float, side: str, market_id: str, percentile: float | None, market_volume: float) -> None:
+    self.n += 1
+    delta = pnl - self.mean
+    self.mean += delta / self.n
+    self.m2 += delta * (pnl - self.mean)
+    self.pnl_sum += pnl
+    self.volume += trade_usd
+    if pnl > 0:
+      self.wins += 1
+      self.win_sum += pnl
+    elif pnl < 0:
+      self.losses += 1
+      self.loss_sum += -pnl
+
+    self.cum += pnl
+    if self.cum > self.peak:
+      self.peak = self.cum
+    if self.peak - self.cum > self.max_drawdown:
+      self.max_drawdown = self.peak - self.cum
+
+    if percentile is None:
+      return  # no market price data for this trade
+    s = side.lower()
+    if s == "buy":
+      self.entry_sum += percentile
+      self.entry_n += 1
+    elif s == "sell":
+      self.exit_sum += percentile
+      self.exit_n += 1
+    self.liquidity_sum += trade_usd / market_volume if market_volume > 0 else 0.0
+    self.liquidity_n += 1
+    self.market_counts[market_id] = self.market_counts.get(market_id, 0) + 1
+
+  @property
+  def variance(self) -> float:
+    return self.m2 / self.n if self.n > 0 else 0.0
+
+
+class WalletStatsBook:
+  """wallet → its trade_cap most recent history rows (oldest first), plus a
+  dirty set and hourly expiry buckets."""
+
+  def __init__(self, max_wallets: int = WHALE_STATS_BOOK_MAX_WALLETS, bucket_seconds: int = WHALE_STATS_EXPIRY_BUCKET_SECONDS) -> None:
+    self.max_wallets = max(1, int(max_wallets))
+    self.bucket_seconds = max(1, int(bucket_seconds))
+    self.trade_cap = 0
+    self._rows: OrderedDict[str, list[HistoryEntry]] = OrderedDict()
+    self._dirty: set[str] = set()
+    self._unpublished: set[str] = set()
+    self._expiry: dict[int, set[str]] = {}
+
+  def __len__(self) -> int:
+    return len(self._rows)
+
+  @property
+  def dirty_count(self) -> int:
+    return len(self._dirty)
+
+  def configure(self, trade_cap: int) -> None:
+    if int(trade_cap) != self.trade_cap:
+      self._rows.clear()
+      self.trade_cap = int(trade_cap)
+
+  def has(self, wallet: str) -> bool:
+    return wallet in self._rows
+
+  def rows(self, wallet: str) -> list[HistoryEntry]:
+    return self._rows.get(wallet, [])
+
+  def load(self, wallet: str, entries: list[HistoryEntry]) -> None:
+    """Replace a wallet's rows with the committed DB view (any order)."""
+    rows = sorted(entries, key=lambda e: e.timestamp)
+    if self.trade_cap > 0:
+      rows = rows[-self.trade_cap:]
+    self._rows[wallet] = rows
+    self._rows.move_to_end(wallet)
+    while len(self._rows) > self.max_wallets:
+      self._rows.popitem(last=False)
+
+  def record(self, wallet: str, entry: HistoryEntry) -> None:
+    self._dirty.add(wallet)
+    self._unpublished.add(wallet)
+    rows = self._rows.get(wallet)
+    if rows is None:
+      return  # not hydrated; the next run loads it from the DB
+    if any(r.trade_id == entry.trade_id for r in rows):
+      return
+    i = len(rows)
+    while i > 0 and rows[i - 1].timestamp > entry.timestamp:
+      i -= 1
+    rows.insert(i, entry)
+    if self.trade_cap > 0 and len(rows) > self.trade_cap:
+      del rows[: len(rows) - self.trade_cap]
+
+  def mark_dirty(self, wallets) -> None:
+    self._dirty.update(wallets)
+
+  def take_unpublished(self) -> set[str]:
+    unpublished, self._unpublished = self._unpublished, set()
+    return unpublished
+
+  def take_dirty(self, now: datetime, shared=()) -> set[str]:
+    """Drain the dirty set plus every wallet whose expiry bucket is due.
+
+    shared holds wallets dirtied by other processes; they lose their cached
+    rows (even if also dirtied here) so the caller re-hydrates them."""
+    for wallet in shared:
+      self._rows.pop(wallet, None)
+      self._dirty.add(wallet)
+    due = int(_epoch(now) // self.bucket_seconds)
+    for bucket in [b for b in self._expiry if b <= due]:
+      self._dirty |= self._expiry.pop(bucket)
+    dirty, self._dirty = self._dirty, set()
+    return dirty
+
+  def schedule_expiry(self, wallet: str, now: datetime, windows: tuple[float, ...]) -> None:
+    """File wallet under the bucket where its next row leaves a window."""
+    now_ts = _epoch(now)
+    upcoming = [
+      _epoch(r.timestamp) + w
+      for r in self._rows.get(wallet, ())
+      for w in windows
+      if _epoch(r.timestamp) + w > now_ts
+    ]
+    if upcoming:
+      self._expiry.setdefault(int(min(upcoming) // self.bucket_seconds) + 1, set()).add(wallet)
+
+  def refresh(self) -> None:
+    """Drop every hydrated wallet's rows; dirty and expiry state is kept and
+    the next incremental run re-reads the wallets it needs from the DB."""
+    self._rows.clear()
+
+  def clear(self) -> None:
+    self._rows.clear()
+    self._dirty.clear()
+    self._unpublished.clear()
+    self._expiry.clear()
+
+
+_BOOK = WalletStatsBook()
+
+
+def wallet_stats_book() -> WalletStatsBook:
+  return _BOOK
+
+
+async def publish_dirty_wallets(redis) -> int:
+  """Push the wallets recorded in this process to the shared dirty set."""
+  wallets = _BOOK.take_unpublished()
+  if not wallets:
+    return 0
+  try:
+    await redis.sadd(WHALE_STATS_DIRTY_KEY, *wallets)
+  except Exception:
+    _BOOK._unpublished |= wallets
+    raise
+  return len(wallets)
+
+
+async def mark_wallets_dirty(redis, wallets) -> int:
+  """Queue wallets whose history changed outside the consumer for rescoring."""
+  wallets = {w for w in wallets if w}
+  if not wallets:
+    return 0
+  await redis.sadd(WHALE_STATS_DIRTY_KEY, *wallets)
+  return len(wallets)
+
+
+async def queue_backfilled_wallets(wallets) -> int:
+  """mark_wallets_dirty for backfill scripts. Without REDIS_URL the marks
+  would land in the script's own InMemoryRedis and be lost, so nothing is
+  queued and the running engine picks the wallets up on its next full sweep
+  (WHALE_RECOMPUTE_SECONDS) or restart."""
+  from shared.async_utils import get_redis
+  from shared.config import settings
+
+  if not settings.redis_url:
+    logger.warning(
+      "wallet_stats_dirty_marks_skipped wallets=%s reason=no_redis_url "
+      "(unified mode: rescored on the next full sweep or restart)",
+      len(wallets),
+    )
+    return 0
+  return await mark_wallets_dirty(await get_redis(), wallets)
+
+
+async def drain_dirty_wallets(redis) -> set[str]:
+  """Pop the shared dirty set. SPOP is atomic, so concurrent drainers never
+  get the same wallet and a SADD racing the drain is kept for the next one."""
+  drained: set[str] = set()
+  batch = max(1, WHALE_STATS_DIRTY_DRAIN_BATCH)
+  while True:
+    popped = await redis.spop(WHALE_STATS_DIRTY_KEY, batch) or []
+    drained.update(popped)
+    if len(popped) < batch:
+      return drained
+
+
+def stage_history(session, wallet: str, entry: HistoryEntry) -> None:
+  session.info.setdefault(_STAGED_KEY, []).append((wallet, entry))
+
+
+def stage_rescored(session, wallets) -> None:
+  """Wallets rescored in this session go back to dirty if it rolls back."""
+  session.info.setdefault(_RESCORED_KEY, set()).update(wallets)
+
+
+@event.listens_for(Session, "after_commit")
+def _record_staged(session: Session) -> None:
+  staged = session.info.pop(_STAGED_KEY, None)
+  if staged:
+    for wallet, entry in staged:
+      _BOOK.record(wallet, entry)
+  session.info.pop(_RESCORED_KEY, None)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_staged(session: Session, previous_transaction) -> None:
+  session.info.pop(_STAGED_KEY, None)
+  rescored = session.info.pop(_RESCORED_KEY, None)
+  if rescored:
+    _BOOK.mark_dirty(rescored)
@@ -7,8 +7,13 @@ import ssl
 from celery import Celery
 from redis.asyncio import Redis
 
-from services.whale_engine.engine import process_trade_id, recompute_whale_stats
-from services.whale_engine.vw import compute_vw_metrics, prune_vw_snapshots
+from services.whale_engine.engine import process_trade_batch, process_trade_id, recompute_whale_stats, recompute_whale_stats_incremental
+from services.whale_engine.positions import flush_position_book
+from services.whale_engine.score_table import publish_whale_scores, refresh_whale_scores
+from services.whale_engine.wallet_seen import flush_wallet_seen
+from services.whale_engine.wallet_stats import publish_dirty_wallets
+from services.whale_engine.vw import compute_dirty_vw_metrics, compute_vw_metrics, prune_vw_snapshots
+from services.whale_engine.vw_book import vw_snapshot_rings
 from shared.async_utils import BATCH_RPUSH_SCRIPT as _BATCH_RPUSH, get_or_create_event_loop, get_redis, run_async
 from shared.config import get_alert_config, settings
 from shared.db import SessionLocal
@@ -33,9 +38,11 @@ celery_app.conf.task_default_exchange = "whale_engine"
 celery_app.conf.task_default_routing_key = "whale_engine"
 celery_app.conf.beat_schedule = {
     "consume-trade-created": {"task": "services.whale_engine.consume_trade_created", "schedule": 1.0},
-    "recompute-whale-stats": {"task": "services.whale_engine.recompute_whale_stats", "schedule": 300.0},
+    "recompute-whale-stats-incremental": {"task": "services.whale_engine.recompute_whale_stats_incremental", "schedule": 15.0},
+    "recompute-whale-stats": {"task": "services.whale_engine.recompute_whale_stats", "schedule": 3600.0},
     "compute-vw-metrics": {"task": "services.whale_engine.compute_vw_metrics", "schedule": 3600.0},
-    "prune-vw-snapshots": {"task": "services.whale_engine.prune_vw_snapshots", "schedule": 86400.0},
+    "compute-vw-metrics-dirty": {"task": "services.whale_engine.compute_vw_metrics_dirty", "schedule": 5.0},
+    "prune-vw-snapshots": {"task": "services.whale_engine.prune_vw_snapshots", "schedule": 3600.0},
 }
 
 
@@ -55,26 +62,58 @@ async def _consume_once() -> int:
       break
     raws.append(nxt)
 
-  created_count = 0
+  trade_ids: list[str] = []
+  for payload in raws:
+    try:
+      trade_id = str(json.loads(payload).get("trade_id") or "")
+    except Exception:
+      logger.exception("failed_to_process_trade payload=%s", payload)
+      continue
+    if trade_id:
+      trade_ids.append(trade_id)
+
   # Collect event payloads so we can push them AFTER the DB commit (CR-C3).
   # Pushing before commit creates orphan queue messages if the transaction
   # rolls back — downstream services would process a trade that doesn't exist.
   events: list[dict] = []
+  # Recompute may have run in another worker: one GET per batch decides
+  # whether the in-process score table reloads.
+  try:
+    await refresh_whale_scores(redis)
+  except Exception:
+    logger.exception("refresh_whale_scores_failed")
   async with SessionLocal() as session:
-    for payload in raws:
-      try:
-        msg = json.loads(payload)
-        trade_id = str(msg.get("trade_id") or "")
-        logger.debug("processing_trade trade_id=%s", trade_id)
-        if not trade_id:
-          continue
-        created, event = await process_trade_id(session, redis, trade_id)
-        if created and event is not None:
-          created_count += 1
-          events.append(event)
-      except Exception:
-        logger.exception("failed_to_process_trade payload=%s", payload)
+    try:
+      events = await process_trade_batch(session, redis, trade_ids)
+    except Exception:
+      # Fall back to per-trade processing so one bad trade does not drop the batch.
+      logger.exception("process_trade_batch_failed size=%s — falling back to per-trade", len(trade_ids))
+      await session.rollback()
+      events = []
+      for trade_id in trade_ids:
+        try:
+          created, event = await process_trade_id(session, redis, trade_id)
+          if created and event is not None:
+            events.append(event)
+        except Exception:
+          logger.exception("failed_to_process_trade trade_id=%s", trade_id)
     await session.commit()
+  created_count = len(events)
+
+  # No long-lived loop under Celery: write the write-behind buffers back per batch.
+  try:
+    await flush_position_book()
+  except Exception:
+    logger.exception("flush_position_book_failed")
+  try:
+    await flush_wallet_seen()
+  except Exception:
+    logger.exception("flush_wallet_seen_failed")
+  # The incremental recompute may run in another worker process.
+  try:
+    await publish_dirty_wallets(redis)
+  except Exception:
+    logger.exception("publish_dirty_wallets_failed")
 
   # Push to Redis only AFTER the DB transaction committed successfully.
   if events:
@@ -101,6 +140,11 @@ async def _recompute_stats_once() -> int:
   async with SessionLocal() as session:
     n = await recompute_whale_stats(session)
     await session.commit()
+  if n > 0:
+    try:
+      await publish_whale_scores(await get_redis())
+    except Exception:
+      logger.exception("publish_whale_scores_failed")
   return int(n)
 
 
@@ -113,10 +157,39 @@ def recompute_whale_stats_task() -> int:
     return 0
 
 
+async def _recompute_stats_incremental_once() -> int:
+  redis = await get_redis()
+  async with SessionLocal() as session:
+    n = await recompute_whale_stats_incremental(session, redis=redis)
+    await session.commit()
+  if n > 0:
+    try:
+      await publish_whale_scores(redis)
+    except Exception:
+      logger.exception("publish_whale_scores_failed")
+  return int(n)
+
+
+@celery_app.task(name="services.whale_engine.recompute_whale_stats_incremental", autoretry_for=(Exception,), retry_backoff=True, retry_backoff_max=60, max_retries=3, retry_jitter=True)
+def recompute_whale_stats_incremental_task() -> int:
+  try:
+    return run_async(_recompute_stats_incremental_once())
+  except Exception:
+    logger.exception("recompute_whale_stats_incremental_failed")
+    return 0
+
+
 async def _compute_vw_once() -> int:
   """执行一轮 VW 指标计算"""
   config = get_alert_config().get("vw_analysis", {})
   redis = await get_redis()
+  rings = vw_snapshot_rings()
+  if rings is not None and not rings.ready:
+    try:
+      async with SessionLocal() as session:
+        await rings.load(session)
+    except Exception:
+      logger.exception("vw_snapshot_rings_load_failed")
   async with SessionLocal() as session:
     n = await compute_vw_metrics(session, redis, config)
     await session.commit()
@@ -132,6 +205,25 @@ def compute_vw_metrics_task() -> int:
     return 0
 
 
+async def _compute_vw_dirty_once() -> int:
+  """重算成交写入方标记的 dirty 市场（去抖）"""
+  config = get_alert_config().get("vw_analysis", {})
+  redis = await get_redis()
+  async with SessionLocal() as session:
+    n = await compute_dirty_vw_metrics(session, redis, config)
+    await session.commit()
+  return n
+
+
+@celery_app.task(name="services.whale_engine.compute_vw_metrics_dirty", autoretry_for=(Exception,), retry_backoff=True, retry_backoff_max=60, max_retries=3, retry_jitter=True)
+def compute_vw_metrics_dirty_task() -> int:
+  try:
+    return run_async(_compute_vw_dirty_once())
+  except Exception:
+    logger.exception("compute_vw_metrics_dirty_failed")
+    return 0
+
+
 async def _prune_vw_once() -> int:
   """执行一轮 VW 快照清理"""
   config = get_alert_config().get("vw_analysis", {})
@@ -55,6 +55,23 @@ async def get_redis() -> Redis:
     return _redis
 
 
+# ── VW dirty set ───────────────────────────────────────────
+
+# Trade writers (trade_ingest, the unified ingest loops) add the markets they
+# touched; the whale_engine VW job drains the set and recomputes only those.
+# Kept here so writers need not import the VW engine.
+VW_DIRTY_KEY = os.getenv("VW_DIRTY_KEY", "vw:dirty")
+
+
+async def mark_vw_dirty(redis: Redis, market_ids) -> int:
+    """Queue markets with new trades for the next dirty VW recompute."""
+    market_ids = {m for m in market_ids if m}
+    if not market_ids:
+        return 0
+    await redis.sadd(VW_DIRTY_KEY, *market_ids)
+    return len(market_ids)
+
+
 # ── Lua scripts ────────────────────────────────────────────
 
 BATCH_RPUSH_SCRIPT = """
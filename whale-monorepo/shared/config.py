@@ -1,6 +1,11 @@
+import logging
 import os
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from types import MappingProxyType
+from typing import Any, Mapping
 
 try:
   import yaml
@@ -262,13 +267,20 @@ def parse_duration(value: object, default_seconds: int) -> int:
     return int(default_seconds)
 
 
+def _alert_config_path() -> Path:
+  path = Path(os.getenv("ALERT_CONFIG_PATH", "alert_engine_config.yaml"))
+  if not path.is_absolute():
+    path = Path(os.getcwd()) / path
+  return path
+
+
 def get_alert_config() -> dict[str, Any]:
+  """Merged config dict, re-read whenever the file's mtime changes.
+
+  Hot paths use current_config() instead, which skips the stat."""
   global _ALERT_CONFIG_CACHE, _ALERT_CONFIG_MTIME
   base = _alert_config_defaults()
-  config_path = os.getenv("ALERT_CONFIG_PATH", "alert_engine_config.yaml")
-  path = Path(config_path)
-  if not path.is_absolute():
-    path = Path(os.getcwd()) / path
+  path = _alert_config_path()
   mtime = path.stat().st_mtime if path.exists() else None
   if _ALERT_CONFIG_CACHE is not None and mtime == _ALERT_CONFIG_MTIME:
     return _ALERT_CONFIG_CACHE
@@ -286,6 +298,159 @@ def get_alert_config() -> dict[str, Any]:
   return data
 
 
+@dataclass(frozen=True)
+class PlanLimits:
+  max_alerts_per_day: Any  # int or "unlimited"
+  alert_delay_minutes: int
+  min_whale_score: int
+
+
+@dataclass(frozen=True)
+class CompiledAlertConfig:
+  """Typed, pre-parsed view of alert_engine_config.yaml.
+
+  Built once per file version; ``raw`` is the merged dict for sections that
+  are not compiled. Never mutate — a reload builds a new instance.
+  """
+  raw: Mapping[str, Any]
+  mtime: float | None
+  micro_window_seconds: int
+  macro_window_seconds: int
+  spike_threshold: float
+  build_threshold: float
+  exit_threshold: float
+  # whale_engine qualification gates
+  high_confidence: float
+  low_confidence: float
+  high_usd: float
+  low_usd: float
+  # alert_engine gates
+  alert_min_score: int
+  alert_always_score: int
+  alert_min_trade_usd: float
+  cooldown_same_wallet_seconds: int
+  cooldown_different_wallet_seconds: int
+  cooldown_increased_position_seconds: int
+  plan_limits: Mapping[str, PlanLimits]
+
+
+def _plan_limits(plan_cfg: dict, name: str, default_delay_minutes: int, default_max_alerts, default_min_score: int) -> PlanLimits:
+  data = plan_cfg.get(name, {})
+  delay_seconds = parse_duration(data.get("alerts_delay"), default_delay_minutes * 60)
+  return PlanLimits(
+    max_alerts_per_day=data.get("max_alerts_per_day", default_max_alerts),
+    alert_delay_minutes=int(delay_seconds / 60),
+    min_whale_score=int(data.get("min_whale_score", default_min_score)),
+  )
+
+
+def compile_alert_config(data: dict[str, Any], mtime: float | None = None) -> CompiledAlertConfig:
+  alert_thresholds = data.get("alert_thresholds", {})
+  behavior_config = data.get("behavior_detection", {})
+  spike_build_exit = alert_thresholds.get("spike_build_exit_thresholds", {})
+  confidence = alert_thresholds.get("confidence_scores", {})
+  usd_thresholds = alert_thresholds.get("usd_thresholds", {})
+  cooldown = data.get("cooldown_settings", {})
+  plan_cfg = data.get("user_plans", {})
+
+  spike_threshold = behavior_config.get("spike_threshold")
+  if spike_threshold is None:
+    spike_threshold = spike_build_exit.get("whale_entry") or settings.whale_single_trade_usd_threshold
+  build_threshold = behavior_config.get("build_threshold")
+  if build_threshold is None:
+    build_threshold = spike_build_exit.get("whale_build") or settings.whale_build_usd_threshold
+  exit_threshold = behavior_config.get("exit_threshold")
+  if exit_threshold is None:
+    exit_threshold = spike_build_exit.get("whale_exit") or settings.whale_exit_usd_threshold
+
+  same_wallet_seconds = parse_duration(cooldown.get("same_wallet_same_market"), settings.alert_cooldown_seconds)
+  return CompiledAlertConfig(
+    raw=data,
+    mtime=mtime,
+    micro_window_seconds=parse_duration(alert_thresholds.get("micro_window"), 20 * 60),
+    macro_window_seconds=parse_duration(alert_thresholds.get("macro_window"), 6 * 60 * 60),
+    spike_threshold=float(spike_threshold),
+    build_threshold=float(build_threshold),
+    exit_threshold=float(exit_threshold),
+    high_confidence=float(confidence.get("high_confidence", 85)),
+    low_confidence=float(confidence.get("low_confidence", 70)),
+    high_usd=float(usd_thresholds.get("high", 400)),
+    low_usd=float(usd_thresholds.get("low", 2500)),
+    alert_min_score=int(confidence.get("medium_confidence", settings.alert_min_score)),
+    alert_always_score=int(confidence.get("high_confidence", settings.alert_always_score)),
+    alert_min_trade_usd=float(usd_thresholds.get("medium", settings.alert_min_trade_usd)),
+    cooldown_same_wallet_seconds=same_wallet_seconds,
+    cooldown_different_wallet_seconds=parse_duration(cooldown.get("same_market_different_wallet"), 0),
+    cooldown_increased_position_seconds=parse_duration(cooldown.get("increased_position"), same_wallet_seconds),
+    plan_limits=MappingProxyType({
+      "FREE": _plan_limits(plan_cfg, "free", 10, 3, 0),
+      "PRO": _plan_limits(plan_cfg, "pro", 0, "unlimited", 70),
+      "ELITE": _plan_limits(plan_cfg, "elite", 0, "unlimited", 80),
+    }),
+  )
+
+
+_COMPILED_ALERT_CONFIG: CompiledAlertConfig | None = None
+_ALERT_CONFIG_WATCHER: threading.Thread | None = None
+_ALERT_CONFIG_WATCHER_LOCK = threading.Lock()
+ALERT_CONFIG_WATCH_SECONDS = float(os.getenv("ALERT_CONFIG_WATCH_SECONDS", "5"))
+
+
+def reload_alert_config() -> CompiledAlertConfig:
+  """Stat the file and rebuild the compiled snapshot if it changed. The new
+  snapshot replaces the old one in a single assignment."""
+  global _COMPILED_ALERT_CONFIG
+  data = get_alert_config()
+  compiled = _COMPILED_ALERT_CONFIG
+  if compiled is None or compiled.raw is not data:
+    try:
+      compiled = compile_alert_config(data, _ALERT_CONFIG_MTIME)
+    except Exception:
+      if _COMPILED_ALERT_CONFIG is None:
+        raise
+      # Keep serving the last good snapshot; the bad file is retried on
+      # the next watcher tick.
+      logging.getLogger("shared.config").exception("alert_config_compile_failed")
+      return _COMPILED_ALERT_CONFIG
+    _COMPILED_ALERT_CONFIG = compiled
+  return compiled
+
+
+def _watch_alert_config() -> None:
+  while True:
+    time.sleep(ALERT_CONFIG_WATCH_SECONDS)
+    try:
+      reload_alert_config()
+    except Exception:
+      logging.getLogger("shared.config").exception("alert_config_reload_failed")
+
+
+def _start_alert_config_watcher() -> None:
+  global _ALERT_CONFIG_WATCHER
+  with _ALERT_CONFIG_WATCHER_LOCK:
+    if _ALERT_CONFIG_WATCHER is not None:
+      return
+    _ALERT_CONFIG_WATCHER = threading.Thread(target=_watch_alert_config, name="alert-config-watcher", daemon=True)
+    _ALERT_CONFIG_WATCHER.start()
+
+
+def current_config() -> CompiledAlertConfig:
+  """Current compiled alert config — no syscall, no parsing.
+
+  A daemon thread re-stats the file every ALERT_CONFIG_WATCH_SECONDS and
+  swaps in a new snapshot when it changed. With ALERT_CONFIG_WATCH_SECONDS=0
+  there is no watcher and every call stats the file like get_alert_config().
+  """
+  compiled = _COMPILED_ALERT_CONFIG
+  if ALERT_CONFIG_WATCH_SECONDS <= 0:
+    return reload_alert_config()
+  if _ALERT_CONFIG_WATCHER is None:
+    _start_alert_config_watcher()
+  if compiled is None:
+    compiled = reload_alert_config()
+  return compiled
+
+
 async def async_get_alert_config() -> dict[str, Any]:
   """Async variant — runs YAML parsing in a thread executor to avoid
   blocking the event loop on config reloads (PF-L3)."""
@@ -293,9 +458,9 @@ async def async_get_alert_config() -> dict[str, Any]:
   return await asyncio.get_event_loop().run_in_executor(None, get_alert_config)
 
 
-# Preload config at module import so the first request doesn't pay
-# the I/O + YAML parse cost (PF-L3).
-get_alert_config()
+settings = Settings()
 
 
-settings = Settings()
+# Preload config at module import so the first request doesn't pay
+# the I/O + YAML parse cost (PF-L3).
+reload_alert_config()
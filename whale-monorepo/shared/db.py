@@ -1,6 +1,10 @@
 from collections.abc import AsyncIterator
+from decimal import Decimal
 import os
+import sqlite3
+import uuid
 
+from sqlalchemy import Float, Numeric, column, select, table as sql_table, text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
@@ -42,3 +46,101 @@ def insert(table):
     return sqlite_insert(table)
   return pg_insert(table)
 
+
+BULK_UPSERT_COPY_ENABLED = os.getenv("BULK_UPSERT_COPY_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+BULK_UPSERT_COPY_MIN_ROWS = int(os.getenv("BULK_UPSERT_COPY_MIN_ROWS", "500"))
+
+
+def _max_bind_params(dialect_name: str) -> int:
+  # Postgres caps a statement at 32767 parameters; SQLite at 32766 since
+  # 3.32 and 999 before.
+  if dialect_name == "sqlite" and sqlite3.sqlite_version_info < (3, 32, 0):
+    return 990
+  return 32000
+
+
+def _on_conflict(stmt, target, index_elements, update_columns, returning):
+  if update_columns:
+    stmt = stmt.on_conflict_do_update(
+      index_elements=index_elements,
+      set_={c: stmt.excluded[c] for c in update_columns},
+    )
+  else:
+    stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+  if returning:
+    stmt = stmt.returning(target.c[returning])
+  return stmt
+
+
+def _copy_converter(col):
+  # asyncpg's binary COPY wants Decimal for NUMERIC; the rows carry floats.
+  if isinstance(col.type, Numeric) and not isinstance(col.type, Float):
+    return lambda v: v if v is None or isinstance(v, Decimal) else Decimal(str(v))
+  return None
+
+
+async def bulk_upsert(
+  session: AsyncSession,
+  model,
+  rows: list[dict],
+  *,
+  index_elements: list[str],
+  update_columns: list[str] | None = None,
+  returning: str | None = None,
+) -> list:
+  """INSERT rows (dicts with the same keys) into model's table; on conflict
+  on index_elements set update_columns from the new row, or do nothing.
+  Returns the returning column of the rows written, if asked.
+
+  On Postgres over asyncpg, batches of BULK_UPSERT_COPY_MIN_ROWS or more are
+  COPYed into a temp staging table and merged with one INSERT ... SELECT ...
+  ON CONFLICT: no bind parameters to exceed, one plan per table. Otherwise
+  (SQLite, small batches, BULK_UPSERT_COPY_ENABLED=0) it falls back to
+  multi-row VALUES chunked under the dialect's parameter limit.
+  """
+  if not rows:
+    return []
+  target = model.__table__
+  columns = list(rows[0])
+  conn = await session.connection()
+  dialect = conn.dialect
+  if (
+    BULK_UPSERT_COPY_ENABLED
+    and dialect.name == "postgresql"
+    and dialect.driver == "asyncpg"
+    and len(rows) >= BULK_UPSERT_COPY_MIN_ROWS
+  ):
+    return await _copy_upsert(session, conn, target, columns, rows, index_elements, update_columns, returning)
+
+  out: list = []
+  per_chunk = max(1, _max_bind_params(dialect.name) // len(columns))
+  for i in range(0, len(rows), per_chunk):
+    stmt = _on_conflict(insert(target).values(rows[i:i + per_chunk]), target, index_elements, update_columns, returning)
+    result = await session.execute(stmt)
+    if returning:
+      out.extend(result.scalars().all())
+  return out
+
+
+async def _copy_upsert(session, conn, target, columns, rows, index_elements, update_columns, returning) -> list:
+  quote = conn.dialect.identifier_preparer.quote
+  stage = f"_stage_{target.name}_{uuid.uuid4().hex[:12]}"
+  column_list = ", ".join(quote(c) for c in columns)
+  # Same column types as the target, no constraints or defaults.
+  await session.execute(text(
+    f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {column_list} FROM {quote(target.name)} WITH NO DATA"
+  ))
+  converters = [_copy_converter(target.c[c]) for c in columns]
+  records = [
+    tuple(row[c] if conv is None else conv(row[c]) for c, conv in zip(columns, converters))
+    for row in rows
+  ]
+  raw = await conn.get_raw_connection()
+  await raw.driver_connection.copy_records_to_table(stage, records=records, columns=columns)
+
+  staged = sql_table(stage, *[column(c) for c in columns])
+  stmt = pg_insert(target).from_select(columns, select(*staged.c))
+  result = await session.execute(_on_conflict(stmt, target, index_elements, update_columns, returning))
+  out = result.scalars().all() if returning else []
+  await session.execute(text(f"DROP TABLE {stage}"))
+  return out
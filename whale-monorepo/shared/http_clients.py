@@ -0,0 +1,127 @@
+"""Process-wide pooled httpx clients, one per remote host.
+
+Outbound integrations used to build an ``httpx.AsyncClient`` per call, so every
+Gamma, data-api or Telegram request paid DNS, TCP and TLS setup. http_client(url)
+returns a long-lived client for the URL's host instead: connections are kept
+alive and reused, each host gets its own pool size (the per-host concurrency
+cap; requests beyond it wait for a free connection) and default timeout, and
+HTTP/2 is negotiated over HTTPS (requirements.txt pins ``httpx[http2]``; a
+build without ``h2`` falls back to HTTP/1.1).
+
+Async clients belong to the event loop that first used them. A caller on a
+different loop (asyncio.run in a script, a recreated Celery loop) gets a fresh
+client and the stale one is dropped. close_http_clients() closes everything;
+the unified lifespan calls it at shutdown.
+
+Callers share the returned client and must not close it (no ``async with``).
+Per-request ``timeout=`` still overrides the host default.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+
+import httpx
+
+from shared.config import settings
+
+logger = logging.getLogger("shared.http_clients")
+
+try:
+    import h2  # noqa: F401
+    _H2_AVAILABLE = True
+except Exception:  # pragma: no cover - optional dependency
+    _H2_AVAILABLE = False
+
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+
+# host → (max connections, default timeout seconds). Gamma takes the fan-out of
+# token lookups and settlement batches; everything else uses the defaults.
+_HOST_LIMITS: dict[str, tuple[int, float]] = {
+    "gamma-api.polymarket.com": (24, 20.0),
+    "data-api.polymarket.com": (10, 30.0),
+    "clob.polymarket.com": (10, 30.0),
+    "api.telegram.org": (10, 15.0),
+}
+
+_async_clients: dict[str, tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+_sync_clients: dict[str, httpx.Client] = {}
+_sync_lock = threading.Lock()
+
+
+def _origin(url: str) -> tuple[str, str, str]:
+    """(registry key, scheme, host) of a URL or bare host name."""
+    u = httpx.URL(url if "://" in url else f"https://{url}")
+    host = u.host or ""
+    return f"{u.scheme}://{host}:{u.port or ''}", u.scheme, host
+
+
+def _client_kwargs(scheme: str, host: str) -> dict:
+    max_connections, timeout = _HOST_LIMITS.get(host, (HTTP_MAX_CONNECTIONS_PER_HOST, HTTP_TIMEOUT_SECONDS))
+    kwargs = {
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        ),
+        "timeout": httpx.Timeout(timeout),
+    }
+    # Only remote HTTPS hosts go through HTTPS_PROXY; internal service URLs
+    # (plain http) connect directly, as before.
+    if scheme == "https" and settings.https_proxy:
+        kwargs["proxy"] = settings.https_proxy
+    return kwargs
+
+
+def http_client(url: str) -> httpx.AsyncClient:
+    """Shared async client for url's host (created on first use)."""
+    key, scheme, host = _origin(url)
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(key)
+    if entry is not None and entry[0] is loop and not entry[1].is_closed:
+        return entry[1]
+    client = httpx.AsyncClient(http2=HTTP2_ENABLED and _H2_AVAILABLE and scheme == "https", **_client_kwargs(scheme, host))
+    _async_clients[key] = (loop, client)
+    return client
+
+
+def http_sync_client(url: str) -> httpx.Client:
+    """Shared sync client for url's host; thread-safe, for threadpool fan-out."""
+    key, scheme, host = _origin(url)
+    client = _sync_clients.get(key)
+    if client is not None and not client.is_closed:
+        return client
+    with _sync_lock:
+        client = _sync_clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.Client(http2=HTTP2_ENABLED and _H2_AVAILABLE and scheme == "https", **_client_kwargs(scheme, host))
+            _sync_clients[key] = client
+        return client
+
+
+async def close_http_clients() -> int:
+    """Close every pooled client; returns how many were open."""
+    closed = 0
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    for key, (owner, client) in list(_async_clients.items()):
+        # A client from a dead loop cannot be awaited on this one; drop it.
+        if owner is loop and not client.is_closed:
+            try:
+                await client.aclose()
+                closed += 1
+            except Exception:
+                logger.warning("http_client_close_failed key=%s", key, exc_info=True)
+        _async_clients.pop(key, None)
+    for key, client in list(_sync_clients.items()):
+        if not client.is_closed:
+            client.close()
+            closed += 1
+        _sync_clients.pop(key, None)
+    return closed
@@ -0,0 +1,123 @@
+"""In-process last-trade price index per (market_id, outcome).
+
+"What is this market's price now" used to be an ``ORDER BY timestamp DESC
+LIMIT 1`` over trades_raw per market (twice when only NO trades exist). The
+unified ingest loops record every inserted trade here, and load() hydrates the
+index at startup with one ``DISTINCT ON (market_id, outcome)`` query, so
+lookups are dict reads. Entries only move forward in time, so hydration and
+live recording may interleave in any order.
+
+Only the unified process feeds the index. Callers check ``ready`` (or get
+``None`` back) and fall back to SQL, which is what every Celery service does.
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("shared.latest_prices")
+
+LATEST_PRICES_ENABLED = os.getenv("LATEST_PRICES_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+# Hydrate from trades this recent; older markets miss and fall back to SQL.
+LATEST_PRICES_HYDRATE_DAYS = int(os.getenv("LATEST_PRICES_HYDRATE_DAYS", "30"))
+
+# The outcome labels vw._get_market_price has always matched.
+YES_OUTCOMES = ("Yes", "Up", "yes", "YES")
+NO_OUTCOMES = ("No", "Down", "no", "NO")
+
+
+def _epoch(ts: datetime | None) -> float:
+    if ts is None:
+        return datetime.now(timezone.utc).timestamp()
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class LatestPrices:
+    """market_id → {outcome → (epoch, price)} of the newest trade seen."""
+
+    def __init__(self) -> None:
+        self.ready = False
+        self._prices: dict[str, dict[str, tuple[float, Decimal]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    def record(self, market_id: str, outcome: str | None, price, ts: datetime | None) -> None:
+        if not market_id or not outcome or price is None:
+            return
+        epoch = _epoch(ts)
+        outcomes = self._prices.setdefault(market_id, {})
+        current = outcomes.get(outcome)
+        if current is None or epoch >= current[0]:
+            outcomes[outcome] = (epoch, Decimal(str(price)))
+
+    def record_many(self, trades: Iterable[tuple]) -> None:
+        """trades: iterable of (market_id, outcome, price, timestamp)."""
+        for market_id, outcome, price, ts in trades:
+            self.record(market_id, outcome, price, ts)
+
+    def price(self, market_id: str, outcome: str | None) -> Decimal | None:
+        """Last traded price of one outcome."""
+        entry = self._prices.get(market_id, {}).get(outcome or "")
+        return entry[1] if entry else None
+
+    def _latest(self, market_id: str, labels: tuple[str, ...]) -> Decimal | None:
+        outcomes = self._prices.get(market_id)
+        if not outcomes:
+            return None
+        best = None
+        for label in labels:
+            entry = outcomes.get(label)
+            if entry is not None and (best is None or entry[0] > best[0]):
+                best = entry
+        return best[1] if best else None
+
+    def yes_price(self, market_id: str) -> Decimal | None:
+        """Latest YES price, or 1 − latest NO price when only NO traded."""
+        price = self._latest(market_id, YES_OUTCOMES)
+        if price is not None:
+            return price
+        price = self._latest(market_id, NO_OUTCOMES)
+        return Decimal("1") - price if price is not None else None
+
+    async def load(self, session: AsyncSession, days: int = LATEST_PRICES_HYDRATE_DAYS) -> int:
+        """Hydrate from trades_raw; returns the number of markets indexed."""
+        result = await session.execute(
+            text("""
+                SELECT DISTINCT ON (market_id, outcome) market_id, outcome, price, timestamp
+                FROM trades_raw
+                WHERE timestamp > NOW() - (:days * INTERVAL '1 day')
+                  AND outcome IS NOT NULL
+                ORDER BY market_id, outcome, timestamp DESC
+            """),
+            {"days": int(days)},
+        )
+        self.record_many(result.fetchall())
+        self.ready = True
+        return len(self._prices)
+
+    def clear(self) -> None:
+        self._prices.clear()
+        self.ready = False
+
+
+_INDEX = LatestPrices()
+
+
+def latest_prices() -> LatestPrices | None:
+    """The process-wide index, or None when disabled or not hydrated yet."""
+    if not LATEST_PRICES_ENABLED or not _INDEX.ready:
+        return None
+    return _INDEX
+
+
+def latest_prices_index() -> LatestPrices | None:
+    """The index for writers and the loader, ready or not."""
+    return _INDEX if LATEST_PRICES_ENABLED else None
@@ -29,6 +29,7 @@ from .models import (
     SmartCollectionSubscription,
     MarketVwMetrics,
     MarketVwSnapshot,
+    MarketVwSnapshotRollup,
     BlogPost,
 )
 
@@ -62,5 +63,6 @@ __all__ = [
     "SmartCollectionSubscription",
     "MarketVwMetrics",
     "MarketVwSnapshot",
+    "MarketVwSnapshotRollup",
     "BlogPost",
 ]
@@ -291,6 +291,20 @@ class MarketVwSnapshot(Base):
     snapshot_at = Column(DateTime(timezone=True), nullable=False, index=True)
 
 
+class MarketVwSnapshotRollup(Base):
+    """15m / 1h buckets compacted from market_vw_snapshots (prune_vw_snapshots)."""
+    __tablename__ = "market_vw_snapshot_rollups"
+    market_id = Column(String(512), ForeignKey("markets.id"), primary_key=True)
+    resolution_seconds = Column(Integer, primary_key=True)  # 900 | 3600
+    bucket_at = Column(DateTime(timezone=True), primary_key=True)
+    min_divergence = Column(Numeric(10, 8), nullable=True)
+    max_divergence = Column(Numeric(10, 8), nullable=True)
+    last_divergence = Column(Numeric(10, 8), nullable=True)
+    last_yes_market_price = Column(Numeric(10, 8), nullable=True)
+    last_at = Column(DateTime(timezone=True), nullable=False)
+    snapshot_count = Column(Integer, nullable=False, server_default="0")
+
+
 class BlogPost(Base):
     __tablename__ = "blog_posts"
     __table_args__ = (UniqueConstraint("slug", "language", name="uq_blog_post_slug_lang"),)
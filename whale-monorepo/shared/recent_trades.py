@@ -0,0 +1,158 @@
+"""Packed per-(wallet, market) recent-trades cache.
+
+Each fill in ``recent_trades:{wallet}:{market_id}`` is one fixed-width record
+(side code, epoch seconds, amount, price) packed with ``struct`` and base64
+encoded, so it round-trips through ``decode_responses=True`` clients and
+InMemoryRedis alike. A record is 27 bytes, which base64-encodes to exactly 36
+characters with no padding: a whole list decodes with one ``b64decode`` over
+the joined entries and one ``struct.iter_unpack``, instead of ``json.loads``
+plus ``datetime.fromisoformat`` per entry.
+
+JSON entries written before the switch are still decoded (they age out
+within RECENT_TRADES_CACHE_SECONDS).
+"""
+
+import base64
+import binascii
+import json
+import logging
+import struct
+from array import array
+from datetime import datetime, timezone
+from typing import Iterable
+
+from shared.config import settings
+
+logger = logging.getLogger("shared.recent_trades")
+
+_RECORD = struct.Struct("<B2xddd")  # side, pad, epoch, amount, price
+_RECORD_CHARS = 36
+
+SIDE_OTHER = 0
+SIDE_BUY = 1
+SIDE_SELL = 2
+SIDE_NAMES = ("", "buy", "sell")
+
+
+def recent_trades_key(wallet: str, market_id: str) -> str:
+    return f"recent_trades:{wallet}:{market_id}"
+
+
+def side_code(side: str | None) -> int:
+    s = (side or "").lower()
+    if s == "buy":
+        return SIDE_BUY
+    if s == "sell":
+        return SIDE_SELL
+    return SIDE_OTHER
+
+
+def _epoch(ts: datetime | float | str | None) -> float:
+    if ts is None:
+        return datetime.now(timezone.utc).timestamp()
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def encode_trade(timestamp: datetime | float | str | None, side: str | None, amount: object, price: object) -> str:
+    record = _RECORD.pack(side_code(side), _epoch(timestamp), float(amount or 0), float(price or 0))
+    return base64.b64encode(record).decode("ascii")
+
+
+class RecentTrades:
+    """Parallel columns for one cached (wallet, market) list.
+
+    ``timestamps`` are epoch seconds (UTC); ``sides`` hold SIDE_* codes.
+    """
+
+    __slots__ = ("timestamps", "sides", "amounts", "prices")
+
+    def __init__(self) -> None:
+        self.timestamps = array("d")
+        self.sides = array("b")
+        self.amounts = array("d")
+        self.prices = array("d")
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, timestamp: float, side: int, amount: float, price: float) -> None:
+        self.timestamps.append(timestamp)
+        self.sides.append(side)
+        self.amounts.append(amount)
+        self.prices.append(price)
+
+
+def _decode_legacy(raw: str) -> tuple[int, float, float, float] | None:
+    try:
+        data = json.loads(raw)
+        ts = datetime.fromisoformat(data.get("timestamp"))
+    except Exception:
+        logger.debug("recent_trades legacy entry parse failed raw=%s", raw)
+        return None
+    return (side_code(data.get("side")), _epoch(ts), float(data.get("amount") or 0), float(data.get("price") or 0))
+
+
+def _decode_record(raw: str) -> tuple[int, float, float, float] | None:
+    if len(raw) != _RECORD_CHARS:
+        return _decode_legacy(raw)
+    try:
+        return _RECORD.unpack(base64.b64decode(raw, validate=True))
+    except (binascii.Error, struct.error):
+        logger.debug("recent_trades record decode failed raw=%s", raw)
+        return None
+
+
+def decode_trades(raws: list | None) -> RecentTrades | None:
+    """Decode an LRANGE result into columns; ``None`` when nothing usable."""
+    if not raws:
+        return None
+    items = [r.decode("utf-8", "replace") if isinstance(r, (bytes, bytearray)) else str(r) for r in raws]
+    out = RecentTrades()
+    records: Iterable[tuple[int, float, float, float]] | None = None
+    if all(len(r) == _RECORD_CHARS for r in items):
+        try:
+            records = _RECORD.iter_unpack(base64.b64decode("".join(items), validate=True))
+        except (binascii.Error, struct.error):
+            records = None
+    if records is None:
+        records = (rec for rec in (_decode_record(r) for r in items) if rec is not None)
+    for side, ts, amount, price in records:
+        out.append(ts, side, amount, price)
+    if not out:
+        return None
+    return out
+
+
+async def load_trades(redis, wallet: str, market_id: str) -> RecentTrades | None:
+    key = recent_trades_key(wallet, market_id)
+    if not await redis.exists(key):
+        return None
+    return decode_trades(await redis.lrange(key, 0, -1))
+
+
+async def push_trades(redis, trades: Iterable[tuple[str, str, datetime | float | str | None, str | None, object, object]]) -> int:
+    """Append ``(wallet, market_id, timestamp, side, amount, price)`` fills.
+
+    One pipeline for the whole batch: a multi-value RPUSH per key, then a
+    single LTRIM + EXPIRE per key.
+    """
+    by_key: dict[str, list[str]] = {}
+    for wallet, market_id, timestamp, side, amount, price in trades:
+        if not wallet or not market_id:
+            continue
+        by_key.setdefault(recent_trades_key(wallet, market_id), []).append(encode_trade(timestamp, side, amount, price))
+    if not by_key:
+        return 0
+    async with redis.pipeline(transaction=False) as pipe:
+        for key, values in by_key.items():
+            pipe.rpush(key, *values)
+            pipe.ltrim(key, -settings.recent_trades_cache_max, -1)
+            pipe.expire(key, settings.recent_trades_cache_seconds)
+        await pipe.execute()
+    return sum(len(v) for v in by_key.values())
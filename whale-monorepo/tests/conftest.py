@@ -1,6 +1,7 @@
 import os
 import sys
 import asyncio
+import contextlib
 import inspect
 from decimal import Decimal
 from pathlib import Path
@@ -116,6 +117,12 @@ class _FakeResult:
     return None
 
 
+class _FakeConnection:
+  class dialect:
+    name = "postgresql"
+    driver = "fake"
+
+
 class FakeAsyncSession:
   """In-memory SQL session for integration-style tests.
 
@@ -123,10 +130,13 @@ class FakeAsyncSession:
     - Select(TokenCondition).where(TokenCondition.token_id == ...)  → lookup via _where_criteria
     - Insert(TokenCondition).values(...).on_conflict_do_update(...) → stored in _token_conditions
     - Insert(Market).values(...) / Insert(TradeRaw).values(...)    → stored in _markets / _trades
+    - Multi-row Insert(...).values([...]) and executemany (parameters list)
+      → each row handled as a single-row INSERT
     - raw SQL via _handle_raw_sql: active-markets JOIN query,
       market_vw_metrics/snapshots INSERT/SELECT/DELETE/COUNT,
       price-from-trades_raw SELECT, outcome-amount-price-from-trades_raw SELECT,
-      to_regclass table-existence check.
+      batched VW reads (per-outcome sums, unnest market prices, snapshot
+      history aggregate, signal directions), to_regclass table-existence check.
 
   DOES NOT SUPPORT: JOINs (except active-markets), Subquery, ORDER BY, LIMIT,
     OFFSET, GROUP BY, HAVING, raw parameterized text() queries beyond the
@@ -151,8 +161,22 @@ class FakeAsyncSession:
   async def commit(self) -> None:
     return None
 
+  async def connection(self):
+    return _FakeConnection()
+
   async def execute(self, statement, parameters=None):
     """Handle SQLAlchemy execute() — supports Insert, Select, TextClause, and raw SQL strings."""
+    # ---- Insert: multi-row VALUES / executemany → one row at a time ---------
+    if isinstance(statement, Insert) and (statement._multi_values or isinstance(parameters, list)):
+      sql = str(statement)
+      if isinstance(parameters, list):
+        rows = parameters
+      else:
+        rows = [{getattr(k, "key", k): v for k, v in r.items()} for r in statement._multi_values[0]]
+      for row in rows:
+        self._handle_raw_sql(sql, row)
+      return _FakeResult(rowcount=len(rows))
+
     # ---- Insert: compile to extract inline values --------------------------
     if isinstance(statement, Insert):
       try:
@@ -198,15 +222,54 @@ class FakeAsyncSession:
       return _FakeResult(rowcount=deleted)
 
     # ---- INSERT INTO market_vw_snapshots ------------------------------------
+    # Rows keyed by column name are stored under the abbreviated INSERT keys.
     if sql_upper.startswith("INSERT INTO MARKET_VW_SNAPSHOTS"):
-      self._vw_snapshots.append(dict(params))
+      self._vw_snapshots.append({_ALIAS_REVERSE.get(k, k): v for k, v in params.items()})
       return _FakeResult(rowcount=1)
 
     # ---- INSERT INTO market_vw_metrics (UPSERT) -----------------------------
     if sql_upper.startswith("INSERT INTO MARKET_VW_METRICS"):
-      self._vw_metrics.append(dict(params))
+      self._vw_metrics.append({_ALIAS_REVERSE.get(k, k): v for k, v in params.items()})
       return _FakeResult(rowcount=1)
 
+    # ---- Batched VW reads (market_id = ANY(:mids) / unnest(:mids)) ----------
+    mids = params.get("mids") or []
+    if "SELECT MARKET_ID, SIGNAL_DIRECTION FROM MARKET_VW_METRICS" in sql_upper:
+      latest = {m.get("mid"): m.get("sd") for m in self._vw_metrics}
+      return _FakeResult([_FakeRow((mid, latest[mid])) for mid in mids if mid in latest])
+
+    if "ARRAY_AGG" in sql_upper and "FROM MARKET_VW_SNAPSHOTS" in sql_upper:
+      floor = params["floor"]
+      rows = []
+      for mid in mids:
+        matching = sorted(
+          (s for s in self._vw_snapshots if s.get("mid") == mid and s["snapshot_at"] >= params["since24"]),
+          key=lambda s: s["snapshot_at"],
+        )
+        if matching:
+          def past(cutoff):
+            older = [s for s in matching if floor <= s["snapshot_at"] <= cutoff]
+            return older[-1].get("div") if older else None
+          rows.append(_FakeRow((mid, past(params["c5"]), past(params["c15"]), past(params["c60"]), len(matching))))
+      return _FakeResult(rows)
+
+    if "UNNEST(" in sql_upper and "FROM TRADES_RAW" in sql_upper:
+      rows = []
+      for mid in mids:
+        yes = [t.price for t in self._trades if t.market_id == mid and t.outcome == "Yes"]
+        no = [t.price for t in self._trades if t.market_id == mid and t.outcome == "No"]
+        rows.append(_FakeRow((mid, yes[-1] if yes else None, no[-1] if no else None)))
+      return _FakeResult(rows)
+
+    if "SELECT MARKET_ID, OUTCOME, SUM(" in sql_upper and "FROM TRADES_RAW" in sql_upper:
+      sums: dict[tuple, list] = {}
+      for t in self._trades:
+        if t.market_id in mids:
+          acc = sums.setdefault((t.market_id, t.outcome), [Decimal("0"), Decimal("0")])
+          acc[0] += t.amount * t.price
+          acc[1] += t.amount
+      return _FakeResult([_FakeRow((mid, outcome, usd, tokens)) for (mid, outcome), (usd, tokens) in sums.items()])
+
     # ---- COUNT(*) FROM market_vw_snapshots ----------------------------------
     if sql_upper.startswith("SELECT COUNT(*) FROM MARKET_VW_SNAPSHOTS"):
       mid = params.get("mid", "")
@@ -299,6 +362,48 @@ def db_session():
   return FakeAsyncSession()
 
 
+@pytest.fixture
+def pg_session():
+  """Factory for an AsyncSession on a real Postgres (TEST_DATABASE_URL).
+
+  ``async with pg_session(Model, ...) as session`` creates the models' tables
+  and opens one transaction that is rolled back afterwards, so nothing
+  persists. Skips when no server is configured or reachable; the COPY and
+  rollup SQL only runs there (the fake session cannot check it)."""
+  url = os.getenv("TEST_DATABASE_URL", "")
+  if not url:
+    pytest.skip("TEST_DATABASE_URL not set")
+  if url.startswith("postgresql://") or url.startswith("postgres://"):
+    url = "postgresql+asyncpg://" + url.split("://", 1)[1]
+
+  @contextlib.asynccontextmanager
+  async def open_session(*models):
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    engine = create_async_engine(url)
+    try:
+      try:
+        conn = await engine.connect()
+      except Exception as e:
+        pytest.skip(f"postgres unreachable: {e}")
+      trans = await conn.begin()
+      try:
+        for model in models:
+          await conn.run_sync(model.__table__.create, checkfirst=True)
+        session = AsyncSession(bind=conn, expire_on_commit=False)
+        try:
+          yield session
+        finally:
+          await session.close()
+      finally:
+        await trans.rollback()
+        await conn.close()
+    finally:
+      await engine.dispose()
+
+  return open_session
+
+
 @pytest.fixture
 def redis_client():
   """Fake Redis client for integration tests."""
@@ -29,3 +29,27 @@ def test_trade_small():
   d = should_alert(whale_score=80, trade_usd=999, min_score=75, min_usd=1000, always_score=85)
   assert d.should_alert is False
   assert d.signal_level == "none"
+
+
+def test_compiled_config_reloads_on_file_change(tmp_path, monkeypatch):
+  import os
+  from shared import config as config_mod
+
+  path = tmp_path / "alert_engine_config.yaml"
+  path.write_text("cooldown_settings:\n  same_wallet_same_market: 2m\nuser_plans:\n  free:\n    alerts_delay: 5m\n")
+  monkeypatch.setenv("ALERT_CONFIG_PATH", str(path))
+  cfg = config_mod.reload_alert_config()
+  assert cfg.cooldown_same_wallet_seconds == 120
+  assert cfg.cooldown_increased_position_seconds == 300
+  assert cfg.plan_limits["FREE"].alert_delay_minutes == 5
+  assert config_mod.reload_alert_config() is cfg
+
+  path.write_text("cooldown_settings:\n  same_wallet_same_market: 30s\n")
+  os.utime(path, (1, 1))
+  cfg2 = config_mod.reload_alert_config()
+  assert cfg2 is not cfg
+  assert cfg2.cooldown_same_wallet_seconds == 30
+  assert cfg2.plan_limits["FREE"].alert_delay_minutes == 10
+
+  monkeypatch.delenv("ALERT_CONFIG_PATH")
+  config_mod.reload_alert_config()
@@ -11,6 +11,8 @@ import pytest
 
 from services.trade_ingest.polymarket import parse_trade
 from services.trade_ingest.markets import resolve_token_id
+from services.unified.memory_store import InMemoryRedis
+from shared.recent_trades import SIDE_BUY, SIDE_SELL, decode_trades, encode_trade, load_trades, push_trades
 
 
 # ── Helpers ──────────────────────────────────────────────
@@ -171,13 +173,13 @@ async def test_resolve_token_id_empty_string():
 
     with (
         patch("services.trade_ingest.markets._has_token_conditions_table") as mock_ht,
-        patch("services.trade_ingest.markets.httpx") as mock_httpx,
+        patch("services.trade_ingest.markets.http_client") as mock_http_client,
     ):
         mock_ht.return_value = False
         # Mock the API response to return nothing
         mock_client = MagicMock()
-        mock_client.get.return_value.status_code = 404
-        mock_httpx.AsyncClient.return_value.__aenter__.return_value = mock_client
+        mock_client.get = AsyncMock(return_value=MagicMock(status_code=404))
+        mock_http_client.return_value = mock_client
 
         result = await resolve_token_id(session, "")
         # Empty token_id → all API fallbacks fail → returns None (not even a constructed name)
@@ -198,3 +200,194 @@ async def test_resolve_token_id_cache_hit():
         mock_ht.return_value = True
         result = await resolve_token_id(session, "cached_token")
         assert result == "Cached Market Question"
+
+
+# ── Packed recent-trades cache ─────────────────────────────
+
+
+class TestRecentTradesCache:
+    """shared.recent_trades — packed records round-trip through Redis lists."""
+
+    def test_round_trip_columns(self):
+        ts = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+        raws = [
+            encode_trade(ts, "buy", 100.5, 0.65),
+            encode_trade(ts + timedelta(seconds=7), "SELL", 20, 0.4),
+        ]
+        assert all(len(r) == 36 for r in raws)
+        trades = decode_trades(raws)
+        assert len(trades) == 2
+        assert list(trades.timestamps) == [ts.timestamp(), ts.timestamp() + 7]
+        assert list(trades.sides) == [SIDE_BUY, SIDE_SELL]
+        assert list(trades.amounts) == [100.5, 20.0]
+        assert list(trades.prices) == [0.65, 0.4]
+
+    def test_legacy_json_and_garbage_entries(self):
+        ts = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+        legacy = '{"timestamp": "2026-03-01T12:00:00+00:00", "side": "sell", "amount": 5, "price": 0.5}'
+        trades = decode_trades([legacy, "not-a-record", encode_trade(ts, "buy", 1, 0.1)])
+        assert list(trades.sides) == [SIDE_SELL, SIDE_BUY]
+        assert list(trades.timestamps) == [ts.timestamp(), ts.timestamp()]
+        assert decode_trades([]) is None
+        assert decode_trades(["{broken"]) is None
+
+    @pytest.mark.asyncio
+    async def test_push_trades_trims_per_key(self):
+        redis = InMemoryRedis(decode_responses=True)
+        ts = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+        with patch("shared.recent_trades.settings") as mock_settings:
+            mock_settings.recent_trades_cache_max = 3
+            mock_settings.recent_trades_cache_seconds = 60
+            pushed = await push_trades(
+                redis,
+                [("0xw", "m1", ts + timedelta(seconds=i), "buy", i + 1, 0.5) for i in range(5)]
+                + [("0xw", "m2", ts, "sell", 9, 0.9), ("", "m3", ts, "buy", 1, 1)],
+            )
+        assert pushed == 6
+        m1 = await load_trades(redis, "0xw", "m1")
+        assert list(m1.amounts) == [3.0, 4.0, 5.0]
+        m2 = await load_trades(redis, "0xw", "m2")
+        assert list(m2.sides) == [SIDE_SELL]
+        assert await load_trades(redis, "0xw", "m3") is None
+
+
+# ── Watermark paging ───────────────────────────────────────
+
+
+def _feed(n: int, newest: datetime) -> list[dict]:
+    """n raw trades, newest first, one second apart."""
+    return [
+        {
+            "id": f"t{i}", "asset_id": "m1", "wallet": "0xA", "side": "BUY",
+            "outcome": "Yes", "size": "1", "price": "0.5",
+            "timestamp": int((newest - timedelta(seconds=i)).timestamp()),
+        }
+        for i in range(n)
+    ]
+
+
+def _paged_client(feed: list[dict], fail_offsets=()) -> MagicMock:
+    """httpx client stub serving feed[offset:offset + limit]; 503 at fail_offsets."""
+    async def get(url, params=None, timeout=None):
+        resp = MagicMock()
+        offset, limit = params["offset"], params["limit"]
+        if offset in fail_offsets:
+            resp.status_code = 503
+            resp.text = "unavailable"
+            return resp
+        resp.status_code = 200
+        resp.json.return_value = feed[offset:offset + limit]
+        return resp
+    client = MagicMock()
+    client.get = AsyncMock(side_effect=get)
+    return client
+
+
+class TestTradeWatermark:
+    """polymarket.fetch_new_trades — page back to the watermark, never past it."""
+
+    @pytest.mark.asyncio
+    async def test_pages_until_watermark(self):
+        from services.trade_ingest import polymarket
+
+        newest = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(minutes=1)
+        feed = _feed(25, newest)
+        # Watermark sits on t21 (plus t22 at an older second): t0..t20 are new.
+        wm = polymarket.TradeWatermark(newest - timedelta(seconds=21), {"t21"})
+        client = _paged_client(feed)
+        with patch.object(polymarket, "TRADE_INGEST_PAGE_LIMIT", 10), patch.object(polymarket, "TRADE_INGEST_MAX_PAGES", 5):
+            rows, saturated, outcome = await polymarket.fetch_new_trades(client, wm)
+        assert [r["trade_id"] for r in rows] == [f"t{i}" for i in range(21)]
+        assert saturated is True and outcome == polymarket.SCAN_REACHED
+        assert client.get.await_count == 3
+        advanced = wm.advanced(rows)
+        assert advanced.ts == newest and advanced.ids == {"t0"}
+
+    @pytest.mark.asyncio
+    async def test_cold_start_reads_one_page_and_cap_logs_gap(self):
+        from services.trade_ingest import polymarket
+
+        newest = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(minutes=1)
+        feed = _feed(50, newest)
+        with patch.object(polymarket, "TRADE_INGEST_PAGE_LIMIT", 10), patch.object(polymarket, "TRADE_INGEST_MAX_PAGES", 2):
+            rows, saturated, outcome = await polymarket.fetch_new_trades(_paged_client(feed), polymarket.TradeWatermark())
+            assert len(rows) == 10 and saturated is False and outcome == polymarket.SCAN_REACHED
+            old = polymarket.TradeWatermark(newest - timedelta(hours=1), ())
+            rows, saturated, outcome = await polymarket.fetch_new_trades(_paged_client(feed), old)
+            assert len(rows) == 20 and saturated is True and outcome == polymarket.SCAN_CAPPED
+
+    @pytest.mark.asyncio
+    async def test_failed_page_holds_watermark(self):
+        """A 503 mid-scan is not the end of the feed: rows fetched so far are
+        inserted but the watermark stays put, and the next poll closes the gap."""
+        from services.trade_ingest import polymarket
+
+        newest = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(minutes=1)
+        feed = _feed(25, newest)
+        wm = polymarket.TradeWatermark(newest - timedelta(seconds=21), {"t21"})
+        session = MagicMock()
+        session.info = {}
+        upsert = AsyncMock(side_effect=lambda s, model, rows, **kw: [r["trade_id"] for r in rows] if model is polymarket.TradeRaw else [])
+
+        with (
+            patch.object(polymarket, "TRADE_INGEST_PAGE_LIMIT", 10),
+            patch.object(polymarket, "TRADE_INGEST_MAX_PAGES", 5),
+            patch.object(polymarket, "_WATERMARK", wm),
+            patch.object(polymarket, "bulk_upsert", upsert),
+            patch.object(polymarket.asyncio, "sleep", AsyncMock()),
+            patch.object(polymarket, "http_client", return_value=_paged_client(feed, fail_offsets={10})),
+        ):
+            inserted = await polymarket.ingest_trades(session)
+            assert inserted == [f"t{i}" for i in range(10)]
+            assert polymarket._STAGED_KEY not in session.info
+
+            with patch.object(polymarket, "http_client", return_value=_paged_client(feed)):
+                inserted = await polymarket.ingest_trades(session)
+            assert inserted == [f"t{i}" for i in range(21)]
+            staged = session.info[polymarket._STAGED_KEY]
+            assert staged.ts == newest and staged.ids == {"t0"}
+
+    def test_watermark_round_trip_and_ties(self):
+        from services.trade_ingest.polymarket import TradeWatermark
+
+        ts = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+        wm = TradeWatermark.loads(TradeWatermark(ts, {"a", "b"}).dumps())
+        assert wm.ts == ts and wm.ids == {"a", "b"}
+        assert wm.covers(ts, "a") and wm.covers(ts - timedelta(seconds=1), "z")
+        assert not wm.covers(ts, "c")
+        assert wm.advanced([{"trade_id": "c", "timestamp": ts}]).ids == {"a", "b", "c"}
+        assert not TradeWatermark().covers(ts, "a")
+
+    def test_pacer_tracks_trade_rate(self):
+        from services.trade_ingest.polymarket import TradePollPacer
+
+        pacer = TradePollPacer(5, 30, page_limit=500)
+        assert pacer.interval() == 30
+        pacer.observe(0, False, now=0.0)
+        pacer.observe(100, False, now=10.0)  # 10 trades/s → 25s for half a page
+        assert pacer.interval() == pytest.approx(25.0)
+        pacer.observe(1000, True, now=15.0)
+        assert pacer.interval() == 5
+        pacer.observe(0, False, now=45.0)
+        assert 5 <= pacer.interval() <= 30
+
+
+# ── Pooled HTTP clients ────────────────────────────────────
+
+
+@pytest.mark.asyncio
+async def test_http_clients_pool_per_host_and_close():
+    from shared import http_clients
+
+    gamma = http_clients.http_client("https://gamma-api.polymarket.com/markets")
+    assert http_clients.http_client("https://gamma-api.polymarket.com/tokens?x=1") is gamma
+    other = http_clients.http_client("http://localhost:8011/health")
+    assert other is not gamma
+    assert gamma._transport._pool._max_connections == 24
+    sync = http_clients.http_sync_client("https://gamma-api.polymarket.com/markets")
+    assert http_clients.http_sync_client("gamma-api.polymarket.com") is sync
+
+    assert await http_clients.close_http_clients() == 3
+    assert gamma.is_closed and other.is_closed and sync.is_closed
+    assert http_clients.http_client("https://gamma-api.polymarket.com") is not gamma
+    await http_clients.close_http_clients()
@@ -1,9 +1,11 @@
 # tests/test_vw.py
 
+import json
+
 import pytest
 from decimal import Decimal
 from datetime import datetime, timedelta, timezone
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from services.whale_engine.vw import (
     _calc_vw_prices,
@@ -195,38 +197,361 @@ async def test_compute_vw_metrics_writes_metrics():
 
     mock_session.execute.side_effect = [
         _make_result(rows=[("market_1", Decimal("200"))]),  # 0: active markets (market_id, vol_24h)
-        _make_result(rows=[                                 # 1: trades
-            ("Yes", Decimal("100"), Decimal("0.60")),
-            ("No", Decimal("50"), Decimal("0.40")),
+        _make_result(rows=[                                 # 1: VW sums (market_id, outcome, Σusd, Σtokens)
+            ("market_1", "Yes", Decimal("60"), Decimal("100")),
+            ("market_1", "No", Decimal("20"), Decimal("50")),
         ]),
-        _make_result(rows=[(Decimal("0.55"),)]),            # 2: market price
-        _make_result(rows=[]),                               # 3: past_5m snapshot
-        _make_result(rows=[]),                               # 4: past_15m snapshot
-        _make_result(rows=[]),                               # 5: past_1h snapshot
-        _make_result(scalar_val=5),                          # 6: snapshot count
-        _make_result(rows=[]),                               # 7: prev signal_direction
-        _make_result(rowcount=1),                            # 8: UPSERT metrics
-        _make_result(rowcount=1),                            # 9: INSERT snapshot
+        _make_result(rows=[("market_1", Decimal("0.55"), None)]),  # 2: market prices
+        _make_result(rows=[("market_1", None, None, None, 5)]),    # 3: snapshot history
+        _make_result(rows=[]),                               # 4: prev signal_direction
+        _make_result(rowcount=1),                            # 5: UPSERT metrics
+        _make_result(rowcount=1),                            # 6: INSERT snapshots
     ]
     mock_redis.get.return_value = None
 
     count = await compute_vw_metrics(mock_session, mock_redis, {})
     assert count == 1
-    # 10 DB calls: active + trades + price + 3×past + count + prev_dir + upsert + insert
-    assert mock_session.execute.call_count == 10
+    # 7 DB calls regardless of market count: active + sums + prices + history + prev_dir + upsert + insert
+    assert mock_session.execute.call_count == 7
+
+
+@pytest.mark.asyncio
+async def test_compute_vw_metrics_direction_change_reads_previous_direction():
+    """上一次信号方向在写入前读取：bearish → bullish 触发方向翻转推送"""
+    mock_session = AsyncMock()
+    mock_redis = AsyncMock()
+
+    mock_session.execute.side_effect = [
+        _make_result(rows=[("market_1", Decimal("200"))]),
+        _make_result(rows=[
+            ("market_1", "Yes", Decimal("60"), Decimal("100")),
+            ("market_1", "No", Decimal("20"), Decimal("50")),
+        ]),
+        _make_result(rows=[("market_1", Decimal("0.40"), None)]),
+        _make_result(rows=[]),
+        _make_result(rows=[("market_1", "bearish")]),
+        _make_result(rowcount=1),
+        _make_result(rowcount=1),
+    ]
+    mock_redis.get.return_value = None
+
+    count = await compute_vw_metrics(mock_session, mock_redis, {"min_24h_volume_usd": 100})
+    assert count == 1
+    mock_redis.rpush.assert_called_once()
+    payload = json.loads(mock_redis.rpush.call_args[0][1])
+    assert payload["signal_direction"] == "bullish"
+    assert payload["is_direction_change"] is True
+
+
+@pytest.mark.asyncio
+async def test_vw_book_feeds_compute_without_trade_scans():
+    """累加器加载后：live 交易累加进桶，过期桶被丢弃，compute 不再扫描 trades_raw"""
+    from services.whale_engine.vw_book import VwBook
+
+    now = datetime.now(timezone.utc)
+    bucket = int(now.timestamp() // 3600)
+    book = VwBook(bucket_seconds=3600)
+    load_session = AsyncMock()
+    load_session.execute.return_value = _make_result(rows=[
+        ("market_1", "Yes", bucket, Decimal("30"), Decimal("50"), now - timedelta(minutes=1)),
+        ("market_1", "No", bucket - 1, Decimal("20"), Decimal("50"), now - timedelta(hours=1)),
+        ("market_1", "Yes", bucket - 24 * 8, Decimal("999"), Decimal("999"), now - timedelta(days=8)),
+    ])
+    assert await book.load(load_session, 7) == 1
+    book.record("market_1", "Yes", 50.0, 0.6, now)
+    book.expire(now)
+
+    assert sorted(book.sums("market_1", now, 7)) == [
+        ("No", Decimal("20"), Decimal("50")),
+        ("Yes", Decimal("60.0"), Decimal("100.0")),
+    ]
+    assert book.active_markets(now, Decimal("10")) == {"market_1": Decimal("80.0")}
+
+    mock_session = AsyncMock()
+    mock_redis = AsyncMock()
+    mock_session.execute.side_effect = [
+        _make_result(rows=[("market_1",)]),                        # 0: open markets
+        _make_result(rows=[("market_1", Decimal("0.55"), None)]),  # 1: market prices
+        _make_result(rows=[]),                                     # 2: snapshot history
+        _make_result(rows=[]),                                     # 3: prev signal_direction
+        _make_result(rowcount=1),                                  # 4: UPSERT metrics
+        _make_result(rowcount=1),                                  # 5: INSERT snapshots
+    ]
+    with patch("services.whale_engine.vw.vw_book", return_value=book):
+        count = await compute_vw_metrics(mock_session, mock_redis, {"min_24h_volume_usd": 10})
+    assert count == 1
+    assert mock_session.execute.call_count == 6
+    assert not any("trades_raw" in str(c.args[0]) and "GROUP BY" in str(c.args[0]) for c in mock_session.execute.call_args_list)
+
+
+def test_snapshot_ring_answers_velocity_baselines_and_warmup():
+    """环形缓冲：二分查找 N 分钟前最近快照，溢出后仍记得最后淘汰的一条"""
+    from services.whale_engine.vw_book import VwSnapshotRings
+
+    now = datetime.now(timezone.utc)
+    rings = VwSnapshotRings(capacity=4)
+    for minutes, div in [(62, "0.01"), (50, "0.02"), (20, "0.03"), (10, "0.04"), (2, "0.05")]:
+        rings.append("m", now - timedelta(minutes=minutes), Decimal(div))
+
+    past_5m, past_15m, past_1h, count_24h = rings.history("m", now)
+    assert past_5m == Decimal("0.04")
+    assert past_15m == Decimal("0.03")
+    assert past_1h == Decimal("0.01")  # 已被淘汰，但仍是 1h 前最近的一条
+    assert count_24h == 4
+    assert rings.history("other", now) == (None, None, None, 0)
+
+    # 比 1h + 5 分钟更早的快照不作基准
+    rings.append("stale", now - timedelta(minutes=120), Decimal("0.01"))
+    rings.append("stale", now - timedelta(minutes=2), Decimal("0.05"))
+    assert rings.history("stale", now) == (None, None, None, 2)
 
 
 @pytest.mark.asyncio
-async def test_prune_vw_snapshots_deletes_old():
-    """prune_vw_snapshots 删除过期快照并返回删除数"""
+async def test_compute_vw_metrics_reads_history_from_snapshot_rings():
+    """快照环形缓冲就绪时不查 market_vw_snapshots，新快照在提交后追加"""
+    from services.whale_engine.vw_book import VwSnapshotRings, _append_staged
+
+    now = datetime.now(timezone.utc)
+    rings = VwSnapshotRings(capacity=8)
+    rings.ready = True
+    for minutes in (70, 30, 10):
+        rings.append("market_1", now - timedelta(minutes=minutes), Decimal("0.05"))
+
     mock_session = AsyncMock()
-    delete_result = MagicMock()
-    delete_result.rowcount = 5
-    mock_session.execute.return_value = delete_result
+    mock_session.info = {}
+    mock_redis = AsyncMock()
+    mock_redis.get.return_value = None
+    mock_session.execute.side_effect = [
+        _make_result(rows=[("market_1", Decimal("200"))]),
+        _make_result(rows=[
+            ("market_1", "Yes", Decimal("60"), Decimal("100")),
+            ("market_1", "No", Decimal("20"), Decimal("50")),
+        ]),
+        _make_result(rows=[("market_1", Decimal("0.55"), None)]),
+        _make_result(rows=[]),                               # prev signal_direction
+        _make_result(rowcount=1),
+        _make_result(rowcount=1),
+    ]
+    with patch("services.whale_engine.vw.vw_snapshot_rings", return_value=rings):
+        count = await compute_vw_metrics(mock_session, mock_redis, {})
+    assert count == 1
+    assert mock_session.execute.call_count == 6
+
+    metrics_stmt = mock_session.execute.call_args_list[4].args[0]
+    assert metrics_stmt.compile().params["vw_velocity_5m_m0"] == Decimal("0")
+    assert len(rings._rings["market_1"]) == 3
+    with patch("services.whale_engine.vw_book._RINGS", rings):
+        _append_staged(mock_session)
+    assert len(rings._rings["market_1"]) == 4
+
+
+@pytest.mark.asyncio
+async def test_dirty_markets_are_debounced():
+    """dirty 市场去抖：interval 内重复标记只在到期后重算一次"""
+    from services.unified.memory_store import InMemoryRedis
+    from services.whale_engine.vw import VwDebouncer, drain_vw_dirty
+    from shared.async_utils import mark_vw_dirty
+
+    redis = InMemoryRedis()
+    debouncer = VwDebouncer(interval=60)
+    assert await mark_vw_dirty(redis, ["m1", "m2", ""]) == 2
+    debouncer.add(await drain_vw_dirty(redis))
+    assert sorted(debouncer.take_due(1000.0)) == ["m1", "m2"]
+
+    await mark_vw_dirty(redis, ["m1"])
+    debouncer.add(await drain_vw_dirty(redis))
+    assert debouncer.take_due(1030.0) == []
+    assert len(debouncer) == 1
+    assert debouncer.take_due(1060.0) == ["m1"]
+    assert await drain_vw_dirty(redis) == set()
+
+
+@pytest.mark.asyncio
+async def test_market_prices_read_latest_price_index_before_sql():
+    """最新成交价索引命中的市场不查 trades_raw，只有未命中的走 SQL"""
+    from services.whale_engine.vw import _fetch_market_prices
+    from shared.latest_prices import LatestPrices
+
+    now = datetime.now(timezone.utc)
+    index = LatestPrices()
+    index.record_many([
+        ("m_yes", "Yes", 0.61, now - timedelta(minutes=5)),
+        ("m_yes", "Up", 0.64, now - timedelta(minutes=1)),
+        ("m_yes", "Yes", 0.50, now - timedelta(hours=1)),  # 更旧的成交不覆盖
+        ("m_no", "No", 0.30, now),
+    ])
+    index.ready = True
+    assert index.price("m_yes", "Yes") == Decimal("0.61")
+    assert index.yes_price("m_yes") == Decimal("0.64")
+    assert index.yes_price("m_no") == Decimal("0.70")
+
+    session = AsyncMock()
+    session.execute.return_value = _make_result(rows=[("m_miss", None, Decimal("0.25"))])
+    with patch("services.whale_engine.vw.latest_prices", return_value=index):
+        prices = await _fetch_market_prices(session, ["m_yes", "m_no", "m_miss"])
+    assert prices == {"m_yes": Decimal("0.64"), "m_no": Decimal("0.70"), "m_miss": Decimal("0.75")}
+    session.execute.assert_called_once()
+    assert session.execute.call_args.args[1] == {"mids": ["m_miss"]}
+
+
+@pytest.mark.asyncio
+async def test_prune_vw_snapshots_rolls_up_then_expires(pg_session):
+    """prune_vw_snapshots 在真实 Postgres 上执行 raw→15m、15m→1h、过期小时桶删除"""
+    from sqlalchemy import insert, select, text
+    from shared.models.models import Market, MarketVwSnapshot, MarketVwSnapshotRollup
+
+    now = datetime.now(timezone.utc)
+
+    def floor(ts, seconds):
+        return datetime.fromtimestamp(int(ts.timestamp()) // seconds * seconds, tz=timezone.utc)
+
+    raw_bucket = floor(now - timedelta(days=3), 900)
+    hour = floor(now - timedelta(days=10), 3600)
+    expired = floor(now - timedelta(days=40), 3600)
+    mid = "m_prune_test"
+
+    async with pg_session(Market, MarketVwSnapshot, MarketVwSnapshotRollup) as session:
+        await session.execute(insert(Market), [{"id": mid, "title": "prune"}])
+        await session.execute(insert(MarketVwSnapshot), [
+            {"market_id": mid, "vw_divergence": Decimal("0.1"), "yes_market_price": Decimal("0.5"), "snapshot_at": raw_bucket + timedelta(seconds=60)},
+            {"market_id": mid, "vw_divergence": Decimal("0.3"), "yes_market_price": Decimal("0.6"), "snapshot_at": raw_bucket + timedelta(seconds=120)},
+            {"market_id": mid, "vw_divergence": Decimal("-0.2"), "yes_market_price": Decimal("0.4"), "snapshot_at": now - timedelta(hours=1)},
+        ])
+        rollup = {"market_id": mid, "last_yes_market_price": Decimal("0.5")}
+        await session.execute(insert(MarketVwSnapshotRollup), [
+            {**rollup, "resolution_seconds": 900, "bucket_at": hour, "min_divergence": Decimal("-0.1"),
+             "max_divergence": Decimal("0.2"), "last_divergence": Decimal("0.1"), "last_at": hour + timedelta(seconds=800), "snapshot_count": 3},
+            {**rollup, "resolution_seconds": 900, "bucket_at": hour + timedelta(seconds=900), "min_divergence": Decimal("0.0"),
+             "max_divergence": Decimal("0.4"), "last_divergence": Decimal("0.25"), "last_at": hour + timedelta(seconds=1700), "snapshot_count": 2},
+            {**rollup, "resolution_seconds": 3600, "bucket_at": expired, "min_divergence": Decimal("0"),
+             "max_divergence": Decimal("0"), "last_divergence": Decimal("0"), "last_at": expired, "snapshot_count": 1},
+        ])
+
+        compacted = await prune_vw_snapshots(
+            session, {"rollup_raw_after_hours": 24, "snapshot_retention_days": 7, "hourly_retention_days": 30}
+        )
+        assert compacted >= 3
+
+        raw = (await session.execute(
+            select(MarketVwSnapshot.vw_divergence).where(MarketVwSnapshot.market_id == mid)
+        )).scalars().all()
+        assert raw == [Decimal("-0.2")]
+
+        rows = (await session.execute(
+            text("""
+                SELECT resolution_seconds, bucket_at, min_divergence, max_divergence,
+                       last_divergence, last_yes_market_price, snapshot_count
+                FROM market_vw_snapshot_rollups WHERE market_id = :mid
+                ORDER BY resolution_seconds, bucket_at
+            """),
+            {"mid": mid},
+        )).fetchall()
+        assert [tuple(r) for r in rows] == [
+            (900, raw_bucket, Decimal("0.1"), Decimal("0.3"), Decimal("0.3"), Decimal("0.6"), 2),
+            (3600, hour, Decimal("-0.1"), Decimal("0.4"), Decimal("0.25"), Decimal("0.5"), 5),
+        ]
+
+        # 再跑一次：没有新数据可压缩，已有桶保持不变
+        assert await prune_vw_snapshots(session, {}) == 0
+
+
+def test_backtest_signals_match_scalar_helpers():
+    """回测的列式 divergence / velocity 与 Decimal 逐市场公式一致；并行扫描与串行一致"""
+    pytest.importorskip("numpy")
+    from datetime import date
+    from scripts.backtest_vw import build_frame, compute_signals, sweep_thresholds, threshold_grid
+
+    d1, d2, d3 = date(2026, 3, 1), date(2026, 3, 2), date(2026, 3, 4)
+    sums = [
+        ("m1", d1, "yes", 60.0, 100.0), ("m1", d1, "no", 30.0, 80.0),
+        ("m1", d2, "yes", 70.0, 100.0),
+        ("m1", d3, "yes", 20.0, 50.0), ("m1", d3, "no", 45.0, 90.0),
+        ("m2", d1, "no", 40.0, 100.0), ("m2", d2, "no", 50.0, 100.0),
+        ("m3", d1, "yes", 10.0, 20.0),  # 只有一个有效日，应被剔除
+        ("m4", d1, "yes", 10.0, 20.0), ("m4", d2, "yes", 12.0, 20.0),  # 缺收盘价
+    ]
+    closes = [
+        ("m1", d1, "Yes", 0.58), ("m1", d1, "No", 0.40),
+        ("m1", d2, "No", 0.35),
+        ("m1", d3, "Yes", 0.45),
+        ("m2", d1, "No", 0.42), ("m2", d2, "No", 0.47),
+        ("m3", d1, "Yes", 0.5),
+    ]
+    signals = compute_signals(build_frame(["m1", "m2", "m3", "m4"], sums, closes))
+
+    def scalar(rows, close):
+        vw = _calc_vw_prices([(o.capitalize(), Decimal(str(tok)), Decimal(str(t)) / Decimal(str(tok))) for o, t, tok in rows])
+        return _calc_divergence(vw["yes_vw_price"], vw["no_vw_price"], Decimal(str(close)))
+
+    expected = [
+        scalar([("yes", 60.0, 100.0), ("no", 30.0, 80.0)], 0.58),
+        scalar([("yes", 70.0, 100.0)], 0.65),
+        scalar([("yes", 20.0, 50.0), ("no", 45.0, 90.0)], 0.45),
+        scalar([("no", 40.0, 100.0)], 0.58),
+        scalar([("no", 50.0, 100.0)], 0.53),
+    ]
+    assert signals.market.tolist() == [0, 0, 0, 1, 1]
+    assert signals.divergence.tolist() == pytest.approx([float(e) for e in expected])
+    vel = signals.velocity.tolist()
+    assert vel[0] != vel[0] and vel[3] != vel[3]  # 各市场首日 NaN
+    assert vel[1] == pytest.approx(float(_calc_velocity(expected[1], expected[0], 1440)))
+    assert vel[2] == pytest.approx(float(_calc_velocity(expected[2], expected[1], 2 * 1440)))
+    assert signals.next_move.tolist()[:2] == pytest.approx([0.65 - 0.58, 0.45 - 0.65])
+
+    div_grid = threshold_grid(signals.divergence, 4)
+    vel_grid = threshold_grid(signals.velocity, 4)
+    serial = sweep_thresholds(signals, div_grid, vel_grid, workers=1)
+    assert len(serial) == len(div_grid) * len(vel_grid)
+    assert sweep_thresholds(signals, div_grid, vel_grid, workers=2) == serial
+
+
+@pytest.mark.asyncio
+async def test_snapshot_history_query_picks_each_horizon(db_session):
+    """SQL 路径：5m/15m/1h 各取自己的基准快照，超出 1h + 5 分钟的不算，velocity 随之不同"""
+    from services.whale_engine.vw import compute_vw_metrics
+    from shared.models.models import Market, TradeRaw
+
+    now = datetime.now(timezone.utc)
+    market_id = "m-horizons"
+    db_session.add(Market(id=market_id, title="horizons", status="active"))
+    db_session.add(TradeRaw(
+        trade_id="h-yes", market_id=market_id, outcome="Yes", wallet="0xa", side="BUY",
+        amount=Decimal("1000"), price=Decimal("0.60"), timestamp=now - timedelta(minutes=1),
+    ))
+    db_session.add(TradeRaw(
+        trade_id="h-no", market_id=market_id, outcome="No", wallet="0xb", side="BUY",
+        amount=Decimal("1000"), price=Decimal("0.40"), timestamp=now - timedelta(minutes=1),
+    ))
+    for minutes, div in [(180, "-0.50"), (61, "-0.20"), (16, "-0.10"), (6, "-0.05")]:
+        db_session._vw_snapshots.append(
+            {"mid": market_id, "div": Decimal(div), "snapshot_at": now - timedelta(minutes=minutes)}
+        )
+
+    with (
+        patch("services.whale_engine.vw.vw_book", return_value=None),
+        patch("services.whale_engine.vw.vw_snapshot_rings", return_value=None),
+        patch("services.whale_engine.vw._get_last_alert_time", new_callable=AsyncMock, return_value=None),
+    ):
+        count = await compute_vw_metrics(db_session, AsyncMock(), {"min_24h_volume_usd": 100})
+    assert count == 1
 
-    deleted = await prune_vw_snapshots(mock_session, {})
-    assert deleted == 5
-    mock_session.execute.assert_called_once()
+    metrics = db_session._vw_metrics[-1]
+    divergence = metrics["div"]
+    assert metrics["v5"] == _calc_velocity(divergence, Decimal("-0.05"), 5)
+    assert metrics["v15"] == _calc_velocity(divergence, Decimal("-0.10"), 15)
+    assert metrics["v1h"] == _calc_velocity(divergence, Decimal("-0.20"), 60)
+    assert len({metrics["v5"], metrics["v15"], metrics["v1h"]}) == 3
+
+    # 1h 基准只剩 3 小时前的快照时，1h velocity 为空
+    db_session._vw_snapshots = [s for s in db_session._vw_snapshots if s["div"] != Decimal("-0.20")]
+    db_session._vw_metrics.clear()
+    with (
+        patch("services.whale_engine.vw.vw_book", return_value=None),
+        patch("services.whale_engine.vw.vw_snapshot_rings", return_value=None),
+        patch("services.whale_engine.vw._get_last_alert_time", new_callable=AsyncMock, return_value=None),
+    ):
+        await compute_vw_metrics(db_session, AsyncMock(), {"min_24h_volume_usd": 100})
+    assert db_session._vw_metrics[-1]["v1h"] is None
 
 
 # ---------------------------------------------------------------------------
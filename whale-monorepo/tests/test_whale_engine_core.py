@@ -11,12 +11,21 @@ from unittest.mock import AsyncMock, patch, MagicMock
 
 import pytest
 
+from services.whale_engine import positions as position_book_mod
+from services.whale_engine.behavior import RollingWindowState
+from services.whale_engine.score_table import WhaleScoreTable
+from services.whale_engine.wallet_seen import WalletSeenBuffer
 from services.whale_engine.engine import (
     _WindowMetrics,
     _apply_trade_to_position,
+    _behavior_thresholds,
     _combine_window_metrics,
     _compute_scores,
+    _window_seconds,
+    detect_behavior,
 )
+from shared.config import current_config
+from shared.models import TradeRaw
 
 
 # ── Additional _apply_trade_to_position scenarios ──────────
@@ -124,3 +133,388 @@ class TestWindowMetrics:
         normal = _compute_scores(base, wallet_age_days=180.0, wash_suspected=False)
         washed = _compute_scores(base, wallet_age_days=180.0, wash_suspected=True)
         assert washed["whale_score"] < normal["whale_score"] * 0.5
+
+
+# ── RollingWindowState vs detect_behavior ─────────────────
+
+
+class TestRollingWindowState:
+    """The incremental windows must answer exactly like the list detector."""
+
+    def _stream(self, start: datetime) -> list[TradeRaw]:
+        # Deterministic mix of small fills, a build-up, a large spike and an
+        # unwind, spread over ~8h so trades expire out of both windows.
+        trades = []
+        for i in range(160):
+            side = "sell" if (i // 20) % 3 == 2 else "buy"
+            amount = 40.0 + (i * 37) % 900
+            if side == "sell":
+                amount *= 3
+            if i == 57:
+                amount = 20000.0
+            price = 0.2 + ((i * 13) % 70) / 100.0
+            trades.append(TradeRaw(trade_id=f"t{i}", side=side, amount=amount, price=price, timestamp=start + timedelta(minutes=3 * i)))
+        return trades
+
+    def _state(self) -> tuple[RollingWindowState, tuple[float, float, float]]:
+        cfg = current_config()
+        micro_seconds, macro_seconds = _window_seconds(cfg)
+        thresholds = _behavior_thresholds(cfg)
+        return RollingWindowState(micro_seconds, macro_seconds, thresholds[0]), thresholds
+
+    def test_matches_detect_behavior_on_stream(self):
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        trades = self._stream(start)
+        state, (_, build, exit_) = self._state()
+        seen = set()
+        for i, t in enumerate(trades):
+            now = t.timestamp + timedelta(seconds=30)
+            state.append(t.timestamp, t.side, t.amount, t.price, trade_id=f"t{i}")
+            expected = detect_behavior(trades[: i + 1], trades[: i + 1], now)
+            got = state.detect(now, build, exit_)
+            assert got[0] == expected[0] and got[1] == expected[1] and got[4] == expected[4]
+            assert got[2] == pytest.approx(expected[2], rel=1e-9, abs=1e-6)
+            assert got[3] == pytest.approx(expected[3], rel=1e-9, abs=1e-9)
+            seen.add(got[0])
+        assert {"spike", "build", "exit"} <= seen
+
+    def test_seed_skips_older_and_duplicate_appends(self):
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        trades = self._stream(start)[:10]
+        state, _ = self._state()
+        state.seed(trades, trades[5].timestamp)
+        assert len(state) == 5
+        # Already covered by the seed.
+        assert state.append(trades[2].timestamp, "buy", 10.0, 0.5, trade_id="old") is False
+        assert state.append(trades[5].timestamp, "buy", 10.0, 0.5, trade_id="t5") is True
+        # Replayed after a rollback.
+        assert state.append(trades[5].timestamp, "buy", 10.0, 0.5, trade_id="t5") is False
+        assert len(state) == 6
+
+    def test_late_fill_is_inserted_in_order_and_expires(self):
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        state, (_, build, exit_) = self._state()
+        state.append(start + timedelta(minutes=10), "buy", 10.0, 0.5, trade_id="a")
+        state.append(start, "buy", 10.0, 0.5, trade_id="late")
+        state.expire(start + timedelta(seconds=state.macro_seconds, minutes=5))
+        assert len(state) == 1
+        assert state.buy_count == 1
+
+
+# ── Write-behind position book ────────────────────────────
+
+
+class TestPositionBook:
+    """Staged updates become visible to other sessions only after commit."""
+
+    def _session(self):
+        session = AsyncMock()
+        session.info = {}
+        return session
+
+    @pytest.mark.asyncio
+    async def test_stage_commit_and_flush(self):
+        book = position_book_mod.PositionBook()
+        now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        writer, reader = self._session(), self._session()
+        book.stage(writer, ("0xw", "m1"), 10.0, 0.5, now)
+        assert book.position(writer, ("0xw", "m1")) == (10.0, 0.5)
+        assert book.position(reader, ("0xw", "m1")) == (0.0, 0.0)
+        assert book.dirty_count == 0
+
+        book._promote(writer.info.pop(position_book_mod._STAGED_KEY))
+        assert book.position(reader, ("0xw", "m1")) == (10.0, 0.5)
+        assert book.dirty_count == 1
+
+        flusher = self._session()
+        assert await book.flush(flusher) == 1
+        assert flusher.execute.await_count == 1
+        assert book.dirty_count == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_rows_dirty(self):
+        book = position_book_mod.PositionBook()
+        now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        book._promote({("0xw", "m1"): (1.0, 0.2, now)})
+        flusher = self._session()
+        flusher.execute.side_effect = RuntimeError("db down")
+        with pytest.raises(RuntimeError):
+            await book.flush(flusher)
+        assert book.dirty_count == 1
+
+
+class TestWalletSeenBuffer:
+    """Sightings collapse to one (first, last) range per wallet."""
+
+    def test_touch_keeps_widest_range(self):
+        buf = WalletSeenBuffer()
+        t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        buf.touch("0xw", t0 + timedelta(seconds=5))
+        buf.touch("0xw", t0)
+        buf.touch("0xw", t0 + timedelta(seconds=9))
+        buf.touch("0xv", t0)
+        batch = buf.take()
+        assert batch["0xw"] == [t0, t0 + timedelta(seconds=9)]
+        assert len(batch) == 2 and len(buf) == 0
+
+    def test_merge_after_failed_write(self):
+        buf = WalletSeenBuffer()
+        t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        buf.touch("0xw", t0)
+        batch = buf.take()
+        buf.touch("0xw", t0 + timedelta(seconds=3))
+        buf.merge(batch)
+        assert buf.take()["0xw"] == [t0, t0 + timedelta(seconds=3)]
+
+
+class TestWhaleScoreTable:
+    """Recompute runs merge into the table under a newer version."""
+
+    @pytest.mark.asyncio
+    async def test_load_lookup_and_apply(self):
+        table = WhaleScoreTable(overlay_seconds=60)
+        session = AsyncMock()
+        result = MagicMock()
+        result.all.return_value = [("0xa", 70), ("0xb", 40)]
+        session.execute.return_value = result
+        await table.ensure_loaded(session)
+        await table.ensure_loaded(session)
+        assert session.execute.await_count == 1
+        assert table.lookup("0xa") == (70, True)
+        assert table.lookup("0xnew") == (0, True)
+
+        table.remember("0xa", 95)
+        assert table.lookup("0xa") == (95, False)
+
+        table.apply({"0xa": 80}, version=5)
+        assert table.version == 5
+        assert table.lookup("0xa") == (80, True)  # overlay dropped
+        assert table.lookup("0xb") == (40, True)  # untouched wallets kept
+        table.apply({"0xa": 10}, version=4)
+        assert table.lookup("0xa") == (80, True)
+
+    @pytest.mark.asyncio
+    async def test_failed_load_backs_off(self):
+        table = WhaleScoreTable(retry_seconds=30)
+        session = AsyncMock()
+        session.execute.side_effect = RuntimeError("db down")
+        clock = [1000.0]
+        with patch("services.whale_engine.score_table.time.monotonic", lambda: clock[0]):
+            await table.ensure_loaded(session)
+            await table.ensure_loaded(session)
+            assert session.execute.await_count == 1
+            assert not table.loaded and table.lookup("0xa") == (0, True)
+
+            result = MagicMock()
+            result.all.return_value = [("0xa", 70)]
+            session.execute.side_effect = None
+            session.execute.return_value = result
+            clock[0] += 31
+            await table.ensure_loaded(session)
+        assert session.execute.await_count == 2
+        assert table.loaded and table.lookup("0xa") == (70, True)
+
+    @pytest.mark.asyncio
+    async def test_newer_published_version_forces_reload(self):
+        table = WhaleScoreTable()
+        session = AsyncMock()
+        result = MagicMock()
+        result.all.return_value = [("0xa", 70)]
+        session.execute.return_value = result
+        await table.ensure_loaded(session)
+        table.apply({"0xa": 71}, version=10)
+        assert table.note_version(10) is False
+        assert table.note_version(11) is True
+        assert not table.loaded
+        await table.ensure_loaded(session)
+        assert table.version == 11
+        assert table.lookup("0xa") == (70, True)
+
+
+# ── Wallet-partitioned whale consumers ────────────────────
+
+
+class TestPartitionRouting:
+    """trade_created is split by wallet with per-wallet order preserved."""
+
+    @pytest.mark.asyncio
+    async def test_route_keeps_wallet_order_within_partition(self):
+        import json
+        from services.unified import worker_loop
+        from services.unified.memory_store import InMemoryRedis
+
+        redis = InMemoryRedis(decode_responses=True)
+        raws = [
+            json.dumps({"trade_id": f"t{i}", "wallet": f"0xW{i % 5}", "enqueued_at": 100.0 + i})
+            for i in range(40)
+        ] + ["not json"]
+        routed = await worker_loop._route_trade_created(redis, raws, 3)
+        assert routed == 40
+
+        seen: dict[str, list[int]] = {}
+        for p in range(3):
+            for raw in await redis.lrange(worker_loop._partition_queue(p), 0, -1):
+                msg = json.loads(raw)
+                assert worker_loop._wallet_partition(msg["wallet"], 3) == p
+                seen.setdefault(msg["wallet"], []).append(int(msg["trade_id"][1:]))
+        assert sorted(sum(seen.values(), [])) == list(range(40))
+        for ids in seen.values():
+            assert ids == sorted(ids)
+
+    @pytest.mark.asyncio
+    async def test_wallet_lookup_failure_falls_back_to_trade_id(self, monkeypatch):
+        import json
+        from services.unified import worker_loop
+        from services.unified.memory_store import InMemoryRedis
+
+        def broken_session():
+            raise RuntimeError("pool exhausted")
+
+        monkeypatch.setattr(worker_loop, "SessionLocal", broken_session)
+        redis = InMemoryRedis(decode_responses=True)
+        raws = [json.dumps({"trade_id": f"t{i}"}) for i in range(12)]
+        assert await worker_loop._route_trade_created(redis, raws, 3) == 12
+
+        delivered = {}
+        for p in range(3):
+            for raw in await redis.lrange(worker_loop._partition_queue(p), 0, -1):
+                msg = json.loads(raw)
+                assert worker_loop._wallet_partition(msg["trade_id"], 3) == p
+                delivered[msg["trade_id"]] = p
+        assert sorted(delivered) == sorted(f"t{i}" for i in range(12))
+
+    @pytest.mark.asyncio
+    async def test_failed_partition_push_requeues_in_order(self):
+        import json
+        from services.unified import worker_loop
+        from services.unified.memory_store import InMemoryRedis
+        from shared.config import settings
+
+        class FlakyRedis(InMemoryRedis):
+            async def rpush(self, key, *values):
+                if key == worker_loop._partition_queue(1):
+                    raise ConnectionError("redis down")
+                return await super().rpush(key, *values)
+
+        redis = FlakyRedis(decode_responses=True)
+        await redis.rpush(settings.trade_created_queue, "later")
+        raws = [json.dumps({"trade_id": f"t{i}", "wallet": f"0xW{i % 4}", "enqueued_at": 1.0}) for i in range(16)]
+        with pytest.raises(ConnectionError):
+            await worker_loop._route_trade_created(redis, raws, 3)
+
+        pushed = [
+            json.loads(raw)["trade_id"]
+            for p in (0, 2)
+            for raw in await redis.lrange(worker_loop._partition_queue(p), 0, -1)
+        ]
+        requeued = [json.loads(raw)["trade_id"] for raw in (await redis.lrange(settings.trade_created_queue, 0, -1))[:-1]]
+        assert (await redis.lrange(settings.trade_created_queue, -1, -1)) == ["later"]
+        failed = [f"t{i}" for i in range(16) if worker_loop._wallet_partition(f"0xW{i % 4}", 3) == 1]
+        assert failed and set(failed) <= set(requeued)
+        assert requeued == sorted(requeued, key=lambda t: int(t[1:]))  # arrival order, ahead of "later"
+        assert sorted(pushed + requeued, key=lambda t: int(t[1:])) == [f"t{i}" for i in range(16)]
+
+    def test_worker_status_includes_queue_stats(self):
+        from services.unified import worker_loop
+
+        worker_loop._beat("whale_consume:p9")
+        worker_loop._worker_queue_stats["whale_consume:p9"] = {"depth": 7, "lag_sec": 1.5}
+        status = worker_loop.get_worker_status()["whale_consume:p9"]
+        assert status["depth"] == 7 and status["lag_sec"] == 1.5
+        assert "last_beat_sec" in status
+
+
+# ── Batched vs per-trade consumer ─────────────────────────
+
+
+class TestProcessTradeBatchParity:
+    """process_trade_batch emits exactly what process_trade_id would."""
+
+    _WALLET_SCORES = {"0xa": 90, "0xb": 50}
+
+    def _trades(self, now):
+        def trade(i, wallet, side, amount, price, minutes_ago):
+            return TradeRaw(
+                trade_id=f"p{i}", market_id="m1", outcome="Yes", wallet=wallet, side=side,
+                amount=Decimal(str(amount)), price=Decimal(str(price)), timestamp=now - timedelta(minutes=minutes_ago),
+            )
+
+        return [
+            trade(0, "0xa", "BUY", 6000, 0.5, 9),     # low confidence, $3k
+            trade(1, "0xb", "BUY", 100, 0.5, 8),      # too small, no event
+            trade(2, "0xa", "BUY", 12000, 0.5, 7),    # spike adds to the position
+            trade(3, "0xb", "BUY", 20000, 0.5, 6),    # low score lifted by the spike
+            trade(4, "0xa", "BUY", 8000, 0.6, 5),
+            trade(5, "0xa", "SELL", 20000, 0.7, 4),   # folded into 0xa's buy spike
+            trade(6, "0xc", "BUY", 30000, 0.4, 3),    # unscored wallet
+        ]
+
+    @staticmethod
+    def _reset_process_state():
+        from services.whale_engine.behavior import window_states
+        from services.whale_engine.positions import position_book
+        from services.whale_engine.score_table import whale_score_table
+        from services.whale_engine.wallet_stats import wallet_stats_book
+
+        for singleton in (position_book(), window_states(), whale_score_table(), wallet_stats_book()):
+            if singleton is not None:
+                singleton.clear()
+
+    async def _run(self, batched: bool) -> list[dict]:
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+        from sqlalchemy.pool import StaticPool
+
+        from services.unified.memory_store import InMemoryRedis
+        from services.whale_engine import engine as engine_mod
+        from shared.models import WhalePosition, WhaleProfile, WhaleScore, WhaleStats, WhaleTrade, WhaleTradeHistory
+
+        self._reset_process_state()
+        engine_mod._HAS_WHALE_POSITIONS_TABLE = None  # re-inspect the fresh schema
+        now = datetime.now(timezone.utc)
+        trades = self._trades(now)
+        db = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with db.begin() as conn:
+            for model in (TradeRaw, WhaleStats, WhaleScore, WhaleTrade, WhaleProfile, WhalePosition, WhaleTradeHistory):
+                await conn.run_sync(model.__table__.create)
+        async with AsyncSession(db, expire_on_commit=False) as session:
+            session.add_all(trades)
+            session.add_all(WhaleStats(wallet_address=w, whale_score=s) for w, s in self._WALLET_SCORES.items())
+            await session.commit()
+
+        # Same ids both ways, including a duplicate and an unknown id.
+        ids = [t.trade_id for t in trades] + ["p2", "missing"]
+        redis = InMemoryRedis(decode_responses=True)
+        async with AsyncSession(db, expire_on_commit=False) as session:
+            if batched:
+                events = await engine_mod.process_trade_batch(session, redis, ids)
+            else:
+                events = []
+                for trade_id in ids:
+                    created, event = await engine_mod.process_trade_id(session, redis, trade_id)
+                    if created and event is not None:
+                        events.append(event)
+            await session.commit()
+        await db.dispose()
+        return [{k: v for k, v in e.items() if k != "created_at"} for e in events]
+
+    @pytest.mark.asyncio
+    async def test_batched_and_per_trade_paths_emit_same_events(self, monkeypatch):
+        from services.whale_engine import engine as engine_mod
+        from shared.config import settings
+
+        monkeypatch.setattr(settings, "database_url", "sqlite+aiosqlite://")
+        for flag in (
+            "_HAS_WHALE_POSITIONS_TABLE", "_HAS_WHALE_TRADES_ACTION_TYPE_COLUMN", "_HAS_WHALE_PROFILES_TABLE",
+            "_HAS_WHALE_TRADE_HISTORY_TABLE", "_HAS_WHALE_STATS_TABLE", "_SCHEMA_FLAGS_CHECKED_AT",
+        ):
+            monkeypatch.setattr(engine_mod, flag, getattr(engine_mod, flag))
+        try:
+            per_trade = await self._run(batched=False)
+            batched = await self._run(batched=True)
+        finally:
+            self._reset_process_state()
+
+        assert batched == per_trade
+        assert [e["trade_id"] for e in per_trade] == ["p0", "p2", "p3", "p4", "p5", "p6"]
+        assert [e["action_type"] for e in per_trade] == ["entry", "add", "entry", "add", "add", "entry"]
+        assert {e["signal_level"] for e in per_trade} == {"low", "high"}
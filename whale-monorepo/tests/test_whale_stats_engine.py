@@ -1,9 +1,24 @@
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+import math
+
+import pytest
+
 from services.whale_engine.engine import (
   _WindowMetrics,
   _combine_window_metrics,
   _apply_trade_to_position,
   _compute_scores,
+  _fetch_multi_window_metrics,
+  _fetch_window_metrics,
+  _market_context,
+  _wallet_window_metrics,
+  _window_metrics_from_rows,
 )
+from services.unified.memory_store import InMemoryRedis
+from services.whale_engine import wallet_stats
+from services.whale_engine.wallet_stats import HistoryEntry, WalletStatsBook
 
 
 def test_apply_trade_to_position_realized_pnl_and_actions():
@@ -94,3 +109,481 @@ def test_compute_scores_applies_wallet_age_and_wash_penalties():
 
   s_wash = _compute_scores(base, wallet_age_days=30.0, wash_suspected=True)
   assert s_wash["whale_score"] < s_old["whale_score"] * 0.5
+
+
+def _entries(start: datetime) -> list[HistoryEntry]:
+  pnls = [120.0, -40.0, 0.0, -300.0, 55.5, 210.0, -12.0]
+  return [
+    HistoryEntry(f"t{i}", "m1" if i % 3 else "m2", "buy" if i % 2 else "sell", p, 100.0 + 10 * i, start + timedelta(hours=i))
+    for i, p in enumerate(pnls)
+  ]
+
+
+def test_wallet_window_metrics_matches_two_pass():
+  start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+  entries = _entries(start)
+  raw = [type("R", (), {"trade_id": e.trade_id, "market_id": e.market_id, "price": 0.1 * (i + 1), "amount": 10.0})() for i, e in enumerate(entries)]
+  volume, percentiles = _market_context(raw)
+  m = _wallet_window_metrics(list(reversed(entries)), percentiles, volume)
+
+  pnls = [e.pnl for e in entries]
+  mean = sum(pnls) / len(pnls)
+  assert m.trades == 7
+  assert abs(m.total_pnl - sum(pnls)) < 1e-9
+  assert abs(m.stddev_pnl - math.sqrt(sum((p - mean) ** 2 for p in pnls) / len(pnls))) < 1e-9
+  assert abs(m.max_drawdown - 340.0) < 1e-9  # peak 120 -> trough -220
+  assert abs(m.win_rate - 3 / 6) < 1e-9  # the zero-PnL trade is not closed
+  assert abs(m.top_market_fraction - 4 / 7) < 1e-9
+
+
+def test_wallet_stats_book_caps_rows_and_schedules_expiry():
+  start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+  book = WalletStatsBook(bucket_seconds=3600)
+  book.configure(trade_cap=5)
+  entries = _entries(start)
+  book.record("0xw", entries[0])  # not hydrated yet: only marks dirty
+  assert not book.has("0xw")
+  book.load("0xw", entries[:4])
+  for e in entries[4:]:
+    book.record("0xw", e)
+  book.record("0xw", entries[6])  # replay is a no-op
+  assert [e.trade_id for e in book.rows("0xw")] == ["t2", "t3", "t4", "t5", "t6"]
+
+  now = start + timedelta(hours=7)
+  assert book.take_dirty(now) == {"0xw"}
+  book.schedule_expiry("0xw", now, (86400.0,))
+  assert book.take_dirty(start + timedelta(days=1, hours=2)) == set()
+  assert book.take_dirty(start + timedelta(days=1, hours=3)) == {"0xw"}
+
+  # A full pass refreshes the book: rows go, pending dirty marks stay.
+  book.record("0xw", entries[0]._replace(trade_id="t9"))
+  book.refresh()
+  assert not book.has("0xw") and len(book) == 0
+  assert book.take_dirty(now) == {"0xw"}
+
+
+@pytest.mark.asyncio
+async def test_shared_dirty_set_rehydrates_foreign_wallets(monkeypatch):
+  monkeypatch.setattr(wallet_stats, "WHALE_STATS_DIRTY_DRAIN_BATCH", 2)
+  start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+  entries = _entries(start)
+  redis = InMemoryRedis(decode_responses=True)
+  consumer = WalletStatsBook()
+  consumer.configure(trade_cap=5)
+  monkeypatch.setattr(wallet_stats, "_BOOK", consumer)
+  consumer.record("0xa", entries[0])
+  consumer.record("0xb", entries[1])
+  assert await wallet_stats.publish_dirty_wallets(redis) == 2
+  assert await wallet_stats.publish_dirty_wallets(redis) == 0
+  await wallet_stats.mark_wallets_dirty(redis, ["0xc", ""])
+
+  recompute = WalletStatsBook()
+  recompute.configure(trade_cap=5)
+  recompute.load("0xa", entries[:2])
+  recompute.load("0xb", entries[:2])
+  recompute.record("0xb", entries[2])  # dirty here and elsewhere
+  recompute.load("0xd", entries[:2])
+  recompute.mark_dirty(["0xd"])
+  shared = await wallet_stats.drain_dirty_wallets(redis)
+  assert shared == {"0xa", "0xb", "0xc"}
+  assert await redis.scard(wallet_stats.WHALE_STATS_DIRTY_KEY) == 0
+  assert recompute.take_dirty(start, shared) == {"0xa", "0xb", "0xc", "0xd"}
+  # Rows cached before another process wrote them are re-read from the DB.
+  assert not recompute.has("0xa")
+  assert not recompute.has("0xb")
+  assert recompute.has("0xd")
+
+
+@pytest.mark.asyncio
+async def test_backfill_marks_skipped_without_redis_url(monkeypatch):
+  from shared import async_utils
+  from shared.config import settings
+
+  redis = InMemoryRedis(decode_responses=True)
+  monkeypatch.setattr(async_utils, "_redis", redis)
+  monkeypatch.setattr(settings, "redis_url", "")
+  assert await wallet_stats.queue_backfilled_wallets({"0xa"}) == 0
+  assert await redis.scard(wallet_stats.WHALE_STATS_DIRTY_KEY) == 0
+  monkeypatch.setattr(settings, "redis_url", "redis://localhost:6379/0")
+  assert await wallet_stats.queue_backfilled_wallets({"0xa", "0xb"}) == 2
+  assert await redis.scard(wallet_stats.WHALE_STATS_DIRTY_KEY) == 2
+
+
+class _StatsSession:
+  """Serves the two whale-stats SELECTs from lists, honouring the
+  timestamp filter, ordering and LIMIT the engine puts on them."""
+
+  def __init__(self, raw, history):
+    self.raw = raw
+    self.history = history
+    self.calls = 0
+
+  async def execute(self, stmt):
+    self.calls += 1
+    table = stmt.get_final_froms()[0].name
+    since = next(c.right.value for c in stmt._where_criteria)
+    limit = stmt._limit
+    result = MagicMock()
+    if table == "trades_raw":
+      rows = sorted((r for r in self.raw if r.timestamp >= since), key=lambda r: r.timestamp, reverse=True)
+      result.all.return_value = rows[:limit]
+    else:
+      rows = sorted((h for h in self.history if h.timestamp >= since), key=lambda h: h.timestamp, reverse=True)
+      rows.sort(key=lambda h: h.wallet_address)
+      result.all.return_value = rows[:limit]
+    return result
+
+
+# Shaped like the engine's column SELECT rows: positional and by name.
+_RawRow = namedtuple("_RawRow", "trade_id market_id price amount timestamp")
+_HistoryRow = namedtuple("_HistoryRow", "wallet_address trade_id market_id side pnl trade_usd timestamp")
+
+
+def _stats_dataset(now: datetime):
+  raw, history = [], []
+  for i in range(400):
+    ts = now - timedelta(hours=5 * i + (i % 7))
+    market = f"m{i % 5}"
+    raw.append(_RawRow(trade_id=f"r{i}", market_id=market, price=0.05 + (i * 37 % 90) / 100.0, amount=10.0 + i % 13, timestamp=ts))
+    if i % 3 == 0:
+      history.append(_HistoryRow(
+        trade_id=f"r{i}",
+        wallet_address=("0xa", "0xb", "0xc", "0xd")[i % 4],
+        market_id=market,
+        side="buy" if i % 2 else "sell",
+        pnl=((i * 53) % 200) - 90.0,
+        trade_usd=100.0 + (i * 17) % 900,
+        timestamp=ts,
+      ))
+  return raw, history
+
+
+def _baseline_window_metrics(raw, history, since, trade_cap, raw_cap, history_cap):
+  """Straight two-pass port of the original per-window metrics, sharing no
+  code with the engine, so the golden test pins behaviour independently."""
+  raw_rows = sorted((r for r in raw if r.timestamp >= since), key=lambda r: r.timestamp, reverse=True)[:raw_cap]
+  market_volume: dict[str, float] = {}
+  market_prices: dict[str, list[tuple[float, str]]] = {}
+  for r in raw_rows:
+    market_volume[r.market_id] = market_volume.get(r.market_id, 0.0) + r.price * r.amount
+    market_prices.setdefault(r.market_id, []).append((r.price, r.trade_id))
+  percentiles: dict[str, float] = {}
+  for items in market_prices.values():
+    items.sort(key=lambda x: x[0])
+    for idx, (_, tid) in enumerate(items):
+      percentiles[tid] = idx / (len(items) - 1) if len(items) > 1 else 0.5
+
+  rows = sorted((h for h in history if h.timestamp >= since), key=lambda h: h.timestamp, reverse=True)
+  rows.sort(key=lambda h: h.wallet_address)
+  by_wallet: dict[str, list] = {}
+  for h in rows[:history_cap]:
+    by_wallet.setdefault(h.wallet_address, []).append(h)
+
+  out = {}
+  for wallet, trades in by_wallet.items():
+    trades = trades[:trade_cap]
+    n = len(trades)
+    pnls = [t.pnl for t in trades]
+    total_pnl = sum(pnls)
+    total_vol = sum(t.trade_usd for t in trades)
+    mean = total_pnl / n
+    wins = [p for p in pnls if p > 0]
+    losses = [p for p in pnls if p < 0]
+    avg_win = sum(wins) / len(wins) if wins else 0.0
+    avg_loss = sum(-p for p in losses) / len(losses) if losses else 0.0
+    cum, peak, max_dd = 0.0, -math.inf, 0.0
+    for t in sorted(trades, key=lambda t: t.timestamp):
+      cum += t.pnl
+      peak = max(peak, cum)
+      max_dd = max(max_dd, peak - cum)
+    entries, exits, liquidity, counts = [], [], [], {}
+    for t in trades:
+      pr = percentiles.get(t.trade_id)
+      if pr is None:
+        continue
+      if t.side.lower() == "buy":
+        entries.append(pr)
+      elif t.side.lower() == "sell":
+        exits.append(pr)
+      m_vol = market_volume.get(t.market_id, 0.0)
+      liquidity.append(t.trade_usd / m_vol if m_vol > 0 else 0.0)
+      counts[t.market_id] = counts.get(t.market_id, 0) + 1
+    out[wallet] = _WindowMetrics(
+      trades=n,
+      win_rate=len(wins) / (len(wins) + len(losses)) if wins or losses else 0.0,
+      roi=total_pnl / total_vol if total_vol > 0 else 0.0,
+      total_pnl=total_pnl,
+      total_volume=total_vol,
+      avg_trade_size=total_vol / n,
+      max_drawdown=max_dd,
+      stddev_pnl=math.sqrt(sum((p - mean) ** 2 for p in pnls) / n),
+      avg_entry_percentile=sum(entries) / len(entries) if entries else 0.5,
+      avg_exit_percentile=sum(exits) / len(exits) if exits else 0.5,
+      risk_reward_ratio=avg_win / avg_loss if avg_loss > 0 else 0.0,
+      market_liquidity_ratio=sum(liquidity) / len(liquidity) if liquidity else 0.0,
+      top_market_fraction=max(counts.values()) / n if counts else 0.0,
+      pnl_abs_ratio=abs(total_pnl) / total_vol if total_vol > 0 else 0.0,
+    )
+  return out
+
+
+def _assert_metrics_match(got: dict, expected: dict) -> None:
+  assert got.keys() == expected.keys()
+  for wallet, m in expected.items():
+    for field, value in vars(m).items():
+      assert getattr(got[wallet], field) == pytest.approx(value, rel=1e-9, abs=1e-9), (wallet, field)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("columnar", [True, False])
+@pytest.mark.parametrize("history_cap", ["100000", "40"])
+async def test_multi_window_metrics_golden(monkeypatch, history_cap, columnar):
+  from services.whale_engine import engine
+
+  if columnar:
+    pytest.importorskip("numpy")
+  monkeypatch.setattr(engine, "columnar_enabled", lambda: columnar)
+  monkeypatch.setenv("WHALE_STATS_RAW_TRADE_CAP", "250")
+  monkeypatch.setenv("WHALE_STATS_HISTORY_CAP", history_cap)
+  now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+  raw, history = _stats_dataset(now)
+  sinces = [now - timedelta(days=d) for d in (7, 30, 90)]
+
+  session = _StatsSession(raw, history)
+  multi = await _fetch_multi_window_metrics(session, sinces=sinces, trade_cap=30)
+  assert session.calls == (2 if history_cap == "100000" else 6)
+  for since, got in zip(sinces, multi):
+    _assert_metrics_match(got, _baseline_window_metrics(raw, history, since, 30, 250, int(history_cap)))
+  reference = [await _fetch_window_metrics(_StatsSession(raw, history), since=s, trade_cap=30) for s in sinces]
+  assert multi == reference
+
+  if history_cap == "100000":
+    # Frozen output of the per-window implementation.
+    assert [len(m) for m in multi] == [4, 4, 4]
+    assert [m["0xa"].trades for m in multi] == [3, 12, 30]
+    assert round(multi[2]["0xa"].total_pnl, 6) == 160.0
+    assert round(multi[2]["0xa"].max_drawdown, 6) == 162.0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("pool_workers", [0, 1])
+async def test_offloaded_window_metrics_match_inline(monkeypatch, pool_workers):
+  from services.unified import executor
+  from services.whale_engine import engine
+
+  monkeypatch.setenv("WHALE_STATS_RAW_TRADE_CAP", "250")
+  monkeypatch.setattr(executor, "COMPUTE_POOL_WORKERS", pool_workers)
+  now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+  raw, history = _stats_dataset(now)
+  sinces = [now - timedelta(days=d) for d in (7, 30, 90)]
+  # Inline, the tuple path runs under both backends; the pool process uses its own.
+  backends = [True, False] if pool_workers == 0 else [engine.columnar_enabled()]
+  try:
+    for columnar in backends:
+      monkeypatch.setattr(engine, "columnar_enabled", lambda: columnar)
+      inline = await _fetch_multi_window_metrics(_StatsSession(raw, history), sinces=sinces, trade_cap=30)
+      offloaded = await _fetch_multi_window_metrics(
+        _StatsSession(raw, history), sinces=sinces, trade_cap=30, offload=executor.run_compute,
+      )
+      assert offloaded == inline
+  finally:
+    executor.shutdown_compute_pool()
+
+
+@pytest.mark.asyncio
+async def test_compute_timeout_terminates_pool_workers(monkeypatch):
+  import asyncio
+  import os
+  import time
+  from services.unified import executor
+
+  monkeypatch.setattr(executor, "COMPUTE_POOL_WORKERS", 1)
+  monkeypatch.setenv("COMPUTE_TIMEOUT_PROBE_SECONDS", "0.5")
+  try:
+    pid = await executor.run_compute("pid", os.getpid)
+    assert pid != os.getpid()
+    with pytest.raises(asyncio.TimeoutError):
+      await executor.run_compute("probe", time.sleep, 30)
+    assert executor._pool is None and not executor._pool_pids
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+      try:
+        os.kill(pid, 0)
+      except ProcessLookupError:
+        break
+      await asyncio.sleep(0.05)
+    else:
+      pytest.fail(f"pool worker {pid} still running")
+  finally:
+    executor.shutdown_compute_pool()
+
+
+def test_columnar_window_metrics_match_scalar(monkeypatch):
+  pytest.importorskip("numpy")
+  import services.whale_engine.engine as engine
+
+  now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+  raw, history = _stats_dataset(now)
+  # Equal timestamps within a wallet, a history row without a raw row and a
+  # single-trade market exercise the tie and fallback branches.
+  history.append(_HistoryRow(trade_id="r3", wallet_address="0xb", market_id="m3", side="SELL", pnl=-12.5, trade_usd=40.0, timestamp=history[1].timestamp))
+  history.append(_HistoryRow(trade_id="gone", wallet_address="0xe", market_id="m9", side="buy", pnl=7.0, trade_usd=70.0, timestamp=now - timedelta(days=2)))
+  raw.append(_RawRow(trade_id="solo", market_id="m7", price=0.3, amount=5.0, timestamp=now - timedelta(days=1)))
+  history.append(_HistoryRow(trade_id="solo", wallet_address="0xe", market_id="m7", side="buy", pnl=0.0, trade_usd=1.5, timestamp=now - timedelta(days=1)))
+  raw.sort(key=lambda r: r.timestamp, reverse=True)
+  history.sort(key=lambda h: h.timestamp, reverse=True)
+  history.sort(key=lambda h: h.wallet_address)
+  sinces = [now - timedelta(days=d) for d in (7, 30, 90)]
+
+  for cap in (1, 5, 30):
+    columnar = _window_metrics_from_rows(history, sinces, cap, raw)
+    monkeypatch.setattr(engine, "columnar_enabled", lambda: False)
+    scalar = _window_metrics_from_rows(history, sinces, cap, raw)
+    monkeypatch.undo()
+    assert columnar == scalar
+
+
+@pytest.mark.parametrize("columnar", [True, False])
+def test_sql_market_context_matches_python_ranking(monkeypatch, columnar):
+  from sqlalchemy import create_engine
+  from shared.models import TradeRaw, WhaleTradeHistory
+  import services.whale_engine.engine as engine
+
+  if not columnar:
+    monkeypatch.setattr(engine, "columnar_enabled", lambda: False)
+  now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+  raw, history = _stats_dataset(now)
+  # percent_rank() gives equal prices one percentile; Python orders them by
+  # fetch order, so compare on distinct prices.
+  raw = [r._replace(price=0.01 + i / 1000.0) for i, r in enumerate(raw)]
+  sinces = [now - timedelta(days=d) for d in (7, 30, 90)]
+
+  db = create_engine("sqlite://")
+  TradeRaw.__table__.create(db)
+  WhaleTradeHistory.__table__.create(db)
+  with db.begin() as conn:
+    conn.execute(TradeRaw.__table__.insert(), [dict(r._asdict(), wallet="0x0", side="buy") for r in raw])
+    conn.execute(WhaleTradeHistory.__table__.insert(), [dict(h._asdict(), price=0.5, size=1.0) for h in history])
+    rows = conn.execute(engine._history_context_query(sinces, 0)).all()
+
+  from_sql = _window_metrics_from_rows(rows, sinces, 30)
+  from_raw = _window_metrics_from_rows(history, sinces, 30, raw)
+  assert [sorted(m) for m in from_sql] == [sorted(m) for m in from_raw]
+  for sql_window, raw_window in zip(from_sql, from_raw):
+    for wallet, expected in raw_window.items():
+      got = sql_window[wallet]
+      for field in expected.__dataclass_fields__:
+        assert math.isclose(getattr(got, field), getattr(expected, field), rel_tol=1e-9, abs_tol=1e-12), field
+
+
+@pytest.mark.asyncio
+async def test_streamed_window_metrics_match_capped_fetch():
+  from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+  from sqlalchemy.pool import StaticPool
+  from shared.models import TradeRaw, WhaleTradeHistory
+  import services.whale_engine.engine as engine
+
+  now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+  raw, history = _stats_dataset(now)
+  sinces = [now - timedelta(days=d) for d in (7, 30, 90)]
+  db = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+  async with db.begin() as conn:
+    await conn.run_sync(TradeRaw.__table__.create)
+    await conn.run_sync(WhaleTradeHistory.__table__.create)
+    await conn.execute(TradeRaw.__table__.insert(), [dict(r._asdict(), wallet="0x0", side="buy") for r in raw])
+    await conn.execute(WhaleTradeHistory.__table__.insert(), [dict(h._asdict(), price=0.5, size=1.0) for h in history])
+
+  async with AsyncSession(db) as session:
+    assert engine._sql_context_supported(session)
+    loaded = await _fetch_multi_window_metrics(session, sinces=sinces, trade_cap=5)
+    chunks = [m async for m in engine._stream_window_metrics(session, sinces=sinces, trade_cap=5, chunk_wallets=1)]
+  await db.dispose()
+
+  assert len(chunks) == 4  # one per wallet
+  streamed = [{} for _ in sinces]
+  for chunk in chunks:
+    for merged, window in zip(streamed, chunk):
+      assert not set(merged) & set(window)
+      merged.update(window)
+  assert streamed == loaded
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_values_fallback_chunks_and_merges(monkeypatch):
+  from sqlalchemy import select
+  from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+  from sqlalchemy.pool import StaticPool
+  import shared.db as db_mod
+  from shared.models import WhaleProfile
+
+  monkeypatch.setattr(db_mod, "_max_bind_params", lambda name: 21)  # 3 rows of 7 columns
+  now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+  rows = [
+    {"wallet_address": f"0x{i}", "total_volume": 10.0 * i, "total_trades": i, "realized_pnl": 1.0, "wins": 1, "losses": 0, "updated_at": now}
+    for i in range(8)
+  ]
+  update = ["total_volume", "total_trades", "updated_at"]
+  engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+  async with engine.begin() as conn:
+    await conn.run_sync(WhaleProfile.__table__.create)
+  async with AsyncSession(engine) as session:
+    await db_mod.bulk_upsert(session, WhaleProfile, rows[:5], index_elements=["wallet_address"], update_columns=update)
+    changed = [dict(r, total_trades=100 + i, wins=9) for i, r in enumerate(rows)]
+    await db_mod.bulk_upsert(session, WhaleProfile, changed, index_elements=["wallet_address"], update_columns=update)
+    added = await db_mod.bulk_upsert(
+      session, WhaleProfile, [dict(rows[0], wallet_address="0xnew"), rows[1]], index_elements=["wallet_address"], returning="wallet_address",
+    )
+    got = (await session.execute(select(WhaleProfile.wallet_address, WhaleProfile.total_trades, WhaleProfile.wins))).all()
+  await engine.dispose()
+
+  assert added == ["0xnew"]  # do-nothing: the existing wallet is skipped
+  by_wallet = {w: (t, wins) for w, t, wins in got}
+  assert len(by_wallet) == 9
+  assert by_wallet["0x2"] == (102, 1)  # updated columns only
+  assert by_wallet["0x7"] == (107, 9)  # inserted by the second call
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_copy_path_merges_on_postgres(monkeypatch, pg_session):
+  from sqlalchemy import select, text
+  import shared.db as db_mod
+  from shared.models import WhaleProfile
+
+  monkeypatch.setattr(db_mod, "BULK_UPSERT_COPY_ENABLED", True)
+  monkeypatch.setattr(db_mod, "BULK_UPSERT_COPY_MIN_ROWS", 2)
+  copied = []
+  real_copy = db_mod._copy_upsert
+
+  async def spy(*args, **kwargs):
+    copied.append(len(args[4]))
+    return await real_copy(*args, **kwargs)
+
+  monkeypatch.setattr(db_mod, "_copy_upsert", spy)
+  now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+  rows = [
+    {"wallet_address": f"0xcopy{i}", "total_volume": 10.5 * i, "total_trades": i, "realized_pnl": 0.25, "wins": 1, "losses": 0, "updated_at": now}
+    for i in range(6)
+  ]
+  update = ["total_volume", "total_trades", "updated_at"]
+  async with pg_session(WhaleProfile) as session:
+    await db_mod.bulk_upsert(session, WhaleProfile, rows[:4], index_elements=["wallet_address"], update_columns=update)
+    changed = [dict(r, total_trades=100 + i, wins=9) for i, r in enumerate(rows)]
+    await db_mod.bulk_upsert(session, WhaleProfile, changed, index_elements=["wallet_address"], update_columns=update)
+    added = await db_mod.bulk_upsert(
+      session, WhaleProfile, [dict(rows[0], wallet_address="0xcopynew"), rows[1]], index_elements=["wallet_address"], returning="wallet_address",
+    )
+    got = (
+      await session.execute(
+        select(WhaleProfile.wallet_address, WhaleProfile.total_volume, WhaleProfile.total_trades, WhaleProfile.wins)
+        .where(WhaleProfile.wallet_address.like("0xcopy%"))
+      )
+    ).all()
+    stages = (await session.execute(text("SELECT count(*) FROM pg_tables WHERE tablename LIKE '_stage_whale_profiles_%'"))).scalar()
+
+  assert copied == [4, 6, 2]
+  assert added == ["0xcopynew"]
+  by_wallet = {w: (float(v), t, wins) for w, v, t, wins in got}
+  assert len(by_wallet) == 7
+  assert by_wallet["0xcopy2"] == (21.0, 102, 1)  # NUMERIC from float, updated columns only
+  assert by_wallet["0xcopy5"] == (52.5, 105, 9)  # inserted by the second call
+  assert stages == 0